@@ -3,11 +3,12 @@ import hashlib
 import logging
 import os
 from datetime import datetime
-from typing import List, Dict, Optional, Tuple, Union
+from typing import Iterator, List, Dict, Optional, Tuple, Union
 import json
 import random
 import textwrap
 import re
+import threading
 import time
 import urllib.parse
 
@@ -41,6 +42,20 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 ALIYUN_API_KEY = os.getenv("DASHSCOPE_API_KEY") or os.getenv("ALIYUN_API_KEY")
 VOLC_SEEDREAM_API_KEY = os.getenv("VOLC_SEEDREAM_API_KEY")
+# 自反思记录和性能日志保留的最大条数
+RAG_PERFORMANCE_LOG_LIMIT = int(os.getenv("RAG_PERFORMANCE_LOG_LIMIT", "1000"))
+# 自反思模式：off（不反思）/ sampled（按比例在请求内反思）/ async（先返回回答，后台反思）/ inline（每次请求内反思）
+RAG_REFLECTION_MODES = ("off", "sampled", "async", "inline")
+RAG_REFLECTION_MODE = os.getenv("RAG_REFLECTION_MODE", "async").lower()
+RAG_REFLECTION_SAMPLE_RATE = float(os.getenv("RAG_REFLECTION_SAMPLE_RATE", "0.1"))
+# ask 并发检索阶段的线程数和各阶段时限（秒）；图片理解阶段的时限按单张图片计算
+RAG_STAGE_WORKERS = int(os.getenv("RAG_STAGE_WORKERS", "16"))
+RAG_STAGE_TIMEOUTS = {
+    "image": float(os.getenv("RAG_STAGE_TIMEOUT_IMAGE", "30")),
+    "vector": float(os.getenv("RAG_STAGE_TIMEOUT_VECTOR", "5")),
+    "database": float(os.getenv("RAG_STAGE_TIMEOUT_DATABASE", "10")),
+    "web": float(os.getenv("RAG_STAGE_TIMEOUT_WEB", "15")),
+}
 
 # 导入统一的数据库连接模块（从父目录）
 import sys
@@ -54,6 +69,77 @@ sys.path.insert(0, scripts_dir)
 from db_connection import get_user_db_config, get_user_db_connection
 from festival_name_utils import chinese_to_english_festival, extract_and_convert_festival_name
 from rag_base import RAGBase
+from retrieval_cache import get_retrieval_cache
+from reflection_worker import get_reflection_worker, reflection_record
+
+# 检索阶段线程池（与 query_database 的分表查询线程池分开，避免阶段任务占满线程后分表查询排队）
+_stage_executor = None
+_stage_executor_lock = threading.Lock()
+
+
+def _get_stage_executor() -> concurrent.futures.ThreadPoolExecutor:
+    """获取各RAG实例共享的检索阶段线程池"""
+    global _stage_executor
+    if _stage_executor is None:
+        with _stage_executor_lock:
+            if _stage_executor is None:
+                _stage_executor = concurrent.futures.ThreadPoolExecutor(max_workers=RAG_STAGE_WORKERS,
+                                                                        thread_name_prefix='rag-stage')
+    return _stage_executor
+
+
+_JSON_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f', '"': '"', '\\': '\\', '/': '/'}
+
+
+class _AnswerFieldStream:
+    """从模型流式输出的JSON文本中增量提取 answer 字段的内容（其余字段在流结束后统一解析）"""
+
+    _START = re.compile(r'"answer"\s*:\s*"')
+
+    def __init__(self):
+        self.text = ""
+        self._pos = None  # answer 字符串尚未输出部分在 text 中的位置
+        self.done = False
+
+    def feed(self, chunk: str) -> str:
+        """追加一段模型输出，返回本次新增的 answer 文本（转义序列被截断时等下一段再输出）"""
+        self.text += chunk
+        if self.done:
+            return ""
+        if self._pos is None:
+            match = self._START.search(self.text)
+            if not match:
+                return ""
+            self._pos = match.end()
+        buf = self.text
+        i = self._pos
+        out = []
+        while i < len(buf):
+            ch = buf[i]
+            if ch == '"':
+                self.done = True
+                i += 1
+                break
+            if ch == '\\':
+                if i + 1 >= len(buf):
+                    break
+                esc = buf[i + 1]
+                if esc == 'u':
+                    if i + 6 > len(buf):
+                        break
+                    try:
+                        out.append(chr(int(buf[i + 2:i + 6], 16)))
+                    except ValueError:
+                        pass
+                    i += 6
+                    continue
+                out.append(_JSON_ESCAPES.get(esc, esc))
+                i += 2
+                continue
+            out.append(ch)
+            i += 1
+        self._pos = i
+        return "".join(out)
 
 
 class CulturalResourceRAG(RAGBase):
@@ -79,9 +165,11 @@ class CulturalResourceRAG(RAGBase):
         if not self.db_config:
             self.db_config = get_user_db_config()
 
-        # 自反思与性能记录存储
+        # 自反思与性能记录存储（后台反思线程也会写入，读写时加锁）
         self.reflection_history = []
         self.performance_log = []
+        self._log_lock = threading.Lock()
+        self.reflection_mode = RAG_REFLECTION_MODE if RAG_REFLECTION_MODE in RAG_REFLECTION_MODES else "async"
 
         # 问答输出解析器（定义结构化输出字段）
         response_schemas = [
@@ -276,6 +364,8 @@ class CulturalResourceRAG(RAGBase):
                 raise RuntimeError("当前 VectorStore 不支持 add_documents 方法")
             if hasattr(self.vector_store, "persist"):
                 self.vector_store.persist()
+            # 向量库内容变化，使该向量库的检索结果缓存失效
+            get_retrieval_cache().invalidate_vector(self._persist_directory)
             print(f"数据已成功加载并索引到 {self._persist_directory}")
         except Exception as e:
             print(f"向量库写入错误: {e}")
@@ -308,13 +398,16 @@ class CulturalResourceRAG(RAGBase):
                     "improvement_suggestions": "无法解析反思结果",
                     "requires_retrieval": "否"
                 }
-            self.reflection_history.append({
-                "question": question,
-                "answer": answer,
-                "context": context,
-                "reflection": reflection_data,
-                "timestamp": datetime.now()
-            })
+            with self._log_lock:
+                self.reflection_history.append({
+                    "question": question,
+                    "answer": answer,
+                    "context": context,
+                    "reflection": reflection_data,
+                    "timestamp": datetime.now()
+                })
+                if len(self.reflection_history) > RAG_PERFORMANCE_LOG_LIMIT:
+                    del self.reflection_history[:-RAG_PERFORMANCE_LOG_LIMIT]
             return reflection_data
         except Exception as e:
             print(f"自反思过程中出现错误: {e}")
@@ -372,105 +465,233 @@ class CulturalResourceRAG(RAGBase):
     
     # clear_conversation_history 方法已继承自 RAGBase，无需重复定义
     
-    def ask(self, query: str, image_paths: Optional[List[str]] = None, 
-            session_id: Optional[int] = None, use_history: bool = True) -> Dict:
+    @staticmethod
+    def _timed_stage(func):
+        start = time.time()
+        return func(), time.time() - start
+
+    def _run_stages(self, stages: Dict) -> Tuple[Dict, Dict[str, Dict]]:
         """
-        回答用户关于传统节日的问题（支持多轮对话和图片输入）
-        :param query: 用户问题
-        :param image_paths: 图片路径列表（可选）
-        :param session_id: 会话ID（可选，用于持久化对话）
-        :param use_history: 是否使用对话历史
-        :return: 包含回答、关键实体、来源、置信度的字典
+        在线程池上并发执行检索阶段，每个阶段按 RAG_STAGE_TIMEOUTS 独立限时（从提交时开始计算）
+        超时或出错的阶段结果为None，其余阶段不受影响；超时的阶段在后台继续执行完后丢弃结果
+        :param stages: {阶段名: 无参函数}，阶段名形如 "vector"、"image[0]"（方括号前为时限类别）
+        :return: ({阶段名: 结果}, {阶段名: {"status", "seconds", ...}})
         """
-        print(f"收到问题: {query}")
-        if image_paths:
-            print(f"附带图片: {image_paths}")
-        
-        # 读取图片信息
-        image_context = ""
-        if image_paths:
-            image_descriptions = []
-            for img_path in image_paths:
-                img_info = self._read_image_info(img_path)
-                if img_info:
-                    image_descriptions.append(img_info)
-            if image_descriptions:
-                image_context = "\n".join(image_descriptions)
-                print(f"图片信息: {image_context[:200]}...")
+        executor = _get_stage_executor()
+        start = time.time()
+        futures = {name: executor.submit(self._timed_stage, func) for name, func in stages.items()}
+        results: Dict = {}
+        timings: Dict[str, Dict] = {}
+        for name, future in futures.items():
+            timeout = RAG_STAGE_TIMEOUTS.get(name.split("[")[0], 10.0)
+            try:
+                value, seconds = future.result(timeout=max(0.0, start + timeout - time.time()))
+                results[name] = value
+                timings[name] = {"status": "ok" if value else "empty", "seconds": round(seconds, 3)}
+            except concurrent.futures.TimeoutError:
+                future.cancel()
+                results[name] = None
+                timings[name] = {"status": "timeout", "seconds": round(time.time() - start, 3), "timeout": timeout}
+                print(f"[RAG] 检索阶段 {name} 超过 {timeout} 秒，跳过该来源")
+            except Exception as e:
+                results[name] = None
+                timings[name] = {"status": "error", "seconds": round(time.time() - start, 3), "error": str(e)[:200]}
+                print(f"[RAG] 检索阶段 {name} 出错: {e}")
+        return results, timings
+    
+    def _retrieve(self, query: str, image_paths: Optional[List[str]] = None) -> Dict:
+        """
+        检索阶段（ask 和 ask_stream 共用）：图片理解、向量库、数据库并发检索，本地来源不足时网页兜底
+        :return: 包含 context、vector_docs、db_results、web_docs、stage_timings 的字典
+        """
+        # 1. 并发检索：图片理解（每张图片一个阶段）、向量库、数据库互不依赖，各阶段独立限时，
+        #    慢或失败的来源只影响自己的结果，不再累加到总耗时
+        stages = {}
+        for idx, img_path in enumerate(image_paths or []):
+            stages[f"image[{idx}]"] = lambda p=img_path: self._read_image_info(p)
+        stages["vector"] = lambda: self._call_retriever(query)
+        if self.retrieval_tables:
+            stages["database"] = lambda: self.query_database(query, self.retrieval_tables)
+        print(f"[RAG] 并发检索阶段：{', '.join(stages)}")
+        stage_results, stage_timings = self._run_stages(stages)
         
         context_parts = []
         
         # 添加图片信息到上下文
+        image_descriptions = [stage_results[name] for name in stages
+                              if name.startswith("image[") and stage_results.get(name)]
+        image_context = "\n".join(image_descriptions)
         if image_context:
+            print(f"图片信息: {image_context[:200]}...")
             context_parts.append(f"用户上传的图片信息：\n{image_context}")
         
         # 保存检索结果用于后续返回
-        vector_docs = []
-        db_results = []
+        vector_docs = stage_results.get("vector") or []
+        db_results = stage_results.get("database") or []
         web_docs = []
         
-        try:
-            vector_docs = self._call_retriever(query)
-            vector_context = "\n".join([getattr(d, "page_content", str(d)) for d in vector_docs]) if vector_docs else ""
-            if vector_context:
-                context_parts.append(f"向量库检索结果：\n{vector_context}")
-        except Exception as e:
-            print(f"向量数据库检索错误: {e}")
-            vector_context = ""
+        vector_context = "\n".join([getattr(d, "page_content", str(d)) for d in vector_docs]) if vector_docs else ""
+        if vector_context:
+            context_parts.append(f"向量库检索结果：\n{vector_context}")
 
         if self.retrieval_tables:
-            try:
-                print(f"[RAG] 开始数据库检索，查询词：{query}")
-                db_results = self.query_database(query, self.retrieval_tables)
-                print(f"[RAG] 数据库检索完成，找到 {len(db_results)} 条结果")
-                if db_results:
-                    db_context_parts = []
-                    for result in db_results:
-                        db_text = f"来源表：{result.get('table', '')}\n"
-                        if result.get('title'):
-                            db_text += f"标题：{result.get('title')}\n"
-                        if result.get('content'):
-                            db_text += f"内容：{result.get('content')}\n"
-                        if result.get('source'):
-                            db_text += f"来源：{result.get('source')}\n"
-                        db_context_parts.append(db_text)
-                    context_parts.append(f"数据库检索结果：\n" + "\n---\n".join(db_context_parts))
-                    print(f"[RAG] 数据库检索结果已添加到上下文")
-                else:
-                    print(f"[RAG] 警告：数据库检索未找到匹配结果，查询词：{query}")
-            except Exception as e:
-                import traceback
-                print(f"[RAG] 数据库查询过程中出现错误: {e}")
-                print(f"[RAG] 错误堆栈: {traceback.format_exc()}")
+            print(f"[RAG] 数据库检索完成，找到 {len(db_results)} 条结果")
+            if db_results:
+                db_context_parts = []
+                for result in db_results:
+                    db_text = f"来源表：{result.get('table', '')}\n"
+                    if result.get('title'):
+                        db_text += f"标题：{result.get('title')}\n"
+                    if result.get('content'):
+                        db_text += f"内容：{result.get('content')}\n"
+                    if result.get('source'):
+                        db_text += f"来源：{result.get('source')}\n"
+                    db_context_parts.append(db_text)
+                context_parts.append(f"数据库检索结果：\n" + "\n---\n".join(db_context_parts))
+                print(f"[RAG] 数据库检索结果已添加到上下文")
+            else:
+                print(f"[RAG] 警告：数据库检索未找到匹配结果，查询词：{query}")
         
         context = "\n\n".join(context_parts) if context_parts else ""
         
+        # 2. 网页爬取只在本地来源不足时作为兜底阶段执行（同样限时）
         if not context or len(context.strip()) < 50:
             print("数据库和向量库中未找到相关信息，尝试从网页爬取...")
-            try:
-                web_docs = self._crawl_web_content(query, max_results=3)
-                if web_docs:
-                    web_context = "\n\n".join([getattr(d, "page_content", str(d)) for d in web_docs])
-                    if web_context:
-                        context_parts.append(f"网页检索结果：\n{web_context}")
-                        context = "\n\n".join(context_parts)
-                        
-                        web_sources = [d.metadata.get("source", "") for d in web_docs if d.metadata.get("source")]
-                        if web_sources:
-                            print(f"已从以下网页获取信息: {', '.join(web_sources[:2])}")
-            except Exception as e:
-                print(f"网页爬取失败: {e}")
+            web_results, web_timings = self._run_stages({"web": lambda: self._crawl_web_content(query, max_results=3)})
+            stage_timings.update(web_timings)
+            web_docs = web_results.get("web") or []
+            if web_docs:
+                web_context = "\n\n".join([getattr(d, "page_content", str(d)) for d in web_docs])
+                if web_context:
+                    context_parts.append(f"网页检索结果：\n{web_context}")
+                    context = "\n\n".join(context_parts)
+                    
+                    web_sources = [d.metadata.get("source", "") for d in web_docs if d.metadata.get("source")]
+                    if web_sources:
+                        print(f"已从以下网页获取信息: {', '.join(web_sources[:2])}")
+        else:
+            stage_timings["web"] = {"status": "skipped", "seconds": 0.0}
+
+        return {
+            "context": context,
+            "vector_docs": vector_docs,
+            "db_results": db_results,
+            "web_docs": web_docs,
+            "stage_timings": stage_timings
+        }
+
+    @staticmethod
+    def _history_text(history: List[Dict], use_history: bool) -> str:
+        """把最近5轮对话历史拼成提示词文本"""
+        if not use_history or not history:
+            return ""
+        history_parts = []
+        for hist in history[-5:]:  # 只保留最近5轮对话
+            if hist.get("role") == "user":
+                history_parts.append(f"用户：{hist.get('content', '')}")
+            elif hist.get("role") == "assistant":
+                history_parts.append(f"助手：{hist.get('content', '')}")
+        return "\n".join(history_parts)
+
+    def _parse_answer(self, raw_text: str) -> Dict:
+        """解析结构化输出并补全缺失字段，解析失败时使用原始文本作为答案"""
+        try:
+            parsed = self.output_parser.parse(raw_text)
+            return {
+                "answer": parsed.get("answer", ""),
+                "key_entities": parsed.get("key_entities", []),
+                "sources": parsed.get("sources", ""),
+                "confidence": parsed.get("confidence", 0)
+            }
+        except Exception as e:
+            import traceback
+            print(f"[RAG] 解析回答失败: {e}")
+            print(f"[RAG] raw_text前200字符: {raw_text[:200] if raw_text else 'None'}")
+            print(f"[RAG] 解析错误堆栈: {traceback.format_exc()}")
+            return {
+                "answer": raw_text if raw_text else "抱歉，无法解析模型返回的内容",
+                "key_entities": [],
+                "sources": "",
+                "confidence": 0
+            }
+
+    @staticmethod
+    def _remember_turn(history: List[Dict], query: str, image_paths: Optional[List[str]], answer: str):
+        """把本轮问答追加到对话历史"""
+        history.append({
+            "role": "user",
+            "content": query,
+            "image_paths": image_paths or [],
+            "timestamp": datetime.now()
+        })
+        history.append({
+            "role": "assistant",
+            "content": answer,
+            "timestamp": datetime.now()
+        })
+        # 限制历史记录长度，只保留最近20轮对话（原地截断，外部传入的历史同样生效）
+        if len(history) > 40:
+            del history[:-40]
+
+    @staticmethod
+    def _build_retrieved_resources(retrieval: Dict) -> Dict:
+        """整理检索到的资源信息，确保包含resource_id"""
+        retrieved_resources = {
+            "vector_results": [],
+            "database_results": retrieval["db_results"],
+            "web_results": [],
+            # 各检索阶段的状态（ok/empty/timeout/error/skipped）和耗时
+            "stage_timings": retrieval["stage_timings"]
+        }
+        
+        # 向量库结果
+        for doc in retrieval["vector_docs"]:
+            metadata = getattr(doc, "metadata", {})
+            retrieved_resources["vector_results"].append({
+                "content": getattr(doc, "page_content", str(doc))[:500],  # 限制长度
+                "metadata": metadata,
+                "resource_id": metadata.get('id') or metadata.get('resource_id')  # 提取resource_id
+            })
+        
+        # 确保database_results包含resource_id字段
+        for db_result in retrieval["db_results"]:
+            # 如果结果中没有resource_id，尝试从id字段获取
+            if 'resource_id' not in db_result and 'id' in db_result:
+                db_result['resource_id'] = db_result['id']
+        
+        # 网页爬取结果
+        for doc in retrieval["web_docs"]:
+            retrieved_resources["web_results"].append({
+                "content": getattr(doc, "page_content", str(doc))[:500],  # 限制长度
+                "source": getattr(doc, "metadata", {}).get("source", ""),
+                "title": getattr(doc, "metadata", {}).get("title", "")
+            })
+        return retrieved_resources
+    
+    def ask(self, query: str, image_paths: Optional[List[str]] = None, 
+            session_id: Optional[int] = None, use_history: bool = True,
+            conversation_history: Optional[List[Dict]] = None) -> Dict:
+        """
+        回答用户关于传统节日的问题（支持多轮对话和图片输入）
+        :param query: 用户问题
+        :param image_paths: 图片路径列表（可选）
+        :param session_id: 会话ID（可选，用于持久化对话）
+        :param use_history: 是否使用对话历史
+        :param conversation_history: 外部维护的对话历史（多个用户共享同一实例时传入各自的历史，原地读写），默认使用实例自身的历史
+        :return: 包含回答、关键实体、来源、置信度的字典
+        """
+        history = self.conversation_history if conversation_history is None else conversation_history
+        ask_start = time.time()
+        print(f"收到问题: {query}")
+        if image_paths:
+            print(f"附带图片: {image_paths}")
+        
+        # 1-2. 检索
+        retrieval = self._retrieve(query, image_paths)
+        context = retrieval["context"]
 
         # 构建对话历史文本
-        conversation_history_text = ""
-        if use_history and self.conversation_history:
-            history_parts = []
-            for hist in self.conversation_history[-5:]:  # 只保留最近5轮对话
-                if hist.get("role") == "user":
-                    history_parts.append(f"用户：{hist.get('content', '')}")
-                elif hist.get("role") == "assistant":
-                    history_parts.append(f"助手：{hist.get('content', '')}")
-            conversation_history_text = "\n".join(history_parts)
+        conversation_history_text = self._history_text(history, use_history)
         
         # 3. 生成回答（保证结构化输出）
         try:
@@ -482,27 +703,7 @@ class CulturalResourceRAG(RAGBase):
             print(f"[RAG] 调用模型生成回答...")
             raw_text = self._call_model(prompt_text)
             print(f"[RAG] 模型返回文本长度: {len(raw_text) if raw_text else 0}")
-            # 解析结构化输出，补全缺失字段
-            try:
-                parsed = self.output_parser.parse(raw_text)
-                parsed = {
-                    "answer": parsed.get("answer", ""),
-                    "key_entities": parsed.get("key_entities", []),
-                    "sources": parsed.get("sources", ""),
-                    "confidence": parsed.get("confidence", 0)
-                }
-            except Exception as e:
-                import traceback
-                print(f"[RAG] 解析回答失败: {e}")
-                print(f"[RAG] raw_text前200字符: {raw_text[:200] if raw_text else 'None'}")
-                print(f"[RAG] 解析错误堆栈: {traceback.format_exc()}")
-                # 解析失败时返回标准格式，使用原始文本作为答案
-                parsed = {
-                    "answer": raw_text if raw_text else "抱歉，无法解析模型返回的内容",
-                    "key_entities": [],
-                    "sources": "",
-                    "confidence": 0
-                }
+            parsed = self._parse_answer(raw_text)
         except Exception as e:
             import traceback
             print(f"[RAG] 生成回答时出现错误: {e}")
@@ -514,32 +715,34 @@ class CulturalResourceRAG(RAGBase):
                 "confidence": 0
             }
 
-        # 4. 自反思评估，必要时重新检索生成
+        answer_ms = int((time.time() - ask_start) * 1000)
+
+        # 4. 自反思评估：inline 每次在请求内评估，sampled 按比例在请求内评估，必要时重新检索生成；
+        #    async 先返回回答，由后台线程评估；off 不评估
+        reflection_mode = self.reflection_mode
+        reflect_inline = reflection_mode == "inline" or \
+            (reflection_mode == "sampled" and random.random() < RAG_REFLECTION_SAMPLE_RATE)
         reflection_result = None
+        reflection_ms = None
+        regenerated = False
         try:
-            reflection_result = self.self_reflect(query, json.dumps(parsed, ensure_ascii=False), context)
-            if reflection_result.get("requires_retrieval") == "是":
+            if reflect_inline:
+                reflection_start = time.time()
+                reflection_result = self.self_reflect(query, json.dumps(parsed, ensure_ascii=False), context)
+                reflection_ms = int((time.time() - reflection_start) * 1000)
+            if reflection_result and reflection_result.get("requires_retrieval") == "是":
                 print("根据自反思结果，重新检索并生成...")
                 additional_context = self._get_additional_context(query, reflection_result)
                 if additional_context:
                     enhanced_context = f"{context}\n\n补充信息:\n{additional_context}"
-                    prompt_text2 = self.rag_prompt.format(context=enhanced_context, question=query)
+                    prompt_text2 = self.rag_prompt.format(
+                        context=enhanced_context,
+                        question=query,
+                        conversation_history=conversation_history_text or "无对话历史"
+                    )
                     raw_text2 = self._call_model(prompt_text2)
-                    try:
-                        parsed = self.output_parser.parse(raw_text2)
-                        parsed = {
-                            "answer": parsed.get("answer", ""),
-                            "key_entities": parsed.get("key_entities", []),
-                            "sources": parsed.get("sources", ""),
-                            "confidence": parsed.get("confidence", 0)
-                        }
-                    except Exception:
-                        parsed = {
-                            "answer": raw_text2,
-                            "key_entities": [],
-                            "sources": "",
-                            "confidence": 0
-                        }
+                    regenerated = True
+                    parsed = self._parse_answer(raw_text2)
         except Exception as e:
             print(f"自反思阶段错误: {e}")
             reflection_result = {
@@ -551,72 +754,109 @@ class CulturalResourceRAG(RAGBase):
 
         # 5. 更新对话历史
         if use_history:
-            self.conversation_history.append({
-                "role": "user",
-                "content": query,
-                "image_paths": image_paths or [],
-                "timestamp": datetime.now()
-            })
-            self.conversation_history.append({
-                "role": "assistant",
-                "content": parsed.get("answer", ""),
-                "timestamp": datetime.now()
-            })
-            # 限制历史记录长度，只保留最近20轮对话
-            if len(self.conversation_history) > 40:
-                self.conversation_history = self.conversation_history[-40:]
+            self._remember_turn(history, query, image_paths, parsed.get("answer", ""))
         
-        # 6. 记录性能日志
+        # 6. 记录性能日志；反思结果由后台线程写入 rag_reflection_log（async 模式同时在后台完成反思）
         try:
-            self.performance_log.append({
-                "question": query,
-                "answer": parsed,
-                "accuracy_score": reflection_result.get("accuracy_score", 5),
-                "timestamp": datetime.now()
-            })
+            if reflection_mode == "async":
+                get_reflection_worker().submit_reflection(self, query, parsed, context,
+                                                          session_id=session_id, answer_ms=answer_ms)
+            else:
+                record = reflection_record(query, parsed, reflection_result,
+                                           reflection_mode if reflect_inline or reflection_mode == "off" else "skipped",
+                                           session_id=session_id, answer_ms=answer_ms,
+                                           reflection_ms=reflection_ms, regenerated=regenerated)
+                self.record_performance(record)
+                if reflection_result is not None:
+                    get_reflection_worker().submit_record(record)
         except Exception as e:
             print(f"记录性能日志失败: {e}")
 
-        # 7. 整理检索到的资源信息，确保包含resource_id
-        retrieved_resources = {
-            "vector_results": [],
-            "database_results": db_results,
-            "web_results": []
-        }
-        
-        # 向量库结果
-        if vector_docs:
-            for doc in vector_docs:
-                metadata = getattr(doc, "metadata", {})
-                retrieved_resources["vector_results"].append({
-                    "content": getattr(doc, "page_content", str(doc))[:500],  # 限制长度
-                    "metadata": metadata,
-                    "resource_id": metadata.get('id') or metadata.get('resource_id')  # 提取resource_id
-                })
-        
-        # 确保database_results包含resource_id字段
-        for db_result in db_results:
-            # 如果结果中没有resource_id，尝试从id字段获取
-            if 'resource_id' not in db_result and 'id' in db_result:
-                db_result['resource_id'] = db_result['id']
-        
-        # 网页爬取结果
-        if web_docs:
-            for doc in web_docs:
-                retrieved_resources["web_results"].append({
-                    "content": getattr(doc, "page_content", str(doc))[:500],  # 限制长度
-                    "source": getattr(doc, "metadata", {}).get("source", ""),
-                    "title": getattr(doc, "metadata", {}).get("title", "")
-                })
-
-        # 返回结果，包含检索到的资源
+        # 7. 返回结果，包含检索到的资源
         result = {
             **parsed,
-            "retrieved_resources": retrieved_resources
+            "retrieved_resources": self._build_retrieved_resources(retrieval)
         }
         
         return result
 
+    def _stream_model(self, prompt_text: str) -> Iterator[str]:
+        """
+        流式调用模型，逐段返回文本（ChatTongyi / ChatOpenAI 的 stream 接口）；
+        模型不支持流式时退化为一次性返回完整文本
+        """
+        print(f"[RAG] 流式调用模型，提示词长度: {len(prompt_text)}")
+        if not hasattr(self.model, "stream"):
+            yield self._call_model(prompt_text)
+            return
+        for chunk in self.model.stream(prompt_text):
+            text = chunk if isinstance(chunk, str) else getattr(chunk, "content", None)
+            if text:
+                yield str(text)
+
+    def ask_stream(self, query: str, image_paths: Optional[List[str]] = None,
+                   session_id: Optional[int] = None, use_history: bool = True,
+                   conversation_history: Optional[List[Dict]] = None) -> Iterator[Tuple[str, Dict]]:
+        """
+        流式回答（与 ask 的检索、提示词、对话历史一致），依次产出 (事件名, 数据)：
+        - ("metadata", {"retrieved_resources": ...})：检索完成、开始生成前
+        - ("token", {"text": ...})：模型生成的 answer 字段片段
+        - ("final", {answer, key_entities, sources, confidence, retrieved_resources})：解析后的完整结果
+        回答已边生成边发送，无法再根据自反思重新生成，因此除 off 外的自反思都在后台执行（sampled 仍按比例）
+        """
+        history = self.conversation_history if conversation_history is None else conversation_history
+        ask_start = time.time()
+        print(f"收到问题（流式）: {query}")
+        
+        retrieval = self._retrieve(query, image_paths)
+        context = retrieval["context"]
+        retrieved_resources = self._build_retrieved_resources(retrieval)
+        yield "metadata", {"retrieved_resources": retrieved_resources}
+
+        conversation_history_text = self._history_text(history, use_history)
+        extractor = _AnswerFieldStream()
+        try:
+            prompt_text = self.rag_prompt.format(
+                context=context or "",
+                question=query or "",
+                conversation_history=conversation_history_text or "无对话历史"
+            )
+            for chunk in self._stream_model(prompt_text):
+                text = extractor.feed(chunk)
+                if text:
+                    yield "token", {"text": text}
+            print(f"[RAG] 模型流式返回文本长度: {len(extractor.text)}")
+            parsed = self._parse_answer(extractor.text)
+        except Exception as e:
+            import traceback
+            print(f"[RAG] 流式生成回答时出现错误: {e}")
+            print(f"[RAG] 错误堆栈: {traceback.format_exc()}")
+            parsed = {
+                "answer": f"回答生成失败：{str(e)}",
+                "key_entities": [],
+                "sources": "",
+                "confidence": 0
+            }
+        answer_ms = int((time.time() - ask_start) * 1000)
+
+        if use_history:
+            self._remember_turn(history, query, image_paths, parsed.get("answer", ""))
+
+        try:
+            reflection_mode = self.reflection_mode
+            if reflection_mode in ("async", "inline") or \
+                    (reflection_mode == "sampled" and random.random() < RAG_REFLECTION_SAMPLE_RATE):
+                get_reflection_worker().submit_reflection(self, query, parsed, context,
+                                                          session_id=session_id, answer_ms=answer_ms)
+            else:
+                self.record_performance(reflection_record(
+                    query, parsed, None, "off" if reflection_mode == "off" else "skipped",
+                    session_id=session_id, answer_ms=answer_ms))
+        except Exception as e:
+            print(f"记录性能日志失败: {e}")
+
+        yield "final", {**parsed, "retrieved_resources": retrieved_resources}
+
     # _crawl_web_content 方法已继承自 RAGBase，无需重复定义
 
     def _get_additional_context(self, query: str, reflection_result: Dict) -> str:
@@ -778,21 +1018,40 @@ class CulturalResourceRAG(RAGBase):
             resource_dict.get("novelty_explanation", "")
         )
 
+    def record_performance(self, record: Dict):
+        """
+        记录一次问答的性能日志（请求线程和后台反思线程都会调用）
+        :param record: reflection_worker.reflection_record 构造的记录，未反思时 accuracy_score 为None
+        """
+        entry = dict(record, timestamp=datetime.now())
+        with self._log_lock:
+            self.performance_log.append(entry)
+            if len(self.performance_log) > RAG_PERFORMANCE_LOG_LIMIT:
+                del self.performance_log[:-RAG_PERFORMANCE_LOG_LIMIT]
+
     def get_performance_summary(self) -> Dict:
         """
-        获取系统性能统计信息
+        获取系统性能统计信息（准确率只统计经过自反思评估的回答）
         :return: 包含问题数、平均准确率等统计数据的字典
         """
-        if not self.performance_log:
-            return {"message": "暂无性能数据"}
-        total_questions = len(self.performance_log)
-        avg_accuracy = sum([log.get("accuracy_score", 5) for log in self.performance_log]) / total_questions
-        high_quality_responses = len([log for log in self.performance_log if log.get("accuracy_score", 5) > 7])
+        with self._log_lock:
+            logs = list(self.performance_log)
+        if not logs:
+            return {"message": "暂无性能数据", "reflection_mode": self.reflection_mode}
+        total_questions = len(logs)
+        scores = [log["accuracy_score"] for log in logs if log.get("accuracy_score") is not None]
+        high_quality_responses = len([score for score in scores if score > 7])
+        modes: Dict[str, int] = {}
+        for log in logs:
+            modes[log.get("mode") or "inline"] = modes.get(log.get("mode") or "inline", 0) + 1
         return {
             "total_questions": total_questions,
-            "average_accuracy": round(avg_accuracy, 2),
+            "reflected_questions": len(scores),
+            "average_accuracy": round(sum(scores) / len(scores), 2) if scores else None,
             "high_quality_responses": high_quality_responses,
-            "improvement_rate": round(high_quality_responses / total_questions * 100, 2)
+            "improvement_rate": round(high_quality_responses / len(scores) * 100, 2) if scores else None,
+            "reflection_mode": self.reflection_mode,
+            "modes": modes
         }
 
     def update_retrieval_tables(self, table_names: List[str]):
@@ -10,6 +10,8 @@ import json
 from typing import List, Dict, Tuple, Optional
 from pathlib import Path
 from search_optimizer import SearchOptimizer
+from bm25 import BM25FIndex
+from batch_similarity import BatchSimilarity, top_k_indices
 
 
 class AdvancedSearchEnhancer:
@@ -23,6 +25,8 @@ class AdvancedSearchEnhancer:
         初始化高级搜索增强器
         """
         self.optimizer = SearchOptimizer()
+        # 批量相似度：文档只分词一次，所有扩展查询一次向量化计算
+        self.similarity = BatchSimilarity(self.optimizer)
         self.search_history = []
     
     def enhanced_search(self, query: str, documents: List[Dict], top_k: int = 10) -> List[Tuple[Dict, float]]:
@@ -35,37 +39,36 @@ class AdvancedSearchEnhancer:
             top_k: 返回最相似的前k个结果
             
         Returns:
-            排序后的结果列表，包含文档和相似度分数
+            排序后的结果列表，包含文档和BM25F相关度分数（归一化到0~1）
         """
         if not query or not documents:
             return []
         
-        # 预处理查询
-        processed = self.optimizer.preprocess_search_query(query)
+        # 以文档在列表中的下标为ID建立BM25F索引（标题、正文两个字段），
+        # 文档只分词一次，同义词扩展在查询端完成
+        index = BM25FIndex(optimizer=self.optimizer)
+        for i, doc in enumerate(documents):
+            index.add_document(i, {
+                'title': doc.get('title', '') or '',
+                'content': doc.get('content', '') or '',
+            })
         
-        results = []
-        for doc in documents:
-            content = doc.get('content', '') or doc.get('title', '') or ''
-            
-            # 计算原始查询相似度
-            orig_sim = self.optimizer.calculate_similarity(query, content)
-            
-            # 计算扩展查询相似度
-            max_exp_sim = 0
-            for exp_query in processed['expanded_queries']:
-                exp_sim = self.optimizer.calculate_similarity(exp_query, content)
-                max_exp_sim = max(max_exp_sim, exp_sim)
-            
-            # 最终相似度取最大值
-            final_sim = max(orig_sim, max_exp_sim)
-            
-            results.append((doc, final_sim))
+        ranked = index.top_k(query, top_k)
         
-        # 按相似度排序
-        results.sort(key=lambda x: x[1], reverse=True)
+        # 分数归一化到 [0, 1]，保持与原相似度分数相同的取值范围
+        max_score = ranked[0][1] if ranked else 0
+        results = [(documents[i], score / max_score if max_score else 0.0) for i, score in ranked]
+        
+        # 命中不足top_k时用未命中的文档（分数为0）补足
+        if len(results) < top_k:
+            hit = {i for i, _ in ranked}
+            for i, doc in enumerate(documents):
+                if len(results) >= top_k:
+                    break
+                if i not in hit:
+                    results.append((doc, 0.0))
         
-        # 返回top_k结果
-        return results[:top_k]
+        return results
     
     def multimodal_search_enhancement(self, query: str, text_results: List[Dict], 
                                     image_results: List[Dict]) -> Dict[str, List]:
@@ -82,34 +85,27 @@ class AdvancedSearchEnhancer:
         """
         # 预处理查询
         processed = self.optimizer.preprocess_search_query(query)
+        queries = [query] + processed['expanded_queries']
         
-        # 增强文本结果
-        enhanced_text_results = []
-        for item in text_results:
-            content = item.get('content', '') or item.get('title', '') or ''
-            similarity = self.optimizer.calculate_similarity(query, content)
-            
-            # 添加同义词扩展匹配
-            for exp_query in processed['expanded_queries']:
-                exp_similarity = self.optimizer.calculate_similarity(exp_query, content)
-                similarity = max(similarity, exp_similarity)
-            
+        # 增强文本结果（原查询和同义词扩展查询一次批量计算，取最大值）
+        enhanced_text_results = list(text_results)
+        similarities = self.similarity.max_similarity(
+            queries,
+            [item.get('content', '') or item.get('title', '') or '' for item in enhanced_text_results],
+            [self._doc_key(item) for item in enhanced_text_results]
+        )
+        for item, similarity in zip(enhanced_text_results, similarities):
             item['enhanced_similarity'] = similarity
-            enhanced_text_results.append(item)
         
         # 增强图片结果
-        enhanced_image_results = []
-        for item in image_results:
-            content = item.get('content', '') or item.get('description', '') or ''
-            similarity = self.optimizer.calculate_similarity(query, content)
-            
-            # 添加同义词扩展匹配
-            for exp_query in processed['expanded_queries']:
-                exp_similarity = self.optimizer.calculate_similarity(exp_query, content)
-                similarity = max(similarity, exp_similarity)
-            
+        enhanced_image_results = list(image_results)
+        similarities = self.similarity.max_similarity(
+            queries,
+            [item.get('content', '') or item.get('description', '') or '' for item in enhanced_image_results],
+            [self._doc_key(item) for item in enhanced_image_results]
+        )
+        for item, similarity in zip(enhanced_image_results, similarities):
             item['enhanced_similarity'] = similarity
-            enhanced_image_results.append(item)
         
         # 按相似度排序
         enhanced_text_results.sort(key=lambda x: x.get('enhanced_similarity', 0), reverse=True)
@@ -122,7 +118,8 @@ class AdvancedSearchEnhancer:
             'processed_query': processed['cleaned_query']
         }
     
-    def semantic_search(self, query: str, documents: List[Dict], threshold: float = 0.1) -> List[Dict]:
+    def semantic_search(self, query: str, documents: List[Dict], threshold: float = 0.1,
+                        top_k: Optional[int] = None, metric: str = 'jaccard') -> List[Dict]:
         """
         语义搜索 - 返回高于阈值的匹配结果
         
@@ -130,6 +127,8 @@ class AdvancedSearchEnhancer:
             query: 搜索查询
             documents: 文档列表
             threshold: 相似度阈值
+            top_k: 只返回相似度最高的前k个（候选很多时不对全部结果排序），None表示全部
+            metric: 相似度算法，'jaccard'（默认）或 'cosine'
             
         Returns:
             符合条件的文档列表
@@ -140,31 +139,34 @@ class AdvancedSearchEnhancer:
         # 预处理查询
         processed = self.optimizer.preprocess_search_query(query)
         
-        results = []
-        for doc in documents:
-            content = doc.get('content', '') or doc.get('title', '') or ''
-            
-            # 计算原始查询相似度
-            orig_sim = self.optimizer.calculate_similarity(query, content)
-            
-            # 计算扩展查询相似度
-            max_exp_sim = 0
-            for exp_query in processed['expanded_queries']:
-                exp_sim = self.optimizer.calculate_similarity(exp_query, content)
-                max_exp_sim = max(max_exp_sim, exp_sim)
-            
-            # 最终相似度取最大值
-            final_sim = max(orig_sim, max_exp_sim)
-            
-            if final_sim >= threshold:
-                doc['semantic_similarity'] = final_sim
-                results.append(doc)
+        # 原始查询和扩展查询一次批量计算，最终相似度取最大值
+        similarities = self.similarity.max_similarity(
+            [query] + processed['expanded_queries'],
+            [doc.get('content', '') or doc.get('title', '') or '' for doc in documents],
+            [self._doc_key(doc) for doc in documents],
+            metric=metric
+        )
         
-        # 按相似度排序
-        results.sort(key=lambda x: x.get('semantic_similarity', 0), reverse=True)
+        matched = [i for i, sim in enumerate(similarities) if sim >= threshold]
+        if top_k is not None:
+            order = [matched[i] for i in top_k_indices([similarities[i] for i in matched], top_k)]
+        else:
+            # 按相似度排序
+            order = sorted(matched, key=lambda i: similarities[i], reverse=True)
         
+        results = []
+        for i in order:
+            documents[i]['semantic_similarity'] = similarities[i]
+            results.append(documents[i])
         return results
     
+    @staticmethod
+    def _doc_key(doc: Dict):
+        """文档词集合的缓存键（表名 + ID，没有ID时为None，只按文本哈希缓存）"""
+        if doc.get('id') is None:
+            return None
+        return (doc.get('table'), doc.get('id'))
+    
     def get_search_statistics(self) -> Dict:
         """
         获取搜索统计信息
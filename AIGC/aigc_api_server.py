@@ -11,6 +11,7 @@ AIGC API服务器
 import os
 import sys
 import json
+import base64
 
 # 设置标准输出编码为UTF-8，解决Windows终端中文乱码问题
 # 优先使用环境变量PYTHONIOENCODING（如果已设置）
@@ -94,6 +95,20 @@ from login import AuthSystem
 from upload_handler import ResourceUploader
 from user_logging import UserLogging
 from db_connection import get_user_db_connection
+from user_cache import CachedAuthSystem, invalidate_user_cache, get_user_cache_stats
+from schema_registry import schema_registry
+from image_tags import tag_match_subquery, tag_prefix_pattern
+from search_index import get_entity_search_index, ENTITY_TABLES
+from suggest_index import get_suggest_index, SUGGEST_DEFAULT_LIMIT
+from graph_index import get_entity_graph_index
+from festival_index import get_festival_resource_index
+from search_cache import get_search_result_cache, get_shared_optimizer, notify_search_tables_changed
+from retrieval_cache import get_retrieval_cache
+from rag_engine import RAGEngine
+from embedding_cache import cached_embeddings, get_embedding_cache
+from reflection_worker import get_reflection_worker, query_reflection_outcomes
+from keyword_extractor import get_keyword_extractor
+from query_compiler import compile_query
 from pymysql.cursors import DictCursor
 from scripts.export_user_resource import export_user_resource_to_excel, batch_export_user_resources
 
@@ -129,6 +144,47 @@ except Exception as e:
     traceback.print_exc()
     # 继续启动，不中断
 
+# 启动实体检索倒排索引（后台构建，构建完成前检索回退到数据库查询）
+# 索引刷新到新数据时清空检索结果缓存和RAG检索缓存中实体表的条目（覆盖Java后端、爬虫等进程外的写入）
+try:
+    get_entity_search_index().add_change_listener(get_search_result_cache().invalidate)
+    get_entity_search_index().add_change_listener(
+        lambda: get_retrieval_cache().invalidate(*ENTITY_TABLES))
+    get_entity_search_index().start()
+except Exception as e:
+    import traceback
+    traceback.print_exc()
+    # 继续启动，不中断
+
+# 启动搜索框输入提示索引（实体检索索引刷新到新数据时同步刷新）
+try:
+    get_entity_search_index().add_change_listener(get_suggest_index().request_refresh)
+    get_suggest_index().start()
+except Exception as e:
+    import traceback
+    traceback.print_exc()
+    # 继续启动，不中断
+
+# 启动实体关系图索引（RAG多跳扩展和详情页相关实体使用，构建完成前RAG回退到SQL查询实体关系）
+try:
+    get_entity_graph_index().start()
+except Exception as e:
+    import traceback
+    traceback.print_exc()
+    # 继续启动，不中断
+
+# 启动节日资源索引（资源详情页按节日名称查询，就绪前回退到按名称模糊查询；实体检索索引刷新到新数据时同步刷新）
+# 索引归类到新的资源和图片时删除RAG检索缓存中这些表的条目（进程外写入的资源和图片）
+try:
+    get_entity_search_index().add_change_listener(get_festival_resource_index().request_refresh)
+    get_festival_resource_index().add_change_listener(
+        lambda: get_retrieval_cache().invalidate('cultural_resources', 'crawled_images'))
+    get_festival_resource_index().start()
+except Exception as e:
+    import traceback
+    traceback.print_exc()
+    # 继续启动，不中断
+
 # 配置静态文件服务（使用相对路径）
 # os已在文件开头导入，无需重复导入
 # 获取项目根目录（相对于当前文件）
@@ -142,22 +198,18 @@ os.makedirs(public_dir, exist_ok=True)
 auth_system = None
 
 def get_auth_system():
-    """获取认证系统实例（延迟初始化）"""
+    """获取认证系统实例（延迟初始化，用户配置和用户信息查询带缓存）"""
     global auth_system
     if auth_system is None:
         try:
-            auth_system = AuthSystem()
+            auth_system = CachedAuthSystem(AuthSystem())
         except Exception as e:
             import traceback
             traceback.print_exc()
             # 即使初始化失败，也创建一个实例，在实际使用时再处理错误
-            auth_system = AuthSystem()
+            auth_system = CachedAuthSystem(AuthSystem())
     return auth_system
 
-# 初始化RAG和ImageAIGC系统（按用户动态创建）
-rag_systems = {}  # {user_id: rag_system}
-image_aigc_systems = {}  # {user_id: image_aigc_system}
-
 # 全局搜索RAG系统（用于全文检索功能，不按用户区分）
 search_rag_system = None
 
@@ -214,40 +266,10 @@ def save_aigc_message_to_db(user_id: int, session_id: int, user_message: str, ai
         
         try:
             with conn.cursor(DictCursor) as cursor:
-                # 检查表是否有新字段
-                try:
-                    cursor.execute("""
-                        SELECT COLUMN_NAME 
-                        FROM INFORMATION_SCHEMA.COLUMNS 
-                        WHERE TABLE_SCHEMA = DATABASE() 
-                        AND TABLE_NAME = 'qa_messages' 
-                        AND COLUMN_NAME = 'user_message'
-                    """)
-                    has_new_structure = cursor.fetchone() is not None
-                    
-                    # 检查是否有image_from_users_url字段
-                    cursor.execute("""
-                        SELECT COLUMN_NAME 
-                        FROM INFORMATION_SCHEMA.COLUMNS 
-                        WHERE TABLE_SCHEMA = DATABASE() 
-                        AND TABLE_NAME = 'qa_messages' 
-                        AND COLUMN_NAME = 'image_from_users_url'
-                    """)
-                    has_image_from_users_field = cursor.fetchone() is not None
-                    
-                    # 检查是否有retrieval_id字段
-                    cursor.execute("""
-                        SELECT COLUMN_NAME 
-                        FROM INFORMATION_SCHEMA.COLUMNS 
-                        WHERE TABLE_SCHEMA = DATABASE() 
-                        AND TABLE_NAME = 'qa_messages' 
-                        AND COLUMN_NAME = 'retrieval_id'
-                    """)
-                    has_retrieval_id_field = cursor.fetchone() is not None
-                except:
-                    has_new_structure = False
-                    has_image_from_users_field = False
-                    has_retrieval_id_field = False
+                # 检查表是否有新字段（从启动时加载的表结构注册表读取）
+                has_new_structure = schema_registry.has_column('qa_messages', 'user_message')
+                has_image_from_users_field = schema_registry.has_column('qa_messages', 'image_from_users_url')
+                has_retrieval_id_field = schema_registry.has_column('qa_messages', 'retrieval_id')
                 
                 if has_new_structure:
                     if message_id:
@@ -380,11 +402,8 @@ def get_text_model():
     except Exception:
         return None
 
-def get_or_create_rag_system(user_id: int, db_config: Optional[Dict] = None):
-    """获取或创建用户的RAG系统（延迟加载）"""
-    if user_id in rag_systems:
-        return rag_systems[user_id]
-    
+def _create_text_rag_system():
+    """构建进程内共享的文本RAG实例（延迟加载）"""
     text_model = get_text_model()
     if not text_model:
         return None
@@ -393,22 +412,18 @@ def get_or_create_rag_system(user_id: int, db_config: Optional[Dict] = None):
         # 延迟导入RAG模块，避免启动时加载
         from RAG import CulturalResourceRAG
         
-        rag_system = CulturalResourceRAG(
+        return CulturalResourceRAG(
             model=text_model,
             persist_directory="./chroma_db_web",
-            database_name="java-project",
-            db_config=db_config
+            database_name="java-project"
         )
-        rag_systems[user_id] = rag_system
-        return rag_system
     except Exception as e:
+        import traceback
+        traceback.print_exc()
         return None
 
-def get_or_create_image_aigc_system(user_id: int, db_config: Optional[Dict] = None):
-    """获取或创建用户的ImageAIGC系统（延迟加载）"""
-    if user_id in image_aigc_systems:
-        return image_aigc_systems[user_id]
-    
+def _create_image_aigc_system():
+    """构建进程内共享的ImageAIGC实例（延迟加载）"""
     text_model = get_text_model()
     if not text_model:
         return None
@@ -423,17 +438,28 @@ def get_or_create_image_aigc_system(user_id: int, db_config: Optional[Dict] = No
         aigc_graph_dir = os.path.join(base_dir, "AIGC_graph")
         os.makedirs(aigc_graph_dir, exist_ok=True)
         
-        image_aigc_system = ImageAIGC(
+        return ImageAIGC(
             text_model=text_model,
             persist_directory="./chroma_db_image",
             database_name="java-project",
-            local_save_dir=aigc_graph_dir,  # 指定保存到AIGC_graph文件夹
-            db_config=db_config
+            local_save_dir=aigc_graph_dir  # 指定保存到AIGC_graph文件夹
         )
-        image_aigc_systems[user_id] = image_aigc_system
-        return image_aigc_system
     except Exception as e:
+        import traceback
+        traceback.print_exc()
         return None
+
+# RAG和ImageAIGC实例全进程共享，按用户只保留对话历史等轻量会话（LRU + 空闲过期）
+rag_engine = RAGEngine(_create_text_rag_system, _create_image_aigc_system)
+
+def get_or_create_rag_system(user_id: int, db_config: Optional[Dict] = None):
+    """获取绑定用户会话的RAG系统（共享实例 + 用户自己的对话历史）"""
+    return rag_engine.text_session(user_id)
+
+def get_or_create_image_aigc_system(user_id: int, db_config: Optional[Dict] = None):
+    """获取绑定用户会话的ImageAIGC系统（共享实例 + 用户自己的对话历史）"""
+    return rag_engine.image_session(user_id)
+
 @app.route('/api/multimodal/search', methods=['POST'])
 def multimodal_search():
     temp_dir = None
@@ -502,6 +528,8 @@ def multimodal_search():
                             image_embedding = OpenAIEmbeddings(model="text-embedding-3-large")
                         else:
                             image_embedding = None
+                        # 图片描述的查询向量走持久化缓存，同一描述重复检索不再调用嵌入接口
+                        image_embedding = cached_embeddings(image_embedding)
                         
                         if image_embedding:
                             image_vector_store = Chroma(
@@ -597,6 +625,8 @@ def multimodal_search():
         final_query = " ".join(query_parts).strip()
         if not final_query:
             return jsonify({'success': False, 'message': '缺少查询内容或图片描述失败'}), 400
+        # 数据库检索只使用编译后的少量检索词：用户输入优先，图片描述只作为补充关键词的上下文
+        compiled_query = compile_query(query, " ".join(image_descriptions))
 
         # 使用向量检索和数据库检索
         vector_results = []
@@ -622,7 +652,7 @@ def multimodal_search():
         
         try:
             # 数据库检索（不限制返回条数）
-            db_results = rag_system.query_database(final_query)
+            db_results = rag_system.query_database(final_query, compiled=compiled_query)
         except Exception as e:
             import traceback
             traceback.print_exc()
@@ -713,6 +743,7 @@ def multimodal_search():
         response = {
             "success": True,
             "query_used": final_query,
+            "query_terms": compiled_query.terms,  # 数据库检索实际使用的检索词
             "image_descriptions": image_descriptions,
             "image_vector_results": image_vector_results,  # 图片向量搜索结果（新增）
             "vector_results": vector_results,  # 文本向量结果
@@ -976,6 +1007,7 @@ def update_signature():
                     (signature, user_id)
                 )
                 conn.commit()
+            invalidate_user_cache(user_id)
             
             # 返回更新后的用户信息
             user_info = get_auth_system().get_user_by_id(user_id)
@@ -1037,6 +1069,7 @@ def delete_account():
                 # 删除用户的所有数据（根据外键约束，相关数据会被级联删除或设置为NULL）
                 cursor.execute("DELETE FROM users WHERE id = %s", (user_id,))
                 conn.commit()
+            invalidate_user_cache(user_id)
             
             return jsonify({'success': True, 'message': '账号已注销'})
         finally:
@@ -1142,6 +1175,7 @@ def change_password_by_security():
                     (new_password_hash, user_id)
                 )
                 conn.commit()
+                invalidate_user_cache(user_id)
                 return jsonify({'success': True, 'message': '密码修改成功'})
         finally:
             conn.close()
@@ -1297,6 +1331,7 @@ def change_avatar():
                                 ('/default.jpg', user_id)
                             )
                             conn.commit()
+                        invalidate_user_cache(user_id)
                         return jsonify({
                             'success': True,
                             'message': '已切换为默认头像',
@@ -1375,6 +1410,7 @@ def change_avatar():
                             (new_avatar_path, user_id)
                         )
                         conn.commit()
+                    invalidate_user_cache(user_id)
                     return jsonify({
                         'success': True,
                         'message': '头像更换成功',
@@ -1416,6 +1452,143 @@ def log_user_access(user_id, access_type, access_path=None, resource_id=None, re
         pass
 
 
+def _finish_text_chat(user_id: int, session_id: Optional[int], message_id: Optional[int], final_query: str,
+                      result: Dict, user_uploaded_image_urls: list, db_config: Dict) -> str:
+    """
+    文字AIGC生成完成后的收尾（普通请求和流式请求共用）：
+    提取检索资源ID、保存生成的文字资源、用message_id更新会话消息并记录使用日志
+    :return: 最终回答（为空时替换为提示语）
+    """
+    # 确保返回的answer字段不为空
+    answer = result.get('answer', '')
+    if not answer:
+        answer = '抱歉，未能生成有效回答。请检查输入内容或稍后重试。'
+    
+    # 获取检索到的资源
+    retrieved_resources = result.get('retrieved_resources', {})
+    
+    # 从检索结果中提取资源ID列表（包括database_results和vector_results）
+    retrieval_ids = []
+    try:
+        # 从数据库检索结果中提取
+        database_results = retrieved_resources.get('database_results', [])
+        for db_result in database_results:
+            resource_id = db_result.get('resource_id') or db_result.get('id')
+            if resource_id:
+                retrieval_ids.append(str(resource_id))
+        
+        # 从向量检索结果中提取
+        vector_results = retrieved_resources.get('vector_results', [])
+        for vec_result in vector_results:
+            resource_id = vec_result.get('resource_id') or vec_result.get('metadata', {}).get('id')
+            if resource_id:
+                retrieval_ids.append(str(resource_id))
+        
+        # 去重
+        retrieval_ids = list(set(retrieval_ids))
+        retrieval_id_str = ','.join(retrieval_ids) if retrieval_ids else None
+        print(f"[AIGC] 提取到检索资源ID: {retrieval_id_str}")
+    except Exception as e:
+        import traceback
+        print(f"[AIGC] 提取检索资源ID失败: {e}")
+        print(f"[AIGC] 错误堆栈: {traceback.format_exc()}")
+        retrieval_id_str = None
+    
+    # 保存AIGC生成的文字资源到数据库
+    try:
+        # 从查询中提取资源标题（使用查询的前50字作为标题）
+        resource_title = final_query[:50] if len(final_query) > 50 else final_query
+        if not resource_title:
+            resource_title = "AIGC生成的文化资源"
+        
+        # 提取节日名称
+        festival_names = extract_festival_names(answer + " " + final_query)
+        festival_title = festival_names[0] if festival_names else None
+        
+        # 保存到AIGC_cultural_resources和AIGC_cultural_entities表
+        save_aigc_text_resource(
+            db_config=db_config,
+            resource_title=resource_title,
+            content_text=answer,
+            source_from="Tongyi文字生成",
+            festival_title=festival_title,
+            tags=result.get('key_entities', [])
+        )
+    except Exception as e:
+        # 不影响正常返回，继续执行
+        pass
+    
+    # 更新消息到数据库（使用message_id更新，而不是再次插入）
+    if session_id and message_id:
+        try:
+            # 文字AIGC如果没有图片，使用AIGC_graph/default.jpg
+            default_image_url = '/AIGC_graph/default.jpg'
+            save_aigc_message_to_db(
+                user_id=user_id,
+                session_id=session_id,
+                user_message=final_query,
+                ai_message=answer,
+                model='text',
+                image_url=default_image_url if not user_uploaded_image_urls else None,
+                retrieval_id=retrieval_id_str,
+                message_id=message_id,  # 使用message_id更新现有消息
+                db_config=db_config
+            )
+            # 记录文字AIGC使用日志
+            UserLogging.log_aigc_text(user_id, final_query)
+        except Exception as save_error:
+            import traceback
+            traceback.print_exc()
+    
+    return answer
+
+
+def _sse_event(event: str, data: Dict) -> str:
+    """格式化一条Server-Sent Events消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+def _stream_text_chat(rag_system, user_id: int, session_id: Optional[int], message_id: Optional[int],
+                      final_query: str, image_paths: list, user_uploaded_image_urls: list, db_config: Dict):
+    """
+    文字AIGC的SSE输出：metadata（检索结果）-> token（回答片段）-> final（结构化结果）；
+    数据库消息在流结束时更新，临时图片在生成器结束后清理（请求函数返回时生成器尚未执行）
+    """
+    try:
+        result = None
+        for event, data in rag_system.ask_stream(
+            query=final_query,
+            image_paths=image_paths if image_paths else None,
+            use_history=True
+        ):
+            if event == 'final':
+                result = data
+                break
+            yield _sse_event(event, data)
+        if result is None:
+            result = {'answer': ''}
+        answer = _finish_text_chat(user_id, session_id, message_id, final_query, result,
+                                   user_uploaded_image_urls, db_config)
+        yield _sse_event('final', {
+            'answer': answer,
+            'key_entities': result.get('key_entities', []),
+            'sources': result.get('sources', ''),
+            'confidence': result.get('confidence', 0),
+            'message_id': message_id
+        })
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        yield _sse_event('error', {'error': str(e), 'answer': f'处理失败：{str(e)}'})
+    finally:
+        for path in image_paths:
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+            except Exception:
+                pass
+
+
 @app.route('/api/aigc/chat', methods=['POST'])
 def aigc_chat():
     """处理AIGC聊天请求（支持流式输出）"""
@@ -1614,6 +1787,20 @@ def aigc_chat():
                         traceback.print_exc()
                 
                 
+                if stream:
+                    # 流式输出：检索完成后先发送检索结果，再逐段发送模型生成的回答，最后发送结构化结果；
+                    # 临时图片交给生成器在流结束后清理，避免本函数的finally提前删除
+                    stream_image_paths = image_paths
+                    image_paths = []
+                    return Response(
+                        stream_with_context(_stream_text_chat(
+                            rag_system, user_id, session_id, message_id, final_query,
+                            stream_image_paths, user_uploaded_image_urls, db_config
+                        )),
+                        mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+                    )
+                
                 # 确保image_paths参数正确传递
                 result = rag_system.ask(
                     query=final_query,
@@ -1621,95 +1808,16 @@ def aigc_chat():
                     use_history=True
                 )
                 
-                # 确保返回的answer字段不为空
-                answer = result.get('answer', '')
-                if not answer:
-                    answer = '抱歉，未能生成有效回答。请检查输入内容或稍后重试。'
-                
-                # 获取检索到的资源
-                retrieved_resources = result.get('retrieved_resources', {})
-                
-                # 从检索结果中提取资源ID列表（包括database_results和vector_results）
-                retrieval_ids = []
-                try:
-                    # 从数据库检索结果中提取
-                    database_results = retrieved_resources.get('database_results', [])
-                    for db_result in database_results:
-                        resource_id = db_result.get('resource_id') or db_result.get('id')
-                        if resource_id:
-                            retrieval_ids.append(str(resource_id))
-                    
-                    # 从向量检索结果中提取
-                    vector_results = retrieved_resources.get('vector_results', [])
-                    for vec_result in vector_results:
-                        resource_id = vec_result.get('resource_id') or vec_result.get('metadata', {}).get('id')
-                        if resource_id:
-                            retrieval_ids.append(str(resource_id))
-                    
-                    # 去重
-                    retrieval_ids = list(set(retrieval_ids))
-                    retrieval_id_str = ','.join(retrieval_ids) if retrieval_ids else None
-                    print(f"[AIGC] 提取到检索资源ID: {retrieval_id_str}")
-                except Exception as e:
-                    import traceback
-                    print(f"[AIGC] 提取检索资源ID失败: {e}")
-                    print(f"[AIGC] 错误堆栈: {traceback.format_exc()}")
-                    retrieval_id_str = None
+                answer = _finish_text_chat(user_id, session_id, message_id, final_query, result,
+                                           user_uploaded_image_urls, db_config)
                 
-                # 保存AIGC生成的文字资源到数据库
-                try:
-                    # 从查询中提取资源标题（使用查询的前50字作为标题）
-                    resource_title = final_query[:50] if len(final_query) > 50 else final_query
-                    if not resource_title:
-                        resource_title = "AIGC生成的文化资源"
-                    
-                    # 提取节日名称
-                    festival_names = extract_festival_names(answer + " " + final_query)
-                    festival_title = festival_names[0] if festival_names else None
-                    
-                    # 保存到AIGC_cultural_resources和AIGC_cultural_entities表
-                    save_aigc_text_resource(
-                        db_config=db_config,
-                        resource_title=resource_title,
-                        content_text=answer,
-                        source_from="Tongyi文字生成",
-                        festival_title=festival_title,
-                        tags=result.get('key_entities', [])
-                    )
-                except Exception as e:
-                    # 不影响正常返回，继续执行
-                    pass
-                
-                # 更新消息到数据库（使用message_id更新，而不是再次插入）
-                if session_id and message_id:
-                    try:
-                        # 文字AIGC如果没有图片，使用AIGC_graph/default.jpg
-                        default_image_url = '/AIGC_graph/default.jpg'
-                        save_aigc_message_to_db(
-                            user_id=user_id,
-                            session_id=session_id,
-                            user_message=final_query,
-                            ai_message=answer,
-                            model='text',
-                            image_url=default_image_url if not user_uploaded_image_urls else None,
-                            retrieval_id=retrieval_id_str,
-                            message_id=message_id,  # 使用message_id更新现有消息
-                            db_config=db_config
-                        )
-                        # 记录文字AIGC使用日志
-                        UserLogging.log_aigc_text(user_id, final_query)
-                    except Exception as save_error:
-                        import traceback
-                        traceback.print_exc()
-                
-                
-                # 非流式输出（普通模式，不再支持流式输出）
+                # 非流式输出
                 return jsonify({
                     'answer': answer,
                     'key_entities': result.get('key_entities', []),
                     'sources': result.get('sources', ''),
                     'confidence': result.get('confidence', 0),
-                    'retrieved_resources': retrieved_resources
+                    'retrieved_resources': result.get('retrieved_resources', {})
                 })
             except Exception as e:
                 import traceback
@@ -2202,9 +2310,9 @@ def extract_title():
             except:
                 pass
         
-        # 如果没有用户系统，尝试使用第一个可用的系统
-        if not rag_system and rag_systems:
-            rag_system = list(rag_systems.values())[0]
+        # 如果没有用户系统，使用共享的RAG实例
+        if not rag_system:
+            rag_system = rag_engine.text_system()
         
         # 使用AI提取主题（调用阿里云API）
         if rag_system and hasattr(rag_system, 'model') and rag_system.model:
@@ -2458,14 +2566,163 @@ def health():
     except Exception as e:
         db_status = f'error: {str(e)}'
     
+    try:
+        from db_connection import get_pool_stats
+        db_pools = get_pool_stats()
+    except Exception as e:
+        db_pools = f'error: {str(e)}'
+    
+    try:
+        user_caches = get_user_cache_stats()
+    except Exception as e:
+        user_caches = f'error: {str(e)}'
+    
+    try:
+        search_index = get_entity_search_index().stats()
+    except Exception as e:
+        search_index = f'error: {str(e)}'
+    
+    try:
+        search_cache = get_search_result_cache().stats()
+    except Exception as e:
+        search_cache = f'error: {str(e)}'
+    
+    try:
+        keyword_cache = get_keyword_extractor().stats()
+    except Exception as e:
+        keyword_cache = f'error: {str(e)}'
+    
+    try:
+        suggest_index = get_suggest_index().stats()
+    except Exception as e:
+        suggest_index = f'error: {str(e)}'
+    
+    try:
+        search_optimizer = get_shared_optimizer().stats()
+    except Exception as e:
+        search_optimizer = f'error: {str(e)}'
+    
+    try:
+        graph_index = get_entity_graph_index().stats()
+    except Exception as e:
+        graph_index = f'error: {str(e)}'
+    
+    try:
+        festival_index = get_festival_resource_index().stats()
+    except Exception as e:
+        festival_index = f'error: {str(e)}'
+    
+    try:
+        retrieval_cache = get_retrieval_cache().stats()
+    except Exception as e:
+        retrieval_cache = f'error: {str(e)}'
+    
+    try:
+        rag_engine_stats = rag_engine.stats()
+    except Exception as e:
+        rag_engine_stats = f'error: {str(e)}'
+    
+    try:
+        embedding_cache = get_embedding_cache().stats()
+    except Exception as e:
+        embedding_cache = f'error: {str(e)}'
+    
+    try:
+        reflection_worker = get_reflection_worker().stats()
+    except Exception as e:
+        reflection_worker = f'error: {str(e)}'
+    
     return jsonify({
         'status': 'ok',
-        'rag_systems_count': len(rag_systems),
-        'image_aigc_systems_count': len(image_aigc_systems),
+        'search_index': search_index,
+        'suggest_index': suggest_index,
+        'graph_index': graph_index,
+        'festival_index': festival_index,
+        'search_cache': search_cache,
+        'retrieval_cache': retrieval_cache,
+        'embedding_cache': embedding_cache,
+        'reflection_worker': reflection_worker,
+        'keyword_cache': keyword_cache,
+        'search_optimizer': search_optimizer,
+        'rag_engine': rag_engine_stats,
+        'rag_systems_count': len(rag_engine.sessions),
+        'image_aigc_systems_count': len(rag_engine.sessions),
         'database_status': db_status,
+        'db_pools': db_pools,
+        'user_caches': user_caches,
+        'schema_registry_loaded': schema_registry.summary()['loaded'],
         'search_rag_initialized': search_rag_system is not None
     })
 
+@app.route('/api/admin/schema/refresh', methods=['POST'])
+def refresh_schema_registry():
+    """刷新表结构注册表（执行数据库迁移后调用，仅管理员和超级管理员）"""
+    try:
+        user_id = (request.headers.get('X-User-Id') or request.headers.get('X-User-ID') or
+                   (request.json.get('user_id') if request.is_json else None))
+        if not user_id:
+            return jsonify({'success': False, 'message': '未授权访问，请先登录'}), 401
+        
+        user_info = get_auth_system().get_user_by_id(int(user_id))
+        if not user_info:
+            return jsonify({'success': False, 'message': '用户不存在'}), 404
+        
+        role = user_info.get('role')
+        if role != '管理员' and role != '超级管理员':
+            return jsonify({'success': False, 'message': '权限不足，仅管理员可操作'}), 403
+        
+        if not schema_registry.refresh():
+            return jsonify({'success': False, 'message': '刷新表结构失败'}), 500
+        
+        return jsonify({'success': True, 'message': '表结构已刷新', 'schema': schema_registry.summary()})
+    except ValueError:
+        return jsonify({'success': False, 'message': '无效的用户ID'}), 400
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'message': f'刷新表结构失败：{str(e)}'}), 500
+
+@app.route('/api/admin/rag/reflections', methods=['GET'])
+def get_rag_reflections():
+    """查询RAG自反思结果（回答质量看板，仅管理员和超级管理员）"""
+    try:
+        user_id = request.headers.get('X-User-Id') or request.headers.get('X-User-ID') or request.args.get('user_id')
+        if not user_id:
+            return jsonify({'success': False, 'message': '未授权访问，请先登录'}), 401
+        
+        user_info = get_auth_system().get_user_by_id(int(user_id))
+        if not user_info:
+            return jsonify({'success': False, 'message': '用户不存在'}), 404
+        
+        role = user_info.get('role')
+        if role != '管理员' and role != '超级管理员':
+            return jsonify({'success': False, 'message': '权限不足，仅管理员可操作'}), 403
+        
+        hours = float(request.args.get('hours', 24))
+        mode = request.args.get('mode') or None
+        limit = max(1, min(int(request.args.get('limit', 50)), 500))
+        
+        outcomes = query_reflection_outcomes(hours=hours, mode=mode, limit=limit)
+        if outcomes is None:
+            # 未创建 rag_reflection_log 表时回退到当前进程内的统计
+            rag_system = rag_engine.text_system()
+            outcomes = {
+                'summary': rag_system.get_performance_summary() if rag_system else {},
+                'recent': [],
+                'source': 'memory'
+            }
+        else:
+            outcomes['source'] = 'database'
+        outcomes['worker'] = get_reflection_worker().stats()
+        
+        return jsonify({'success': True, 'data': outcomes})
+    except ValueError:
+        return jsonify({'success': False, 'message': '无效的参数'}), 400
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'message': f'查询反思结果失败：{str(e)}'}), 500
+
 @app.route('/api/home/resources', methods=['GET'])
 def get_home_resources():
     """获取首页资源列表（从crawled_images和cultural_entities表）"""
@@ -2491,6 +2748,9 @@ def get_home_resources():
         try:
             with conn.cursor() as cursor:
                 resources = []
+                # 是否已迁移 content_feature_data 生成列
+                has_cf_columns = schema_registry.has_column('cultural_resources', 'cf_title')
+                has_aigc_cf_columns = schema_registry.has_column('AIGC_cultural_resources', 'cf_text')
                 
                 # 1. 从crawled_images表获取图片资源，按resource_id或entity_id分组
                 # 优先选择有resource_id和entity_id的图片，每个资源只取第一张图片（优先非default图片）
@@ -2534,25 +2794,34 @@ def get_home_resources():
                 paginated_images = festival_list[start_idx:end_idx]
                 
                 
+                # 当前页图片关联的实体一次查询取回（不再逐张图片查询）
+                page_entity_ids = list(dict.fromkeys(img['entity_id'] for img in paginated_images
+                                                     if img.get('entity_id')))
+                page_entities = {}
+                if page_entity_ids:
+                    placeholders = ', '.join(['%s'] * len(page_entity_ids))
+                    cursor.execute(f"""
+                        SELECT id, entity_name, description, entity_type, cultural_value
+                        FROM cultural_entities
+                        WHERE id IN ({placeholders})
+                    """, page_entity_ids)
+                    page_entities = {row['id']: row for row in cursor.fetchall()}
+                festival_index = get_festival_resource_index()
+                
                 # 构建资源列表
                 for img in paginated_images:
                     # 优先通过entity_id关联查询cultural_entities表（最准确的方式）
                     entity_id = img.get('entity_id')
                     resource_id = img.get('resource_id')
-                    festival_name = img.get('festival_name')  # 从数据库字段直接获取
+                    # 从数据库字段直接获取，没有时取关联实体或资源所属的节日（节日资源索引）
+                    festival_name = img.get('festival_name') or festival_index.festival_of(entity_id, resource_id)
                     
                     entity_name = ""
                     description = ""
                     
-                    # 1. 优先通过entity_id直接关联查询（最准确）
+                    # 1. 优先通过entity_id直接关联（最准确）
                     if entity_id:
-                        cursor.execute("""
-                            SELECT entity_name, description, entity_type, cultural_value
-                            FROM cultural_entities
-                            WHERE id = %s
-                            LIMIT 1
-                        """, (entity_id,))
-                        entity_info = cursor.fetchone()
+                        entity_info = page_entities.get(entity_id)
                         if entity_info:
                             entity_name = entity_info.get('entity_name', '') or ''
                             description = entity_info.get('description', '') or ''
@@ -2561,14 +2830,26 @@ def get_home_resources():
                     
                     # 2. 如果没有entity_id，尝试通过resource_id查询cultural_resources，再关联cultural_entities
                     if not entity_name and resource_id:
-                        cursor.execute("""
-                            SELECT cr.id, cr.title, cr.content_feature_data
-                            FROM cultural_resources cr
-                            WHERE cr.id = %s
-                            LIMIT 1
-                        """, (resource_id,))
+                        if has_cf_columns:
+                            # 生成列中已物化 $.title 和 $.meta.festival_names[0]，不需要读取和解析整个JSON
+                            cursor.execute("""
+                                SELECT cr.id, cr.title, cr.cf_title, cr.cf_festival
+                                FROM cultural_resources cr
+                                WHERE cr.id = %s
+                                LIMIT 1
+                            """, (resource_id,))
+                        else:
+                            cursor.execute("""
+                                SELECT cr.id, cr.title, cr.content_feature_data
+                                FROM cultural_resources cr
+                                WHERE cr.id = %s
+                                LIMIT 1
+                            """, (resource_id,))
                         resource_info = cursor.fetchone()
-                        if resource_info:
+                        if resource_info and has_cf_columns:
+                            entity_name = resource_info.get('cf_title') or entity_name
+                            festival_name = festival_name or resource_info.get('cf_festival')
+                        elif resource_info:
                             # 从content_feature_data中提取信息
                             try:
                                 content_data = json.loads(resource_info.get('content_feature_data', '{}') or '{}')
@@ -2582,7 +2863,7 @@ def get_home_resources():
                                         festival_name = meta.get('festival_names', [None])[0] if meta.get('festival_names') else None
                             except:
                                 pass
-                            
+                        if resource_info:
                             # 通过resource_id查找关联的entity_id
                             cursor.execute("""
                                 SELECT ci.entity_id
@@ -2711,8 +2992,11 @@ def get_home_resources():
                 if remaining_after_entities > 0:
                     # 计算偏移量
                     offset_aigc = max(0, (page - 1) * page_size - len(paginated_images) - len(entities))
-                    cursor.execute("""
-                        SELECT id, title, resource_type, content_feature_data, source_from
+                    # 已迁移生成列时只取正文前200字，不读取整个JSON
+                    content_columns = ("LEFT(cf_text, 200) AS cf_text, cf_title" if has_aigc_cf_columns
+                                       else "content_feature_data")
+                    cursor.execute(f"""
+                        SELECT id, title, resource_type, {content_columns}, source_from
                         FROM AIGC_cultural_resources
                         WHERE resource_type = '文本'
                         ORDER BY created_at DESC
@@ -2724,14 +3008,18 @@ def get_home_resources():
                         # 解析content_feature_data获取文本内容
                         entity_name = aigc.get('title', '')
                         description = ''
-                        try:
-                            content_data = json.loads(aigc.get('content_feature_data', '{}') or '{}')
-                            if isinstance(content_data, dict):
-                                description = content_data.get('text', '')[:200] or ''
-                                if not entity_name:
-                                    entity_name = content_data.get('title', '')
-                        except:
-                            pass
+                        if has_aigc_cf_columns:
+                            description = aigc.get('cf_text') or ''
+                            entity_name = entity_name or aigc.get('cf_title') or ''
+                        else:
+                            try:
+                                content_data = json.loads(aigc.get('content_feature_data', '{}') or '{}')
+                                if isinstance(content_data, dict):
+                                    description = content_data.get('text', '')[:200] or ''
+                                    if not entity_name:
+                                        entity_name = content_data.get('title', '')
+                            except:
+                                pass
                         
                         # AIGC文字资源统一使用 AIGC_graph/default.jpg
                         image_url = "/AIGC_graph/default.jpg"
@@ -2788,6 +3076,36 @@ def get_home_resources():
         }), 500
 
 
+# 详情页预取的相关实体：扩展跳数和最多条数
+DETAIL_RELATED_HOPS = int(os.getenv("DETAIL_RELATED_HOPS", "2"))
+DETAIL_RELATED_LIMIT = int(os.getenv("DETAIL_RELATED_LIMIT", "20"))
+# 详情页图片排序：非默认图片在前，"序号.jpg"、"序号-子序号.jpg" 按数字顺序
+DETAIL_IMAGE_ORDER_BY = """
+                            CASE 
+                                WHEN file_name != 'default.jpg' THEN 0
+                                ELSE 1
+                            END,
+                            CASE 
+                                WHEN file_name REGEXP '^[0-9]+\\.[a-zA-Z]+$' THEN 1
+                                WHEN file_name REGEXP '^[0-9]+-[0-9]+\\.[a-zA-Z]+$' THEN 2
+                                ELSE 3
+                            END,
+                            CAST(SUBSTRING_INDEX(SUBSTRING_INDEX(file_name, '-', 1), '.', 1) AS UNSIGNED),
+                            CASE 
+                                WHEN file_name REGEXP '^[0-9]+-[0-9]+\\.[a-zA-Z]+$' 
+                                THEN CAST(SUBSTRING_INDEX(SUBSTRING_INDEX(file_name, '-', -1), '.', 1) AS UNSIGNED)
+                                ELSE 0
+                            END"""
+
+
+def _related_entities(entity_id):
+    """详情页的相关实体（从实体关系图索引中取，不访问数据库；索引未就绪时返回空列表）"""
+    graph_index = get_entity_graph_index()
+    if not entity_id or not graph_index.ready:
+        return []
+    return graph_index.related_entities(entity_id, hops=DETAIL_RELATED_HOPS, limit=DETAIL_RELATED_LIMIT)
+
+
 @app.route('/api/resource/detail', methods=['GET'])
 def get_resource_detail():
     """获取资源详情（某个节日的所有图片）
@@ -2844,6 +3162,11 @@ def get_resource_detail():
     if not festival_name:
         return jsonify({'success': False, 'message': '缺少festival_name参数或无法通过id+table获取festival_name'}), 400
     
+    # 记录实体详情访问（搜索框输入提示按访问次数计算热度）
+    viewer_id = request.headers.get('X-User-Id') or request.args.get('user_id')
+    if viewer_id and resource_id_param and table_param in ('cultural_entities', 'AIGC_cultural_entities'):
+        log_user_access(viewer_id, 'entity_view', '/api/resource/detail', resource_id_param, table_param)
+    
     try:
         import re
         
@@ -2863,113 +3186,135 @@ def get_resource_detail():
                 entity_name = festival_name
                 description = ""
                 entity_id = None
+                entity_info = None
                 
-                # 1. 先尝试通过entity_name精确匹配或模糊匹配查找实体
-                cursor.execute("""
-                    SELECT id, entity_name, description, entity_type, cultural_value
-                    FROM cultural_entities
-                    WHERE entity_name = %s OR entity_name LIKE %s
-                    ORDER BY CASE WHEN entity_name = %s THEN 1 ELSE 2 END
-                    LIMIT 1
-                """, (festival_name, f'%{festival_name}%', festival_name))
-                entity_info = cursor.fetchone()
-                
-                if entity_info:
-                    entity_id = entity_info.get('id')
-                    entity_name = entity_info.get('entity_name', festival_name)
-                    description = entity_info.get('description', '') or ''
-                    # 不限制描述长度，返回完整描述
-                
-                # 2. 查找该节日的所有图片（优先通过entity_id，如果没有则通过tags匹配）
-                if entity_id:
-                    # 通过entity_id关联查询（最准确）
-                    cursor.execute("""
-                        SELECT id, file_name, storage_path, tags, dimensions, crawl_time, resource_id, entity_id
-                        FROM crawled_images
-                        WHERE entity_id = %s
-                        ORDER BY 
-                            CASE 
-                                WHEN file_name != 'default.jpg' THEN 0
-                                ELSE 1
-                            END,
-                            CASE 
-                                WHEN file_name REGEXP '^[0-9]+\\.[a-zA-Z]+$' THEN 1
-                                WHEN file_name REGEXP '^[0-9]+-[0-9]+\\.[a-zA-Z]+$' THEN 2
-                                ELSE 3
-                            END,
-                            CAST(SUBSTRING_INDEX(SUBSTRING_INDEX(file_name, '-', 1), '.', 1) AS UNSIGNED),
-                            CASE 
-                                WHEN file_name REGEXP '^[0-9]+-[0-9]+\\.[a-zA-Z]+$' 
-                                THEN CAST(SUBSTRING_INDEX(SUBSTRING_INDEX(file_name, '-', -1), '.', 1) AS UNSIGNED)
-                                ELSE 0
-                            END
-                    """, (entity_id,))
+                # 节日名称（含别名）走节日资源索引：一次键查找得到实体和图片ID，再按主键取回
+                festival_entry = get_festival_resource_index().lookup(festival_name)
+                if festival_entry is not None:
+                    if festival_entry['entities']:
+                        # 与查询名称相同的实体排在最前，其次是节日名称本身
+                        cursor.execute("""
+                            SELECT id, entity_name, description, entity_type, cultural_value
+                            FROM cultural_entities
+                            WHERE id = %s
+                        """, (festival_entry['entities'][0]['id'],))
+                        entity_info = cursor.fetchone()
+                    if entity_info:
+                        entity_id = entity_info.get('id')
+                        entity_name = entity_info.get('entity_name', festival_name)
+                        description = entity_info.get('description', '') or ''
+                    
+                    # 找到实体时只取该实体的图片，否则取归入该节日的全部图片（与按名称查询的行为一致）
+                    image_ids = [image_id for image_id, image_entity_id in festival_entry['images'].items()
+                                 if not entity_id or image_entity_id == entity_id]
+                    images = []
+                    if image_ids:
+                        placeholders = ', '.join(['%s'] * len(image_ids))
+                        cursor.execute(f"""
+                            SELECT id, file_name, storage_path, tags, dimensions, crawl_time, resource_id, entity_id
+                            FROM crawled_images
+                            WHERE id IN ({placeholders})
+                            ORDER BY {DETAIL_IMAGE_ORDER_BY}
+                        """, image_ids)
+                        images = cursor.fetchall()
                 else:
-                    # 通过tags字段匹配节日名称（备用方案）
+                    # 1. 先尝试通过entity_name精确匹配或模糊匹配查找实体
                     cursor.execute("""
-                        SELECT id, file_name, storage_path, tags, dimensions, crawl_time, resource_id, entity_id
-                        FROM crawled_images
-                        WHERE tags LIKE %s OR festival_name = %s
-                        ORDER BY 
-                            CASE 
-                                WHEN file_name != 'default.jpg' THEN 0
-                                ELSE 1
-                            END,
-                            CASE 
-                                WHEN file_name REGEXP '^[0-9]+\\.[a-zA-Z]+$' THEN 1
-                                WHEN file_name REGEXP '^[0-9]+-[0-9]+\\.[a-zA-Z]+$' THEN 2
-                                ELSE 3
-                            END,
-                            CAST(SUBSTRING_INDEX(SUBSTRING_INDEX(file_name, '-', 1), '.', 1) AS UNSIGNED),
-                            CASE 
-                                WHEN file_name REGEXP '^[0-9]+-[0-9]+\\.[a-zA-Z]+$' 
-                                THEN CAST(SUBSTRING_INDEX(SUBSTRING_INDEX(file_name, '-', -1), '.', 1) AS UNSIGNED)
-                                ELSE 0
-                            END
-                    """, (f'%{festival_name}%', festival_name))
+                        SELECT id, entity_name, description, entity_type, cultural_value
+                        FROM cultural_entities
+                        WHERE entity_name = %s OR entity_name LIKE %s
+                        ORDER BY CASE WHEN entity_name = %s THEN 1 ELSE 2 END
+                        LIMIT 1
+                    """, (festival_name, f'%{festival_name}%', festival_name))
+                    entity_info = cursor.fetchone()
                 
-                images = cursor.fetchall()
+                    if entity_info:
+                        entity_id = entity_info.get('id')
+                        entity_name = entity_info.get('entity_name', festival_name)
+                        description = entity_info.get('description', '') or ''
+                        # 不限制描述长度，返回完整描述
                 
-                # 3. 如果通过图片找到了entity_id，但没有描述，再次查询
-                if not description and images:
-                    for img in images:
-                        img_entity_id = img.get('entity_id')
-                        if img_entity_id:
-                            cursor.execute("""
-                                SELECT entity_name, description
-                                FROM cultural_entities
-                                WHERE id = %s
-                                LIMIT 1
-                            """, (img_entity_id,))
-                            entity_info = cursor.fetchone()
-                            if entity_info:
-                                entity_name = entity_info.get('entity_name', entity_name)
-                                description = entity_info.get('description', '') or description
-                                break
-                
-                # 4. 如果还是没有描述，尝试从resource_id关联查询
-                if not description and images:
-                    for img in images:
-                        resource_id = img.get('resource_id')
-                        if resource_id:
-                            cursor.execute("""
-                                SELECT cr.content_feature_data
-                                FROM cultural_resources cr
-                                WHERE cr.id = %s
-                                LIMIT 1
-                            """, (resource_id,))
-                            resource_info = cursor.fetchone()
-                            if resource_info and resource_info.get('content_feature_data'):
-                                try:
-                                    content_data = json.loads(resource_info['content_feature_data'] or '{}')
-                                    if isinstance(content_data, dict):
-                                        description = content_data.get('text', '') or description
-                                        if not entity_name or entity_name == festival_name:
-                                            entity_name = content_data.get('title', entity_name)
-                                except:
-                                    pass
-                            if description:
-                                break
+                    # 2. 查找该节日的所有图片（优先通过entity_id，如果没有则通过tags匹配）
+                    if entity_id:
+                        # 通过entity_id关联查询（最准确）
+                        cursor.execute(f"""
+                            SELECT id, file_name, storage_path, tags, dimensions, crawl_time, resource_id, entity_id
+                            FROM crawled_images
+                            WHERE entity_id = %s
+                            ORDER BY {DETAIL_IMAGE_ORDER_BY}
+                        """, (entity_id,))
+                    elif schema_registry.has_table('image_tags'):
+                        # 通过标签或节日名称匹配（备用方案）：标签走 image_tags 索引，节日名称走 idx_festival_name
+                        cursor.execute(f"""
+                            SELECT ci.id, ci.file_name, ci.storage_path, ci.tags, ci.dimensions, ci.crawl_time,
+                                   ci.resource_id, ci.entity_id
+                            FROM crawled_images ci
+                            JOIN (
+                                {tag_match_subquery('crawled_images')}
+                                UNION
+                                SELECT id FROM crawled_images WHERE festival_name = %s
+                            ) m ON m.image_id = ci.id
+                            ORDER BY {DETAIL_IMAGE_ORDER_BY}
+                        """, (tag_prefix_pattern(festival_name), festival_name))
+                    else:
+                        # 通过tags字段匹配节日名称（备用方案）
+                        cursor.execute(f"""
+                            SELECT id, file_name, storage_path, tags, dimensions, crawl_time, resource_id, entity_id
+                            FROM crawled_images
+                            WHERE tags LIKE %s OR festival_name = %s
+                            ORDER BY {DETAIL_IMAGE_ORDER_BY}
+                        """, (f'%{festival_name}%', festival_name))
+                
+                    images = cursor.fetchall()
+                
+                # 3. 如果通过图片找到了entity_id，但没有描述，取第一张有关联实体的图片的实体信息（一次查询）
+                image_entity_ids = list(dict.fromkeys(img['entity_id'] for img in images if img.get('entity_id')))
+                if not description and image_entity_ids:
+                    placeholders = ', '.join(['%s'] * len(image_entity_ids))
+                    cursor.execute(f"""
+                        SELECT id, entity_name, description
+                        FROM cultural_entities
+                        WHERE id IN ({placeholders})
+                    """, image_entity_ids)
+                    image_entities = {row['id']: row for row in cursor.fetchall()}
+                    for img_entity_id in image_entity_ids:
+                        if img_entity_id in image_entities:
+                            entity_name = image_entities[img_entity_id].get('entity_name', entity_name)
+                            description = image_entities[img_entity_id].get('description', '') or description
+                            break
+                
+                # 4. 如果还是没有描述，取第一张有关联资源的图片的资源正文（一次查询）
+                image_resource_ids = list(dict.fromkeys(img['resource_id'] for img in images if img.get('resource_id')))
+                if not description and image_resource_ids:
+                    placeholders = ', '.join(['%s'] * len(image_resource_ids))
+                    has_cf_columns = schema_registry.has_column('cultural_resources', 'cf_text')
+                    # 生成列中已物化 $.text 和 $.title，不需要读取和解析整个JSON
+                    content_columns = "cr.cf_text, cr.cf_title" if has_cf_columns else "cr.content_feature_data"
+                    cursor.execute(f"""
+                        SELECT cr.id, {content_columns}
+                        FROM cultural_resources cr
+                        WHERE cr.id IN ({placeholders})
+                    """, image_resource_ids)
+                    image_resources = {row['id']: row for row in cursor.fetchall()}
+                    for img_resource_id in image_resource_ids:
+                        resource_info = image_resources.get(img_resource_id)
+                        if not resource_info:
+                            continue
+                        if has_cf_columns:
+                            resource_text, resource_title = resource_info.get('cf_text'), resource_info.get('cf_title')
+                        else:
+                            try:
+                                content_data = json.loads(resource_info.get('content_feature_data') or '{}')
+                            except Exception:
+                                content_data = None
+                            if not isinstance(content_data, dict):
+                                continue
+                            resource_text, resource_title = content_data.get('text'), content_data.get('title')
+                        if resource_text:
+                            description = resource_text
+                            if not entity_name or entity_name == festival_name:
+                                entity_name = resource_title or entity_name
+                            break
                 
                 # 5. 即使没有图片，也返回实体信息
                 if not images:
@@ -2988,7 +3333,8 @@ def get_resource_detail():
                             'entity_name': entity_name,
                             'description': description or '暂无简介',
                             'images': [default_image],
-                            'total_images': 1
+                            'total_images': 1,
+                            'related_entities': _related_entities(entity_id)
                         })
                     else:
                         return jsonify({
@@ -3073,7 +3419,8 @@ def get_resource_detail():
                     'description': description or '暂无简介',
                     'images': image_list,
                     'total_images': len(image_list),
-                    'resource_id': resource_id  # 返回resource_id用于评论功能
+                    'resource_id': resource_id,  # 返回resource_id用于评论功能
+                    'related_entities': _related_entities(entity_id)  # 相关实体（1~2跳）
                 })
         finally:
             if conn:
@@ -3086,6 +3433,388 @@ def get_resource_detail():
         traceback.print_exc()
         return jsonify({'success': False, 'message': f'获取资源详情失败：{str(e)}'}), 500
 
+# 检索分页参数：每页默认条数和单页最大条数（倒排索引只需从数据库取回当前页的记录）
+SEARCH_DEFAULT_LIMIT = int(os.getenv("SEARCH_DEFAULT_LIMIT", "20"))
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "200"))
+
+
+def _encode_search_cursor(row):
+    """将结果行的排序键 (combined_score, id, table) 编码为分页游标；倒排索引的命中在末尾附带 bm25_score"""
+    key = [row['combined_score'], row['id'], row['source_table']]
+    if row.get('bm25_score') is not None:
+        key.append(row['bm25_score'])
+    return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def _decode_search_cursor(cursor):
+    """解析分页游标，格式错误时返回None"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        score, entity_id, table = key[:3]
+        if table not in ENTITY_TABLES or len(key) > 4:
+            return None
+        if len(key) == 4:
+            # 倒排索引的排序键 (combined_score, bm25_score, id, table)
+            return (float(score), float(key[3]), int(entity_id), table)
+        return (float(score), int(entity_id), table)
+    except Exception:
+        return None
+
+
+def _parse_search_paging(args):
+    """
+    解析检索接口的分页参数
+    - limit/cursor：键集分页（推荐），cursor 取上一页返回的 next_cursor
+    - page/page_size：按页码翻页（兼容前端分页组件），page_size 等同于 limit
+
+    Returns:
+        (limit, after, offset, page)，参数非法时返回None
+    """
+    try:
+        limit = int(args.get('limit') or args.get('page_size') or SEARCH_DEFAULT_LIMIT)
+        page = int(args.get('page') or 1)
+    except (TypeError, ValueError):
+        return None
+    limit = max(1, min(limit, SEARCH_MAX_RESULTS))
+    page = max(1, page)
+
+    cursor = (args.get('cursor') or '').strip()
+    if cursor:
+        after = _decode_search_cursor(cursor)
+        if after is None:
+            return None
+        return limit, after, 0, None
+    return limit, None, (page - 1) * limit, page
+
+
+def _search_entities_by_sql(cursor, keyword, use_fulltext=False, limit=SEARCH_DEFAULT_LIMIT,
+                            after=None, offset=0):
+    """
+    直接在数据库中检索实体（倒排索引尚未就绪时的回退路径）
+    按 (combined_score, id, source_table) 降序排序并在SQL中分页，只取回 limit 条
+
+    Returns:
+        (结果行列表, 命中总数)
+    """
+    like_pattern = f'%{keyword}%'
+    exact_match = keyword
+    partial_match = like_pattern
+    
+    # 构建查询：优先使用全文索引，否则使用LIKE
+    # 一个实体关联多张图片时只取一张，保证每个实体只出现一次（分页排序键唯一）
+    if use_fulltext:
+        # 使用全文索引查询（MATCH AGAINST）
+        union_sql = """
+            (SELECT
+                ce.id,
+                'cultural_entities' as source_table,
+                ce.entity_name as title,
+                ce.description,
+                COALESCE(MIN(ci.storage_path), ce.related_images_url) as image_url,
+                ce.source,
+                '传统实体' as type_tag,
+                CASE
+                    WHEN ce.entity_name LIKE %s THEN 2.0  -- 实体名完全匹配权重最高
+                    WHEN MATCH(ce.entity_name, ce.description) AGAINST(%s IN NATURAL LANGUAGE MODE) THEN 1.8  -- 全文索引匹配权重高
+                    WHEN ce.entity_name LIKE %s THEN 1.5  -- 实体名部分匹配权重较高
+                    WHEN ce.description LIKE %s THEN 1.0  -- 描述匹配权重中等
+                    ELSE 0.5
+                END as relevance_score,
+                1 as type_weight  -- 传统实体权重更高
+            FROM cultural_entities ce
+            LEFT JOIN crawled_images ci ON ce.id = ci.entity_id
+            WHERE MATCH(ce.entity_name, ce.description) AGAINST(%s IN NATURAL LANGUAGE MODE)
+               OR ce.entity_name LIKE %s 
+               OR ce.description LIKE %s
+            GROUP BY ce.id)
+
+            UNION ALL
+
+            (SELECT
+                ace.id,
+                'AIGC_cultural_entities' as source_table,
+                ace.entity_name as title,
+                ace.description,
+                ace.related_images_url as image_url,
+                'AIGC生成' as source,
+                'AI实体' as type_tag,
+                CASE
+                    WHEN ace.entity_name LIKE %s THEN 1.6  -- AI实体名完全匹配权重较高
+                    WHEN MATCH(ace.entity_name, ace.description) AGAINST(%s IN NATURAL LANGUAGE MODE) THEN 1.4  -- 全文索引匹配权重较高
+                    WHEN ace.entity_name LIKE %s THEN 1.2  -- AI实体名部分匹配权重中等
+                    WHEN ace.description LIKE %s THEN 0.8  -- AI描述匹配权重较低
+                    ELSE 0.4
+                END as relevance_score,
+                0.7 as type_weight  -- AI生成实体权重较低
+            FROM AIGC_cultural_entities ace
+            WHERE MATCH(ace.entity_name, ace.description) AGAINST(%s IN NATURAL LANGUAGE MODE)
+               OR ace.entity_name LIKE %s 
+               OR ace.description LIKE %s)
+        """
+        # 准备查询参数（全文索引需要单独的关键词参数）
+        params = [
+            exact_match, keyword, partial_match, partial_match, keyword, partial_match, partial_match,  # 传统实体
+            exact_match, keyword, partial_match, partial_match, keyword, partial_match, partial_match   # AI实体
+        ]
+        count_sql = """
+            SELECT
+                (SELECT COUNT(*) FROM cultural_entities ce
+                 WHERE MATCH(ce.entity_name, ce.description) AGAINST(%s IN NATURAL LANGUAGE MODE)
+                    OR ce.entity_name LIKE %s OR ce.description LIKE %s)
+              + (SELECT COUNT(*) FROM AIGC_cultural_entities ace
+                 WHERE MATCH(ace.entity_name, ace.description) AGAINST(%s IN NATURAL LANGUAGE MODE)
+                    OR ace.entity_name LIKE %s OR ace.description LIKE %s) as total
+        """
+        count_params = [keyword, partial_match, partial_match] * 2
+    else:
+        # 使用LIKE查询（不支持全文索引时）
+        union_sql = """
+            (SELECT
+                ce.id,
+                'cultural_entities' as source_table,
+                ce.entity_name as title,
+                ce.description,
+                COALESCE(MIN(ci.storage_path), ce.related_images_url) as image_url,
+                ce.source,
+                '传统实体' as type_tag,
+                CASE
+                    WHEN ce.entity_name LIKE %s THEN 2.0  -- 实体名完全匹配权重最高
+                    WHEN ce.entity_name LIKE %s THEN 1.5  -- 实体名部分匹配权重较高
+                    WHEN ce.description LIKE %s THEN 1.0  -- 描述匹配权重中等
+                    ELSE 0.5
+                END as relevance_score,
+                1 as type_weight  -- 传统实体权重更高
+            FROM cultural_entities ce
+            LEFT JOIN crawled_images ci ON ce.id = ci.entity_id
+            WHERE ce.entity_name LIKE %s OR ce.description LIKE %s
+            GROUP BY ce.id)
+
+            UNION ALL
+
+            (SELECT
+                ace.id,
+                'AIGC_cultural_entities' as source_table,
+                ace.entity_name as title,
+                ace.description,
+                ace.related_images_url as image_url,
+                'AIGC生成' as source,
+                'AI实体' as type_tag,
+                CASE
+                    WHEN ace.entity_name LIKE %s THEN 1.6  -- AI实体名完全匹配权重较高
+                    WHEN ace.entity_name LIKE %s THEN 1.2  -- AI实体名部分匹配权重中等
+                    WHEN ace.description LIKE %s THEN 0.8  -- AI描述匹配权重较低
+                    ELSE 0.4
+                END as relevance_score,
+                0.7 as type_weight  -- AI生成实体权重较低
+            FROM AIGC_cultural_entities ace
+            WHERE ace.entity_name LIKE %s OR ace.description LIKE %s)
+        """
+        params = [
+            exact_match, partial_match, partial_match, partial_match, partial_match,  # 传统实体
+            exact_match, partial_match, partial_match, partial_match, partial_match   # AI实体
+        ]
+        count_sql = """
+            SELECT
+                (SELECT COUNT(*) FROM cultural_entities ce
+                 WHERE ce.entity_name LIKE %s OR ce.description LIKE %s)
+              + (SELECT COUNT(*) FROM AIGC_cultural_entities ace
+                 WHERE ace.entity_name LIKE %s OR ace.description LIKE %s) as total
+        """
+        count_params = [partial_match, partial_match] * 2
+
+    # 综合排序：相关性得分 * 类型权重；在SQL中完成排序和分页，避免取回全部命中
+    page_sql = f"""
+        SELECT hits.*, hits.relevance_score * hits.type_weight as combined_score
+        FROM ({union_sql}) hits
+    """
+    if after is not None:
+        page_sql += """
+        WHERE (hits.relevance_score * hits.type_weight, hits.id, hits.source_table) < (%s, %s, %s)
+        """
+        # 倒排索引产生的游标带有 bm25_score，SQL检索不按它排序
+        params.extend(after if len(after) == 3 else (after[0], after[2], after[3]))
+    page_sql += """
+        ORDER BY combined_score DESC, hits.id DESC, hits.source_table DESC
+        LIMIT %s OFFSET %s
+    """
+    params.extend([limit, offset])
+    cursor.execute(page_sql, params)
+    results_list = list(cursor.fetchall())
+    for result in results_list:
+        result['combined_score'] = float(result.get('combined_score') or 0)
+
+    cursor.execute(count_sql, count_params)
+    row = cursor.fetchone()
+    total = int(row['total'] or 0) if row else 0
+    return results_list, total
+
+
+def _hydrate_entity_hits(cursor, hits):
+    """
+    按倒排索引的命中结果从数据库取回实体详情（按主键IN查询），保持命中顺序
+    索引中存在但数据库中已删除的记录会被跳过
+    """
+    ids_by_table = {}
+    for hit in hits:
+        ids_by_table.setdefault(hit['table'], []).append(hit['id'])
+    
+    rows_by_key = {}
+    ce_ids = ids_by_table.get('cultural_entities')
+    if ce_ids:
+        placeholders = ','.join(['%s'] * len(ce_ids))
+        cursor.execute(f"""
+            SELECT
+                ce.id,
+                ce.entity_name as title,
+                ce.description,
+                COALESCE(ci.storage_path, ce.related_images_url) as image_url,
+                ce.source
+            FROM cultural_entities ce
+            LEFT JOIN crawled_images ci ON ce.id = ci.entity_id
+            WHERE ce.id IN ({placeholders})
+        """, ce_ids)
+        for row in cursor.fetchall():
+            # 一个实体关联多张图片时只取第一张
+            rows_by_key.setdefault(('cultural_entities', row['id']), row)
+    
+    ace_ids = ids_by_table.get('AIGC_cultural_entities')
+    if ace_ids:
+        placeholders = ','.join(['%s'] * len(ace_ids))
+        cursor.execute(f"""
+            SELECT
+                ace.id,
+                ace.entity_name as title,
+                ace.description,
+                ace.related_images_url as image_url,
+                'AIGC生成' as source
+            FROM AIGC_cultural_entities ace
+            WHERE ace.id IN ({placeholders})
+        """, ace_ids)
+        for row in cursor.fetchall():
+            rows_by_key.setdefault(('AIGC_cultural_entities', row['id']), row)
+    
+    results = []
+    for hit in hits:
+        row = rows_by_key.get((hit['table'], hit['id']))
+        if not row:
+            continue
+        row = dict(row)
+        row['source_table'] = hit['table']
+        row['type_tag'] = hit['type_tag']
+        row['relevance_score'] = hit['relevance_score']
+        row['type_weight'] = hit['type_weight']
+        row['combined_score'] = hit['combined_score']
+        results.append(row)
+    return results
+
+
+def _search_entities(cursor, keyword, use_fulltext=False, limit=SEARCH_DEFAULT_LIMIT,
+                     after=None, offset=0):
+    """
+    检索实体：倒排索引就绪时走索引，否则回退到数据库查询
+
+    Args:
+        limit: 本页条数
+        after: 键集分页游标解析出的排序键，倒排索引为 (combined_score, bm25_score, id, table)，SQL检索为 (combined_score, id, table)
+        offset: 按页码翻页时跳过的条数
+
+    Returns:
+        (本页结果行, 命中总数估计, 下一页游标)；没有下一页时游标为None
+    """
+    # 多取一条用于判断是否还有下一页
+    index = get_entity_search_index()
+    if index.ready:
+        hits, total = index.search_page(keyword, limit=limit + 1, after=after, offset=offset)
+        has_more = len(hits) > limit
+        hits = hits[:limit]
+        # 游标取自索引命中而不是回表后的结果，回表时跳过已删除记录也不会影响翻页
+        next_cursor = _encode_search_cursor({
+            'combined_score': hits[-1]['combined_score'],
+            'id': hits[-1]['id'],
+            'source_table': hits[-1]['table'],
+            'bm25_score': hits[-1]['bm25_score'],
+        }) if has_more else None
+        return _hydrate_entity_hits(cursor, hits), total, next_cursor
+
+    results, total = _search_entities_by_sql(cursor, keyword, use_fulltext, limit=limit + 1,
+                                             after=after, offset=offset)
+    has_more = len(results) > limit
+    results = results[:limit]
+    next_cursor = _encode_search_cursor(results[-1]) if has_more else None
+    return results, total, next_cursor
+
+
+def _search_page_response(results, total, next_cursor, paging, **extra):
+    """组装检索接口的分页响应"""
+    limit, _, _, page = paging
+    response = {
+        "code": 200,
+        "msg": "success",
+        "data": _format_search_results(results),
+        "total": total,  # 命中总数估计（索引刷新前已删除的记录仍会被计入）
+        "limit": limit,
+        "next_cursor": next_cursor,
+        "has_more": next_cursor is not None,
+    }
+    if page is not None:
+        response["page"] = page
+        response["page_size"] = limit
+        response["total_pages"] = max(1, (total + limit - 1) // limit)
+    response.update(extra)
+    return response
+
+
+def _format_search_results(results):
+    """将检索结果行格式化为前端需要的结构"""
+    formatted_list = []
+    
+    for row in results:
+        # 提取描述摘要
+        desc = row.get('description', '')
+        if desc:
+            snippet = desc[:100] + '...'
+        else:
+            snippet = '暂无详细描述'
+        
+        # 提取并处理图片URL
+        img = row.get('image_url')
+        image_url = None
+        if img and img != 'null' and img.strip():
+            # 如果是从crawled_images关联的路径
+            if 'crawled_images' in img or img.startswith('crawled_images'):
+                actual_file = os.path.basename(img)
+                image_url = f"/api/images/crawled/{actual_file}"
+            # 如果是related_images_url字段（可能是URL字符串）
+            elif img.startswith('http://') or img.startswith('https://'):
+                image_url = img
+            # 如果是以/开头的路径
+            elif img.startswith('/'):
+                image_url = img
+            # 其他情况，尝试作为文件名处理
+            else:
+                image_url = f"/api/images/crawled/{os.path.basename(img)}"
+        
+        # 如果没有图片，使用默认图片
+        if not image_url:
+            image_url = "/public/default.jpg"
+
+        # 组装数据
+        formatted_list.append({
+            "id": row['id'],
+            "table": row.get('source_table'),
+            "title": row['title'],
+            "entity_name": row['title'],
+            "description": desc,
+            "snippet": snippet,
+            "tags": [row['type_tag']], 
+            "source_url": row.get('source', '#'),
+            "image_url": image_url,
+            "relevance_score": row.get('relevance_score', 0)
+        })
+    return formatted_list
+
+
 @app.route('/api/search', methods=['GET'])
 def search_resources():
     """全文检索接口：关键词直接与数据库匹配，不使用AI分析"""
@@ -3095,6 +3824,18 @@ def search_resources():
     if not keyword:
         return jsonify({"code": 400, "msg": "请输入搜索关键词", "data": []})
 
+    paging = _parse_search_paging(request.args)
+    if paging is None:
+        return jsonify({"code": 400, "msg": "分页参数无效", "data": []})
+    limit, after, offset, _ = paging
+
+    # 相同（归一化后）查询直接返回缓存结果
+    search_cache = get_search_result_cache()
+    cache_key = search_cache.make_key('search', keyword, limit, after, offset)
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return jsonify(cached)
+
     # 获取数据库连接
     from db_connection import get_default_db_connection
     conn = get_default_db_connection()
@@ -3106,198 +3847,19 @@ def search_resources():
         with conn.cursor(DictCursor) as cursor:
             # ------------------------
             # 直接关键词匹配查询（不使用AI分析）
+            # 优先在内存倒排索引中匹配排序，数据库只取回排名靠前的记录
             # ------------------------
 
-            # 构建LIKE查询条件
-            like_pattern = f'%{keyword}%'
-
-            # 检查是否支持全文索引
-            cursor.execute("""
-                SELECT COUNT(*) as cnt
-                FROM information_schema.STATISTICS 
-                WHERE TABLE_SCHEMA = DATABASE() 
-                AND TABLE_NAME = 'cultural_entities' 
-                AND INDEX_NAME = 'idx_ce_search'
-            """)
-            has_fulltext = cursor.fetchone().get('cnt', 0) > 0
-            
-            # 构建查询：优先使用全文索引，否则使用LIKE
-            if has_fulltext:
-                # 使用全文索引查询（MATCH AGAINST）
-                sql = """
-                    (SELECT
-                        ce.id,
-                        ce.entity_name as title,
-                        ce.description,
-                        COALESCE(ci.storage_path, ce.related_images_url) as image_url,
-                        ce.source,
-                        '传统实体' as type_tag,
-                        CASE
-                            WHEN ce.entity_name LIKE %s THEN 2.0  -- 实体名完全匹配权重最高
-                            WHEN MATCH(ce.entity_name, ce.description) AGAINST(%s IN NATURAL LANGUAGE MODE) THEN 1.8  -- 全文索引匹配权重高
-                            WHEN ce.entity_name LIKE %s THEN 1.5  -- 实体名部分匹配权重较高
-                            WHEN ce.description LIKE %s THEN 1.0  -- 描述匹配权重中等
-                            ELSE 0.5
-                        END as relevance_score,
-                        1 as type_weight  -- 传统实体权重更高
-                    FROM cultural_entities ce
-                    LEFT JOIN crawled_images ci ON ce.id = ci.entity_id
-                    WHERE MATCH(ce.entity_name, ce.description) AGAINST(%s IN NATURAL LANGUAGE MODE)
-                       OR ce.entity_name LIKE %s 
-                       OR ce.description LIKE %s
-                    GROUP BY ce.id, ce.entity_name, ce.description, ce.source, ci.storage_path, ce.related_images_url)
-
-                    UNION ALL
-
-                    (SELECT
-                        ace.id,
-                        ace.entity_name as title,
-                        ace.description,
-                        ace.related_images_url as image_url,
-                        'AIGC生成' as source,
-                        'AI实体' as type_tag,
-                        CASE
-                            WHEN ace.entity_name LIKE %s THEN 1.6  -- AI实体名完全匹配权重较高
-                            WHEN MATCH(ace.entity_name, ace.description) AGAINST(%s IN NATURAL LANGUAGE MODE) THEN 1.4  -- 全文索引匹配权重较高
-                            WHEN ace.entity_name LIKE %s THEN 1.2  -- AI实体名部分匹配权重中等
-                            WHEN ace.description LIKE %s THEN 0.8  -- AI描述匹配权重较低
-                            ELSE 0.4
-                        END as relevance_score,
-                        0.7 as type_weight  -- AI生成实体权重较低
-                    FROM AIGC_cultural_entities ace
-                    WHERE MATCH(ace.entity_name, ace.description) AGAINST(%s IN NATURAL LANGUAGE MODE)
-                       OR ace.entity_name LIKE %s 
-                       OR ace.description LIKE %s)
-                    
-                    -- 不限制返回条数，移除所有LIMIT子句
-                """
-                # 准备查询参数（全文索引需要单独的关键词参数）
-                exact_match = keyword
-                partial_match = like_pattern
-                cursor.execute(sql, (
-                    exact_match, keyword, partial_match, partial_match, keyword, partial_match, partial_match,  # 传统实体
-                    exact_match, keyword, partial_match, partial_match, keyword, partial_match, partial_match   # AI实体
-                ))
-            else:
-                # 使用LIKE查询（不支持全文索引时）
-                sql = """
-                    (SELECT
-                        ce.id,
-                        ce.entity_name as title,
-                        ce.description,
-                        COALESCE(ci.storage_path, ce.related_images_url) as image_url,
-                        ce.source,
-                        '传统实体' as type_tag,
-                        CASE
-                            WHEN ce.entity_name LIKE %s THEN 2.0  -- 实体名完全匹配权重最高
-                            WHEN ce.entity_name LIKE %s THEN 1.5  -- 实体名部分匹配权重较高
-                            WHEN ce.description LIKE %s THEN 1.0  -- 描述匹配权重中等
-                            ELSE 0.5
-                        END as relevance_score,
-                        1 as type_weight  -- 传统实体权重更高
-                    FROM cultural_entities ce
-                    LEFT JOIN crawled_images ci ON ce.id = ci.entity_id
-                    WHERE ce.entity_name LIKE %s OR ce.description LIKE %s
-                    GROUP BY ce.id, ce.entity_name, ce.description, ce.source, ci.storage_path, ce.related_images_url)
-
-                    UNION ALL
-
-                    (SELECT
-                        ace.id,
-                        ace.entity_name as title,
-                        ace.description,
-                        ace.related_images_url as image_url,
-                        'AIGC生成' as source,
-                        'AI实体' as type_tag,
-                        CASE
-                            WHEN ace.entity_name LIKE %s THEN 1.6  -- AI实体名完全匹配权重较高
-                            WHEN ace.entity_name LIKE %s THEN 1.2  -- AI实体名部分匹配权重中等
-                            WHEN ace.description LIKE %s THEN 0.8  -- AI描述匹配权重较低
-                            ELSE 0.4
-                        END as relevance_score,
-                        0.7 as type_weight  -- AI生成实体权重较低
-                    FROM AIGC_cultural_entities ace
-                    WHERE ace.entity_name LIKE %s OR ace.description LIKE %s)
-                    
-                    -- 不限制返回条数，移除所有LIMIT子句
-                """
-                # 准备查询参数
-                exact_match = keyword
-                partial_match = like_pattern
-                cursor.execute(sql, (
-                    exact_match, partial_match, partial_match, partial_match, partial_match,  # 传统实体
-                    exact_match, partial_match, partial_match, partial_match, partial_match   # AI实体
-                ))
-
-            results = cursor.fetchall()
-
-            # ------------------------
-            # 检索结果排序和格式化（不限制返回条数）
-            # ------------------------
-            def sort_key(result):
-                # 综合排序：相关性得分 * 类型权重
-                relevance = result.get('relevance_score', 0)
-                type_weight = result.get('type_weight', 0.5)
-                return -(relevance * type_weight)
-            
-            # 为结果添加权重并排序
-            results_list = list(results)  # 转换为列表
-            for result in results_list:
-                result['combined_score'] = result.get('relevance_score', 0) * result.get('type_weight', 0.5)
-            
-            results_list.sort(key=lambda x: x.get('combined_score', 0), reverse=True)
-            results = results_list  # 不限制返回条数
+            # 检查是否支持全文索引（仅索引未就绪、回退到数据库查询时使用）
+            has_fulltext = schema_registry.has_index('cultural_entities', 'idx_ce_search')
             
-            formatted_list = []
-            
-            for row in results:
-                # 提取描述摘要
-                desc = row.get('description', '')
-                if desc:
-                    snippet = desc[:100] + '...'
-                else:
-                    snippet = '暂无详细描述'
-                
-                # 提取并处理图片URL
-                img = row.get('image_url')
-                image_url = None
-                if img and img != 'null' and img.strip():
-                    # 如果是从crawled_images关联的路径
-                    if 'crawled_images' in img or img.startswith('crawled_images'):
-                        actual_file = os.path.basename(img)
-                        image_url = f"/api/images/crawled/{actual_file}"
-                    # 如果是related_images_url字段（可能是URL字符串）
-                    elif img.startswith('http://') or img.startswith('https://'):
-                        image_url = img
-                    # 如果是以/开头的路径
-                    elif img.startswith('/'):
-                        image_url = img
-                    # 其他情况，尝试作为文件名处理
-                    else:
-                        image_url = f"/api/images/crawled/{os.path.basename(img)}"
-                
-                # 如果没有图片，使用默认图片
-                if not image_url:
-                    image_url = "/public/default.jpg"
-
-                # 组装数据
-                formatted_list.append({
-                    "id": row['id'],
-                    "title": row['title'],
-                    "entity_name": row['title'],
-                    "description": desc,
-                    "snippet": snippet,
-                    "tags": [row['type_tag']], 
-                    "source_url": row.get('source', '#'),
-                    "image_url": image_url,
-                    "relevance_score": row.get('relevance_score', 0)
-                })
+            results, total, next_cursor = _search_entities(
+                cursor, keyword, use_fulltext=has_fulltext, limit=limit, after=after, offset=offset
+            )
 
-            return jsonify({
-                "code": 200,
-                "msg": "success",
-                "data": formatted_list
-            })
+            response = _search_page_response(results, total, next_cursor, paging)
+            search_cache.set(cache_key, response)
+            return jsonify(response)
     
     except Exception as e:
         import traceback
@@ -3312,22 +3874,55 @@ def search_resources():
                 pass
 
 
+@app.route('/api/search/suggest', methods=['GET'])
+def search_suggest():
+    """搜索框输入提示：实体名称、节日名称（含拼音）前缀补全，只查询内存索引"""
+    prefix = request.args.get('q', '').strip()
+    try:
+        limit = int(request.args.get('limit', SUGGEST_DEFAULT_LIMIT))
+    except (TypeError, ValueError):
+        return jsonify({"code": 400, "msg": "limit参数无效", "data": []})
+    if not prefix:
+        return jsonify({"code": 200, "msg": "success", "data": []})
+
+    index = get_suggest_index()
+    return jsonify({"code": 200, "msg": "success", "data": index.suggest(prefix, limit), "ready": index.ready})
+
+
 @app.route('/api/ai_search', methods=['GET'])
 def ai_search():
     """
     AI 检索接口：调用大模型理解用户需求，将用户需求转化为检索词进行语义搜索
     - 首先使用AI模型分析用户需求，转化为检索关键词
     - 然后使用检索关键词在数据库中匹配
-    - 依赖环境变量 DASHSCOPE_API_KEY 或 ALIYUN_API_KEY
+    - 依赖环境变量 DASHSCOPE_API_KEY 或 ALIYUN_API_KEY；模型不可用或超时时使用本地关键词提取
+    - 关键词提取结果持久化缓存，重复查询不再调用大模型
     - 返回结构：data 为检索结果列表，ai_analysis 为 AI 分析结果
     """
     keyword = request.args.get('q', '').strip()
     if not keyword:
         return jsonify({"code": 400, "msg": "请输入搜索关键词", "data": []})
 
+    paging = _parse_search_paging(request.args)
+    if paging is None:
+        return jsonify({"code": 400, "msg": "分页参数无效", "data": []})
+    limit, after, offset, _ = paging
+
+    # 相同（归一化后）查询直接返回缓存结果，省去大模型调用
+    search_cache = get_search_result_cache()
+    cache_key = search_cache.make_key('ai_search', keyword, limit, after, offset)
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return jsonify(cached)
+
+    # ------------------------
+    # 1. AI语义分析：将用户需求转化为检索关键词（在获取数据库连接之前完成，避免等待模型时占用连接）
+    # 提取结果持久化缓存；未命中时模型限时调用，超时或不可用时使用本地jieba TF-IDF提取
+    # ------------------------
     rag_system = init_search_rag_system()
-    if not rag_system:
-        return jsonify({"code": 500, "msg": "AI 检索初始化失败，请检查阿里云 API Key 配置", "data": []})
+    model = rag_system.model if rag_system else None
+    ai_analysis, analysis_source = get_keyword_extractor().extract(keyword, model)
+    search_query = ai_analysis.get("search_query") or keyword
 
     # 获取数据库连接
     from db_connection import get_default_db_connection
@@ -3337,170 +3932,26 @@ def ai_search():
 
     try:
         # ------------------------
-        # 1. AI语义分析：将用户需求转化为检索关键词
-        # ------------------------
-        semantic_extraction_prompt = """
-你是一位专业的文化资源检索专家，请将用户的自然语言查询转换为精确的检索关键词。
-
-用户查询: {query}
-
-请按照以下JSON格式返回结果：
-{{
-  "keywords": ["关键词1", "关键词2", ...],  # 提取的核心关键词（用于数据库检索）
-  "search_query": "优化后的检索式"  # 适合数据库检索的检索式
-}}
-
-要求：
-1. 提取用户查询中的核心文化主题、节日名称、习俗、人物、地点等关键词
-2. 如果涉及多个概念，用空格或逗号分隔
-3. 保持原意，不要添加额外信息
-4. search_query应该是适合在数据库中直接检索的字符串
-"""
-        
-        try:
-            extraction_response = rag_system.model.invoke(
-                semantic_extraction_prompt.format(query=keyword)
-            )
-            extraction_result = extraction_response.content if hasattr(extraction_response, 'content') else str(extraction_response)
-            
-            # 解析AI返回的结果
-            try:
-                if isinstance(extraction_result, str):
-                    ai_analysis = json.loads(extraction_result)
-                elif isinstance(extraction_result, dict):
-                    ai_analysis = extraction_result
-                else:
-                    raise ValueError("无法解析AI返回结果")
-                
-                # 获取检索关键词
-                search_keywords = ai_analysis.get("keywords", [keyword])
-                search_query = ai_analysis.get("search_query", keyword)
-                
-                # 如果关键词是列表，取第一个作为主要检索词
-                if isinstance(search_keywords, list) and search_keywords:
-                    primary_keyword = search_keywords[0]
-                else:
-                    primary_keyword = keyword
-                
-            except (json.JSONDecodeError, ValueError, TypeError) as e:
-                # 如果解析失败，使用原始关键词
-                primary_keyword = keyword
-                search_query = keyword
-                ai_analysis = {"keywords": [keyword], "search_query": keyword}
-        except Exception as e:
-            # 如果AI调用失败，使用原始关键词
-            primary_keyword = keyword
-            search_query = keyword
-            ai_analysis = {"keywords": [keyword], "search_query": keyword}
-
-        # ------------------------
-        # 2. 使用检索关键词在数据库中匹配
+        # 2. 使用检索关键词匹配（倒排索引优先，数据库只取回排名靠前的记录）
         # ------------------------
         from pymysql.cursors import DictCursor
         with conn.cursor(DictCursor) as cursor:
-            like_pattern = f'%{search_query}%'
-            
-            sql = """
-                (SELECT 
-                    ce.id, 
-                    ce.entity_name as title, 
-                    ce.description, 
-                    COALESCE(ci.storage_path, ce.related_images_url) as image_url,
-                    ce.source,
-                    '传统实体' as type_tag,
-                    CASE
-                        WHEN ce.entity_name LIKE %s THEN 2.0
-                        WHEN ce.entity_name LIKE %s THEN 1.5
-                        WHEN ce.description LIKE %s THEN 1.0
-                        ELSE 0.5
-                    END as relevance_score,
-                    1 as type_weight
-                FROM cultural_entities ce
-                LEFT JOIN crawled_images ci ON ce.id = ci.entity_id
-                WHERE ce.entity_name LIKE %s OR ce.description LIKE %s
-                GROUP BY ce.id, ce.entity_name, ce.description, ce.source, ci.storage_path, ce.related_images_url)
-                
-                UNION ALL
-                
-                (SELECT 
-                    ace.id, 
-                    ace.entity_name as title, 
-                    ace.description, 
-                    ace.related_images_url as image_url,
-                    'AIGC生成' as source,
-                    'AI实体' as type_tag,
-                    CASE
-                        WHEN ace.entity_name LIKE %s THEN 1.6
-                        WHEN ace.entity_name LIKE %s THEN 1.2
-                        WHEN ace.description LIKE %s THEN 0.8
-                        ELSE 0.4
-                    END as relevance_score,
-                    0.7 as type_weight
-                FROM AIGC_cultural_entities ace
-                WHERE ace.entity_name LIKE %s OR ace.description LIKE %s)
-                
-                -- 不限制返回条数，移除所有LIMIT子句
-            """
-            
-            exact_match = search_query
-            partial_match = like_pattern
-            
-            cursor.execute(sql, (
-                exact_match, partial_match, partial_match, partial_match, partial_match,  # 传统实体
-                exact_match, partial_match, partial_match, partial_match, partial_match   # AI实体
-            ))
-            results = cursor.fetchall()
+            results, total, next_cursor = _search_entities(
+                cursor, search_query, limit=limit, after=after, offset=offset
+            )
 
         # ------------------------
-        # 3. 检索结果排序和格式化
+        # 3. 检索结果格式化（分页）
         # ------------------------
-        results_list = list(results)  # 转换为列表
-        for result in results_list:
-            result['combined_score'] = result.get('relevance_score', 0) * result.get('type_weight', 0.5)
-        
-        results_list.sort(key=lambda x: x.get('combined_score', 0), reverse=True)
-        results = results_list  # 不限制返回条数
-        
-        formatted_list = []
-        for row in results:
-            desc = row.get('description', '')
-            snippet = desc[:100] + '...' if desc else '暂无详细描述'
-            
-            # 处理图片URL
-            img = row.get('image_url')
-            image_url = None
-            if img and img != 'null' and img.strip():
-                if 'crawled_images' in img or img.startswith('crawled_images'):
-                    actual_file = os.path.basename(img)
-                    image_url = f"/api/images/crawled/{actual_file}"
-                elif img.startswith('http://') or img.startswith('https://'):
-                    image_url = img
-                elif img.startswith('/'):
-                    image_url = img
-                else:
-                    image_url = f"/api/images/crawled/{os.path.basename(img)}"
-            
-            if not image_url:
-                image_url = "/public/default.jpg"
-            
-            formatted_list.append({
-                "id": row['id'],
-                "title": row['title'],
-                "entity_name": row['title'],
-                "description": desc,
-                "snippet": snippet,
-                "tags": [row['type_tag']], 
-                "source_url": row.get('source', '#'),
-                "image_url": image_url,
-                "relevance_score": row.get('relevance_score', 0)
-            })
-
-        return jsonify({
-            "code": 200,
-            "msg": "success",
-            "data": formatted_list,
-            "ai_analysis": ai_analysis  # 返回AI分析结果
-        })
+        response = _search_page_response(
+            results, total, next_cursor, paging,
+            ai_analysis=ai_analysis,  # 返回AI分析结果
+            analysis_source=analysis_source  # 分析结果来源：cache / model / local
+        )
+        # 本地提取只是模型超时或不可用时的临时结果，不缓存整页响应，待模型结果写入关键词缓存后再缓存
+        if analysis_source != 'local':
+            search_cache.set(cache_key, response)
+        return jsonify(response)
     
     except Exception as e:
         import traceback
@@ -3665,20 +4116,14 @@ def create_aigc_session():
                 
                 # 检查表是否有mode字段，如果没有则添加
                 try:
-                    cursor.execute("""
-                        SELECT COLUMN_NAME 
-                        FROM INFORMATION_SCHEMA.COLUMNS 
-                        WHERE TABLE_SCHEMA = DATABASE() 
-                        AND TABLE_NAME = 'qa_sessions' 
-                        AND COLUMN_NAME = 'mode'
-                    """)
-                    if not cursor.fetchone():
+                    if not schema_registry.has_column('qa_sessions', 'mode'):
                         # 添加mode字段
                         cursor.execute("""
                             ALTER TABLE qa_sessions 
                             ADD COLUMN mode ENUM('text', 'image') DEFAULT 'text' COMMENT '会话模式（text或image）'
                         """)
                         conn.commit()
+                        schema_registry.mark_column('qa_sessions', 'mode')
                 except Exception as e:
                     pass
                 
@@ -3747,39 +4192,15 @@ def get_session_messages(session_id):
                     return jsonify({'success': False, 'message': '无权访问该会话'}), 403
                 
                 # 获取消息列表（使用新的表结构）
-                # 检查表是否有新字段
-                try:
-                    cursor.execute("""
-                        SELECT COLUMN_NAME 
-                        FROM INFORMATION_SCHEMA.COLUMNS 
-                        WHERE TABLE_SCHEMA = DATABASE() 
-                        AND TABLE_NAME = 'qa_messages' 
-                        AND COLUMN_NAME = 'user_message'
-                    """)
-                    has_new_structure = cursor.fetchone() is not None
-                except:
-                    has_new_structure = False
+                # 检查表是否有新字段（从表结构注册表读取）
+                has_new_structure = schema_registry.has_column('qa_messages', 'user_message')
                 
                 if has_new_structure:
                     # 检查是否有image_from_users_url字段
-                    cursor.execute("""
-                        SELECT COLUMN_NAME 
-                        FROM INFORMATION_SCHEMA.COLUMNS 
-                        WHERE TABLE_SCHEMA = DATABASE() 
-                        AND TABLE_NAME = 'qa_messages' 
-                        AND COLUMN_NAME = 'image_from_users_url'
-                    """)
-                    has_image_from_users_field = cursor.fetchone() is not None
+                    has_image_from_users_field = schema_registry.has_column('qa_messages', 'image_from_users_url')
                     
                     # 检查是否有retrieval_id字段
-                    cursor.execute("""
-                        SELECT COLUMN_NAME 
-                        FROM INFORMATION_SCHEMA.COLUMNS 
-                        WHERE TABLE_SCHEMA = DATABASE() 
-                        AND TABLE_NAME = 'qa_messages' 
-                        AND COLUMN_NAME = 'retrieval_id'
-                    """)
-                    has_retrieval_id_field = cursor.fetchone() is not None
+                    has_retrieval_id_field = schema_registry.has_column('qa_messages', 'retrieval_id')
                     
                     # 使用新表结构
                     fields = ['id', 'user_id', 'session_id', 'create_time', 'user_message', 'ai_message', 
@@ -4042,18 +4463,8 @@ def save_message(session_id):
                     else:
                         model = 'text'
                 
-                # 检查表是否有新字段
-                try:
-                    cursor.execute("""
-                        SELECT COLUMN_NAME 
-                        FROM INFORMATION_SCHEMA.COLUMNS 
-                        WHERE TABLE_SCHEMA = DATABASE() 
-                        AND TABLE_NAME = 'qa_messages' 
-                        AND COLUMN_NAME = 'user_message'
-                    """)
-                    has_new_structure = cursor.fetchone() is not None
-                except:
-                    has_new_structure = False
+                # 检查表是否有新字段（从表结构注册表读取）
+                has_new_structure = schema_registry.has_column('qa_messages', 'user_message')
                 
                 if has_new_structure:
                     # 使用新表结构保存消息
@@ -4771,6 +5182,10 @@ def approve_annotation(task_id):
         # 2. 执行数据迁移
         result = uploader.approve_and_migrate_annotation(task_id, user_id)
         
+        # 迁移会写入实体和图片表，使检索缓存失效
+        if isinstance(result, dict) and result.get('success'):
+            notify_search_tables_changed()
+        
         return jsonify(result)
         
     except Exception as e:
@@ -6247,6 +6662,7 @@ if __name__ == '__main__':
                     # 更新用户角色
                     cursor.execute("UPDATE users SET role = %s WHERE id = %s", (new_role, target_user_id))
                     conn.commit()
+                    invalidate_user_cache(target_user_id)
                     
                     return jsonify({'success': True, 'message': '角色切换成功'})
             finally:
@@ -6351,6 +6767,9 @@ if __name__ == '__main__':
             # 这里应该保存到数据库，但由于是模拟数据，暂时只返回成功
             # 实际实现时，应该更新对应的资源表
             
+            # 编辑会修改已有实体和图片记录，使检索缓存失效并全量重建索引
+            notify_search_tables_changed(rebuild=True)
+            
             return jsonify({
                 'success': True,
                 'message': '保存成功'
@@ -6399,6 +6818,8 @@ if __name__ == '__main__':
         test_conn = get_user_db_connection()
         if test_conn:
             print("[启动检查] [OK] 数据库连接成功")
+            # 一次性加载表结构，请求路径上不再查询INFORMATION_SCHEMA
+            schema_registry.load(test_conn)
             test_conn.close()
         else:
             print("[启动检查] [WARN] 数据库连接失败，但服务器将继续启动")
@@ -20,6 +20,9 @@ sys.path.insert(0, project_root)
 sys.path.insert(0, scripts_dir)
 from db_connection import get_user_db_connection, get_user_db_config
 from festival_name_utils import chinese_to_english_festival, extract_and_convert_festival_name
+from search_cache import notify_search_tables_changed
+from schema_registry import schema_registry
+from image_tags import write_image_tags
 
 
 def extract_festival_names(text: str) -> List[str]:
@@ -138,6 +141,8 @@ def save_aigc_text_resource(
         ))
         
         conn.commit()
+        # 新增了AI资源和实体，使检索结果缓存失效
+        notify_search_tables_changed('AIGC_cultural_resources', 'AIGC_cultural_entities')
         return resource_id
         
     except Exception as e:
@@ -213,7 +218,11 @@ def save_aigc_image(
         """, (file_name, storage_path, dimensions, tags_json))
         
         image_id = cursor.lastrowid
+        # 标签同步写入 image_tags（同一事务），按标签查图片走索引
+        if tags and schema_registry.has_table('image_tags'):
+            write_image_tags(cursor, 'AIGC_graph', image_id, tags)
         conn.commit()
+        notify_search_tables_changed('AIGC_graph')
         return image_id
         
     except Exception as e:
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+批量相似度计算
+SearchOptimizer.calculate_similarity 每次调用都要对两段文本重新分词、构建集合，
+对候选文档逐个、对扩展查询逐个调用时开销为 O(文档数 × 扩展查询数 × 分词)。
+这里改为批量计算：
+- 文档只分词一次，词集合按 (文档ID, 文本哈希) 缓存，重复请求中的相同文档不再分词
+- 只保留查询词表中的列构建稀疏的文档-词矩阵（SciPy CSR），与查询矩阵相乘一次得到所有
+  (文档, 扩展查询) 的交集大小，向量化计算 Jaccard / 余弦相似度并对扩展查询取最大值
+- top_k 使用 argpartition，不对全部候选排序
+NumPy/SciPy 不可用时退化为基于缓存词集合的逐个计算（结果相同）
+"""
+import os
+import sys
+import math
+from typing import Hashable, List, Optional, Sequence
+
+# 添加项目根目录和scripts目录到路径
+current_dir = os.path.dirname(os.path.realpath(__file__))
+project_root = os.path.dirname(current_dir)
+scripts_dir = os.path.join(project_root, 'scripts')
+sys.path.insert(0, project_root)
+sys.path.insert(0, scripts_dir)
+
+from ttl_cache import TTLCache
+
+try:
+    import numpy as np
+    from scipy.sparse import csr_matrix
+    HAS_SCIPY = True
+except ImportError:
+    np = None
+    csr_matrix = None
+    HAS_SCIPY = False
+
+TOKEN_SET_CACHE_SIZE = int(os.getenv("TOKEN_SET_CACHE_SIZE", "20000"))
+TOKEN_SET_CACHE_TTL = float(os.getenv("TOKEN_SET_CACHE_TTL", "3600"))
+
+METRICS = ('jaccard', 'cosine')
+
+
+class BatchSimilarity:
+    """基于词集合重叠的批量相似度（与 SearchOptimizer.calculate_similarity 的 Jaccard 结果一致）"""
+
+    def __init__(self, optimizer, cache_size: int = TOKEN_SET_CACHE_SIZE, ttl: float = TOKEN_SET_CACHE_TTL):
+        """
+        Args:
+            optimizer: SearchOptimizer（提供分词和停用词过滤）
+            cache_size: 文档词集合缓存的条目数
+            ttl: 文档词集合缓存的过期时间（秒）
+        """
+        self.optimizer = optimizer
+        self._token_sets = TTLCache(maxsize=cache_size, ttl=ttl, name='doc_token_sets')
+
+    def tokenize(self, text: str) -> frozenset:
+        if not text:
+            return frozenset()
+        try:
+            tokens = self.optimizer.tokenize_and_filter(text)
+        except ImportError:
+            # jieba不可用时按空白切分
+            tokens = [t for t in text.split() if t not in self.optimizer.stopwords]
+        return frozenset(tokens)
+
+    def document_token_sets(self, texts: Sequence[str],
+                            ids: Optional[Sequence[Hashable]] = None) -> List[frozenset]:
+        """文档词集合（按 (文档ID, 文本哈希) 缓存；ID为None的文档只按文本哈希缓存）"""
+        token_sets = []
+        for i, text in enumerate(texts):
+            text = text or ''
+            key = (ids[i] if ids is not None else None, hash(text))
+            token_set = self._token_sets.get(key)
+            if token_set is None:
+                token_set = self.tokenize(text)
+                self._token_sets.set(key, token_set)
+            token_sets.append(token_set)
+        return token_sets
+
+    def max_similarity(self, queries: Sequence[str], texts: Sequence[str],
+                       ids: Optional[Sequence[Hashable]] = None, metric: str = 'jaccard') -> List[float]:
+        """
+        计算每个文档与一组查询（原查询及其同义词扩展）的最大相似度
+
+        Args:
+            queries: 查询列表
+            texts: 文档文本列表
+            ids: 文档ID列表（用于词集合缓存），与texts等长
+            metric: 'jaccard' 或 'cosine'
+
+        Returns:
+            list: 与texts等长的相似度（0~1）
+        """
+        if metric not in METRICS:
+            raise ValueError(f"不支持的相似度: {metric}")
+        if not texts:
+            return []
+        query_sets = [self.tokenize(q) for q in dict.fromkeys(q for q in queries if q)]
+        if not query_sets:
+            return [0.0] * len(texts)
+        doc_sets = self.document_token_sets(texts, ids)
+        if HAS_SCIPY:
+            scores = self._max_similarity_sparse(query_sets, doc_sets, metric)
+        else:
+            scores = [max(self._pair_similarity(q, d, metric) for q in query_sets) for d in doc_sets]
+        # 与 calculate_similarity 一致：文本为空时相似度为0（先于"两边词集合都为空时为1"的规则）
+        return [score if text else 0.0 for text, score in zip(texts, scores)]
+
+    @staticmethod
+    def _pair_similarity(query_set: frozenset, doc_set: frozenset, metric: str) -> float:
+        if not query_set and not doc_set:
+            return 1.0
+        if not query_set or not doc_set:
+            return 0.0
+        inter = len(query_set & doc_set)
+        if metric == 'cosine':
+            return inter / math.sqrt(len(query_set) * len(doc_set))
+        return inter / (len(query_set) + len(doc_set) - inter)
+
+    @staticmethod
+    def _max_similarity_sparse(query_sets: List[frozenset], doc_sets: List[frozenset], metric: str) -> List[float]:
+        # 只有查询中出现的词影响交集大小，矩阵只保留这些列；文档词集合大小单独记录
+        vocab = {}
+        for query_set in query_sets:
+            for token in query_set:
+                vocab.setdefault(token, len(vocab))
+
+        indptr, indices = [0], []
+        for doc_set in doc_sets:
+            indices.extend(vocab[t] for t in doc_set if t in vocab)
+            indptr.append(len(indices))
+        width = max(1, len(vocab))
+        docs = csr_matrix((np.ones(len(indices), dtype=np.float64), indices, indptr),
+                          shape=(len(doc_sets), width))
+
+        q_indptr, q_indices = [0], []
+        for query_set in query_sets:
+            q_indices.extend(vocab[t] for t in query_set)
+            q_indptr.append(len(q_indices))
+        queries = csr_matrix((np.ones(len(q_indices), dtype=np.float64), q_indices, q_indptr),
+                             shape=(len(query_sets), width))
+
+        inter = (docs @ queries.T).toarray()  # 文档数 × 查询数
+        doc_sizes = np.fromiter((len(d) for d in doc_sets), dtype=np.float64, count=len(doc_sets))[:, None]
+        query_sizes = np.fromiter((len(q) for q in query_sets), dtype=np.float64, count=len(query_sets))[None, :]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if metric == 'cosine':
+                sims = inter / np.sqrt(doc_sizes * query_sizes)
+            else:
+                sims = inter / (doc_sizes + query_sizes - inter)
+        sims = np.nan_to_num(sims, nan=0.0, posinf=0.0)
+        # 与逐个计算一致：两边都为空时相似度为1
+        sims[(doc_sizes == 0) & (query_sizes == 0)] = 1.0
+        return sims.max(axis=1).astype(float).tolist()
+
+    def stats(self):
+        stats = self._token_sets.stats()
+        stats['vectorized'] = HAS_SCIPY
+        return stats
+
+
+def top_k_indices(scores: Sequence[float], k: int) -> List[int]:
+    """得分最高的k个下标（降序，得分相同时下标小的在前）；候选很多时用 argpartition 避免全量排序"""
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return []
+    if HAS_SCIPY and n > k:
+        arr = np.asarray(scores, dtype=float)
+        idx = np.argpartition(-arr, k - 1)[:k]
+        return sorted(idx.tolist(), key=lambda i: (-arr[i], i))
+    return sorted(range(n), key=lambda i: (-scores[i], i))[:k]
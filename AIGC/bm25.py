@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+BM25F 排序引擎
+在 SearchOptimizer 的分词、停用词和同义词基础上实现多字段 BM25（BM25F）：
+- 文档只在入库时分词一次，预先计算各字段词频、字段长度、文档频率
+- 查询时用同义词表扩展查询词（同义词按较低权重参与打分），不需要重新分词文档
+- top_k 只遍历命中查询词的倒排表并用堆取前k，开销与命中数成正比，而不是与语料规模成正比
+"""
+import math
+import heapq
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+from search_optimizer import SearchOptimizer
+
+# 默认字段权重：标题命中比正文命中更重要
+DEFAULT_FIELD_WEIGHTS = {'title': 2.0, 'content': 1.0}
+# 同义词扩展出的查询词相对原查询词的权重
+SYNONYM_WEIGHT = 0.6
+
+
+class BM25FIndex:
+    """多字段BM25索引"""
+
+    def __init__(self, optimizer: Optional[SearchOptimizer] = None,
+                 field_weights: Optional[Dict[str, float]] = None,
+                 k1: float = 1.2, b: float = 0.75,
+                 field_b: Optional[Dict[str, float]] = None):
+        """
+        Args:
+            optimizer: 搜索优化器（提供分词、停用词和同义词），不提供则新建
+            field_weights: 字段权重，如 {'title': 2.0, 'content': 1.0}
+            k1: 词频饱和参数
+            b: 默认的长度归一化参数
+            field_b: 按字段覆盖的长度归一化参数
+        """
+        self.optimizer = optimizer or SearchOptimizer()
+        self.field_weights = dict(field_weights or DEFAULT_FIELD_WEIGHTS)
+        self.fields = list(self.field_weights.keys())
+        self.k1 = k1
+        self.field_b = {f: (field_b or {}).get(f, b) for f in self.fields}
+
+        self._postings: Dict[str, Dict[Hashable, Tuple[int, ...]]] = {}  # term -> {doc_id: 各字段词频}
+        self._doc_lengths: Dict[Hashable, Tuple[int, ...]] = {}  # doc_id -> 各字段长度
+        self._doc_terms: Dict[Hashable, Tuple[str, ...]] = {}  # doc_id -> 文档包含的词项（用于删除）
+        self._total_lengths = [0] * len(self.fields)
+
+    # ==================== 索引维护 ====================
+    def tokenize(self, text: str) -> List[str]:
+        """分词并过滤停用词（统一转为小写）"""
+        if not text:
+            return []
+        try:
+            tokens = self.optimizer.tokenize_and_filter(text.lower())
+        except Exception:
+            # jieba不可用时按空白切分
+            tokens = [t for t in text.lower().split() if t not in self.optimizer.stopwords]
+        return [t.strip() for t in tokens if t.strip()]
+
+    def add_document(self, doc_id: Hashable, fields: Dict[str, object], tokenized: bool = False):
+        """
+        添加（或替换）一个文档
+
+        Args:
+            doc_id: 文档唯一标识
+            fields: 字段名 -> 文本；tokenized=True 时为已分好的词列表
+            tokenized: 字段值是否已经分词
+        """
+        if doc_id in self._doc_lengths:
+            self.remove_document(doc_id)
+
+        counts_per_field = []
+        lengths = []
+        for field in self.fields:
+            value = fields.get(field) or ([] if tokenized else '')
+            tokens = list(value) if tokenized else self.tokenize(value)
+            counts: Dict[str, int] = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            counts_per_field.append(counts)
+            lengths.append(len(tokens))
+
+        terms = set()
+        for counts in counts_per_field:
+            terms.update(counts.keys())
+        for term in terms:
+            self._postings.setdefault(term, {})[doc_id] = tuple(c.get(term, 0) for c in counts_per_field)
+
+        self._doc_lengths[doc_id] = tuple(lengths)
+        self._doc_terms[doc_id] = tuple(terms)
+        for i, length in enumerate(lengths):
+            self._total_lengths[i] += length
+
+    def add_documents(self, documents: Iterable[Dict], id_field: str = 'id',
+                      field_map: Optional[Dict[str, str]] = None):
+        """
+        批量添加文档
+
+        Args:
+            documents: 文档字典列表
+            id_field: 文档ID所在的键
+            field_map: 索引字段 -> 文档中的键，如 {'title': 'title', 'content': 'content'}
+        """
+        field_map = field_map or {f: f for f in self.fields}
+        for doc in documents:
+            self.add_document(doc[id_field], {f: doc.get(key, '') for f, key in field_map.items()})
+
+    def remove_document(self, doc_id: Hashable):
+        """删除文档并更新统计信息"""
+        lengths = self._doc_lengths.pop(doc_id, None)
+        if lengths is None:
+            return
+        for term in self._doc_terms.pop(doc_id, ()):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        for i, length in enumerate(lengths):
+            self._total_lengths[i] -= length
+
+    def __len__(self):
+        return len(self._doc_lengths)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._doc_lengths
+
+    # ==================== 打分 ====================
+    def idf(self, term: str) -> float:
+        """BM25 IDF（带+1平滑，保证非负）"""
+        n = len(self._doc_lengths)
+        df = len(self._postings.get(term, ()))
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def expand_query(self, query: str) -> Dict[str, float]:
+        """
+        将查询转换为加权查询词：原查询词权重为1，同义词扩展出的词使用 SYNONYM_WEIGHT
+        只对查询分词，文档不需要重新处理
+        """
+        cleaned = self.optimizer.remove_stopwords(query) or query
+        terms: Dict[str, float] = {}
+        for token in self.tokenize(cleaned):
+            terms[token] = 1.0
+
+        synonyms_dict = self.optimizer.synonyms_dict
+        for token in list(terms.keys()):
+            for synonym in synonyms_dict.get(token, ()):
+                for syn_token in self.tokenize(synonym):
+                    if syn_token not in terms:
+                        terms[syn_token] = SYNONYM_WEIGHT
+        return terms
+
+    def _avg_lengths(self) -> List[float]:
+        n = len(self._doc_lengths) or 1
+        return [total / n or 1.0 for total in self._total_lengths]
+
+    def score_terms(self, query_terms: Dict[str, float],
+                    candidates: Optional[Iterable[Hashable]] = None) -> Dict[Hashable, float]:
+        """
+        计算文档的BM25F得分
+
+        Args:
+            query_terms: 加权查询词（expand_query 的返回值）
+            candidates: 只为这些文档打分；为None时对所有命中查询词的文档打分
+
+        Returns:
+            doc_id -> 得分（只包含得分大于0的文档）
+        """
+        avg_lengths = self._avg_lengths()
+        weights = [self.field_weights[f] for f in self.fields]
+        bs = [self.field_b[f] for f in self.fields]
+        candidate_set = set(candidates) if candidates is not None else None
+        scores: Dict[Hashable, float] = {}
+
+        for term, q_weight in query_terms.items():
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf(term)
+            if candidate_set is not None and len(candidate_set) < len(postings):
+                items = ((d, postings[d]) for d in candidate_set if d in postings)
+            else:
+                items = postings.items()
+            for doc_id, tfs in items:
+                if candidate_set is not None and doc_id not in candidate_set:
+                    continue
+                lengths = self._doc_lengths[doc_id]
+                # BM25F：各字段按长度归一化后的词频加权求和，再统一做饱和
+                pseudo_tf = 0.0
+                for i, tf in enumerate(tfs):
+                    if tf:
+                        norm = 1 - bs[i] + bs[i] * lengths[i] / avg_lengths[i]
+                        pseudo_tf += weights[i] * tf / norm
+                if pseudo_tf:
+                    scores[doc_id] = scores.get(doc_id, 0.0) + \
+                        q_weight * idf * pseudo_tf / (self.k1 + pseudo_tf)
+        return scores
+
+    def score(self, query: str, candidates: Optional[Iterable[Hashable]] = None) -> Dict[Hashable, float]:
+        """对查询文本打分（自动进行同义词扩展）"""
+        return self.score_terms(self.expand_query(query), candidates)
+
+    def top_k(self, query: str, k: int = 10,
+              candidates: Optional[Iterable[Hashable]] = None) -> List[Tuple[Hashable, float]]:
+        """
+        返回得分最高的前k个文档
+
+        Returns:
+            [(doc_id, score), ...]，按得分降序
+        """
+        scores = self.score(query, candidates)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def stats(self) -> Dict:
+        return {
+            'documents': len(self._doc_lengths),
+            'terms': len(self._postings),
+            'avg_field_lengths': dict(zip(self.fields, (round(x, 2) for x in self._avg_lengths()))),
+            'field_weights': self.field_weights,
+        }
@@ -0,0 +1,503 @@
+# -*- coding: utf-8 -*-
+"""
+节日资源索引
+资源详情页原来按节日名称对 cultural_entities 做 LIKE 查询、对 crawled_images 按标签或节日名称匹配，
+同一个节日的不同叫法（端阳节 / 端午节）还会得到不同的结果。
+这里预先计算 规范节日名称 -> 实体ID、资源ID、图片ID 的映射：
+- 规范键为 chinese_to_english_festival 的英文名，别名归到同一个键
+- 实体按实体名称归类；资源按标题和 content_feature_data 中的第一个节日名称归类；
+  图片按 festival_name、标签以及关联的实体和资源归类
+- 内存中保存完整映射，同时写入 festival_resource_index 表：服务重启后先从表中加载，不等全量构建即可使用
+- 后台线程按 id / updated_at 水位增量刷新（新资源入库后一个刷新周期内可查到），定期全量重建以反映删除和改名
+节日详情页只需一次键查找，再按主键取回实体和图片
+"""
+import os
+import sys
+import time
+import threading
+from functools import lru_cache
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+# 添加项目根目录和scripts目录到路径
+current_dir = os.path.dirname(os.path.realpath(__file__))
+project_root = os.path.dirname(current_dir)
+scripts_dir = os.path.join(project_root, 'scripts')
+sys.path.insert(0, project_root)
+sys.path.insert(0, scripts_dir)
+
+from pymysql.cursors import SSDictCursor
+from db_connection import get_default_db_connection
+from schema_registry import schema_registry
+from festival_name_utils import FESTIVAL_NAME_MAP, chinese_to_english_festival
+from image_tags import normalize_tags
+
+FESTIVAL_INDEX_REFRESH_INTERVAL = float(os.getenv("FESTIVAL_INDEX_REFRESH_INTERVAL", "60"))
+FESTIVAL_INDEX_REBUILD_INTERVAL = float(os.getenv("FESTIVAL_INDEX_REBUILD_INTERVAL", "3600"))
+# 写入 festival_resource_index 时每批的行数
+FESTIVAL_INDEX_WRITE_BATCH = 1000
+
+FESTIVAL_INDEX_TABLE = 'festival_resource_index'
+ENTITY_TABLE = 'cultural_entities'
+RESOURCE_TABLE = 'cultural_resources'
+IMAGE_TABLE = 'crawled_images'
+# 读取顺序：图片会继承关联实体和资源的节日，必须最后读取
+SOURCE_TABLES = (ENTITY_TABLE, RESOURCE_TABLE, IMAGE_TABLE)
+
+# 规范键 -> 展示用的中文名称（FESTIVAL_NAME_MAP 中每个英文名对应的第一个中文名称）
+DISPLAY_NAMES: Dict[str, str] = {}
+for _chinese, _english in FESTIVAL_NAME_MAP.items():
+    DISPLAY_NAMES.setdefault(_english, _chinese)
+_ENGLISH_NAMES = {english.lower(): english for english in DISPLAY_NAMES}
+# 泛称不作为节日（否则所有含"节日"的名称都会归到同一个键）
+_GENERIC_KEYS = {"Traditional Festival", "Festival"}
+
+
+@lru_cache(maxsize=65536)
+def festival_key(name) -> Optional[str]:
+    """
+    节日名称的规范键：chinese_to_english_festival 归一后的英文名（端阳节、端午节 -> Dragon Boat Festival），
+    也接受英文名称（不区分大小写）；不是节日名称或只是泛称时返回None
+    """
+    if not isinstance(name, str):
+        return None
+    name = name.strip()
+    if not name:
+        return None
+    english = _ENGLISH_NAMES.get(name.lower())
+    if english is None:
+        english = chinese_to_english_festival(name)
+        # 找不到映射时返回的是原名称或 "Traditional Festival"
+        if english not in DISPLAY_NAMES:
+            return None
+    return None if english in _GENERIC_KEYS else english
+
+
+class _FestivalData:
+    """一份完整的节日资源映射，全量重建时整体替换"""
+
+    def __init__(self):
+        self.entities: Dict[str, Dict[int, str]] = {}  # 规范键 -> {实体ID: 实体名称}
+        self.resources: Dict[str, Set[int]] = {}  # 规范键 -> {资源ID}
+        self.images: Dict[str, Dict[int, Optional[int]]] = {}  # 规范键 -> {图片ID: 关联实体ID}
+        self.entity_keys: Dict[int, str] = {}  # 实体ID -> 规范键（图片按关联实体归类）
+        self.resource_keys: Dict[int, Tuple[str, ...]] = {}  # 资源ID -> 规范键（资源会更新，刷新时先移除旧键）
+        self.watermarks: Dict[str, Dict] = {}
+
+    def add(self, key: str, source_table: str, source_id: int, name: Optional[str] = None,
+            entity_id: Optional[int] = None):
+        if source_table == ENTITY_TABLE:
+            self.entities.setdefault(key, {})[source_id] = name or ''
+            self.entity_keys[source_id] = key
+        elif source_table == RESOURCE_TABLE:
+            self.resources.setdefault(key, set()).add(source_id)
+            keys = self.resource_keys.get(source_id, ())
+            if key not in keys:
+                self.resource_keys[source_id] = keys + (key,)
+        elif source_table == IMAGE_TABLE:
+            self.images.setdefault(key, {})[source_id] = entity_id
+
+    def remove_resource(self, resource_id: int):
+        for key in self.resource_keys.pop(resource_id, ()):
+            bucket = self.resources.get(key)
+            if bucket is not None:
+                bucket.discard(resource_id)
+
+    def keys(self) -> Set[str]:
+        return set(self.entities) | set(self.resources) | set(self.images)
+
+    def rows(self, source_table: str) -> Iterator[Tuple]:
+        """某个来源表在 festival_resource_index 中应有的行 (festival_key, source_id, name, entity_id)"""
+        if source_table == ENTITY_TABLE:
+            for key, bucket in self.entities.items():
+                for entity_id, name in bucket.items():
+                    yield key, entity_id, name[:255] or None, None
+        elif source_table == RESOURCE_TABLE:
+            for key, bucket in self.resources.items():
+                for resource_id in bucket:
+                    yield key, resource_id, None, None
+        elif source_table == IMAGE_TABLE:
+            for key, bucket in self.images.items():
+                for image_id, entity_id in bucket.items():
+                    yield key, image_id, None, entity_id
+
+
+class FestivalResourceIndex:
+    """规范节日名称 -> 实体、资源、图片的索引"""
+
+    def __init__(self):
+        self._data = _FestivalData()
+        self._lock = threading.RLock()
+        self.ready = False
+        self.running = False
+        self.loaded_rows = 0
+        self.last_build_time: Optional[float] = None
+        self.last_refresh_time: Optional[float] = None
+        self.build_seconds: Optional[float] = None
+        self.lookups = 0
+        self._wakeup = threading.Event()
+        self._rebuild_requested = False
+        self._change_listeners: List[Callable[[], None]] = []
+
+    # ==================== 读取来源表 ====================
+    @staticmethod
+    def _iter_source(conn, source_table: str, mark: Optional[Dict]) -> Iterator[Dict]:
+        """读取来源表中与节日归类有关的列；mark不为空时只读取水位之后新增或更新的记录"""
+        has_updated_at = schema_registry.has_column(source_table, 'updated_at')
+        if source_table == ENTITY_TABLE:
+            fields = "id, entity_name"
+        elif source_table == RESOURCE_TABLE:
+            fields = "id, title" + (", cf_festival" if schema_registry.has_column(RESOURCE_TABLE, 'cf_festival') else "")
+        else:
+            fields = "id, festival_name, tags, entity_id, resource_id"
+        if has_updated_at:
+            fields += ", updated_at"
+        sql = f"SELECT {fields} FROM {source_table}"
+        params: Tuple = ()
+        if mark:
+            if has_updated_at and mark.get('updated_at') is not None:
+                sql += " WHERE id > %s OR updated_at >= %s"
+                params = (mark['id'], mark['updated_at'])
+            else:
+                sql += " WHERE id > %s"
+                params = (mark['id'],)
+        # 水位取 (updated_at, 已读ID)：updated_at 只精确到秒，用 >= 读出与水位同一秒的记录，已读过的跳过
+        seen = mark.get('ids') if mark and mark.get('updated_at') is not None else None
+        with conn.cursor(SSDictCursor) as cursor:
+            cursor.execute(sql, params)
+            for row in cursor:
+                if seen and int(row['id']) in seen and row.get('updated_at') == mark['updated_at']:
+                    continue
+                yield row
+
+    @staticmethod
+    def _row_keys(data: _FestivalData, source_table: str, row: Dict) -> List[str]:
+        """一条来源记录归属的规范键"""
+        if source_table == ENTITY_TABLE:
+            names = [row.get('entity_name')]
+        elif source_table == RESOURCE_TABLE:
+            names = [row.get('title'), row.get('cf_festival')]
+        else:
+            names = [row.get('festival_name')] + normalize_tags(row.get('tags'))
+        keys = [festival_key(name) for name in names]
+        if source_table == IMAGE_TABLE:
+            if row.get('entity_id') is not None:
+                keys.append(data.entity_keys.get(int(row['entity_id'])))
+            if row.get('resource_id') is not None:
+                keys.extend(data.resource_keys.get(int(row['resource_id']), ()))
+        return [key for key in dict.fromkeys(keys) if key]
+
+    @classmethod
+    def _load_rows(cls, data: _FestivalData, source_table: str, rows) -> Dict[int, List[Tuple]]:
+        """把来源记录归入索引，返回 来源ID -> 写入表中的行"""
+        changed: Dict[int, List[Tuple]] = {}
+        mark = data.watermarks.setdefault(source_table, {'id': 0, 'updated_at': None})
+        for row in rows:
+            source_id = int(row['id'])
+            if source_table == RESOURCE_TABLE:
+                data.remove_resource(source_id)
+            name = (row.get('entity_name') or '').strip() if source_table == ENTITY_TABLE else None
+            entity_id = int(row['entity_id']) if source_table == IMAGE_TABLE and row.get('entity_id') else None
+            changed[source_id] = []
+            for key in cls._row_keys(data, source_table, row):
+                data.add(key, source_table, source_id, name, entity_id)
+                changed[source_id].append((key, source_table, source_id, name[:255] if name else None, entity_id))
+            mark['id'] = max(mark['id'], source_id)
+            updated_at = row.get('updated_at')
+            if updated_at is not None:
+                if mark['updated_at'] is None or updated_at > mark['updated_at']:
+                    mark['updated_at'] = updated_at
+                    mark['ids'] = {source_id}
+                elif updated_at == mark['updated_at']:
+                    mark.setdefault('ids', set()).add(source_id)
+        return changed
+
+    # ==================== festival_resource_index 表 ====================
+    @staticmethod
+    def _write_changes(conn, source_table: str, changed: Dict[int, List[Tuple]]):
+        """覆盖写入增量刷新涉及的来源记录"""
+        source_ids = list(changed)
+        with conn.cursor() as cursor:
+            for i in range(0, len(source_ids), FESTIVAL_INDEX_WRITE_BATCH):
+                batch = source_ids[i:i + FESTIVAL_INDEX_WRITE_BATCH]
+                placeholders = ', '.join(['%s'] * len(batch))
+                cursor.execute(f"DELETE FROM {FESTIVAL_INDEX_TABLE} WHERE source_table = %s "
+                               f"AND source_id IN ({placeholders})", [source_table] + batch)
+                rows = [r for source_id in batch for r in changed[source_id]]
+                if rows:
+                    cursor.executemany(f"""
+                        INSERT INTO {FESTIVAL_INDEX_TABLE} (festival_key, source_table, source_id, name, entity_id)
+                        VALUES (%s, %s, %s, %s, %s)
+                    """, rows)
+                conn.commit()
+
+    @staticmethod
+    def _persist(conn, data: _FestivalData) -> Tuple[int, int]:
+        """全量构建后按差异同步 festival_resource_index（只写入变化的行），返回 (写入行数, 删除行数)"""
+        written = removed = 0
+        for source_table in SOURCE_TABLES:
+            existing: Dict[Tuple[str, int], Tuple] = {}
+            with conn.cursor(SSDictCursor) as cursor:
+                cursor.execute(f"SELECT festival_key, source_id, name, entity_id FROM {FESTIVAL_INDEX_TABLE} "
+                               f"WHERE source_table = %s", (source_table,))
+                for row in cursor:
+                    existing[(row['festival_key'], int(row['source_id']))] = (row.get('name'), row.get('entity_id'))
+            upserts = []
+            for key, source_id, name, entity_id in data.rows(source_table):
+                if existing.pop((key, source_id), 0) != (name, entity_id):
+                    upserts.append((key, source_table, source_id, name, entity_id))
+            stale = [(key, source_table, source_id) for key, source_id in existing]
+            with conn.cursor() as cursor:
+                for i in range(0, len(stale), FESTIVAL_INDEX_WRITE_BATCH):
+                    cursor.executemany(f"DELETE FROM {FESTIVAL_INDEX_TABLE} WHERE festival_key = %s "
+                                       f"AND source_table = %s AND source_id = %s",
+                                       stale[i:i + FESTIVAL_INDEX_WRITE_BATCH])
+                    conn.commit()
+                for i in range(0, len(upserts), FESTIVAL_INDEX_WRITE_BATCH):
+                    cursor.executemany(f"""
+                        INSERT INTO {FESTIVAL_INDEX_TABLE} (festival_key, source_table, source_id, name, entity_id)
+                        VALUES (%s, %s, %s, %s, %s)
+                        ON DUPLICATE KEY UPDATE name = VALUES(name), entity_id = VALUES(entity_id)
+                    """, upserts[i:i + FESTIVAL_INDEX_WRITE_BATCH])
+                    conn.commit()
+            written += len(upserts)
+            removed += len(stale)
+        return written, removed
+
+    def load(self) -> bool:
+        """从 festival_resource_index 表加载上次构建的结果（表为空或不存在时返回False）"""
+        if not schema_registry.has_table(FESTIVAL_INDEX_TABLE):
+            return False
+        conn = get_default_db_connection()
+        if not conn:
+            return False
+        try:
+            data = _FestivalData()
+            count = 0
+            with conn.cursor(SSDictCursor) as cursor:
+                cursor.execute(f"SELECT festival_key, source_table, source_id, name, entity_id "
+                               f"FROM {FESTIVAL_INDEX_TABLE}")
+                for row in cursor:
+                    if row['source_table'] not in SOURCE_TABLES:
+                        continue
+                    entity_id = row.get('entity_id')
+                    data.add(row['festival_key'], row['source_table'], int(row['source_id']), row.get('name'),
+                             int(entity_id) if entity_id is not None else None)
+                    count += 1
+            if not count:
+                return False
+            with self._lock:
+                # 加载期间后台构建已完成时不覆盖
+                if self.ready:
+                    return False
+                self._data = data
+                self.ready = True
+            self.loaded_rows = count
+            print(f"[FestivalIndex] 已从 {FESTIVAL_INDEX_TABLE} 加载 {count} 行，{len(data.keys())} 个节日")
+            self._notify_changed()
+            return True
+        except Exception as e:
+            print(f"[FestivalIndex] 加载 {FESTIVAL_INDEX_TABLE} 失败: {e}")
+            return False
+        finally:
+            conn.close()
+
+    # ==================== 构建和刷新 ====================
+    def build(self) -> bool:
+        """全量构建索引，构建完成后原子替换旧索引并同步到 festival_resource_index 表"""
+        conn = get_default_db_connection()
+        if not conn:
+            print("[FestivalIndex] 数据库连接失败，无法构建索引")
+            return False
+        start = time.time()
+        try:
+            data = _FestivalData()
+            for source_table in SOURCE_TABLES:
+                self._load_rows(data, source_table, self._iter_source(conn, source_table, None))
+            with self._lock:
+                self._data = data
+                self.ready = True
+            self.last_build_time = time.time()
+            self.last_refresh_time = self.last_build_time
+            self.build_seconds = round(self.last_build_time - start, 3)
+            print(f"[FestivalIndex] 索引构建完成: {len(data.keys())} 个节日，耗时 {self.build_seconds} 秒")
+            self._notify_changed()
+            if schema_registry.has_table(FESTIVAL_INDEX_TABLE):
+                try:
+                    written, removed = self._persist(conn, data)
+                    print(f"[FestivalIndex] {FESTIVAL_INDEX_TABLE} 已同步：写入 {written} 行，删除 {removed} 行")
+                except Exception as e:
+                    conn.rollback()
+                    print(f"[FestivalIndex] 同步 {FESTIVAL_INDEX_TABLE} 失败（不影响内存索引）: {e}")
+            return True
+        except Exception as e:
+            print(f"[FestivalIndex] 索引构建失败: {e}")
+            return False
+        finally:
+            conn.close()
+
+    def refresh(self) -> int:
+        """按水位增量刷新新入库的实体、资源和图片，返回变化的来源记录数"""
+        if not self.last_build_time:
+            self.build()
+            return 0
+        conn = get_default_db_connection()
+        if not conn:
+            return 0
+        try:
+            total = 0
+            persist = schema_registry.has_table(FESTIVAL_INDEX_TABLE)
+            for source_table in SOURCE_TABLES:
+                mark = dict(self._data.watermarks.get(source_table) or {'id': 0, 'updated_at': None})
+                # 锁外读出增量记录，持锁写入
+                rows = list(self._iter_source(conn, source_table, mark))
+                if not rows:
+                    continue
+                with self._lock:
+                    changed = self._load_rows(self._data, source_table, rows)
+                total += len(changed)
+                if persist:
+                    try:
+                        self._write_changes(conn, source_table, changed)
+                    except Exception as e:
+                        conn.rollback()
+                        print(f"[FestivalIndex] 写入 {FESTIVAL_INDEX_TABLE} 失败（下次全量构建时同步）: {e}")
+            self.last_refresh_time = time.time()
+            if total:
+                self._notify_changed()
+            return total
+        except Exception as e:
+            print(f"[FestivalIndex] 增量刷新失败: {e}")
+            return 0
+        finally:
+            conn.close()
+
+    def start(self):
+        """在后台线程中加载、构建索引并定期刷新"""
+        if self.running:
+            return
+        self.running = True
+        thread = threading.Thread(target=self._refresh_loop, daemon=True)
+        thread.start()
+
+    def stop(self):
+        self.running = False
+        self._wakeup.set()
+
+    def request_refresh(self, rebuild: bool = False):
+        """
+        请求后台线程立即刷新（本进程写入实体、资源或图片表后调用）
+
+        Args:
+            rebuild: 是否全量重建（修改或删除已有实体、图片时需要）
+        """
+        if rebuild:
+            self._rebuild_requested = True
+        self._wakeup.set()
+
+    def add_change_listener(self, callback: Callable[[], None]):
+        """注册索引内容变化（加载、构建完成或增量刷新到新数据）时的回调"""
+        self._change_listeners.append(callback)
+
+    def _notify_changed(self):
+        for callback in self._change_listeners:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[FestivalIndex] 索引变化回调出错: {e}")
+
+    def _refresh_loop(self):
+        # 先加载上次持久化的结果，使服务启动后立即可用，再全量构建一次以反映停机期间的变化
+        self.load()
+        self.build()
+        while self.running:
+            self._wakeup.wait(FESTIVAL_INDEX_REFRESH_INTERVAL)
+            self._wakeup.clear()
+            if not self.running:
+                break
+            try:
+                rebuild, self._rebuild_requested = self._rebuild_requested, False
+                if rebuild or not self.last_build_time or \
+                        time.time() - self.last_build_time >= FESTIVAL_INDEX_REBUILD_INTERVAL:
+                    self.build()
+                else:
+                    self.refresh()
+            except Exception as e:
+                print(f"[FestivalIndex] 后台刷新出错: {e}")
+
+    # ==================== 查询 ====================
+    def lookup(self, name: str) -> Optional[Dict]:
+        """
+        按节日名称（中文名、别名或英文名）查询
+
+        Args:
+            name: 节日名称
+
+        Returns:
+            dict: {'key', 'display_name', 'entities', 'resource_ids', 'images'}
+                  entities 为 [{'id', 'entity_name'}]，与查询名称相同的排在最前，其次是节日名称本身，再按ID升序；
+                  images 为 {图片ID: 关联实体ID}
+            None: 索引未就绪或不是节日名称（调用方回退到数据库查询）
+        """
+        if not self.ready:
+            return None
+        key = festival_key(name)
+        if not key:
+            return None
+        name = name.strip()
+        with self._lock:
+            self.lookups += 1
+            data = self._data
+            entities = sorted(data.entities.get(key, {}).items(),
+                              key=lambda item: (item[1] != name, item[1] not in FESTIVAL_NAME_MAP, item[0]))
+            return {
+                'key': key,
+                'display_name': DISPLAY_NAMES.get(key, name),
+                'entities': [{'id': entity_id, 'entity_name': entity_name} for entity_id, entity_name in entities],
+                'resource_ids': sorted(data.resources.get(key, ())),
+                'images': dict(data.images.get(key, {})),
+            }
+
+    def festival_of(self, entity_id: Optional[int] = None, resource_id: Optional[int] = None) -> Optional[str]:
+        """实体或资源所属节日的中文名称（首页为没有 festival_name 的图片补全），不属于任何节日时返回None"""
+        if not self.ready:
+            return None
+        with self._lock:
+            data = self._data
+            key = data.entity_keys.get(entity_id) if entity_id is not None else None
+            if key is None and resource_id is not None:
+                key = next(iter(data.resource_keys.get(resource_id, ())), None)
+        return DISPLAY_NAMES.get(key) if key else None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            data = self._data
+            return {
+                'ready': self.ready,
+                'festivals': len(data.keys()),
+                'entities': sum(len(b) for b in data.entities.values()),
+                'resources': sum(len(b) for b in data.resources.values()),
+                'images': sum(len(b) for b in data.images.values()),
+                'persisted': schema_registry.has_table(FESTIVAL_INDEX_TABLE),
+                'loaded_rows': self.loaded_rows,
+                'lookups': self.lookups,
+                'watermarks': {t: {k: (str(v) if k == 'updated_at' and v else v) for k, v in m.items()}
+                               for t, m in data.watermarks.items()},
+                'build_seconds': self.build_seconds,
+                'last_build_time': self.last_build_time,
+                'last_refresh_time': self.last_refresh_time,
+            }
+
+
+# 全局索引实例
+_festival_resource_index = None
+_festival_resource_index_lock = threading.Lock()
+
+
+def get_festival_resource_index() -> FestivalResourceIndex:
+    """获取节日资源索引实例（单例）"""
+    global _festival_resource_index
+    if _festival_resource_index is None:
+        with _festival_resource_index_lock:
+            if _festival_resource_index is None:
+                _festival_resource_index = FestivalResourceIndex()
+    return _festival_resource_index
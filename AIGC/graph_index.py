@@ -0,0 +1,457 @@
+# -*- coding: utf-8 -*-
+"""
+实体关系图索引
+entity_relationships 原来只能通过与 cultural_entities 的三表JOIN、对两端实体名称做LIKE查询，且只有一跳。
+这里把 cultural_entities 和 entity_relationships 加载为内存中的邻接表（CSR，紧凑整数数组）：
+- 实体ID为有序的 array('q')，二分查找得到节点下标
+- 每个节点的邻边连续存放在 targets / rel_types / rel_ids / directions / strengths 中，offsets 为起始位置
+- 增量刷新新增的边先放入 delta 邻接表，全量重建时合并进 CSR；删除和修改由定期全量重建反映
+RAGBase 用它把检索到的实体扩展到1~2跳邻居，资源详情页用它一次取回相关实体，都不再访问数据库。
+"""
+import os
+import sys
+import time
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# 添加项目根目录和scripts目录到路径
+current_dir = os.path.dirname(os.path.realpath(__file__))
+project_root = os.path.dirname(current_dir)
+scripts_dir = os.path.join(project_root, 'scripts')
+sys.path.insert(0, project_root)
+sys.path.insert(0, scripts_dir)
+
+from pymysql.cursors import SSDictCursor
+from db_connection import get_default_db_connection
+from schema_registry import schema_registry
+
+GRAPH_INDEX_REFRESH_INTERVAL = float(os.getenv("GRAPH_INDEX_REFRESH_INTERVAL", "60"))
+GRAPH_INDEX_REBUILD_INTERVAL = float(os.getenv("GRAPH_INDEX_REBUILD_INTERVAL", "3600"))
+# 扩展时每个节点最多沿强度最高的若干条边展开（避免"春节"这类枢纽节点把结果全部占满）
+GRAPH_MAX_FANOUT = int(os.getenv("GRAPH_MAX_FANOUT", "20"))
+# delta 中的边超过该数量时请求后台线程全量重建（合并进CSR）
+GRAPH_DELTA_COMPACT = int(os.getenv("GRAPH_DELTA_COMPACT", "10000"))
+GRAPH_MAX_HOPS = 2
+
+ENTITY_TABLE = 'cultural_entities'
+RELATIONSHIP_TABLE = 'entity_relationships'
+
+# 边的方向：关系从当前节点指向邻居 / 从邻居指向当前节点
+OUTGOING = 1
+INCOMING = -1
+
+
+class _GraphData:
+    """一份完整的图数据，全量重建时整体替换"""
+
+    def __init__(self):
+        self.node_ids = array('q')  # 节点下标 -> 实体ID（升序）
+        self.names: List[str] = []
+        self.types = array('H')  # 节点下标 -> 实体类型下标（实体类型可能超过256种）
+        self.type_names: List[str] = []
+        self.type_index: Dict[str, int] = {}
+        # CSR 邻接表（只覆盖构建时已有的节点，之后新增的节点只有 delta 中的边）
+        self.offsets = array('l', [0])
+        self.targets = array('l')
+        self.rel_types = array('H')
+        self.rel_ids = array('q')
+        self.directions = array('b')
+        self.strengths = array('f')
+        self.relation_names: List[str] = []
+        self.relation_index: Dict[str, int] = {}
+        # 增量刷新新增的边：节点下标 -> [(邻居下标, 关系类型下标, 关系ID, 方向, 强度)]
+        self.delta: Dict[int, List[Tuple[int, int, int, int, float]]] = {}
+        self.delta_edges = 0
+        self.edge_count = 0
+        self.watermarks: Dict[str, Dict] = {}
+
+    def node_of(self, entity_id: int) -> Optional[int]:
+        i = bisect_left(self.node_ids, entity_id)
+        if i < len(self.node_ids) and self.node_ids[i] == entity_id:
+            return i
+        return None
+
+    def intern_type(self, entity_type: Optional[str]) -> int:
+        entity_type = entity_type or ''
+        index = self.type_index.get(entity_type)
+        if index is None:
+            index = self.type_index[entity_type] = len(self.type_names)
+            self.type_names.append(entity_type)
+        return index
+
+    def intern_relation(self, relation: Optional[str]) -> int:
+        relation = relation or ''
+        index = self.relation_index.get(relation)
+        if index is None:
+            index = self.relation_index[relation] = len(self.relation_names)
+            self.relation_names.append(relation)
+        return index
+
+    def edges(self, node: int) -> Iterator[Tuple[int, int, int, int, float]]:
+        """节点的所有邻边 (邻居下标, 关系类型下标, 关系ID, 方向, 强度)"""
+        if node + 1 < len(self.offsets):
+            for k in range(self.offsets[node], self.offsets[node + 1]):
+                yield self.targets[k], self.rel_types[k], self.rel_ids[k], self.directions[k], self.strengths[k]
+        yield from self.delta.get(node, ())
+
+    def degree(self, node: int) -> int:
+        csr = self.offsets[node + 1] - self.offsets[node] if node + 1 < len(self.offsets) else 0
+        return csr + len(self.delta.get(node, ()))
+
+
+class EntityGraphIndex:
+    """cultural_entities + entity_relationships 的内存邻接表"""
+
+    def __init__(self):
+        self._data = _GraphData()
+        self._lock = threading.RLock()
+        self.ready = False
+        self.running = False
+        self.last_build_time: Optional[float] = None
+        self.last_refresh_time: Optional[float] = None
+        self.build_seconds: Optional[float] = None
+        self._wakeup = threading.Event()
+        self._rebuild_requested = False
+        self._change_listeners: List[Callable[[], None]] = []
+
+    # ==================== 构建和刷新 ====================
+    @staticmethod
+    def _iter_entities(conn, mark: Optional[Dict]) -> Iterator[Dict]:
+        """按ID升序读取实体；mark不为空时只读取水位之后新增或更新的记录"""
+        has_updated_at = schema_registry.has_column(ENTITY_TABLE, 'updated_at')
+        fields = "id, entity_name, entity_type" + (", updated_at" if has_updated_at else "")
+        sql = f"SELECT {fields} FROM {ENTITY_TABLE}"
+        params: Tuple = ()
+        if mark:
+            if has_updated_at and mark.get('updated_at') is not None:
+                sql += " WHERE id > %s OR updated_at >= %s"
+                params = (mark['id'], mark['updated_at'])
+            else:
+                sql += " WHERE id > %s"
+                params = (mark['id'],)
+        sql += " ORDER BY id"
+        # 水位取 (updated_at, 已读ID)：updated_at 只精确到秒，用 >= 读出与水位同一秒的记录，已读过的跳过
+        seen = mark.get('ids') if mark and mark.get('updated_at') is not None else None
+        with conn.cursor(SSDictCursor) as cursor:
+            cursor.execute(sql, params)
+            for row in cursor:
+                if seen and int(row['id']) in seen and row.get('updated_at') == mark['updated_at']:
+                    continue
+                yield row
+
+    @staticmethod
+    def _iter_relationships(conn, after_id: int = 0) -> Iterator[Dict]:
+        with conn.cursor(SSDictCursor) as cursor:
+            cursor.execute(f"""
+                SELECT id, source_entity_id, target_entity_id, relationship_type, relationship_strength
+                FROM {RELATIONSHIP_TABLE}
+                WHERE id > %s
+                ORDER BY id
+            """, (after_id,))
+            for row in cursor:
+                yield row
+
+    @staticmethod
+    def _mark_entity(data: _GraphData, row: Dict):
+        mark = data.watermarks.setdefault(ENTITY_TABLE, {'id': 0, 'updated_at': None})
+        mark['id'] = max(mark['id'], int(row['id']))
+        updated_at = row.get('updated_at')
+        if updated_at is not None:
+            if mark['updated_at'] is None or updated_at > mark['updated_at']:
+                mark['updated_at'] = updated_at
+                mark['ids'] = {int(row['id'])}
+            elif updated_at == mark['updated_at']:
+                mark.setdefault('ids', set()).add(int(row['id']))
+
+    def build(self) -> bool:
+        """全量构建图索引，构建完成后原子替换旧索引"""
+        if not schema_registry.has_table(RELATIONSHIP_TABLE):
+            print(f"[GraphIndex] {RELATIONSHIP_TABLE} 表不存在，跳过构建")
+            return False
+        conn = get_default_db_connection()
+        if not conn:
+            print("[GraphIndex] 数据库连接失败，无法构建图索引")
+            return False
+        start = time.time()
+        try:
+            data = _GraphData()
+            for row in self._iter_entities(conn, None):
+                data.node_ids.append(int(row['id']))
+                data.names.append(row.get('entity_name') or '')
+                data.types.append(data.intern_type(row.get('entity_type')))
+                self._mark_entity(data, row)
+
+            # 第一遍：读出有效边（两端实体都存在），统计每个节点的度
+            sources, targets = array('l'), array('l')
+            rel_types, rel_ids, strengths = array('H'), array('q'), array('f')
+            degree = array('l', [0]) * len(data.node_ids)
+            max_rel_id = 0
+            for row in self._iter_relationships(conn):
+                max_rel_id = max(max_rel_id, int(row['id']))
+                src = data.node_of(int(row['source_entity_id']))
+                dst = data.node_of(int(row['target_entity_id']))
+                if src is None or dst is None:
+                    continue
+                sources.append(src)
+                targets.append(dst)
+                rel_types.append(data.intern_relation(row.get('relationship_type')))
+                rel_ids.append(int(row['id']))
+                strengths.append(float(row.get('relationship_strength') or 0.0))
+                degree[src] += 1
+                if dst != src:
+                    degree[dst] += 1
+
+            # 第二遍：按度的前缀和分配每个节点的区间，出边和入边都写入（无向遍历、保留方向）
+            offsets = array('l', [0]) * (len(data.node_ids) + 1)
+            for i, d in enumerate(degree):
+                offsets[i + 1] = offsets[i] + d
+            total = offsets[-1]
+            data.targets = array('l', [0]) * total
+            data.rel_types = array('H', [0]) * total
+            data.rel_ids = array('q', [0]) * total
+            data.directions = array('b', [0]) * total
+            data.strengths = array('f', [0.0]) * total
+            cursor_pos = array('l', offsets[:-1])
+
+            def put(node, neighbor, k, direction):
+                pos = cursor_pos[node]
+                data.targets[pos] = neighbor
+                data.rel_types[pos] = rel_types[k]
+                data.rel_ids[pos] = rel_ids[k]
+                data.directions[pos] = direction
+                data.strengths[pos] = strengths[k]
+                cursor_pos[node] = pos + 1
+
+            for k in range(len(sources)):
+                put(sources[k], targets[k], k, OUTGOING)
+                if targets[k] != sources[k]:
+                    put(targets[k], sources[k], k, INCOMING)
+            data.offsets = offsets
+            data.edge_count = len(sources)
+            data.watermarks[RELATIONSHIP_TABLE] = {'id': max_rel_id}
+
+            with self._lock:
+                self._data = data
+                self.ready = True
+            self.last_build_time = time.time()
+            self.last_refresh_time = self.last_build_time
+            self.build_seconds = round(self.last_build_time - start, 3)
+            print(f"[GraphIndex] 图索引构建完成: {len(data.node_ids)} 个实体，{data.edge_count} 条关系，"
+                  f"耗时 {self.build_seconds} 秒")
+            self._notify_changed()
+            return True
+        except Exception as e:
+            print(f"[GraphIndex] 图索引构建失败: {e}")
+            return False
+        finally:
+            conn.close()
+
+    def refresh(self) -> int:
+        """按水位增量刷新（新增实体、实体名称修改、新增关系），返回变化的记录数"""
+        if not self.ready:
+            self.build()
+            return 0
+        conn = get_default_db_connection()
+        if not conn:
+            return 0
+        try:
+            data = self._data
+            entity_mark = dict(data.watermarks.get(ENTITY_TABLE) or {'id': 0, 'updated_at': None})
+            relation_mark = (data.watermarks.get(RELATIONSHIP_TABLE) or {'id': 0})['id']
+            # 先在锁外读出增量记录，再持锁写入，避免刷新期间阻塞查询
+            entities = list(self._iter_entities(conn, entity_mark))
+            relationships = list(self._iter_relationships(conn, relation_mark))
+            needs_rebuild = False
+            with self._lock:
+                for row in entities:
+                    entity_id = int(row['id'])
+                    node = data.node_of(entity_id)
+                    if node is not None:
+                        data.names[node] = row.get('entity_name') or ''
+                        data.types[node] = data.intern_type(row.get('entity_type'))
+                    elif not data.node_ids or entity_id > data.node_ids[-1]:
+                        data.node_ids.append(entity_id)
+                        data.names.append(row.get('entity_name') or '')
+                        data.types.append(data.intern_type(row.get('entity_type')))
+                    else:
+                        # 小于当前最大ID的新实体（手工指定ID）无法追加到有序数组末尾
+                        needs_rebuild = True
+                    self._mark_entity(data, row)
+                for row in relationships:
+                    mark = data.watermarks.setdefault(RELATIONSHIP_TABLE, {'id': 0})
+                    mark['id'] = max(mark['id'], int(row['id']))
+                    src = data.node_of(int(row['source_entity_id']))
+                    dst = data.node_of(int(row['target_entity_id']))
+                    if src is None or dst is None:
+                        continue
+                    rel_type = data.intern_relation(row.get('relationship_type'))
+                    strength = float(row.get('relationship_strength') or 0.0)
+                    data.delta.setdefault(src, []).append((dst, rel_type, int(row['id']), OUTGOING, strength))
+                    if dst != src:
+                        data.delta.setdefault(dst, []).append((src, rel_type, int(row['id']), INCOMING, strength))
+                    data.delta_edges += 1
+                    data.edge_count += 1
+            if needs_rebuild or data.delta_edges >= GRAPH_DELTA_COMPACT:
+                self.request_refresh(rebuild=True)
+            self.last_refresh_time = time.time()
+            total = len(entities) + len(relationships)
+            if total:
+                self._notify_changed()
+            return total
+        except Exception as e:
+            print(f"[GraphIndex] 增量刷新失败: {e}")
+            return 0
+        finally:
+            conn.close()
+
+    def start(self):
+        """在后台线程中构建图索引并定期刷新"""
+        if self.running:
+            return
+        self.running = True
+        thread = threading.Thread(target=self._refresh_loop, daemon=True)
+        thread.start()
+
+    def stop(self):
+        self.running = False
+        self._wakeup.set()
+
+    def request_refresh(self, rebuild: bool = False):
+        """
+        请求后台线程立即刷新（本进程写入实体或关系后调用）
+
+        Args:
+            rebuild: 是否全量重建（修改或删除已有关系时需要）
+        """
+        if rebuild:
+            self._rebuild_requested = True
+        self._wakeup.set()
+
+    def add_change_listener(self, callback: Callable[[], None]):
+        """注册图索引内容变化时的回调"""
+        self._change_listeners.append(callback)
+
+    def _notify_changed(self):
+        for callback in self._change_listeners:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[GraphIndex] 图索引变化回调出错: {e}")
+
+    def _refresh_loop(self):
+        self.build()
+        while self.running:
+            self._wakeup.wait(GRAPH_INDEX_REFRESH_INTERVAL)
+            self._wakeup.clear()
+            if not self.running:
+                break
+            try:
+                rebuild, self._rebuild_requested = self._rebuild_requested, False
+                if rebuild or not self.ready or (self.last_build_time and
+                                                 time.time() - self.last_build_time >= GRAPH_INDEX_REBUILD_INTERVAL):
+                    self.build()
+                else:
+                    self.refresh()
+            except Exception as e:
+                print(f"[GraphIndex] 后台刷新出错: {e}")
+
+    # ==================== 查询 ====================
+    def has_entity(self, entity_id: int) -> bool:
+        with self._lock:
+            return self._data.node_of(int(entity_id)) is not None
+
+    def expand(self, entity_ids: Iterable[int], hops: int = 1, limit: int = 50,
+               max_fanout: int = GRAPH_MAX_FANOUT) -> List[Dict]:
+        """
+        从一组实体出发按广度优先扩展到 hops 跳以内的邻居
+
+        Args:
+            entity_ids: 起点实体ID（cultural_entities.id）
+            hops: 扩展跳数（1或2）
+            limit: 最多返回的邻居数
+            max_fanout: 每个节点最多沿强度最高的若干条边展开
+
+        Returns:
+            list: 按跳数、关系强度排序的邻居，每项包含 id、entity_name、entity_type、hop、
+                  relationship_id、relationship_type、direction（out/in，相对于 via 实体）、strength、
+                  via_id、via_name、source_entity、target_entity（关系两端的实体名称）
+        """
+        hops = max(1, min(int(hops), GRAPH_MAX_HOPS))
+        results: List[Dict] = []
+        with self._lock:
+            data = self._data
+            frontier = []
+            for entity_id in entity_ids:
+                node = data.node_of(int(entity_id))
+                if node is not None and node not in frontier:
+                    frontier.append(node)
+            visited = set(frontier)
+            for hop in range(1, hops + 1):
+                candidates = []
+                for node in frontier:
+                    edges = sorted(data.edges(node), key=lambda e: -e[4])[:max_fanout]
+                    for neighbor, rel_type, rel_id, direction, strength in edges:
+                        if neighbor in visited:
+                            continue
+                        visited.add(neighbor)
+                        candidates.append((strength, node, neighbor, rel_type, rel_id, direction))
+                if not candidates:
+                    break
+                candidates.sort(key=lambda c: -c[0])
+                for strength, via, neighbor, rel_type, rel_id, direction in candidates:
+                    via_name, name = data.names[via], data.names[neighbor]
+                    results.append({
+                        'id': data.node_ids[neighbor],
+                        'entity_name': name,
+                        'entity_type': data.type_names[data.types[neighbor]],
+                        'hop': hop,
+                        'relationship_id': rel_id,
+                        'relationship_type': data.relation_names[rel_type],
+                        'direction': 'out' if direction == OUTGOING else 'in',
+                        'strength': round(strength, 4),
+                        'via_id': data.node_ids[via],
+                        'via_name': via_name,
+                        'source_entity': via_name if direction == OUTGOING else name,
+                        'target_entity': name if direction == OUTGOING else via_name,
+                    })
+                if len(results) >= limit:
+                    break
+                frontier = [c[2] for c in candidates]
+        return results[:limit]
+
+    def related_entities(self, entity_id: int, hops: int = 1, limit: int = 20) -> List[Dict]:
+        """单个实体的相关实体（资源详情页使用）"""
+        return self.expand([entity_id], hops=hops, limit=limit)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            data = self._data
+            arrays = (data.node_ids, data.types, data.offsets, data.targets, data.rel_types,
+                      data.rel_ids, data.directions, data.strengths)
+            return {
+                'ready': self.ready,
+                'entities': len(data.node_ids),
+                'relationships': data.edge_count,
+                'delta_relationships': data.delta_edges,
+                'relationship_types': len(data.relation_names),
+                'array_bytes': sum(a.itemsize * len(a) for a in arrays),
+                'watermarks': {t: {k: (str(v) if k == 'updated_at' and v else v) for k, v in m.items()}
+                               for t, m in data.watermarks.items()},
+                'build_seconds': self.build_seconds,
+                'last_build_time': self.last_build_time,
+                'last_refresh_time': self.last_refresh_time,
+            }
+
+
+# 全局图索引实例
+_entity_graph_index = None
+
+
+def get_entity_graph_index() -> EntityGraphIndex:
+    """获取实体关系图索引实例（单例）"""
+    global _entity_graph_index
+    if _entity_graph_index is None:
+        _entity_graph_index = EntityGraphIndex()
+    return _entity_graph_index
@@ -568,13 +568,14 @@ class ImageAIGC:
             return conn
         return None
     
-    def query_database(self, query: str, table_names: Optional[List[str]] = None) -> List[Dict]:
+    def query_database(self, query: str, table_names: Optional[List[str]] = None,
+                       compiled=None) -> List[Dict]:
         """
         从指定数据库表中检索相关内容（使用RAGBase统一实现）
         此方法已统一到rag_base.py，通过rag_base实例调用
         """
         if hasattr(self, 'rag_base') and self.rag_base:
-            return self.rag_base.query_database(query, table_names)
+            return self.rag_base.query_database(query, table_names, compiled)
         return []
     
     def _crawl_web_content(self, query: str, max_results: int = 3) -> List[Document]:
@@ -712,7 +713,8 @@ class ImageAIGC:
             auto_detect_comic: bool = True,
             text_overlay: Optional[str] = None,
             image_paths: Optional[List[str]] = None,
-            use_history: bool = True
+            use_history: bool = True,
+            conversation_history: Optional[List[Dict]] = None
     ) -> str:
         """
         生成图像
@@ -722,8 +724,10 @@ class ImageAIGC:
         :param image_size: 图像尺寸
         :param auto_detect_comic: 是否自动检测连环画请求
         :param text_overlay: 可选，要在图片上叠加的文字说明
+        :param conversation_history: 外部维护的对话历史（共享实例时传入用户自己的历史，原地读写），默认使用实例自身的历史
         :return: 本地保存路径（如果是连环画请求，返回JSON字符串包含所有路径）
         """
+        history = self.conversation_history if conversation_history is None else conversation_history
         if auto_detect_comic and self._is_comic_request(prompt):
             comic_paths = self.generate_comic(prompt, style, model_key, image_size)
             if comic_paths:
@@ -757,9 +761,9 @@ class ImageAIGC:
         retrieval_info = self._get_retrieval_info(prompt, style, image_paths)
         
         # 添加对话历史信息
-        if use_history and self.conversation_history:
+        if use_history and history:
             history_parts = []
-            for hist in self.conversation_history[-3:]:  # 只保留最近3轮对话
+            for hist in history[-3:]:  # 只保留最近3轮对话
                 if hist.get("role") == "user":
                     history_parts.append(f"用户：{hist.get('content', '')}")
                 elif hist.get("role") == "assistant":
@@ -866,22 +870,22 @@ class ImageAIGC:
                 
                 # 更新对话历史
                 if use_history:
-                    self.conversation_history.append({
+                    history.append({
                         "role": "user",
                         "content": prompt,
                         "image_paths": image_paths or [],
                         "style": style,
                         "timestamp": datetime.now()
                     })
-                    self.conversation_history.append({
+                    history.append({
                         "role": "assistant",
                         "content": f"已生成图片：{local_path}",
                         "image_path": local_path,
                         "timestamp": datetime.now()
                     })
                     # 限制历史记录长度
-                    if len(self.conversation_history) > 20:
-                        self.conversation_history = self.conversation_history[-20:]
+                    if len(history) > 20:
+                        del history[:-20]
                 
                 return local_path if local_path else ""
 
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+AI检索关键词提取
+/api/ai_search 在检索前需要调用大模型把自然语言查询转换为检索关键词，这一步是完整的一次LLM往返。
+这里把提取结果按归一化查询（统一大小写和首尾空白）持久化到本地SQLite（带TTL），重复查询直接命中缓存；
+缓存未命中时模型调用限时进行，超时或模型不可用时改用本地 jieba TF-IDF 提取，
+超时的模型调用在后台继续完成并写入缓存，供后续相同查询使用。
+"""
+import os
+import sys
+import re
+import json
+import time
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, List, Optional, Tuple
+
+# 添加项目根目录和scripts目录到路径
+current_dir = os.path.dirname(os.path.realpath(__file__))
+project_root = os.path.dirname(current_dir)
+scripts_dir = os.path.join(project_root, 'scripts')
+sys.path.insert(0, project_root)
+sys.path.insert(0, scripts_dir)
+sys.path.insert(0, current_dir)
+
+from search_cache import normalize_query, get_shared_optimizer
+
+KEYWORD_CACHE_PATH = os.getenv("KEYWORD_CACHE_PATH", os.path.join(project_root, "cache", "ai_keyword_cache.db"))
+KEYWORD_CACHE_TTL = float(os.getenv("KEYWORD_CACHE_TTL", str(7 * 24 * 3600)))
+# 模型提取关键词的最长等待时间（秒），超时后使用本地提取结果
+KEYWORD_MODEL_TIMEOUT = float(os.getenv("KEYWORD_MODEL_TIMEOUT", "5"))
+KEYWORD_MODEL_WORKERS = int(os.getenv("KEYWORD_MODEL_WORKERS", "4"))
+# 本地提取的关键词个数
+LOCAL_KEYWORD_TOP_K = 5
+# 缓存键前缀：旧版本按子串去停用词生成的键会把不同查询合并（'在线' -> '线'），换前缀后旧条目不再命中，过期后被清理
+KEYWORD_CACHE_KEY_PREFIX = 'v2:'
+
+SEMANTIC_EXTRACTION_PROMPT = """
+你是一位专业的文化资源检索专家，请将用户的自然语言查询转换为精确的检索关键词。
+
+用户查询: {query}
+
+请按照以下JSON格式返回结果：
+{{
+  "keywords": ["关键词1", "关键词2", ...],  # 提取的核心关键词（用于数据库检索）
+  "search_query": "优化后的检索式"  # 适合数据库检索的检索式
+}}
+
+要求：
+1. 提取用户查询中的核心文化主题、节日名称、习俗、人物、地点等关键词
+2. 如果涉及多个概念，用空格或逗号分隔
+3. 保持原意，不要添加额外信息
+4. search_query应该是适合在数据库中直接检索的字符串
+"""
+
+
+class KeywordCacheStore:
+    """基于SQLite的关键词提取结果缓存（跨进程重启保留）"""
+
+    def __init__(self, db_path: str = KEYWORD_CACHE_PATH, ttl: float = KEYWORD_CACHE_TTL):
+        self.db_path = db_path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = None
+        self.hits = 0
+        self.misses = 0
+
+    def _get_conn(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS keyword_cache (
+                    query TEXT PRIMARY KEY,
+                    result TEXT NOT NULL,
+                    source TEXT,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            # 打开时清理过期条目和旧版本缓存键的条目
+            conn.execute("DELETE FROM keyword_cache WHERE expires_at <= ? OR query NOT LIKE ?",
+                         (time.time(), KEYWORD_CACHE_KEY_PREFIX + '%'))
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, query: str) -> Optional[Dict]:
+        """读取未过期的缓存结果"""
+        try:
+            with self._lock:
+                row = self._get_conn().execute(
+                    "SELECT result, expires_at FROM keyword_cache WHERE query = ?", (query,)
+                ).fetchone()
+                if row and row[1] > time.time():
+                    self.hits += 1
+                    return json.loads(row[0])
+                self.misses += 1
+                return None
+        except Exception as e:
+            print(f"[KeywordCache] 读取缓存失败: {e}")
+            return None
+
+    def set(self, query: str, result: Dict, source: str = 'model'):
+        try:
+            now = time.time()
+            with self._lock:
+                conn = self._get_conn()
+                conn.execute(
+                    "INSERT OR REPLACE INTO keyword_cache (query, result, source, created_at, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (query, json.dumps(result, ensure_ascii=False), source, now, now + self.ttl)
+                )
+                conn.commit()
+        except Exception as e:
+            print(f"[KeywordCache] 写入缓存失败: {e}")
+
+    def purge_expired(self) -> int:
+        """删除过期条目，返回删除数量"""
+        try:
+            with self._lock:
+                conn = self._get_conn()
+                cursor = conn.execute("DELETE FROM keyword_cache WHERE expires_at <= ?", (time.time(),))
+                conn.commit()
+                return cursor.rowcount
+        except Exception as e:
+            print(f"[KeywordCache] 清理过期缓存失败: {e}")
+            return 0
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        size = None
+        try:
+            with self._lock:
+                size = self._get_conn().execute("SELECT COUNT(*) FROM keyword_cache").fetchone()[0]
+        except Exception:
+            pass
+        return {
+            'path': self.db_path,
+            'size': size,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+def parse_model_result(content, query: str) -> Optional[Dict]:
+    """解析模型返回的JSON（兼容 ```json 代码块包裹），解析失败返回None"""
+    if isinstance(content, dict):
+        data = content
+    else:
+        text = str(content or '').strip()
+        match = re.search(r'\{.*\}', text, re.S)
+        if not match:
+            return None
+        try:
+            data = json.loads(match.group(0))
+        except (json.JSONDecodeError, ValueError):
+            return None
+    if not isinstance(data, dict):
+        return None
+    keywords = data.get('keywords') or [query]
+    if isinstance(keywords, str):
+        keywords = [k for k in re.split(r'[\s,，、]+', keywords) if k]
+    return {
+        'keywords': keywords,
+        'search_query': data.get('search_query') or query,
+    }
+
+
+def remove_stopword_tokens(query: str) -> str:
+    """
+    按分词结果去掉停用词（'春节的习俗' -> '春节习俗'），不会像按子串替换那样把 '和服' 变成 '服'；
+    空白分隔的各部分分别处理，部分之间保留一个空格
+    """
+    optimizer = get_shared_optimizer()
+    parts = []
+    for part in (query or '').split():
+        try:
+            part = ''.join(optimizer.tokenize_and_filter(part))
+        except Exception:
+            part = '' if part in optimizer.stopwords else part
+        if part:
+            parts.append(part)
+    return ' '.join(parts)
+
+
+def extract_keywords_locally(query: str, top_k: int = LOCAL_KEYWORD_TOP_K) -> Dict:
+    """
+    本地关键词提取（不调用大模型）
+    优先使用 jieba 的 TF-IDF 关键词提取，不可用时退化为分词 + 停用词过滤
+    """
+    optimizer = get_shared_optimizer()
+    cleaned = remove_stopword_tokens(query) or query
+    keywords: List[str] = []
+    try:
+        import jieba.analyse
+        keywords = [k for k in jieba.analyse.extract_tags(cleaned, topK=top_k) if k not in optimizer.stopwords]
+    except Exception:
+        pass
+    if not keywords:
+        try:
+            tokens = optimizer.tokenize_and_filter(cleaned)
+        except Exception:
+            tokens = cleaned.split()
+        # 去重并保持顺序
+        keywords = list(dict.fromkeys(t.strip() for t in tokens if t.strip()))[:top_k]
+    return {
+        'keywords': keywords or [query],
+        'search_query': cleaned,
+    }
+
+
+class KeywordExtractor:
+    """带持久化缓存和本地回退的检索关键词提取器"""
+
+    def __init__(self, store: Optional[KeywordCacheStore] = None, timeout: float = KEYWORD_MODEL_TIMEOUT):
+        self.store = store or KeywordCacheStore()
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=KEYWORD_MODEL_WORKERS,
+                                            thread_name_prefix='keyword-extract')
+        self._inflight = {}  # 归一化查询 -> 进行中的模型调用
+        self._lock = threading.Lock()
+        self.source_counts = {'cache': 0, 'model': 0, 'local': 0}
+
+    def _call_model(self, model, query: str, key: str) -> Optional[Dict]:
+        try:
+            response = model.invoke(SEMANTIC_EXTRACTION_PROMPT.format(query=query))
+            content = response.content if hasattr(response, 'content') else str(response)
+            result = parse_model_result(content, query)
+            if result:
+                self.store.set(key, result, source='model')
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def extract(self, query: str, model=None) -> Tuple[Dict, str]:
+        """
+        提取检索关键词
+
+        Args:
+            query: 用户查询
+            model: 大模型（提供 invoke 方法），为None时直接本地提取
+
+        Returns:
+            (提取结果 {'keywords': [...], 'search_query': ...}, 来源 'cache' / 'model' / 'local')
+        """
+        # 与检索结果缓存相同的归一化（只统一大小写和首尾空白），模型和本地提取收到的都是原查询
+        key = KEYWORD_CACHE_KEY_PREFIX + normalize_query(query)
+        cached = self.store.get(key)
+        if cached:
+            self.source_counts['cache'] += 1
+            return cached, 'cache'
+
+        if model is not None:
+            with self._lock:
+                future = self._inflight.get(key)
+                if future is None:
+                    future = self._executor.submit(self._call_model, model, query, key)
+                    self._inflight[key] = future
+            try:
+                result = future.result(timeout=self.timeout)
+                if result:
+                    self.source_counts['model'] += 1
+                    return result, 'model'
+            except FutureTimeoutError:
+                # 模型调用在后台继续，完成后写入缓存
+                print(f"[KeywordExtractor] 模型提取超时（{self.timeout}秒），使用本地提取: {query}")
+            except Exception as e:
+                print(f"[KeywordExtractor] 模型提取失败，使用本地提取: {e}")
+
+        self.source_counts['local'] += 1
+        return extract_keywords_locally(query), 'local'
+
+    def stats(self) -> Dict:
+        stats = self.store.stats()
+        stats['sources'] = dict(self.source_counts)
+        stats['timeout'] = self.timeout
+        return stats
+
+
+_keyword_extractor = None
+_extractor_lock = threading.Lock()
+
+
+def get_keyword_extractor() -> KeywordExtractor:
+    """获取关键词提取器单例"""
+    global _keyword_extractor
+    if _keyword_extractor is None:
+        with _extractor_lock:
+            if _keyword_extractor is None:
+                _keyword_extractor = KeywordExtractor()
+    return _keyword_extractor
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+检索词典的 Aho–Corasick 自动机
+停用词、同义词、节日名称编译为一个自动机，一次扫描找出文本中出现的所有词典词，
+查询预处理的耗时与查询长度成正比，而不再与词典大小成正比：
+- SearchOptimizer.remove_stopwords / expand_query_with_synonyms 使用
+- query_compiler 的节日名称识别和粗分词使用
+编译结果序列化为JSON缓存到磁盘（LEXICON_CACHE_PATH），词典文件未变化时直接加载；
+词典文件修改后由 SearchOptimizer 按修改时间检测并热加载
+"""
+import os
+import sys
+import json
+import time
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# 添加项目根目录和scripts目录到路径
+current_dir = os.path.dirname(os.path.realpath(__file__))
+project_root = os.path.dirname(current_dir)
+scripts_dir = os.path.join(project_root, 'scripts')
+sys.path.insert(0, project_root)
+sys.path.insert(0, scripts_dir)
+
+LEXICON_CACHE_PATH = os.getenv("LEXICON_CACHE_PATH", os.path.join(project_root, "cache", "lexicon_automaton.json"))
+
+# 词的类别（位标志，同一个词可以同时属于多个类别）
+STOPWORD = 1
+SYNONYM = 2
+FESTIVAL = 4
+
+# 序列化格式版本，格式变化时递增使旧缓存失效
+_FORMAT_VERSION = 1
+
+
+def festival_source_path() -> Optional[str]:
+    """节日名称映射所在的源文件（用于检测变化）"""
+    try:
+        import festival_name_utils
+        return os.path.realpath(festival_name_utils.__file__)
+    except ImportError:
+        return None
+
+
+def load_festival_names() -> List[str]:
+    try:
+        from festival_name_utils import FESTIVAL_NAME_MAP
+        return list(FESTIVAL_NAME_MAP)
+    except ImportError:
+        return []
+
+
+def source_signature(paths: Sequence[Optional[str]]) -> List:
+    """词典源文件的签名（路径、修改时间、大小），任一变化即需要重新编译"""
+    signature = []
+    for path in paths:
+        if not path:
+            continue
+        try:
+            stat = os.stat(path)
+            signature.append([str(path), stat.st_mtime_ns, stat.st_size])
+        except OSError:
+            signature.append([str(path), None, None])
+    return signature
+
+
+class LexiconAutomaton:
+    """多模式串匹配自动机（goto/fail/output 三张表，输出表已沿失败链合并）"""
+
+    def __init__(self, goto: List[Dict[str, int]], fail: List[int], output: List[List[Tuple[int, int]]]):
+        self._goto = goto
+        self._fail = fail
+        self._output = output
+
+    @classmethod
+    def build(cls, words: Dict[str, int]) -> 'LexiconAutomaton':
+        """
+        编译自动机
+
+        Args:
+            words: 词 -> 类别标志（STOPWORD | SYNONYM | FESTIVAL 的组合）
+        """
+        goto: List[Dict[str, int]] = [{}]
+        output: List[Dict[int, int]] = [{}]
+        for word, kinds in words.items():
+            if not word:
+                continue
+            state = 0
+            for ch in word:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    output.append({})
+                state = nxt
+            output[state][len(word)] = output[state].get(len(word), 0) | kinds
+
+        # 按层次（BFS）计算失败指针，并把失败链上的输出合并到当前状态
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                target = goto[f].get(ch, 0)
+                # 第一层状态的失败指针指向根
+                fail[nxt] = target if target != nxt else 0
+                for length, kinds in output[fail[nxt]].items():
+                    output[nxt][length] = output[nxt].get(length, 0) | kinds
+        return cls(goto, fail, [sorted(o.items()) for o in output])
+
+    def iter_matches(self, text: str, kinds: int = STOPWORD | SYNONYM | FESTIVAL) -> List[Tuple[int, int, int]]:
+        """
+        一次扫描找出文本中出现的所有词典词（含重叠）
+
+        Returns:
+            list: (起始位置, 结束位置, 类别标志)，按结束位置排序
+        """
+        goto, fail, output = self._goto, self._fail, self._output
+        matches = []
+        state = 0
+        i = 0
+        for ch in text:
+            i += 1
+            nxt = goto[state].get(ch)
+            while nxt is None and state:
+                state = fail[state]
+                nxt = goto[state].get(ch)
+            state = nxt or 0
+            out = output[state]
+            if out:
+                for length, word_kinds in out:
+                    if word_kinds & kinds:
+                        matches.append((i - length, i, word_kinds))
+        return matches
+
+    def find(self, text: str, kinds: int) -> List[str]:
+        """文本中出现的指定类别的词（按出现位置排序，去重）"""
+        return list(dict.fromkeys(text[s:e] for s, e, _ in self.iter_matches(text, kinds)))
+
+    def find_longest(self, text: str, kinds: int) -> List[str]:
+        """文本中出现的指定类别的词，重叠时保留最长的（如"中秋节"与"中秋"只保留"中秋节"）"""
+        matches = sorted(self.iter_matches(text, kinds), key=lambda m: (m[0], -(m[1] - m[0])))
+        result, covered_until = [], 0
+        for start, end, _ in matches:
+            if start >= covered_until:
+                result.append(text[start:end])
+                covered_until = end
+        return list(dict.fromkeys(result))
+
+    def replace(self, text: str, kinds: int, replacement: str = '') -> str:
+        """把指定类别的词所覆盖的字符替换为 replacement（重叠的词合并为一段）"""
+        # 短词会先于包含它的长词被报告，按起始位置排序后再合并
+        merged = []
+        for start, end, _ in sorted(self.iter_matches(text, kinds)):
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        if not merged:
+            return text
+        parts, pos = [], 0
+        for start, end in merged:
+            parts.append(text[pos:start])
+            parts.append(replacement)
+            pos = end
+        parts.append(text[pos:])
+        return ''.join(parts)
+
+    @property
+    def size(self) -> int:
+        return len(self._goto)
+
+    # ==================== 序列化 ====================
+    def to_dict(self) -> Dict:
+        return {'goto': self._goto, 'fail': self._fail, 'output': self._output}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'LexiconAutomaton':
+        return cls(data['goto'], data['fail'], [[tuple(o) for o in out] for out in data['output']])
+
+
+def save_automaton(automaton: LexiconAutomaton, signature: List, path: str = LEXICON_CACHE_PATH) -> bool:
+    """把编译好的自动机连同源文件签名写入磁盘（先写临时文件再替换，避免读到半个文件）"""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': _FORMAT_VERSION, 'signature': signature, 'automaton': automaton.to_dict()},
+                      f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+        return True
+    except Exception as e:
+        print(f"[Lexicon] 保存自动机缓存失败: {e}")
+        return False
+
+
+def load_automaton(signature: List, path: str = LEXICON_CACHE_PATH) -> Optional[LexiconAutomaton]:
+    """加载磁盘缓存；缓存不存在、格式版本或源文件签名不一致时返回None"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != _FORMAT_VERSION or data.get('signature') != signature:
+            return None
+        return LexiconAutomaton.from_dict(data['automaton'])
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"[Lexicon] 读取自动机缓存失败，重新编译: {e}")
+        return None
+
+
+def get_or_build_automaton(words: Dict[str, int], signature: List,
+                           path: str = LEXICON_CACHE_PATH) -> LexiconAutomaton:
+    """源文件未变化时从磁盘加载，否则重新编译并写回缓存"""
+    automaton = load_automaton(signature, path)
+    if automaton is not None:
+        return automaton
+    start = time.time()
+    automaton = LexiconAutomaton.build(words)
+    print(f"[Lexicon] 已编译词典自动机：{len(words)} 个词，{automaton.size} 个状态，"
+          f"耗时 {(time.time() - start) * 1000:.1f}ms")
+    save_automaton(automaton, signature, path)
+    return automaton
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+检索查询编译
+query_database 原来把整个用户查询作为一个 '%查询%' 的LIKE模式，多模态检索时查询里还拼接了视觉模型
+对图片的多句描述，结果是每张表都全表扫描且几乎不可能命中。
+这里在检索前把自由文本编译为少量按重要性排序的检索词：
+- 节日名称（festival_name_utils.FESTIVAL_NAME_MAP，含英文名）排在最前
+- 短查询整体保留为一个检索词（与原来的子串语义一致）
+- 长查询用 jieba TF-IDF 提取关键词（去停用词），不可用时按分词/标点切分
+- 剩余名额用同义词（synonyms.txt）补足
+再由编译结果为每张表生成有上限的 OR/MATCH 条件（match_expression / like_predicate）
+"""
+import os
+import sys
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+
+# 添加项目根目录和scripts目录到路径
+current_dir = os.path.dirname(os.path.realpath(__file__))
+project_root = os.path.dirname(current_dir)
+scripts_dir = os.path.join(project_root, 'scripts')
+sys.path.insert(0, project_root)
+sys.path.insert(0, scripts_dir)
+sys.path.insert(0, current_dir)
+
+from search_cache import get_shared_optimizer
+from search_documents import build_match_expression
+from image_tags import escape_like
+
+try:
+    from festival_name_utils import FESTIVAL_NAME_MAP
+except ImportError:
+    FESTIVAL_NAME_MAP = {}
+
+# 编译结果最多包含的检索词个数（含节日名称）
+QUERY_MAX_TERMS = int(os.getenv("QUERY_MAX_TERMS", "5"))
+# LIKE 条件最多使用的检索词个数（每个检索词 × 每个列 一个 LIKE）
+QUERY_MAX_LIKE_TERMS = int(os.getenv("QUERY_MAX_LIKE_TERMS", "3"))
+# 不超过该长度且不含分隔符的查询整体作为一个检索词
+SHORT_QUERY_LENGTH = 12
+# 单个检索词的最大长度
+TERM_MAX_LENGTH = 30
+# 参与编译的输入文本上限（图片描述可能很长）
+QUERY_INPUT_MAX_LENGTH = 2000
+# 检索词最短长度（单字在中文里几乎没有区分度，也低于全文索引的ngram词长）
+TERM_MIN_LENGTH = 2
+
+# 泛化的节日名称不作为检索词（几乎所有记录都会命中）
+_GENERIC_FESTIVALS = {"节日", "传统节日"}
+_SEPARATORS = re.compile(r'[\s，。！？；、,.!?;:：\n\r\t"“”\'‘’()（）《》【】\[\]]+')
+_MEANINGLESS = re.compile(r'^[\W\d_]+$')
+_CJK = re.compile(r'[\u4e00-\u9fff]')
+
+_COMPILE_CACHE_SIZE = 512
+_compile_cache: "OrderedDict[tuple, CompiledQuery]" = OrderedDict()
+_compile_cache_lock = threading.Lock()
+
+
+class CompiledQuery:
+    """编译后的检索查询"""
+
+    def __init__(self, original: str, terms: List[str], festivals: List[str], festivals_en: List[str]):
+        self.original = original
+        # 按重要性排序的检索词（节日名称在前），最多 QUERY_MAX_TERMS 个
+        self.terms = terms
+        # 识别出的中文节日名称及对应英文名称
+        self.festivals = festivals
+        self.festivals_en = festivals_en
+
+    def __bool__(self):
+        return bool(self.terms)
+
+    def __repr__(self):
+        return f"CompiledQuery(terms={self.terms}, festivals_en={self.festivals_en})"
+
+    def like_terms(self, max_terms: int = QUERY_MAX_LIKE_TERMS) -> List[str]:
+        """LIKE 条件使用的检索词（有上限）"""
+        return self.terms[:max_terms]
+
+    def match_expression(self) -> str:
+        """全文检索布尔模式检索式：检索词和英文节日名称之间为或关系"""
+        return build_match_expression(*self.terms, *self.festivals_en)
+
+    def like_predicate(self, columns: Sequence[str], english_columns: Sequence[str] = (),
+                       max_terms: int = QUERY_MAX_LIKE_TERMS) -> Tuple[str, List[str]]:
+        """
+        生成有上限的 OR LIKE 条件
+
+        Args:
+            columns: 用中文检索词匹配的列（SQL表达式）
+            english_columns: 额外用英文节日名称匹配的列
+            max_terms: 最多使用的检索词个数
+
+        Returns:
+            (条件SQL, 参数列表)；没有检索词时返回 ("1=0", [])
+        """
+        clauses, params = [], []
+        for term in self.like_terms(max_terms=max_terms):
+            pattern = f"%{escape_like(term)}%"
+            for column in columns:
+                clauses.append(f"{column} LIKE %s")
+                params.append(pattern)
+        for term in self.festivals_en:
+            pattern = f"%{escape_like(term)}%"
+            for column in english_columns:
+                clauses.append(f"{column} LIKE %s")
+                params.append(pattern)
+        if not clauses:
+            return "1=0", []
+        return "(" + " OR ".join(clauses) + ")", params
+
+
+def _detect_festivals(text: str) -> List[str]:
+    """识别文本中的节日名称（中文名或英文名），长名称优先，返回中文名"""
+    festivals = [name for name in get_shared_optimizer().find_festivals(text) if name not in _GENERIC_FESTIVALS]
+    lowered = text.lower()
+    for name, name_en in FESTIVAL_NAME_MAP.items():
+        if name in _GENERIC_FESTIVALS:
+            continue
+        if name_en.lower() in lowered and not any(FESTIVAL_NAME_MAP[f] == name_en for f in festivals):
+            festivals.append(name)
+    return festivals
+
+
+def _strip_festivals(text: str, festivals: List[str]) -> str:
+    for name in festivals:
+        text = text.replace(name, ' ')
+        text = re.sub(re.escape(FESTIVAL_NAME_MAP[name]), ' ', text, flags=re.IGNORECASE)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def _segment(text: str) -> List[str]:
+    """不依赖jieba的粗分词：按标点和空白切分，中文片段再在停用词处切开，英文词整词过滤停用词"""
+    optimizer = get_shared_optimizer()
+    segments = []
+    for part in _SEPARATORS.split(text):
+        if not part:
+            continue
+        if _CJK.search(part):
+            segments.extend(optimizer.split_on_stopwords(part))
+        elif part.lower() not in optimizer.stopwords:
+            segments.append(part)
+    return segments
+
+
+def _extract_keywords(text: str, top_k: int) -> List[str]:
+    """从文本中提取关键词：jieba TF-IDF 优先（按权重排序），不可用时粗分词"""
+    stopwords = get_shared_optimizer().stopwords
+    try:
+        import jieba.analyse
+        keywords = [k for k in jieba.analyse.extract_tags(text, topK=top_k * 2) if k not in stopwords]
+        if keywords:
+            return keywords
+    except Exception:
+        pass
+    return _segment(text)
+
+
+def _is_valid_term(term: str) -> bool:
+    return len(term) >= TERM_MIN_LENGTH and not _MEANINGLESS.match(term)
+
+
+def _compile(query: str, context: str, max_terms: int) -> CompiledQuery:
+    optimizer = get_shared_optimizer()
+    query = re.sub(r'\s+', ' ', query or '').strip()[:QUERY_INPUT_MAX_LENGTH]
+    context = re.sub(r'\s+', ' ', context or '').strip()[:QUERY_INPUT_MAX_LENGTH]
+    text = f"{query} {context}".strip()
+    original = query
+
+    festivals = _detect_festivals(text)
+    terms: List[str] = []
+
+    def add(term: str):
+        term = (term or '').strip()[:TERM_MAX_LENGTH]
+        if _is_valid_term(term) and term not in terms and term not in optimizer.stopwords \
+                and len(terms) < max_terms:
+            terms.append(term)
+
+    for festival in festivals:
+        add(festival)
+    # 节日名称已作为检索词，从剩余文本中去掉，避免与相邻词粘连成无法命中的长词
+    query, context = _strip_festivals(query, festivals), _strip_festivals(context, festivals)
+
+    # 不含标点和停用词的短查询整体保留（与原来的子串语义一致）；长查询和上下文（图片描述等）只取关键词
+    if query and len(query) <= SHORT_QUERY_LENGTH and _segment(query) == [query]:
+        add(query)
+    elif query:
+        for keyword in _extract_keywords(query, max_terms):
+            add(keyword)
+    if context:
+        for keyword in _extract_keywords(context, max_terms):
+            add(keyword)
+
+    # 同义词补足剩余名额
+    for term in list(terms):
+        for synonym in optimizer.synonyms_dict.get(term, []):
+            add(synonym)
+
+    # 查询全部由单字或停用词组成时保留原查询，避免退化为不带条件的查询
+    if not terms and original:
+        terms.append(original[:TERM_MAX_LENGTH])
+
+    festivals_en = list(dict.fromkeys(FESTIVAL_NAME_MAP[f] for f in festivals))
+    return CompiledQuery(original, terms, festivals, festivals_en)
+
+
+def compile_query(query: str, context: Optional[str] = None, max_terms: int = QUERY_MAX_TERMS) -> CompiledQuery:
+    """
+    把自由文本查询编译为少量检索词
+
+    Args:
+        query: 用户输入的查询
+        context: 附加的查询上下文（如多模态检索中视觉模型生成的图片描述），排在用户查询之后
+        max_terms: 最多保留的检索词个数
+
+    Returns:
+        CompiledQuery: 编译结果（同一查询的结果在进程内缓存）
+    """
+    key = (query or '', context or '', max_terms)
+    with _compile_cache_lock:
+        compiled = _compile_cache.get(key)
+        if compiled is not None:
+            _compile_cache.move_to_end(key)
+            return compiled
+    compiled = _compile(query, context, max_terms)
+    with _compile_cache_lock:
+        _compile_cache[key] = compiled
+        if len(_compile_cache) > _COMPILE_CACHE_SIZE:
+            _compile_cache.popitem(last=False)
+    return compiled
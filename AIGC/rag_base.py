@@ -8,7 +8,9 @@ import sys
 import time
 import re
 import urllib.parse
-from typing import List, Dict, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import List, Dict, Optional, Tuple
 from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import Chroma
@@ -25,6 +27,13 @@ sys.path.insert(0, project_root)
 sys.path.insert(0, scripts_dir)
 
 from db_connection import get_user_db_connection
+from schema_registry import schema_registry
+from image_tags import escape_like, tag_match_subquery, tag_prefix_pattern
+from search_documents import get_synced_tables, search as search_documents_search
+from query_compiler import CompiledQuery, compile_query
+from graph_index import get_entity_graph_index
+from retrieval_cache import get_retrieval_cache, normalize_retrieval_query, vector_table
+from embedding_cache import cached_embeddings
 from dotenv import load_dotenv
 import json
 
@@ -34,14 +43,78 @@ load_dotenv(dotenv_path=env_path, override=True)
 
 ALIYUN_API_KEY = os.getenv("DASHSCOPE_API_KEY") or os.getenv("ALIYUN_API_KEY")
 
-# 导入节日名称转换工具（延迟导入，避免循环依赖）
-def _get_festival_name_utils():
-    """延迟导入节日名称转换工具"""
-    try:
-        from festival_name_utils import chinese_to_english_festival
-        return chinese_to_english_festival
-    except ImportError:
-        return lambda x: ""
+# query_database 并发检索参数：单表最多返回的行数、所有表的总时限（秒）、并发线程数
+RAG_TABLE_ROW_LIMIT = int(os.getenv("RAG_TABLE_ROW_LIMIT", "50"))
+RAG_QUERY_DEADLINE = float(os.getenv("RAG_QUERY_DEADLINE", "8"))
+RAG_QUERY_WORKERS = int(os.getenv("RAG_QUERY_WORKERS", "14"))
+# 文化资源类表（content_feature_data 中存放标题、正文和节日元数据）
+RESOURCE_TABLES = ("cultural_resources", "AIGC_cultural_resources", "cultural_resources_from_user")
+# 是否使用统一检索文档表 search_documents：auto（已安装同步触发器的表使用）/ off（始终逐表查询）
+RAG_USE_SEARCH_DOCUMENTS = os.getenv("RAG_USE_SEARCH_DOCUMENTS", "auto").lower()
+# 实体关系图扩展：从检索到的前 RAG_GRAPH_SEEDS 个实体出发扩展的跳数（图索引就绪时替代 entity_relationships 的SQL查询）
+RAG_GRAPH_HOPS = int(os.getenv("RAG_GRAPH_HOPS", "2"))
+RAG_GRAPH_SEEDS = int(os.getenv("RAG_GRAPH_SEEDS", "10"))
+
+_query_executor = None
+_query_executor_lock = threading.Lock()
+
+# 各RAG实例共享的重量级组件：嵌入模型客户端、文本切分器、按目录复用的Chroma向量库
+_embedding_model = None
+_text_splitter = None
+_vector_stores: Dict[str, Chroma] = {}
+_shared_components_lock = threading.Lock()
+
+
+def _get_query_executor() -> ThreadPoolExecutor:
+    """获取各RAG实例共享的表查询线程池"""
+    global _query_executor
+    if _query_executor is None:
+        with _query_executor_lock:
+            if _query_executor is None:
+                _query_executor = ThreadPoolExecutor(max_workers=RAG_QUERY_WORKERS,
+                                                     thread_name_prefix='rag-query')
+    return _query_executor
+
+def get_embedding_model():
+    """获取进程内共享的嵌入模型客户端（DashScope 不可用时退回 OpenAI），查询向量带持久化缓存"""
+    global _embedding_model
+    if _embedding_model is None:
+        with _shared_components_lock:
+            if _embedding_model is None:
+                try:
+                    embedding_model = DashScopeEmbeddings(
+                        dashscope_api_key=ALIYUN_API_KEY,
+                        model="text-embedding-v2"
+                    )
+                except Exception as e:
+                    print(f"DashScopeEmbeddings 初始化失败: {e}，使用 OpenAIEmbeddings 作为备选。")
+                    embedding_model = OpenAIEmbeddings()
+                _embedding_model = cached_embeddings(embedding_model)
+    return _embedding_model
+
+
+def get_text_splitter() -> RecursiveCharacterTextSplitter:
+    """获取共享的文本切分器（无状态，可跨实例复用）"""
+    global _text_splitter
+    if _text_splitter is None:
+        with _shared_components_lock:
+            if _text_splitter is None:
+                _text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+    return _text_splitter
+
+
+def get_vector_store(persist_directory: str) -> Chroma:
+    """按持久化目录获取共享的Chroma向量库（同一目录只打开一次）"""
+    key = os.path.normpath(persist_directory)
+    store = _vector_stores.get(key)
+    if store is None:
+        embedding_model = get_embedding_model()
+        with _shared_components_lock:
+            store = _vector_stores.get(key)
+            if store is None:
+                store = Chroma(persist_directory=persist_directory, embedding_function=embedding_model)
+                _vector_stores[key] = store
+    return store
 
 
 class RAGBase:
@@ -49,20 +122,10 @@ class RAGBase:
     
     def __init__(self, persist_directory: str, database_name: str,
                  retrieval_tables: Optional[List[str]] = None, db_config: Optional[Dict] = None):
-        """初始化RAG基础组件"""
-        # 初始化嵌入模型
-        try:
-            self.embedding_model = DashScopeEmbeddings(
-                dashscope_api_key=ALIYUN_API_KEY,
-                model="text-embedding-v2"
-            )
-        except Exception as e:
-            print(f"DashScopeEmbeddings 初始化失败: {e}，使用 OpenAIEmbeddings 作为备选。")
-            self.embedding_model = OpenAIEmbeddings()
-        
-        self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-        
-        self.vector_store = Chroma(persist_directory=persist_directory, embedding_function=self.embedding_model)
+        """初始化RAG基础组件（嵌入模型、文本切分器和向量库为进程内共享）"""
+        self.embedding_model = get_embedding_model()
+        self.text_splitter = get_text_splitter()
+        self.vector_store = get_vector_store(persist_directory)
         self._persist_directory = persist_directory
         
         try:
@@ -81,11 +144,29 @@ class RAGBase:
         self.conversation_history: List[Dict] = []
         self.db_config = db_config
         self.db_connection = None
+        # 最近一次 query_database 各表的执行情况（状态、行数、耗时）
+        self.last_query_stats: Dict[str, Dict] = {}
     
     def _call_retriever(self, query: str) -> List[Document]:
-        """从向量库检索相关文档"""
+        """从向量库检索相关文档（结果按 (向量库, 归一化查询, k) 缓存，所有RAG实例共享）"""
         if not self.retriever:
             return []
+        persist_directory = getattr(self, "_persist_directory", None)
+        cache_key = (normalize_retrieval_query(query),
+                     (getattr(self.retriever, "search_kwargs", None) or {}).get("k"))
+        if persist_directory:
+            cached = get_retrieval_cache().get(vector_table(persist_directory), cache_key)
+            if cached is not None:
+                return list(cached)
+        docs = self._invoke_retriever(query)
+        if docs is None:
+            return []
+        if persist_directory:
+            get_retrieval_cache().set(vector_table(persist_directory), cache_key, list(docs))
+        return docs
+    
+    def _invoke_retriever(self, query: str) -> Optional[List[Document]]:
+        """调用检索器，出错时返回None（不缓存）"""
         try:
             if hasattr(self.retriever, "invoke"):
                 docs = self.retriever.invoke(query)
@@ -93,12 +174,12 @@ class RAGBase:
                     return docs
                 return list(docs)
             if hasattr(self.retriever, "get_relevant_documents") and callable(self.retriever.get_relevant_documents):
-                return self.retriever.get_relevant_documents(query)
+                return list(self.retriever.get_relevant_documents(query))
             if callable(self.retriever):
-                return self.retriever(query)
+                return list(self.retriever(query))
         except Exception as e:
             print(f"检索器调用错误: {e}")
-        return []
+        return None
     
     def _get_db_connection(self, user_id: Optional[int] = None):
         """获取数据库连接（使用用户账户）"""
@@ -180,307 +261,555 @@ class RAGBase:
         """清空对话历史"""
         self.conversation_history = []
     
-    def query_database(self, query: str, table_names: Optional[List[str]] = None) -> List[Dict]:
+    def query_database(self, query: str, table_names: Optional[List[str]] = None,
+                       compiled: Optional[CompiledQuery] = None) -> List[Dict]:
         """
         从指定数据库表中检索相关内容（统一实现）
         此方法已从RAG.py迁移至此，供所有RAG类继承使用
         
         :param query: 检索关键词
         :param table_names: 要查询的表名列表（默认使用初始化时的retrieval_tables）
+        :param compiled: 已编译的查询（如多模态检索把图片描述作为上下文编译），不提供时由query编译
         :return: 检索结果列表
         """
         if table_names is None:
             table_names = self.retrieval_tables
         
-        conn = self._get_db_connection()
-        if not conn:
-            print("[RAG] 数据库连接失败，无法检索")
-            return []
-        
         results = []
-        # 提取/截断关键词，避免整段描述导致 LIKE 失效
-        raw_q = query.strip()
-        # 简单按常见分隔符拆分，取前2~3段，最多取前30字
-        parts = []
-        for sep in ["。", "！", "？", "，", ",", ".", ";", "；", "\n"]:
-            if sep in raw_q:
-                parts = raw_q.split(sep)
-                break
-        if not parts:
-            parts = [raw_q]
-        keywords = []
-        for p in parts:
-            p = p.strip()
-            if not p:
+        # 把自由文本编译为少量检索词（节日名称、关键词、同义词），避免整段描述作为一个LIKE模式全表扫描
+        if compiled is None:
+            compiled = compile_query(query)
+        if not compiled:
+            print("[RAG] 查询为空，跳过数据库检索")
+            return results
+        print(f"[RAG] 查询词：{query[:100]}，检索词：{compiled.terms}，英文节日名称：{compiled.festivals_en}")
+        
+        table_names = list(dict.fromkeys(table_names))
+        self.last_query_stats = {}
+        table_results: Dict[str, List[Dict]] = {}
+        
+        # 图索引就绪且同时检索实体时，实体关系由检索到的实体在图索引中扩展得到，不再三表JOIN + LIKE
+        graph_index = get_entity_graph_index()
+        use_graph = (graph_index.ready and "entity_relationships" in table_names
+                     and "cultural_entities" in table_names)
+        sql_tables = [table for table in table_names if not (use_graph and table == "entity_relationships")]
+        
+        # 检索结果缓存（所有RAG实例共享，按表缓存）：命中的表不再查询
+        cache = get_retrieval_cache()
+        cache_key = (tuple(compiled.terms), tuple(compiled.festivals_en), RAG_TABLE_ROW_LIMIT)
+        query_tables = []
+        for table in sql_tables:
+            cached = cache.get(table, cache_key)
+            if cached is None:
+                query_tables.append(table)
+                continue
+            table_results[table] = [dict(row) for row in cached]
+            self.last_query_stats[table] = {'status': 'ok', 'rows': len(cached), 'elapsed_ms': 0.0, 'via': 'cache'}
+        
+        # 已由触发器同步到 search_documents 的表用一条全文索引查询完成检索
+        fanout_tables = query_tables
+        if query_tables and RAG_USE_SEARCH_DOCUMENTS != 'off':
+            table_results.update(self._query_search_documents(compiled, query_tables, RAG_TABLE_ROW_LIMIT))
+            fanout_tables = [table for table in query_tables if table not in table_results]
+        
+        # 其余表逐表查询并发执行（每个任务使用独立的连接池连接），总耗时取决于最慢的表而不是所有表之和；
+        # 超过总时限仍未完成的表直接跳过，返回已完成表的结果
+        deadline = time.monotonic() + RAG_QUERY_DEADLINE
+        time_limit_ms = int(RAG_QUERY_DEADLINE * 1000)
+        futures = {
+            table: _get_query_executor().submit(
+                self._query_table, table, compiled, RAG_TABLE_ROW_LIMIT, time_limit_ms
+            )
+            for table in fanout_tables
+        }
+        if futures:
+            wait(list(futures.values()), timeout=max(0.0, deadline - time.monotonic()))
+        
+        for table, future in futures.items():
+            if not future.done():
+                future.cancel()
+                print(f"[RAG] 表 {table} 查询超时（{RAG_QUERY_DEADLINE}秒），跳过")
+                self.last_query_stats[table] = {'status': 'timeout'}
                 continue
-            keywords.append(p[:30])  # 每段最多30字
-            if len(keywords) >= 3:
-                break
-        if not keywords:
-            keywords = [raw_q[:30]]
+            try:
+                rows, elapsed = future.result()
+                table_results[table] = rows
+                self.last_query_stats[table] = {
+                    'status': 'ok', 'rows': len(rows), 'elapsed_ms': round(elapsed * 1000, 1)
+                }
+            except Exception as e:
+                import traceback
+                print(f"[RAG] 表 {table} 查询错误: {e}")
+                print(f"[RAG] 查询错误堆栈: {traceback.format_exc()}")
+                self.last_query_stats[table] = {'status': 'error', 'error': str(e)}
+        
+        # 成功完成的查询写入缓存（超时和出错的表不缓存）
+        for table in query_tables:
+            if table in table_results:
+                cache.set(table, cache_key, [dict(row) for row in table_results[table]])
         
-        # 将查询词转换为英文节日名称（用于匹配title字段）
-        chinese_to_english_festival = _get_festival_name_utils()
-        query_en = chinese_to_english_festival(query) if chinese_to_english_festival else ""
-        print(f"[RAG] 查询词：{query}，英文转换：{query_en}")
+        if use_graph:
+            table_results["entity_relationships"] = self._expand_entity_relationships(
+                table_results.get("cultural_entities", []), RAG_TABLE_ROW_LIMIT
+            )
+        
+        # 按表的顺序合并结果，保持与串行查询时相同的结果顺序
+        for table in table_names:
+            results.extend(table_results.get(table, []))
         
+        print(f"[RAG] query_database返回 {len(results)} 条结果")
+        return results
+    
+    def _expand_entity_relationships(self, entity_results: List[Dict], limit: int) -> List[Dict]:
+        """从检索到的实体出发在图索引中扩展 RAG_GRAPH_HOPS 跳，转换为 entity_relationships 的结果格式"""
+        start = time.monotonic()
+        seeds = [row["id"] for row in entity_results[:RAG_GRAPH_SEEDS] if row.get("id") is not None]
+        neighbors = get_entity_graph_index().expand(seeds, hops=RAG_GRAPH_HOPS, limit=limit) if seeds else []
+        evidence = self._relationship_evidence([n["relationship_id"] for n in neighbors])
+        results = [{
+            "table": "entity_relationships",
+            "id": n["relationship_id"],
+            "resource_id": n["relationship_id"],
+            "title": f"{n['source_entity']} - {n['relationship_type']} - {n['target_entity']}",
+            # 与逐表查询一致使用关系证据；取不到证据时退化为关联说明
+            "content": evidence.get(n["relationship_id"])
+                       or f"{n['via_name']}的{n['hop']}跳关联实体：{n['entity_name']}"
+                       + (f"（{n['entity_type']}）" if n['entity_type'] else ""),
+            "source": "",
+            "relationship_type": n["relationship_type"],
+            "entity_id": n["id"],
+            "hop": n["hop"],
+        } for n in neighbors]
+        self.last_query_stats["entity_relationships"] = {
+            'status': 'ok', 'rows': len(results),
+            'elapsed_ms': round((time.monotonic() - start) * 1000, 1), 'via': 'graph_index'
+        }
+        return results
+    
+    def _relationship_evidence(self, relationship_ids: List[int]) -> Dict[int, str]:
+        """按关系ID一次取回图扩展结果的 relationship_evidence（图索引只保存关系ID，不常驻证据文本）"""
+        ids = list(dict.fromkeys(relationship_ids))
+        if not ids:
+            return {}
+        try:
+            conn = self._get_query_connection()
+        except Exception as e:
+            print(f"[RAG] 读取关系证据失败: {e}")
+            return {}
         try:
             with conn.cursor() as cursor:
-                for table in table_names:
-                    if table == "cultural_resources":
-                        # 改进查询：同时搜索中英文，并解析JSON字段
-                        sql = """
-                            SELECT id, title, resource_type, content_feature_data, source_from, source_url
-                            FROM cultural_resources
-                            WHERE title LIKE %s 
-                               OR title LIKE %s
-                               OR content_feature_data LIKE %s
-                               OR JSON_EXTRACT(content_feature_data, '$.title') LIKE %s
-                               OR JSON_EXTRACT(content_feature_data, '$.text') LIKE %s
-                               OR JSON_EXTRACT(content_feature_data, '$.meta.festival_names') LIKE %s
-                        """
-                        pattern_cn = f"%{query}%"
-                        pattern_en = f"%{query_en}%" if query_en else pattern_cn
-                        cursor.execute(sql, (pattern_cn, pattern_en, pattern_cn, pattern_cn, pattern_cn, pattern_cn))
-                        rows = cursor.fetchall()
-                        for row in rows:
-                            # 解析content_feature_data JSON字段
-                            content_text = ""
-                            try:
-                                content_data = json.loads(row.get("content_feature_data", "{}"))
-                                if isinstance(content_data, dict):
-                                    content_text = content_data.get("text", "") or content_data.get("title", "")
-                                else:
-                                    content_text = str(content_data)
-                            except:
-                                content_text = str(row.get("content_feature_data", ""))
-                            
-                            results.append({
-                                "table": "cultural_resources",
-                                "id": row.get("id"),
-                                "resource_id": row.get("id"),  # 添加resource_id字段
-                                "title": row.get("title", ""),
-                                "content": content_text[:2000] if content_text else "",
-                                "source": row.get("source_from", ""),
-                                "url": row.get("source_url", "")
-                            })
-                    
-                    elif table == "cultural_entities":
-                        sql = """
-                            SELECT id, entity_name, entity_type, description, source, 
-                                   period_era, cultural_region, 
-                                   style_features, cultural_value, related_images_url, digital_resource_link
-                            FROM cultural_entities
-                            WHERE entity_name LIKE %s 
-                               OR description LIKE %s 
-                               OR entity_type LIKE %s
-                               OR source LIKE %s
-                               OR period_era LIKE %s
-                               OR cultural_region LIKE %s
-                               OR style_features LIKE %s
-                               OR cultural_value LIKE %s
-                        """
-                        pattern = f"%{query}%"
-                        cursor.execute(sql, (pattern, pattern, pattern, pattern, pattern, pattern, pattern, pattern))
-                        rows = cursor.fetchall()
-                        for row in rows:
-                            content_parts = []
-                            if row.get("description"):
-                                content_parts.append(f"描述：{row.get('description')}")
-                            if row.get("cultural_value"):
-                                content_parts.append(f"文化价值：{row.get('cultural_value')}")
-                            if row.get("period_era"):
-                                content_parts.append(f"时期：{row.get('period_era')}")
-                            if row.get("cultural_region"):
-                                content_parts.append(f"文化区域：{row.get('cultural_region')}")
-                            if row.get("style_features"):
-                                content_parts.append(f"风格特征：{row.get('style_features')}")
-                            
-                            results.append({
-                                "table": "cultural_entities",
-                                "id": row.get("id"),
-                                "resource_id": row.get("id"),  # 添加resource_id字段
-                                "title": row.get("entity_name", ""),
-                                "content": "；".join(content_parts) if content_parts else "",
-                                "source": row.get("source", ""),
-                                "entity_type": row.get("entity_type", "")
-                            })
-                    
-                    elif table == "entity_relationships":
-                        sql = """
-                            SELECT er.id, er.relationship_type, er.relationship_evidence,
-                                   ce1.entity_name as source_entity, ce2.entity_name as target_entity
-                            FROM entity_relationships er
-                            JOIN cultural_entities ce1 ON er.source_entity_id = ce1.id
-                            JOIN cultural_entities ce2 ON er.target_entity_id = ce2.id
-                            WHERE ce1.entity_name LIKE %s OR ce2.entity_name LIKE %s 
-                                  OR er.relationship_type LIKE %s
-                        """
-                        pattern = f"%{query}%"
-                        cursor.execute(sql, (pattern, pattern, pattern))
-                        rows = cursor.fetchall()
-                        for row in rows:
-                            results.append({
-                                "table": "entity_relationships",
-                                "id": row.get("id"),
-                                "resource_id": row.get("id"),  # 添加resource_id字段
-                                "title": f"{row.get('source_entity')} - {row.get('relationship_type')} - {row.get('target_entity')}",
-                                "content": row.get("relationship_evidence", ""),
-                                "source": "",
-                                "relationship_type": row.get("relationship_type", "")
-                            })
-                    
-                    elif table == "AIGC_cultural_resources":
-                        # 改进查询：同时搜索中英文，并解析JSON字段
-                        sql = """
-                            SELECT id, title, resource_type, content_feature_data, source_from
-                            FROM AIGC_cultural_resources
-                            WHERE title LIKE %s 
-                               OR title LIKE %s
-                               OR content_feature_data LIKE %s
-                               OR JSON_EXTRACT(content_feature_data, '$.title') LIKE %s
-                               OR JSON_EXTRACT(content_feature_data, '$.text') LIKE %s
-                               OR JSON_EXTRACT(content_feature_data, '$.meta.festival_names') LIKE %s
-                        """
-                        pattern_cn = f"%{query}%"
-                        pattern_en = f"%{query_en}%" if query_en else pattern_cn
-                        cursor.execute(sql, (pattern_cn, pattern_en, pattern_cn, pattern_cn, pattern_cn, pattern_cn))
-                        rows = cursor.fetchall()
-                        for row in rows:
-                            # 解析content_feature_data JSON字段
-                            content_text = ""
-                            try:
-                                content_data = json.loads(row.get("content_feature_data", "{}"))
-                                if isinstance(content_data, dict):
-                                    content_text = content_data.get("text", "") or content_data.get("title", "")
-                                else:
-                                    content_text = str(content_data)
-                            except:
-                                content_text = str(row.get("content_feature_data", ""))
-                            
-                            results.append({
-                                "table": "AIGC_cultural_resources",
-                                "id": row.get("id"),
-                                "resource_id": row.get("id"),  # 添加resource_id字段
-                                "title": row.get("title", ""),
-                                "content": content_text[:2000] if content_text else "",
-                                "source": row.get("source_from", ""),
-                                "url": ""
-                            })
-                    
-                    elif table == "AIGC_graph":
-                        sql = """
-                            SELECT id, file_name, storage_path, dimensions, tags
-                            FROM AIGC_graph
-                            WHERE file_name LIKE %s OR JSON_SEARCH(tags, 'one', %s) IS NOT NULL
-                        """
-                        pattern = f"%{query}%"
-                        cursor.execute(sql, (pattern, pattern))
-                        rows = cursor.fetchall()
-                        for row in rows:
-                            storage_path = row.get("storage_path", "")
-                            # 构建完整路径：项目根目录的AIGC_graph文件夹 + storage_path（使用相对路径）
-                            current_file_dir = os.path.dirname(os.path.realpath(__file__))
-                            base_dir = os.path.dirname(current_file_dir)
-                            full_path = os.path.join(base_dir, "AIGC_graph", storage_path) if storage_path else ""
-                            results.append({
-                                "table": "AIGC_graph",
-                                "id": row.get("id"),
-                                "title": row.get("file_name", ""),
-                                "content": f"图片路径：{full_path}，尺寸：{row.get('dimensions', '未知')}",
-                                "source": "AIGC生成",
-                                "url": full_path,
-                                "image_path": full_path
-                            })
-                    
-                    elif table == "crawled_images":
-                        sql = """
-                            SELECT ci.id, ci.file_name, ci.storage_path, ci.dimensions, ci.tags,
-                                   ci.resource_id, ci.entity_id, ci.festival_name,
-                                   cr.title as resource_title, ce.entity_name
-                            FROM crawled_images ci
-                            LEFT JOIN cultural_resources cr ON ci.resource_id = cr.id
-                            LEFT JOIN cultural_entities ce ON ci.entity_id = ce.id
-                            WHERE ci.file_name LIKE %s 
-                               OR JSON_SEARCH(ci.tags, 'one', %s) IS NOT NULL
-                               OR ci.festival_name LIKE %s
-                               OR cr.title LIKE %s
-                               OR ce.entity_name LIKE %s
-                        """
-                        pattern = f"%{query}%"
-                        cursor.execute(sql, (pattern, pattern, pattern, pattern, pattern))
-                        rows = cursor.fetchall()
-                        for row in rows:
-                            storage_path = row.get("storage_path", "")
-                            # 构建完整路径：项目根目录的crawled_images文件夹 + storage_path（使用相对路径）
-                            current_file_dir = os.path.dirname(os.path.realpath(__file__))
-                            base_dir = os.path.dirname(current_file_dir)
-                            full_path = os.path.join(base_dir, "crawled_images", storage_path) if storage_path else ""
-                            # 如果storage_path已经是完整路径，直接使用
-                            if not os.path.exists(full_path) and storage_path:
-                                # 尝试直接使用storage_path
-                                if os.path.exists(storage_path):
-                                    full_path = storage_path
-                                else:
-                                    # 尝试从项目根目录查找
-                                    full_path = os.path.join(base_dir, storage_path)
-                            
-                            results.append({
-                                "table": "crawled_images",
-                                "id": row.get("id"),
-                                "title": row.get("file_name", ""),
-                                "content": f"图片路径：{full_path}，尺寸：{row.get('dimensions', '未知')}，关联资源：{row.get('resource_title', '')}，关联实体：{row.get('entity_name', '')}",
-                                "source": "爬虫抓取",
-                                "url": full_path,
-                                "image_path": full_path,
-                                "resource_id": row.get("resource_id"),
-                                "entity_id": row.get("entity_id")
-                            })
-                    
-                    elif table == "cultural_resources_from_user":
-                        # 用户上传资源表查询：同时搜索中英文，并解析JSON字段
-                        sql = """
-                            SELECT id, title, resource_type, content_feature_data, source_from, storage_path
-                            FROM cultural_resources_from_user
-                            WHERE title LIKE %s 
-                               OR title LIKE %s
-                               OR content_feature_data LIKE %s
-                               OR JSON_EXTRACT(content_feature_data, '$.title') LIKE %s
-                               OR JSON_EXTRACT(content_feature_data, '$.text') LIKE %s
-                               OR JSON_EXTRACT(content_feature_data, '$.meta.festival_names') LIKE %s
-                        """
-                        pattern_cn = f"%{query}%"
-                        pattern_en = f"%{query_en}%" if query_en else pattern_cn
-                        cursor.execute(sql, (pattern_cn, pattern_en, pattern_cn, pattern_cn, pattern_cn, pattern_cn))
-                        rows = cursor.fetchall()
-                        for row in rows:
-                            # 解析content_feature_data JSON字段
-                            content_text = ""
-                            try:
-                                content_data = json.loads(row.get("content_feature_data", "{}"))
-                                if isinstance(content_data, dict):
-                                    content_text = content_data.get("text", "") or content_data.get("title", "") or content_data.get("content_full", "")
-                                else:
-                                    content_text = str(content_data)
-                            except:
-                                content_text = str(row.get("content_feature_data", ""))
-                            
-                            results.append({
-                                "table": "cultural_resources_from_user",
-                                "id": row.get("id"),
-                                "resource_id": row.get("id"),  # 添加resource_id字段
-                                "title": row.get("title", ""),
-                                "content": content_text[:2000] if content_text else "",
-                                "source": row.get("source_from", "用户上传"),
-                                "url": "",
-                                "storage_path": row.get("storage_path", "")
-                            })
+                cursor.execute(
+                    f"SELECT id, relationship_evidence FROM entity_relationships "
+                    f"WHERE id IN ({', '.join(['%s'] * len(ids))})",
+                    ids
+                )
+                return {int(row["id"]): row.get("relationship_evidence") or "" for row in cursor.fetchall()}
+        except Exception as e:
+            print(f"[RAG] 读取关系证据失败: {e}")
+            return {}
+        finally:
+            conn.close()
+    
+    def _query_search_documents(self, compiled: CompiledQuery, table_names: List[str],
+                                limit: int) -> Dict[str, List[Dict]]:
+        """
+        在统一检索文档表 search_documents 中检索已同步的表
         
+        :return: 表名 -> 检索结果列表；只包含通过 search_documents 完成检索的表，
+                 未同步的表、查询过短或查询失败时由调用方回退到逐表查询
+        """
+        match_expression = compiled.match_expression()
+        if not match_expression:
+            return {}
+        start = time.monotonic()
+        try:
+            conn = self._get_query_connection()
+        except Exception as e:
+            print(f"[RAG] search_documents 检索失败，回退到逐表查询: {e}")
+            return {}
+        try:
+            with conn.cursor() as cursor:
+                synced = get_synced_tables(cursor)
+                tables = [table for table in table_names if table in synced]
+                if not tables:
+                    return {}
+                limited = self._set_execution_time(cursor, int(RAG_QUERY_DEADLINE * 1000))
+                try:
+                    rows = search_documents_search(cursor, match_expression, tables, limit)
+                finally:
+                    if limited:
+                        self._set_execution_time(cursor, 0)
         except Exception as e:
-            import traceback
-            print(f"[RAG] 数据库查询错误: {e}")
-            print(f"[RAG] 查询错误堆栈: {traceback.format_exc()}")
+            print(f"[RAG] search_documents 检索失败，回退到逐表查询: {e}")
+            return {}
+        finally:
+            conn.close()
         
-        print(f"[RAG] query_database返回 {len(results)} 条结果")
+        elapsed_ms = round((time.monotonic() - start) * 1000, 1)
+        table_results: Dict[str, List[Dict]] = {table: [] for table in tables}
+        for row in rows:
+            table_results[row['source_table']].append(self._search_document_to_result(row))
+        for table in tables:
+            self.last_query_stats[table] = {
+                'status': 'ok', 'rows': len(table_results[table]),
+                'elapsed_ms': elapsed_ms, 'via': 'search_documents'
+            }
+        return table_results
+    
+    @staticmethod
+    def _image_full_path(table: str, storage_path: str) -> str:
+        """图片表 storage_path -> 完整路径（项目根目录下的 AIGC_graph / crawled_images 文件夹）"""
+        if not storage_path:
+            return ""
+        full_path = os.path.join(project_root, table, storage_path)
+        if table == "crawled_images" and not os.path.exists(full_path):
+            # 如果storage_path已经是完整路径，直接使用；否则尝试从项目根目录查找
+            full_path = storage_path if os.path.exists(storage_path) else os.path.join(project_root, storage_path)
+        return full_path
+    
+    def _search_document_to_result(self, row: Dict) -> Dict:
+        """把 search_documents 的行转换为与逐表查询相同的结果格式"""
+        table = row["source_table"]
+        result = {
+            "table": table,
+            "id": row.get("source_id"),
+            "title": row.get("title") or "",
+            "content": (row.get("text") or "")[:2000],
+            "source": row.get("source") or "",
+        }
+        if table in ("cultural_resources", "AIGC_cultural_resources", "cultural_resources_from_user"):
+            result["resource_id"] = row.get("source_id")
+            result["url"] = (row.get("url") or "") if table == "cultural_resources" else ""
+            if table == "cultural_resources_from_user":
+                result["storage_path"] = row.get("image_path") or ""
+        elif table == "cultural_entities":
+            result["resource_id"] = row.get("source_id")
+            result["entity_type"] = row.get("tags") or ""
+        elif table == "entity_relationships":
+            result["resource_id"] = row.get("source_id")
+            result["relationship_type"] = row.get("tags") or ""
+        elif table in ("AIGC_graph", "crawled_images"):
+            full_path = self._image_full_path(table, row.get("image_path") or "")
+            result["content"] = f"图片路径：{full_path}，{row.get('text') or ''}"
+            result["url"] = full_path
+            result["image_path"] = full_path
+            if table == "crawled_images":
+                result["resource_id"] = row.get("resource_id")
+                result["entity_id"] = row.get("entity_id")
+        return result
+    
+    def _get_query_connection(self):
+        """获取查询用的数据库连接（每个并发查询任务单独获取，用完归还连接池）"""
+        conn = get_user_db_connection()
+        if conn is None:
+            raise Exception("无法连接到数据库，请检查数据库配置")
+        return conn
+    
+    def _query_table(self, table: str, compiled: CompiledQuery, limit: int,
+                     time_limit_ms: int) -> Tuple[List[Dict], float]:
+        """
+        在单张表中检索（在线程池中执行）
+        
+        :return: (检索结果列表, 耗时秒数)
+        """
+        start = time.monotonic()
+        conn = self._get_query_connection()
+        try:
+            with conn.cursor() as cursor:
+                # 超过时限的查询由MySQL服务端终止，避免超时的慢查询继续占用连接
+                limited = self._set_execution_time(cursor, time_limit_ms)
+                try:
+                    return self._query_table_rows(cursor, table, compiled, limit), time.monotonic() - start
+                finally:
+                    if limited:
+                        self._set_execution_time(cursor, 0)
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def _set_execution_time(cursor, time_limit_ms: int) -> bool:
+        """设置会话级SELECT执行时限（MySQL 5.7.8+），不支持时返回False"""
+        try:
+            cursor.execute(f"SET SESSION MAX_EXECUTION_TIME = {int(time_limit_ms)}")
+            return True
+        except Exception:
+            return False
+    
+    def _query_resource_rows(self, cursor, table: str, compiled: CompiledQuery, limit: int) -> List[Dict]:
+        """
+        文化资源类表（cultural_resources、AIGC_cultural_resources、cultural_resources_from_user）的检索
+        已迁移 content_feature_data 生成列的表使用生成列上的全文索引，不再逐行解析JSON；
+        未迁移的表使用原来的 JSON_EXTRACT LIKE 查询
+        """
+        extra_columns = {
+            "cultural_resources": "source_from, source_url",
+            "AIGC_cultural_resources": "source_from",
+            # 用户上传表没有source_from列
+            "cultural_resources_from_user": "storage_path",
+        }[table]
+        if schema_registry.has_index(table, "idx_cf_search"):
+            match_expression = compiled.match_expression()
+            if match_expression:
+                where = "MATCH(title, cf_title, cf_text, cf_festival_names) AGAINST(%s IN BOOLEAN MODE)"
+                params = [match_expression]
+            else:
+                # 短于ngram词长的查询无法使用全文索引，仍在生成列上LIKE（不需要解析JSON）
+                where, params = compiled.like_predicate(
+                    ["title", "cf_title", "cf_text", "cf_festival_names"], english_columns=["title"]
+                )
+            # 用户上传表正文为空时从content_full回退，只有这张表需要读取原始JSON
+            if table == "cultural_resources_from_user":
+                extra_columns += ", IF(cf_text IS NULL OR cf_text = '', content_feature_data, NULL) AS content_feature_data"
+            cursor.execute(f"""
+                SELECT id, title, resource_type, cf_title, cf_text, {extra_columns}
+                FROM {table}
+                WHERE {where}
+                LIMIT %s
+            """, params + [limit])
+        else:
+            # 改进查询：同时搜索中英文，并解析JSON字段
+            where, params = compiled.like_predicate([
+                "title",
+                "content_feature_data",
+                "JSON_EXTRACT(content_feature_data, '$.title')",
+                "JSON_EXTRACT(content_feature_data, '$.text')",
+                "JSON_EXTRACT(content_feature_data, '$.meta.festival_names')",
+            ], english_columns=["title"])
+            cursor.execute(f"""
+                SELECT id, title, resource_type, content_feature_data, {extra_columns}
+                FROM {table}
+                WHERE {where}
+                LIMIT %s
+            """, params + [limit])
+        
+        results = []
+        for row in cursor.fetchall():
+            if "cf_text" in row:
+                content_text = row.get("cf_text") or ""
+                if not content_text and row.get("content_feature_data"):
+                    content_text = self._parse_content_text(row.get("content_feature_data"), table)
+                content_text = content_text or row.get("cf_title") or ""
+            else:
+                content_text = self._parse_content_text(row.get("content_feature_data"), table)
+            
+            result = {
+                "table": table,
+                "id": row.get("id"),
+                "resource_id": row.get("id"),  # 添加resource_id字段
+                "title": row.get("title", ""),
+                "content": content_text[:2000] if content_text else "",
+                "source": row.get("source_from", "用户上传" if table == "cultural_resources_from_user" else ""),
+                "url": row.get("source_url", "") if table == "cultural_resources" else ""
+            }
+            if table == "cultural_resources_from_user":
+                result["storage_path"] = row.get("storage_path", "")
+            results.append(result)
+        return results
+    
+    @staticmethod
+    def _parse_content_text(raw, table: str) -> str:
+        """解析content_feature_data JSON字段，取正文（没有正文时取标题）"""
+        try:
+            content_data = json.loads(raw or "{}")
+            if isinstance(content_data, dict):
+                content_text = content_data.get("text", "") or content_data.get("title", "")
+                if table == "cultural_resources_from_user":
+                    content_text = content_text or content_data.get("content_full", "")
+                return content_text
+            return str(content_data)
+        except:
+            return str(raw or "")
+    
+    @staticmethod
+    def _tag_match_union(image_table: str, compiled: CompiledQuery) -> Tuple[str, List[str]]:
+        """每个检索词一条标签前缀匹配子查询，UNION 合并（结果列为image_id）"""
+        terms = compiled.like_terms()
+        sql = "\n                        UNION\n                        ".join(
+            tag_match_subquery(image_table) for _ in terms
+        )
+        return sql, [tag_prefix_pattern(term) for term in terms]
+    
+    @staticmethod
+    def _json_tag_predicate(column: str, compiled: CompiledQuery) -> Tuple[str, List[str]]:
+        """未建立 image_tags 时在JSON标签列上逐个检索词 JSON_SEARCH"""
+        terms = compiled.like_terms()
+        sql = " OR ".join(f"JSON_SEARCH({column}, 'one', %s) IS NOT NULL" for _ in terms)
+        return f"({sql})", [f"%{escape_like(term)}%" for term in terms]
+    
+    def _query_table_rows(self, cursor, table: str, compiled: CompiledQuery, limit: int) -> List[Dict]:
+        """
+        执行单张表的检索SQL并转换为统一的结果格式
+        每张表的条件由编译后的检索词生成（全文索引MATCH或有上限的OR LIKE）
+        
+        :param limit: 单表最多返回的行数
+        """
+        results = []
+        if table in RESOURCE_TABLES:
+            results = self._query_resource_rows(cursor, table, compiled, limit)
+
+        elif table == "cultural_entities":
+            match_expression = compiled.match_expression()
+            if match_expression and schema_registry.has_index("cultural_entities", "idx_ce_search"):
+                # 名称和描述上有全文索引时直接MATCH，不再逐行LIKE
+                where = "MATCH(entity_name, description) AGAINST(%s IN BOOLEAN MODE)"
+                params = [match_expression]
+            else:
+                where, params = compiled.like_predicate([
+                    "entity_name", "description", "entity_type", "source",
+                    "period_era", "cultural_region", "style_features", "cultural_value",
+                ])
+            sql = f"""
+                SELECT id, entity_name, entity_type, description, source, 
+                       period_era, cultural_region, 
+                       style_features, cultural_value, related_images_url, digital_resource_link
+                FROM cultural_entities
+                WHERE {where}
+                LIMIT %s
+            """
+            cursor.execute(sql, params + [limit])
+            rows = cursor.fetchall()
+            for row in rows:
+                content_parts = []
+                if row.get("description"):
+                    content_parts.append(f"描述：{row.get('description')}")
+                if row.get("cultural_value"):
+                    content_parts.append(f"文化价值：{row.get('cultural_value')}")
+                if row.get("period_era"):
+                    content_parts.append(f"时期：{row.get('period_era')}")
+                if row.get("cultural_region"):
+                    content_parts.append(f"文化区域：{row.get('cultural_region')}")
+                if row.get("style_features"):
+                    content_parts.append(f"风格特征：{row.get('style_features')}")
+
+                results.append({
+                    "table": "cultural_entities",
+                    "id": row.get("id"),
+                    "resource_id": row.get("id"),  # 添加resource_id字段
+                    "title": row.get("entity_name", ""),
+                    "content": "；".join(content_parts) if content_parts else "",
+                    "source": row.get("source", ""),
+                    "entity_type": row.get("entity_type", "")
+                })
+
+        elif table == "entity_relationships":
+            where, params = compiled.like_predicate(
+                ["ce1.entity_name", "ce2.entity_name", "er.relationship_type"]
+            )
+            sql = f"""
+                SELECT er.id, er.relationship_type, er.relationship_evidence,
+                       ce1.entity_name as source_entity, ce2.entity_name as target_entity
+                FROM entity_relationships er
+                JOIN cultural_entities ce1 ON er.source_entity_id = ce1.id
+                JOIN cultural_entities ce2 ON er.target_entity_id = ce2.id
+                WHERE {where}
+                LIMIT %s
+            """
+            cursor.execute(sql, params + [limit])
+            rows = cursor.fetchall()
+            for row in rows:
+                results.append({
+                    "table": "entity_relationships",
+                    "id": row.get("id"),
+                    "resource_id": row.get("id"),  # 添加resource_id字段
+                    "title": f"{row.get('source_entity')} - {row.get('relationship_type')} - {row.get('target_entity')}",
+                    "content": row.get("relationship_evidence", ""),
+                    "source": "",
+                    "relationship_type": row.get("relationship_type", "")
+                })
+
+        elif table == "AIGC_graph":
+            file_where, file_params = compiled.like_predicate(["file_name"])
+            if schema_registry.has_table("image_tags"):
+                # 标签匹配走 image_tags 的索引（每个检索词一次索引范围扫描），与文件名匹配的图片ID合并后再关联图片表
+                tag_sql, tag_params = self._tag_match_union("AIGC_graph", compiled)
+                cursor.execute(f"""
+                    SELECT g.id, g.file_name, g.storage_path, g.dimensions, g.tags
+                    FROM AIGC_graph g
+                    JOIN (
+                        {tag_sql}
+                        UNION
+                        SELECT id FROM AIGC_graph WHERE {file_where}
+                    ) m ON m.image_id = g.id
+                    LIMIT %s
+                """, tag_params + file_params + [limit])
+            else:
+                tag_where, tag_params = self._json_tag_predicate("tags", compiled)
+                sql = f"""
+                    SELECT id, file_name, storage_path, dimensions, tags
+                    FROM AIGC_graph
+                    WHERE {file_where} OR {tag_where}
+                    LIMIT %s
+                """
+                cursor.execute(sql, file_params + tag_params + [limit])
+            rows = cursor.fetchall()
+            for row in rows:
+                full_path = self._image_full_path("AIGC_graph", row.get("storage_path", ""))
+                results.append({
+                    "table": "AIGC_graph",
+                    "id": row.get("id"),
+                    "title": row.get("file_name", ""),
+                    "content": f"图片路径：{full_path}，尺寸：{row.get('dimensions', '未知')}",
+                    "source": "AIGC生成",
+                    "url": full_path,
+                    "image_path": full_path
+                })
+
+        elif table == "crawled_images":
+            if schema_registry.has_table("image_tags"):
+                # 标签匹配走 image_tags 的索引，与其他条件匹配的图片ID合并后再关联图片表
+                tag_sql, tag_params = self._tag_match_union("crawled_images", compiled)
+                where, params = compiled.like_predicate(
+                    ["ci2.file_name", "ci2.festival_name", "cr2.title", "ce2.entity_name"]
+                )
+                cursor.execute(f"""
+                    SELECT ci.id, ci.file_name, ci.storage_path, ci.dimensions, ci.tags,
+                           ci.resource_id, ci.entity_id, ci.festival_name,
+                           cr.title as resource_title, ce.entity_name
+                    FROM crawled_images ci
+                    JOIN (
+                        {tag_sql}
+                        UNION
+                        SELECT ci2.id
+                        FROM crawled_images ci2
+                        LEFT JOIN cultural_resources cr2 ON ci2.resource_id = cr2.id
+                        LEFT JOIN cultural_entities ce2 ON ci2.entity_id = ce2.id
+                        WHERE {where}
+                    ) m ON m.image_id = ci.id
+                    LEFT JOIN cultural_resources cr ON ci.resource_id = cr.id
+                    LEFT JOIN cultural_entities ce ON ci.entity_id = ce.id
+                    LIMIT %s
+                """, tag_params + params + [limit])
+            else:
+                where, params = compiled.like_predicate(
+                    ["ci.file_name", "ci.festival_name", "cr.title", "ce.entity_name"]
+                )
+                tag_where, tag_params = self._json_tag_predicate("ci.tags", compiled)
+                sql = f"""
+                    SELECT ci.id, ci.file_name, ci.storage_path, ci.dimensions, ci.tags,
+                           ci.resource_id, ci.entity_id, ci.festival_name,
+                           cr.title as resource_title, ce.entity_name
+                    FROM crawled_images ci
+                    LEFT JOIN cultural_resources cr ON ci.resource_id = cr.id
+                    LEFT JOIN cultural_entities ce ON ci.entity_id = ce.id
+                    WHERE {where} OR {tag_where}
+                    LIMIT %s
+                """
+                cursor.execute(sql, params + tag_params + [limit])
+            rows = cursor.fetchall()
+            for row in rows:
+                full_path = self._image_full_path("crawled_images", row.get("storage_path", ""))
+
+                results.append({
+                    "table": "crawled_images",
+                    "id": row.get("id"),
+                    "title": row.get("file_name", ""),
+                    "content": f"图片路径：{full_path}，尺寸：{row.get('dimensions', '未知')}，关联资源：{row.get('resource_title', '')}，关联实体：{row.get('entity_name', '')}",
+                    "source": "爬虫抓取",
+                    "url": full_path,
+                    "image_path": full_path,
+                    "resource_id": row.get("resource_id"),
+                    "entity_id": row.get("entity_id")
+                })
+
         return results
 
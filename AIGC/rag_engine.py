@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+进程级共享的RAG引擎与按用户的轻量会话
+原先每个用户各创建一套 CulturalResourceRAG / ImageAIGC（各自的嵌入客户端、Chroma句柄、文本切分器、提示词解析器），
+并永久保存在字典中，内存随活跃用户线性增长，每个用户的首个请求都要承担冷启动开销。这里拆分为：
+- RAGEngine：进程内只构建一次文本RAG和图像AIGC实例，所有用户共享
+- UserSession：每个用户只保存对话历史、偏好等轻量状态
+- UserSessionStore：线程安全的 LRU + 空闲TTL 会话存储，会话被淘汰或过期时调用淘汰回调
+- TextRAGSession / ImageAIGCSession：把共享实例绑定到某个用户的会话，调用方式与原实例一致
+"""
+import os
+import sys
+import time
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+# 添加项目根目录和scripts目录到路径
+current_dir = os.path.dirname(os.path.realpath(__file__))
+project_root = os.path.dirname(current_dir)
+scripts_dir = os.path.join(project_root, 'scripts')
+sys.path.insert(0, project_root)
+sys.path.insert(0, scripts_dir)
+
+from ttl_cache import TTLCache
+
+# 同时保留的用户会话数、会话空闲过期时间（秒）、过期会话的清理间隔（秒）
+RAG_SESSION_MAXSIZE = int(os.getenv("RAG_SESSION_MAXSIZE", "1000"))
+RAG_SESSION_TTL = float(os.getenv("RAG_SESSION_TTL", "1800"))
+RAG_SESSION_SWEEP_INTERVAL = float(os.getenv("RAG_SESSION_SWEEP_INTERVAL", "60"))
+
+
+class UserSession:
+    """单个用户的轻量会话状态（不持有任何模型或向量库）"""
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        # 文本问答和图像生成各自的对话历史，由共享实例原地读写
+        self.text_history: List[Dict] = []
+        self.image_history: List[Dict] = []
+        self.preferences: Dict[str, Any] = {}
+        self.created_at = time.time()
+        self.last_active = self.created_at
+
+    def clear_history(self):
+        """清空该用户的全部对话历史"""
+        del self.text_history[:]
+        del self.image_history[:]
+
+
+class UserSessionStore:
+    """线程安全的用户会话存储：LRU + 空闲TTL，会话淘汰时调用 on_evict(user_id, session, reason)"""
+
+    def __init__(self, maxsize: int = RAG_SESSION_MAXSIZE, ttl: float = RAG_SESSION_TTL,
+                 on_evict: Optional[Callable[[int, UserSession, str], None]] = None,
+                 sweep_interval: float = RAG_SESSION_SWEEP_INTERVAL):
+        self._sessions = TTLCache(maxsize=maxsize, ttl=ttl, name='rag_sessions', on_evict=self._evicted)
+        self._on_evict = on_evict
+        self._sweep_interval = sweep_interval
+        self._last_sweep = time.monotonic()
+        # 创建锁与统计锁分开：创建会话时写入可能触发LRU淘汰，淘汰回调需要更新统计
+        self._create_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evicted: Dict[str, int] = {'lru': 0, 'expired': 0}
+
+    def _evicted(self, user_id: int, session: UserSession, reason: str):
+        with self._lock:
+            self.evicted[reason] = self.evicted.get(reason, 0) + 1
+        if self._on_evict is not None:
+            self._on_evict(user_id, session, reason)
+
+    def _sweep(self):
+        """定期清理过期会话（TTLCache 只在读取时惰性过期，长期不再访问的用户需要主动清理）"""
+        now = time.monotonic()
+        if now - self._last_sweep < self._sweep_interval:
+            return
+        self._last_sweep = now
+        self._sessions.purge_expired()
+
+    def get(self, user_id: int) -> UserSession:
+        """获取用户会话，不存在或已过期时创建；每次访问重新计算空闲过期时间"""
+        self._sweep()
+        session = self._sessions.get(user_id)
+        if session is None:
+            with self._create_lock:
+                # 同一用户的并发首个请求只创建一个会话
+                session = self._sessions.get(user_id)
+                if session is None:
+                    session = UserSession(user_id)
+                    with self._lock:
+                        self.created += 1
+                    self._sessions.set(user_id, session)
+                    return session
+        session.last_active = time.time()
+        self._sessions.set(user_id, session)
+        return session
+
+    def peek(self, user_id: int) -> Optional[UserSession]:
+        """查看用户会话，不创建也不刷新过期时间"""
+        return self._sessions.get(user_id)
+
+    def pop(self, user_id: int) -> Optional[UserSession]:
+        """主动删除用户会话（如退出登录），不触发淘汰回调"""
+        return self._sessions.pop(user_id)
+
+    def clear(self):
+        self._sessions.clear()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def stats(self) -> Dict:
+        stats = self._sessions.stats()
+        with self._lock:
+            stats['created'] = self.created
+            stats['evicted'] = dict(self.evicted)
+        return stats
+
+
+class _SessionBoundSystem:
+    """把共享实例绑定到用户会话：对话历史读写会话自己的列表，其余属性和方法直接委托给共享实例"""
+
+    def __init__(self, system, session: UserSession):
+        self._system = system
+        self.session = session
+
+    def __getattr__(self, name):
+        return getattr(self._system, name)
+
+
+class TextRAGSession(_SessionBoundSystem):
+    """绑定用户会话的 CulturalResourceRAG"""
+
+    @property
+    def conversation_history(self) -> List[Dict]:
+        return self.session.text_history
+
+    def ask(self, query: str, image_paths: Optional[List[str]] = None,
+            session_id: Optional[int] = None, use_history: bool = True) -> Dict:
+        return self._system.ask(query, image_paths=image_paths, session_id=session_id,
+                                use_history=use_history, conversation_history=self.session.text_history)
+
+    def ask_stream(self, query: str, image_paths: Optional[List[str]] = None,
+                   session_id: Optional[int] = None, use_history: bool = True):
+        return self._system.ask_stream(query, image_paths=image_paths, session_id=session_id,
+                                       use_history=use_history, conversation_history=self.session.text_history)
+
+    def clear_conversation_history(self):
+        del self.session.text_history[:]
+
+
+class ImageAIGCSession(_SessionBoundSystem):
+    """绑定用户会话的 ImageAIGC"""
+
+    @property
+    def conversation_history(self) -> List[Dict]:
+        return self.session.image_history
+
+    def generate_image(self, *args, **kwargs) -> str:
+        kwargs['conversation_history'] = self.session.image_history
+        return self._system.generate_image(*args, **kwargs)
+
+    def clear_conversation_history(self):
+        del self.session.image_history[:]
+
+
+class RAGEngine:
+    """进程级共享的RAG引擎：文本RAG和图像AIGC实例各构建一次，按用户只保留轻量会话"""
+
+    def __init__(self, text_factory: Callable[[], Any], image_factory: Callable[[], Any],
+                 sessions: Optional[UserSessionStore] = None):
+        """
+        Args:
+            text_factory: 构建共享 CulturalResourceRAG 的函数，失败时返回None（下次请求重试）
+            image_factory: 构建共享 ImageAIGC 的函数，失败时返回None
+            sessions: 用户会话存储，默认按环境变量配置创建
+        """
+        self._text_factory = text_factory
+        self._image_factory = image_factory
+        self._text_system = None
+        self._image_system = None
+        self._text_lock = threading.Lock()
+        self._image_lock = threading.Lock()
+        self.sessions = sessions if sessions is not None else UserSessionStore(on_evict=self._session_evicted)
+        self.init_seconds: Dict[str, float] = {}
+
+    @staticmethod
+    def _session_evicted(user_id: int, session: UserSession, reason: str):
+        idle = round(time.time() - session.last_active)
+        print(f"[RAG会话] 回收用户 {user_id} 的会话（{reason}，空闲 {idle} 秒，"
+              f"文本历史 {len(session.text_history)} 条，图像历史 {len(session.image_history)} 条）")
+
+    def _build(self, name: str, factory: Callable[[], Any]):
+        start = time.time()
+        system = factory()
+        if system is not None:
+            self.init_seconds[name] = round(time.time() - start, 3)
+            print(f"[RAG引擎] 共享{name}实例初始化完成，耗时 {self.init_seconds[name]} 秒")
+        return system
+
+    def text_system(self):
+        """获取共享的文本RAG实例（首次调用时构建）"""
+        if self._text_system is None:
+            with self._text_lock:
+                if self._text_system is None:
+                    self._text_system = self._build('text', self._text_factory)
+        return self._text_system
+
+    def image_system(self):
+        """获取共享的图像AIGC实例（首次调用时构建）"""
+        if self._image_system is None:
+            with self._image_lock:
+                if self._image_system is None:
+                    self._image_system = self._build('image', self._image_factory)
+        return self._image_system
+
+    def text_session(self, user_id: int) -> Optional[TextRAGSession]:
+        """获取绑定用户会话的文本RAG，引擎不可用时返回None"""
+        system = self.text_system()
+        if system is None:
+            return None
+        return TextRAGSession(system, self.sessions.get(user_id))
+
+    def image_session(self, user_id: int) -> Optional[ImageAIGCSession]:
+        """获取绑定用户会话的图像AIGC，引擎不可用时返回None"""
+        system = self.image_system()
+        if system is None:
+            return None
+        return ImageAIGCSession(system, self.sessions.get(user_id))
+
+    def stats(self) -> Dict:
+        return {
+            'text_initialized': self._text_system is not None,
+            'image_initialized': self._image_system is not None,
+            'init_seconds': dict(self.init_seconds),
+            'sessions': self.sessions.stats(),
+        }
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+RAG自反思后台任务与结果存储
+CulturalResourceRAG.ask 的自反思是一次完整的LLM调用，放在请求路径上会使对话延迟和token消耗接近翻倍。
+async 模式下回答先返回，自反思作为任务放入有界队列，由后台线程执行：
+- 调用 self_reflect 评估回答，结果写入实例的 performance_log
+- 所有模式的反思结果（含 inline/sampled）都由后台线程写入 rag_reflection_log 表，供质量看板查询
+- 队列满时丢弃任务并计数，不阻塞请求
+"""
+import os
+import sys
+import json
+import time
+import queue
+import threading
+from typing import Dict, List, Optional
+
+# 添加项目根目录和scripts目录到路径
+current_dir = os.path.dirname(os.path.realpath(__file__))
+project_root = os.path.dirname(current_dir)
+scripts_dir = os.path.join(project_root, 'scripts')
+sys.path.insert(0, project_root)
+sys.path.insert(0, scripts_dir)
+
+from db_connection import get_default_db_connection
+from schema_registry import schema_registry
+
+RAG_REFLECTION_QUEUE_SIZE = int(os.getenv("RAG_REFLECTION_QUEUE_SIZE", "256"))
+RAG_REFLECTION_WORKERS = int(os.getenv("RAG_REFLECTION_WORKERS", "1"))
+
+REFLECTION_LOG_TABLE = 'rag_reflection_log'
+
+
+def _score(value) -> Optional[float]:
+    """模型返回的准确性评分可能是字符串，无法解析时返回None"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def reflection_record(question: str, parsed: Dict, reflection: Optional[Dict], mode: str,
+                      session_id: Optional[int] = None, answer_ms: Optional[int] = None,
+                      reflection_ms: Optional[int] = None, regenerated: bool = False) -> Dict:
+    """构造一条反思结果记录（performance_log 和 rag_reflection_log 共用的字段）"""
+    reflection = reflection or {}
+    return {
+        "question": question,
+        "answer": parsed,
+        "mode": mode,
+        "session_id": session_id,
+        "accuracy_score": _score(reflection.get("accuracy_score")) if reflection else None,
+        "needs_more_info": reflection.get("needs_more_info"),
+        "requires_retrieval": reflection.get("requires_retrieval"),
+        "improvement_suggestions": reflection.get("improvement_suggestions"),
+        "regenerated": regenerated,
+        "answer_ms": answer_ms,
+        "reflection_ms": reflection_ms,
+    }
+
+
+def save_reflection_record(record: Dict) -> bool:
+    """写入 rag_reflection_log（表不存在时跳过）"""
+    if not schema_registry.has_table(REFLECTION_LOG_TABLE):
+        return False
+    conn = get_default_db_connection()
+    if not conn:
+        return False
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {REFLECTION_LOG_TABLE}
+                (session_id, mode, question, answer, accuracy_score, needs_more_info, requires_retrieval,
+                 improvement_suggestions, regenerated, answer_ms, reflection_ms)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, (
+                record.get("session_id"), record.get("mode"), record.get("question"),
+                json.dumps(record.get("answer"), ensure_ascii=False, default=str),
+                record.get("accuracy_score"), record.get("needs_more_info"), record.get("requires_retrieval"),
+                record.get("improvement_suggestions"), 1 if record.get("regenerated") else 0,
+                record.get("answer_ms"), record.get("reflection_ms"),
+            ))
+        conn.commit()
+        return True
+    except Exception as e:
+        print(f"[Reflection] 写入反思记录失败: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def query_reflection_outcomes(hours: float = 24, mode: Optional[str] = None, limit: int = 50) -> Optional[Dict]:
+    """
+    查询最近的反思结果（质量看板使用）
+
+    Returns:
+        Dict: {'summary': 按模式汇总的评分统计, 'recent': 最近的记录}；表不存在或查询失败时返回None
+    """
+    if not schema_registry.has_table(REFLECTION_LOG_TABLE):
+        return None
+    conn = get_default_db_connection()
+    if not conn:
+        return None
+    try:
+        from pymysql.cursors import DictCursor
+        where = "created_at >= NOW() - INTERVAL %s SECOND"
+        params: List = [int(hours * 3600)]
+        if mode:
+            where += " AND mode = %s"
+            params.append(mode)
+        with conn.cursor(DictCursor) as cursor:
+            cursor.execute(f"""
+                SELECT mode, COUNT(*) AS total, COUNT(accuracy_score) AS reflected,
+                       AVG(accuracy_score) AS average_accuracy,
+                       SUM(accuracy_score > 7) AS high_quality,
+                       SUM(requires_retrieval = '是') AS requires_retrieval,
+                       SUM(regenerated) AS regenerated,
+                       AVG(answer_ms) AS average_answer_ms, AVG(reflection_ms) AS average_reflection_ms
+                FROM {REFLECTION_LOG_TABLE}
+                WHERE {where}
+                GROUP BY mode
+            """, params)
+            summary = cursor.fetchall()
+            cursor.execute(f"""
+                SELECT id, session_id, mode, question, accuracy_score, needs_more_info, requires_retrieval,
+                       improvement_suggestions, regenerated, answer_ms, reflection_ms, created_at
+                FROM {REFLECTION_LOG_TABLE}
+                WHERE {where}
+                ORDER BY id DESC
+                LIMIT %s
+            """, params + [limit])
+            recent = cursor.fetchall()
+        for row in summary:
+            for key, value in row.items():
+                if key != 'mode' and value is not None:
+                    row[key] = round(float(value), 2)
+        for row in recent:
+            if row.get('accuracy_score') is not None:
+                row['accuracy_score'] = float(row['accuracy_score'])
+            if row.get('created_at') is not None:
+                row['created_at'] = row['created_at'].isoformat()
+        return {'summary': summary, 'recent': recent}
+    except Exception as e:
+        print(f"[Reflection] 查询反思记录失败: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+class ReflectionWorker:
+    """后台执行自反思并持久化反思结果"""
+
+    def __init__(self, queue_size: int = RAG_REFLECTION_QUEUE_SIZE, workers: int = RAG_REFLECTION_WORKERS):
+        self._queue: "queue.Queue[Dict]" = queue.Queue(maxsize=max(1, queue_size))
+        self._workers = max(1, workers)
+        self._lock = threading.Lock()
+        self.running = False
+        self.submitted = 0
+        self.reflected = 0
+        self.persisted = 0
+        self.dropped = 0
+        self.errors = 0
+        self.reflection_seconds = 0.0
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self.running = True
+        for i in range(self._workers):
+            thread = threading.Thread(target=self._run, name=f'rag-reflection-{i}', daemon=True)
+            thread.start()
+
+    def stop(self):
+        self.running = False
+
+    def submit_reflection(self, rag, question: str, parsed: Dict, context: str,
+                          session_id: Optional[int] = None, answer_ms: Optional[int] = None) -> bool:
+        """提交一次后台自反思（async 模式），队列满时丢弃并返回False"""
+        return self._put({"rag": rag, "question": question, "parsed": parsed, "context": context,
+                          "session_id": session_id, "answer_ms": answer_ms})
+
+    def submit_record(self, record: Dict) -> bool:
+        """提交一条已完成的反思记录，只做持久化（inline/sampled 模式）"""
+        return self._put({"record": record})
+
+    def _put(self, job: Dict) -> bool:
+        self.start()
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.submitted += 1
+        return True
+
+    def _run(self):
+        while self.running:
+            try:
+                job = self._queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                self._process(job)
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                print(f"[Reflection] 后台反思任务出错: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _process(self, job: Dict):
+        record = job.get("record")
+        if record is None:
+            rag = job["rag"]
+            start = time.time()
+            reflection = rag.self_reflect(job["question"], json.dumps(job["parsed"], ensure_ascii=False),
+                                          job["context"])
+            seconds = time.time() - start
+            with self._lock:
+                self.reflected += 1
+                self.reflection_seconds += seconds
+            record = reflection_record(job["question"], job["parsed"], reflection, "async",
+                                       session_id=job.get("session_id"), answer_ms=job.get("answer_ms"),
+                                       reflection_ms=int(seconds * 1000))
+            rag.record_performance(record)
+        if save_reflection_record(record):
+            with self._lock:
+                self.persisted += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'running': self.running,
+                'queue_size': self._queue.qsize(),
+                'queue_capacity': self._queue.maxsize,
+                'submitted': self.submitted,
+                'reflected': self.reflected,
+                'persisted': self.persisted,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'average_reflection_ms': round(self.reflection_seconds * 1000 / self.reflected, 1)
+                if self.reflected else 0.0,
+            }
+
+
+_reflection_worker = None
+_reflection_worker_lock = threading.Lock()
+
+
+def get_reflection_worker() -> ReflectionWorker:
+    """获取自反思后台任务实例（单例，首次提交任务时启动线程）"""
+    global _reflection_worker
+    if _reflection_worker is None:
+        with _reflection_worker_lock:
+            if _reflection_worker is None:
+                _reflection_worker = ReflectionWorker()
+    return _reflection_worker
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+RAG检索结果缓存
+CulturalResourceRAG.ask、ImageAIGC._get_retrieval_info 和多模态检索对相同的查询会重复执行向量检索和数据库检索
+（同一用户重新生成回答、多个用户询问"中秋"等）。这里在 RAGBase 层缓存检索结果，所有RAG实例共享：
+- 数据库检索按 (表, 编译后的检索词, 每表行数) 缓存单表结果，不同的表组合共享同一张表的条目
+- 向量检索按 (向量库, 归一化查询, k) 缓存，向量库以 "vector:<目录>" 作为表名
+- LRU + TTL + 内存预算（按JSON序列化后的字节数估算）
+- 按表失效：某张表有写入时只删除该表的条目
+- 分表统计命中率（/api/health 的 retrieval_cache）
+"""
+import os
+import sys
+import json
+import re
+import threading
+from typing import Dict, Hashable, List, Optional, Tuple
+
+# 添加项目根目录和scripts目录到路径
+current_dir = os.path.dirname(os.path.realpath(__file__))
+project_root = os.path.dirname(current_dir)
+scripts_dir = os.path.join(project_root, 'scripts')
+sys.path.insert(0, project_root)
+sys.path.insert(0, scripts_dir)
+
+from ttl_cache import TTLCache
+
+RAG_CACHE_TTL = float(os.getenv("RAG_CACHE_TTL", "600"))
+RAG_CACHE_MAXSIZE = int(os.getenv("RAG_CACHE_MAXSIZE", "4096"))
+RAG_CACHE_MAX_BYTES = int(os.getenv("RAG_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+
+VECTOR_TABLE_PREFIX = 'vector:'
+
+
+def vector_table(persist_directory: str) -> str:
+    """向量库在缓存中的表名"""
+    return VECTOR_TABLE_PREFIX + os.path.normpath(persist_directory)
+
+
+def normalize_retrieval_query(query: str) -> str:
+    """向量检索的查询归一化：统一大小写和空白（不去停用词，避免改变语义检索结果）"""
+    return re.sub(r'\s+', ' ', (query or '').strip().lower())
+
+
+def _estimate_size(value) -> int:
+    """按JSON序列化后的字节数估算缓存条目大小（向量检索结果为Document对象，按其文本和元数据估算）"""
+    try:
+        return len(json.dumps(value, ensure_ascii=False,
+                              default=lambda o: getattr(o, '__dict__', str(o))).encode('utf-8'))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+class RetrievalCache:
+    """按表组织的检索结果缓存"""
+
+    def __init__(self, maxsize: int = RAG_CACHE_MAXSIZE, ttl: float = RAG_CACHE_TTL,
+                 max_bytes: int = RAG_CACHE_MAX_BYTES):
+        self.enabled = ttl > 0 and max_bytes > 0
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl, name='rag_retrieval',
+                               max_bytes=max_bytes, sizeof=_estimate_size)
+        self._lock = threading.Lock()
+        # 表 -> {'hits', 'misses', 'invalidations'}
+        self._table_stats: Dict[str, Dict[str, int]] = {}
+        self.invalidations = 0
+
+    def _count(self, table: str, field: str, n: int = 1):
+        with self._lock:
+            stats = self._table_stats.setdefault(table, {'hits': 0, 'misses': 0, 'invalidations': 0})
+            stats[field] += n
+
+    def get(self, table: str, key: Tuple[Hashable, ...]) -> Optional[List]:
+        """读取某张表的检索结果，未命中时返回None（空列表是有效的缓存结果）"""
+        if not self.enabled:
+            return None
+        value = self._cache.get((table,) + tuple(key))
+        self._count(table, 'hits' if value is not None else 'misses')
+        return value
+
+    def set(self, table: str, key: Tuple[Hashable, ...], value: List):
+        if self.enabled:
+            self._cache.set((table,) + tuple(key), value)
+
+    def invalidate(self, *tables: str) -> int:
+        """
+        使缓存失效
+
+        Args:
+            tables: 发生写入的表，不提供表示全部
+
+        Returns:
+            int: 删除的条目数
+        """
+        self.invalidations += 1
+        if not tables:
+            removed = len(self._cache)
+            self._cache.clear()
+            with self._lock:
+                for stats in self._table_stats.values():
+                    stats['invalidations'] += 1
+            return removed
+        scope = set(tables)
+        removed = self._cache.pop_where(lambda key, value: key[0] in scope)
+        for table in scope:
+            self._count(table, 'invalidations')
+        return removed
+
+    def invalidate_vector(self, persist_directory: str) -> int:
+        """向量库写入后使其检索结果失效"""
+        return self.invalidate(vector_table(persist_directory))
+
+    def stats(self) -> Dict:
+        stats = self._cache.stats()
+        stats['enabled'] = self.enabled
+        stats['invalidations'] = self.invalidations
+        with self._lock:
+            tables = {}
+            for table, counts in sorted(self._table_stats.items()):
+                total = counts['hits'] + counts['misses']
+                tables[table] = dict(counts, hit_rate=round(counts['hits'] / total, 4) if total else 0.0)
+        stats['tables'] = tables
+        return stats
+
+
+_retrieval_cache = None
+_retrieval_cache_lock = threading.Lock()
+
+
+def get_retrieval_cache() -> RetrievalCache:
+    """获取RAG检索结果缓存单例"""
+    global _retrieval_cache
+    if _retrieval_cache is None:
+        with _retrieval_cache_lock:
+            if _retrieval_cache is None:
+                _retrieval_cache = RetrievalCache()
+    return _retrieval_cache
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+检索结果缓存
+/api/search 和 /api/ai_search 的热门查询（春节、中秋、端午等）会被反复请求，
+这里按归一化后的查询（统一大小写、去掉首尾空白）缓存整页响应：
+- LRU + TTL + 内存预算（按JSON序列化后的字节数估算）
+- cultural_entities、AIGC_cultural_entities、crawled_images 有写入时整体失效
+- 进程外的写入（Java后端、爬虫等）由实体倒排索引刷新到新数据时触发失效，TTL兜底
+"""
+import os
+import sys
+import json
+import threading
+from typing import Dict, Hashable, Optional
+
+# 添加项目根目录和scripts目录到路径
+current_dir = os.path.dirname(os.path.realpath(__file__))
+project_root = os.path.dirname(current_dir)
+scripts_dir = os.path.join(project_root, 'scripts')
+sys.path.insert(0, project_root)
+sys.path.insert(0, scripts_dir)
+sys.path.insert(0, current_dir)
+
+from ttl_cache import TTLCache
+from search_optimizer import SearchOptimizer
+from retrieval_cache import get_retrieval_cache
+
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "300"))
+SEARCH_CACHE_MAXSIZE = int(os.getenv("SEARCH_CACHE_MAXSIZE", "1024"))
+SEARCH_CACHE_MAX_BYTES = int(os.getenv("SEARCH_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# 写入这些表会影响检索结果
+SEARCH_SOURCE_TABLES = ('cultural_entities', 'AIGC_cultural_entities', 'crawled_images')
+
+
+_optimizer = None
+_optimizer_lock = threading.Lock()
+
+
+def get_shared_optimizer() -> SearchOptimizer:
+    """获取进程内共享的SearchOptimizer（避免重复加载停用词表和同义词表）"""
+    global _optimizer
+    if _optimizer is None:
+        with _optimizer_lock:
+            if _optimizer is None:
+                _optimizer = SearchOptimizer()
+    return _optimizer
+
+
+def normalize_query(query: str) -> str:
+    """
+    归一化查询：只统一大小写、去掉首尾空白
+    缓存键必须与实际执行的检索一致：倒排索引按小写匹配，LIKE 在 utf8mb4_unicode_ci 下不区分大小写，
+    而按子串去停用词会把不同的查询合并（'和服' -> '服'、'在线' -> '线'），不能用于缓存键
+    """
+    return (query or '').strip().lower()
+
+
+def _estimate_size(value) -> int:
+    """按JSON序列化后的字节数估算缓存条目大小"""
+    try:
+        return len(json.dumps(value, ensure_ascii=False, default=str).encode('utf-8'))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+class SearchResultCache:
+    """检索结果缓存"""
+
+    def __init__(self, maxsize: int = SEARCH_CACHE_MAXSIZE, ttl: float = SEARCH_CACHE_TTL,
+                 max_bytes: int = SEARCH_CACHE_MAX_BYTES):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl, name='search_results',
+                               max_bytes=max_bytes, sizeof=_estimate_size)
+        self.invalidations = 0
+
+    def make_key(self, endpoint: str, query: str, *params: Hashable) -> tuple:
+        """构造缓存键：(接口名, 归一化查询, 分页等其他参数)"""
+        return (endpoint, normalize_query(query)) + tuple(params)
+
+    def get(self, key: tuple) -> Optional[Dict]:
+        return self._cache.get(key)
+
+    def set(self, key: tuple, value: Dict):
+        self._cache.set(key, value)
+
+    def invalidate(self, table: Optional[str] = None):
+        """
+        使缓存失效
+
+        Args:
+            table: 发生写入的表；为None或属于 SEARCH_SOURCE_TABLES 时清空缓存，其他表忽略
+        """
+        if table is not None and table not in SEARCH_SOURCE_TABLES:
+            return
+        self._cache.clear()
+        self.invalidations += 1
+
+    def stats(self) -> Dict:
+        stats = self._cache.stats()
+        stats['invalidations'] = self.invalidations
+        return stats
+
+
+_search_result_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_search_result_cache() -> SearchResultCache:
+    """获取检索结果缓存单例"""
+    global _search_result_cache
+    if _search_result_cache is None:
+        with _cache_lock:
+            if _search_result_cache is None:
+                _search_result_cache = SearchResultCache()
+    return _search_result_cache
+
+
+def notify_search_tables_changed(*tables: str, rebuild: bool = False):
+    """
+    通知检索相关表发生了写入：清空检索结果缓存、删除RAG检索缓存中这些表的条目，并让实体倒排索引和节日资源索引尽快刷新
+
+    Args:
+        tables: 发生写入的表名，不提供表示全部
+        rebuild: 是否需要全量重建索引（修改或删除已有记录时，按id水位的增量刷新无法感知）
+    """
+    if not tables or any(t in SEARCH_SOURCE_TABLES for t in tables):
+        get_search_result_cache().invalidate()
+    get_retrieval_cache().invalidate(*tables)
+
+    if not tables or any(t in ('cultural_entities', 'AIGC_cultural_entities') for t in tables):
+        try:
+            from search_index import get_entity_search_index
+            get_entity_search_index().request_refresh(rebuild=rebuild)
+        except Exception as e:
+            print(f"[SearchCache] 通知索引刷新失败: {e}")
+
+    if not tables or any(t in ('cultural_entities', 'cultural_resources', 'crawled_images') for t in tables):
+        try:
+            from festival_index import get_festival_resource_index
+            get_festival_resource_index().request_refresh(rebuild=rebuild)
+        except Exception as e:
+            print(f"[SearchCache] 通知节日资源索引刷新失败: {e}")
+
+
+if __name__ == "__main__":
+    # 缓存键自检：不同的检索必须得到不同的键，只有大小写和首尾空白不同的查询共用一个键
+    cache = SearchResultCache()
+    for a, b in (('和服', '服'), ('在线', '线'), ('春节的习俗', '春节习俗')):
+        assert cache.make_key('search', a) != cache.make_key('search', b), (a, b)
+    assert cache.make_key('search', ' Spring ', 20) == cache.make_key('search', 'spring', 20)
+    print("缓存键自检通过")
@@ -0,0 +1,429 @@
+# -*- coding: utf-8 -*-
+"""
+实体检索倒排索引
+对 cultural_entities 和 AIGC_cultural_entities 两张表的实体名称和描述建立内存倒排索引
+（jieba分词 + 字符n-gram），/api/search 和 /api/ai_search 直接在索引中完成匹配和排序，
+MySQL只负责按ID取回排名靠前的记录，避免每次搜索都对两张表做前缀通配LIKE全表扫描。
+
+索引在后台线程中构建，之后按 id（表中有 updated_at 时同时按 updated_at）水位增量刷新，
+并定期全量重建以反映删除和修改。
+"""
+import os
+import sys
+import time
+import heapq
+import threading
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+# 添加项目根目录和scripts目录到路径
+current_dir = os.path.dirname(os.path.realpath(__file__))
+project_root = os.path.dirname(current_dir)
+scripts_dir = os.path.join(project_root, 'scripts')
+sys.path.insert(0, project_root)
+sys.path.insert(0, scripts_dir)
+sys.path.insert(0, current_dir)
+
+from pymysql.cursors import SSDictCursor
+from db_connection import get_default_db_connection
+from schema_registry import schema_registry
+from search_optimizer import SearchOptimizer
+from bm25 import BM25FIndex
+
+SEARCH_INDEX_REFRESH_INTERVAL = float(os.getenv("SEARCH_INDEX_REFRESH_INTERVAL", "60"))
+SEARCH_INDEX_REBUILD_INTERVAL = float(os.getenv("SEARCH_INDEX_REBUILD_INTERVAL", "3600"))
+
+# 各表的类型标签、类型权重和匹配权重，与原 /api/search SQL 中的 CASE 权重保持一致
+# 匹配权重依次为：实体名完全匹配、实体名包含、描述包含、分词匹配
+# 同一综合得分内再按 BM25F 得分排序（次级排序键，不改变匹配权重和综合得分）
+ENTITY_TABLES = {
+    'cultural_entities': {
+        'type_tag': '传统实体',
+        'type_weight': 1.0,
+        'match_weights': (2.0, 1.5, 1.0, 0.5),
+    },
+    'AIGC_cultural_entities': {
+        'type_tag': 'AI实体',
+        'type_weight': 0.7,
+        'match_weights': (1.6, 1.2, 0.8, 0.4),
+    },
+}
+
+
+# 实体名和描述在BM25F中的字段权重
+BM25_FIELD_WEIGHTS = {'title': 2.0, 'content': 1.0}
+
+
+def char_ngrams(text: str, n: int = 2) -> Set[str]:
+    """按空白切分后生成字符n-gram（同时包含单字，用于单字查询）"""
+    grams = set()
+    for segment in text.split():
+        grams.update(segment)
+        if len(segment) >= n:
+            grams.update(segment[i:i + n] for i in range(len(segment) - n + 1))
+    return grams
+
+
+class _IndexData:
+    """一份完整的索引数据，全量重建时整体替换"""
+
+    def __init__(self, optimizer: SearchOptimizer):
+        self.bm25 = BM25FIndex(optimizer=optimizer, field_weights=BM25_FIELD_WEIGHTS)
+        self.docs: List[Optional[Tuple[str, int, str]]] = []  # doc_no -> (table, id, 小写实体名)
+        self.doc_terms: List[Optional[Tuple[frozenset, frozenset]]] = []  # doc_no -> (名称词项, 描述词项)
+        self.descs: List[Optional[str]] = []  # doc_no -> 小写描述（n-gram倒排只能筛出候选，需确认是子串）
+        self.doc_keys: Dict[Tuple[str, int], int] = {}  # (table, id) -> doc_no
+        self.title_postings: Dict[str, Set[int]] = {}
+        self.desc_postings: Dict[str, Set[int]] = {}
+        self.watermarks: Dict[str, Dict] = {}  # table -> {'id': 最大id, 'updated_at': 最大更新时间}
+
+
+class EntitySearchIndex:
+    """实体名称/描述倒排索引"""
+
+    def __init__(self, optimizer: Optional[SearchOptimizer] = None, ngram: int = 2):
+        self.optimizer = optimizer or SearchOptimizer()
+        self.ngram = ngram
+        self._data = _IndexData(self.optimizer)
+        self._lock = threading.RLock()
+        self.ready = False
+        self.running = False
+        self.last_build_time: Optional[float] = None
+        self.last_refresh_time: Optional[float] = None
+        self.build_seconds: Optional[float] = None
+        self._wakeup = threading.Event()
+        self._rebuild_requested = False
+        self._change_listeners: List[Callable[[], None]] = []
+
+    # ==================== 分词 ====================
+    def _tokens(self, text: str) -> List[str]:
+        try:
+            return self.optimizer.tokenize_and_filter(text)
+        except Exception:
+            # jieba不可用时只使用n-gram
+            return []
+
+    def _analyze(self, text: str) -> Tuple[frozenset, List[str]]:
+        """返回 (倒排词项集合, jieba分词结果)，文本只分词一次"""
+        text = (text or '').lower()
+        if not text:
+            return frozenset(), []
+        tokens = [t.strip() for t in self._tokens(text) if t.strip()]
+        terms = char_ngrams(text, self.ngram)
+        terms.update(tokens)
+        return frozenset(terms), tokens
+
+    # ==================== 构建和刷新 ====================
+    def _add_doc(self, data: _IndexData, table: str, row: Dict):
+        key = (table, int(row['id']))
+        old_no = data.doc_keys.get(key)
+        if old_no is not None:
+            self._remove_doc(data, old_no)
+
+        title = (row.get('entity_name') or '').lower()
+        title_terms, title_tokens = self._analyze(title)
+        desc = (row.get('description') or '').lower()
+        desc_terms, desc_tokens = self._analyze(desc)
+
+        doc_no = len(data.docs)
+        data.bm25.add_document(doc_no, {'title': title_tokens, 'content': desc_tokens}, tokenized=True)
+        data.docs.append((table, key[1], title))
+        data.doc_terms.append((title_terms, desc_terms))
+        data.descs.append(desc)
+        data.doc_keys[key] = doc_no
+        for term in title_terms:
+            data.title_postings.setdefault(term, set()).add(doc_no)
+        for term in desc_terms:
+            data.desc_postings.setdefault(term, set()).add(doc_no)
+
+        mark = data.watermarks.setdefault(table, {'id': 0, 'updated_at': None})
+        mark['id'] = max(mark['id'], key[1])
+        updated_at = row.get('updated_at')
+        if updated_at is not None:
+            if mark['updated_at'] is None or updated_at > mark['updated_at']:
+                mark['updated_at'] = updated_at
+                mark['ids'] = {key[1]}
+            elif updated_at == mark['updated_at']:
+                mark.setdefault('ids', set()).add(key[1])
+
+    @staticmethod
+    def _remove_doc(data: _IndexData, doc_no: int):
+        doc = data.docs[doc_no]
+        if doc is None:
+            return
+        title_terms, desc_terms = data.doc_terms[doc_no]
+        for term in title_terms:
+            postings = data.title_postings.get(term)
+            if postings is not None:
+                postings.discard(doc_no)
+        for term in desc_terms:
+            postings = data.desc_postings.get(term)
+            if postings is not None:
+                postings.discard(doc_no)
+        data.bm25.remove_document(doc_no)
+        data.docs[doc_no] = None
+        data.doc_terms[doc_no] = None
+        data.descs[doc_no] = None
+        data.doc_keys.pop((doc[0], doc[1]), None)
+
+    def _iter_rows(self, conn, table: str, mark: Optional[Dict]):
+        """读取表中的实体记录；mark不为空时只读取水位之后新增或更新的记录"""
+        has_updated_at = schema_registry.has_column(table, 'updated_at')
+        fields = "id, entity_name, description" + (", updated_at" if has_updated_at else "")
+        sql = f"SELECT {fields} FROM {table}"
+        params: Tuple = ()
+        if mark:
+            if has_updated_at and mark.get('updated_at') is not None:
+                sql += " WHERE id > %s OR updated_at >= %s"
+                params = (mark['id'], mark['updated_at'])
+            else:
+                sql += " WHERE id > %s"
+                params = (mark['id'],)
+
+        # 水位取 (updated_at, 已读ID)：updated_at 只精确到秒，用 >= 读出与水位同一秒的记录，已读过的跳过
+        seen = mark.get('ids') if mark and mark.get('updated_at') is not None else None
+        # 使用流式游标，避免大表一次性读入内存
+        with conn.cursor(SSDictCursor) as cursor:
+            cursor.execute(sql, params)
+            for row in cursor:
+                if seen and int(row['id']) in seen and row.get('updated_at') == mark['updated_at']:
+                    continue
+                yield row
+
+    def build(self) -> bool:
+        """全量构建索引，构建完成后原子替换旧索引"""
+        conn = get_default_db_connection()
+        if not conn:
+            print("[SearchIndex] 数据库连接失败，无法构建索引")
+            return False
+        start = time.time()
+        try:
+            data = _IndexData(self.optimizer)
+            total = 0
+            # 新索引构建期间旧索引照常提供查询
+            for table in ENTITY_TABLES:
+                for row in self._iter_rows(conn, table, None):
+                    self._add_doc(data, table, row)
+                    total += 1
+            with self._lock:
+                self._data = data
+                self.ready = True
+            self.last_build_time = time.time()
+            self.last_refresh_time = self.last_build_time
+            self.build_seconds = round(self.last_build_time - start, 3)
+            print(f"[SearchIndex] 索引构建完成: {total} 条实体，耗时 {self.build_seconds} 秒")
+            self._notify_changed()
+            return True
+        except Exception as e:
+            print(f"[SearchIndex] 索引构建失败: {e}")
+            return False
+        finally:
+            conn.close()
+
+    def refresh(self) -> int:
+        """按水位增量刷新索引，返回新增或更新的记录数"""
+        if not self.ready:
+            self.build()
+            return 0
+        conn = get_default_db_connection()
+        if not conn:
+            return 0
+        try:
+            total = 0
+            for table in ENTITY_TABLES:
+                mark = dict(self._data.watermarks.get(table) or {'id': 0, 'updated_at': None})
+                # 先在锁外读出增量记录，再持锁写入索引，避免刷新期间阻塞查询
+                rows = list(self._iter_rows(conn, table, mark))
+                if rows:
+                    with self._lock:
+                        for row in rows:
+                            self._add_doc(self._data, table, row)
+                total += len(rows)
+            self.last_refresh_time = time.time()
+            if total:
+                self._notify_changed()
+            return total
+        except Exception as e:
+            print(f"[SearchIndex] 增量刷新失败: {e}")
+            return 0
+        finally:
+            conn.close()
+
+    def start(self):
+        """在后台线程中构建索引并定期刷新"""
+        if self.running:
+            return
+        self.running = True
+        thread = threading.Thread(target=self._refresh_loop, daemon=True)
+        thread.start()
+
+    def stop(self):
+        self.running = False
+        self._wakeup.set()
+
+    def request_refresh(self, rebuild: bool = False):
+        """
+        请求后台线程立即刷新索引（本进程写入实体表后调用）
+
+        Args:
+            rebuild: 是否全量重建（修改或删除已有记录时需要）
+        """
+        if rebuild:
+            self._rebuild_requested = True
+        self._wakeup.set()
+
+    def add_change_listener(self, callback: Callable[[], None]):
+        """注册索引内容变化（构建完成或增量刷新到新数据）时的回调"""
+        self._change_listeners.append(callback)
+
+    def _notify_changed(self):
+        for callback in self._change_listeners:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[SearchIndex] 索引变化回调出错: {e}")
+
+    def _refresh_loop(self):
+        self.build()
+        while self.running:
+            self._wakeup.wait(SEARCH_INDEX_REFRESH_INTERVAL)
+            self._wakeup.clear()
+            if not self.running:
+                break
+            try:
+                rebuild, self._rebuild_requested = self._rebuild_requested, False
+                if rebuild or not self.ready or (self.last_build_time and
+                                                 time.time() - self.last_build_time >= SEARCH_INDEX_REBUILD_INTERVAL):
+                    self.build()
+                else:
+                    self.refresh()
+            except Exception as e:
+                print(f"[SearchIndex] 后台刷新出错: {e}")
+
+    # ==================== 查询 ====================
+    @staticmethod
+    def _intersect(postings: Dict[str, Set[int]], terms) -> Set[int]:
+        sets = []
+        for term in terms:
+            docs = postings.get(term)
+            if not docs:
+                return set()
+            sets.append(docs)
+        if not sets:
+            return set()
+        sets.sort(key=len)
+        result = set(sets[0])
+        for docs in sets[1:]:
+            result &= docs
+            if not result:
+                break
+        return result
+
+    def search(self, query: str, limit: int = 200) -> List[Dict]:
+        """在索引中检索实体，返回排名前 limit 的命中（见 search_page）"""
+        return self.search_page(query, limit=limit)[0]
+
+    def search_page(self, query: str, limit: int = 20, after: Optional[Tuple] = None,
+                    offset: int = 0) -> Tuple[List[Dict], int]:
+        """
+        在索引中分页检索实体
+
+        排序键为 (combined_score, bm25_score, id, table) 降序，保证全序，可直接用于键集分页；
+        relevance_score、combined_score 与SQL检索的 CASE 权重一致，BM25F 只在综合得分相同时决定先后；
+        n-gram倒排只用于筛选候选，名称/描述命中都会再确认查询是子串，否则按分词匹配处理或丢弃
+
+        Args:
+            query: 检索关键词
+            limit: 返回的最大条数
+            after: 键集分页游标，即上一页最后一条的 (combined_score, bm25_score, id, table)，只返回排在其后的命中；
+                也接受SQL检索产生的 (combined_score, id, table)，此时不比较 bm25_score
+            offset: 跳过的条数（按页码翻页时使用，和 after 同时给出时在 after 之后再跳过）
+
+        Returns:
+            (命中列表, 命中总数)。命中列表按排序键降序排列，每项包含 table、id、relevance_score、
+            type_weight、type_tag、combined_score、bm25_score（BM25F得分映射到 [0, 1)）
+        """
+        q = (query or '').strip().lower()
+        if not q:
+            return [], 0
+        grams = char_ngrams(q, self.ngram)
+        # 与 LIKE '%q%' 对应：q 的所有n-gram都出现（多字查询只需比对n-gram，单字查询比对单字）
+        contain_terms = [g for g in grams if len(g) == self.ngram] or list(grams)
+
+        with self._lock:
+            data = self._data
+            title_hits = self._intersect(data.title_postings, contain_terms)
+            desc_hits = self._intersect(data.desc_postings, contain_terms)
+            # 分词匹配（含同义词扩展）由BM25F完成，命中的文档同时得到BM25F得分
+            bm25_scores = data.bm25.score_terms(data.bm25.expand_query(q))
+
+            scored = []
+            total = 0
+            for doc_no in title_hits | desc_hits | bm25_scores.keys():
+                doc = data.docs[doc_no]
+                if doc is None:
+                    continue
+                table, entity_id, title = doc
+                weights = ENTITY_TABLES[table]['match_weights']
+                if title == q:
+                    relevance = weights[0]
+                elif doc_no in title_hits and q in title:
+                    relevance = weights[1]
+                elif doc_no in desc_hits and q in data.descs[doc_no]:
+                    relevance = weights[2]
+                elif doc_no in bm25_scores:
+                    relevance = weights[3]
+                else:
+                    # n-gram都出现但不构成子串，也没有分词匹配：SQL检索不会命中
+                    continue
+                bm25 = bm25_scores.get(doc_no, 0.0)
+                bm25 = bm25 / (bm25 + 1.0)
+                combined = relevance * ENTITY_TABLES[table]['type_weight']
+                total += 1
+                key = (combined, bm25, entity_id, table)
+                if after is not None and (key >= after if len(after) == 4 else
+                                          (combined, entity_id, table) >= after):
+                    continue
+                scored.append((key, relevance))
+
+        wanted = offset + limit if limit else None
+        top = heapq.nlargest(wanted, scored) if wanted else sorted(scored, reverse=True)
+        return [
+            {
+                'table': table,
+                'id': entity_id,
+                'relevance_score': relevance,
+                'type_weight': ENTITY_TABLES[table]['type_weight'],
+                'type_tag': ENTITY_TABLES[table]['type_tag'],
+                'combined_score': combined,
+                'bm25_score': bm25,
+            }
+            for (combined, bm25, entity_id, table), relevance in top[offset:]
+        ], total
+
+    def stats(self) -> Dict:
+        with self._lock:
+            data = self._data
+            return {
+                'ready': self.ready,
+                'documents': len(data.doc_keys),
+                'title_terms': len(data.title_postings),
+                'description_terms': len(data.desc_postings),
+                'bm25': data.bm25.stats(),
+                'watermarks': {t: {'id': m['id'], 'updated_at': str(m['updated_at']) if m['updated_at'] else None}
+                               for t, m in data.watermarks.items()},
+                'build_seconds': self.build_seconds,
+                'last_build_time': self.last_build_time,
+                'last_refresh_time': self.last_refresh_time,
+            }
+
+
+# 全局索引实例
+_entity_search_index = None
+
+
+def get_entity_search_index() -> EntitySearchIndex:
+    """获取实体检索索引实例（单例）"""
+    global _entity_search_index
+    if _entity_search_index is None:
+        _entity_search_index = EntitySearchIndex()
+    return _entity_search_index
@@ -3,13 +3,37 @@
 """
 搜索优化工具类
 提供停用词过滤、同义词扩展等功能，用于增强高级搜索功能
+停用词、同义词和节日名称编译为一个 Aho–Corasick 自动机（lexicon_automaton），查询一次扫描完成匹配；
+词典文件修改后自动热加载；重复查询的分词结果使用LRU缓存
 """
 
 import re
 import os
-from typing import List, Dict, Set
+import threading
+import time
+from functools import lru_cache
+from typing import List, Dict, Set, Tuple
 from pathlib import Path
 
+from lexicon_automaton import (
+    STOPWORD, SYNONYM, FESTIVAL, LexiconAutomaton, get_or_build_automaton,
+    source_signature, festival_source_path, load_festival_names
+)
+
+# 检查词典文件是否修改的最小间隔（秒）
+LEXICON_RELOAD_INTERVAL = float(os.getenv("LEXICON_RELOAD_INTERVAL", "5"))
+# 分词结果LRU缓存的容量，以及参与缓存的文本最大长度（只缓存查询这类短文本，文档正文不缓存）
+TOKENIZE_MEMO_SIZE = int(os.getenv("TOKENIZE_MEMO_SIZE", "4096"))
+TOKENIZE_MEMO_MAX_LENGTH = 256
+
+
+def _jieba_cut(text: str) -> Tuple[str, ...]:
+    import jieba
+    return tuple(jieba.cut(text))
+
+
+_jieba_cut_cached = lru_cache(maxsize=TOKENIZE_MEMO_SIZE)(_jieba_cut)
+
 
 class SearchOptimizer:
     """
@@ -34,9 +58,75 @@ class SearchOptimizer:
             stopwords_path = base_dir / "stopwords.txt"
         if synonyms_path is None:
             synonyms_path = base_dir / "synonyms.txt"
+        self._stopwords_path = str(stopwords_path)
+        self._synonyms_path = str(synonyms_path)
         
         self.load_stopwords(stopwords_path)
         self.load_synonyms(synonyms_path)
+        
+        self._reload_lock = threading.Lock()
+        self._last_reload_check = time.monotonic()
+        self._lexicon_signature = self._source_signature()
+        self._lexicon = self._build_lexicon(self._lexicon_signature)
+        self.reload_count = 0
+    
+    def _source_signature(self) -> List:
+        return source_signature([self._stopwords_path, self._synonyms_path, festival_source_path()])
+    
+    def _build_lexicon(self, signature: List) -> LexiconAutomaton:
+        """把停用词、同义词、节日名称编译为一个自动机（源文件未变化时从磁盘缓存加载）"""
+        words: Dict[str, int] = {}
+        for word in self.stopwords:
+            words[word] = words.get(word, 0) | STOPWORD
+        for word in self.synonyms_dict:
+            words[word] = words.get(word, 0) | SYNONYM
+        for word in load_festival_names():
+            words[word] = words.get(word, 0) | FESTIVAL
+        return get_or_build_automaton(words, signature)
+    
+    @property
+    def lexicon(self) -> LexiconAutomaton:
+        """词典自动机；距上次检查超过 LEXICON_RELOAD_INTERVAL 秒时检查词典文件是否修改"""
+        if time.monotonic() - self._last_reload_check >= LEXICON_RELOAD_INTERVAL:
+            self._check_reload()
+        return self._lexicon
+    
+    def _check_reload(self):
+        if not self._reload_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_reload_check = time.monotonic()
+            signature = self._source_signature()
+            if signature != self._lexicon_signature:
+                self.reload(signature)
+        finally:
+            self._reload_lock.release()
+    
+    def reload(self, signature: List = None):
+        """重新加载词典文件并重新编译自动机（新词典准备好后整体替换，检索线程不会看到一半的词典）"""
+        signature = signature or self._source_signature()
+        loader = SearchOptimizer.__new__(SearchOptimizer)
+        loader.stopwords, loader.synonyms_dict = set(), {}
+        loader.load_stopwords(self._stopwords_path)
+        loader.load_synonyms(self._synonyms_path)
+        lexicon = loader._build_lexicon(signature)
+        self.stopwords, self.synonyms_dict = loader.stopwords, loader.synonyms_dict
+        self._lexicon, self._lexicon_signature = lexicon, signature
+        self.reload_count += 1
+        print(f"[SearchOptimizer] 词典已重新加载：{len(self.stopwords)} 个停用词，{len(self.synonyms_dict)} 个同义词")
+    
+    def stats(self) -> Dict:
+        memo = _jieba_cut_cached.cache_info()
+        return {
+            'stopwords': len(self.stopwords),
+            'synonyms': len(self.synonyms_dict),
+            'lexicon_states': self._lexicon.size,
+            'reload_count': self.reload_count,
+            'tokenize_memo': {
+                'hits': memo.hits, 'misses': memo.misses,
+                'size': memo.currsize, 'maxsize': memo.maxsize,
+            },
+        }
     
     def load_stopwords(self, file_path: str):
         """
@@ -98,9 +188,8 @@ class SearchOptimizer:
         if not text:
             return text
         
-        # 简单的词语匹配和移除
-        for stopword in self.stopwords:
-            text = text.replace(stopword, '')
+        # 一次扫描移除所有停用词
+        text = self.lexicon.replace(text, STOPWORD)
         
         # 清理多余的空格
         text = re.sub(r'\s+', ' ', text).strip()
@@ -119,10 +208,11 @@ class SearchOptimizer:
         if not text:
             return []
         
-        # 简单的中文分词（按字符和常见词组）
-        # 在实际应用中，可以使用jieba等专业分词工具
-        import jieba
-        tokens = list(jieba.cut(text))
+        # 短文本（查询）的分词结果走LRU缓存
+        if len(text) <= TOKENIZE_MEMO_MAX_LENGTH:
+            tokens = _jieba_cut_cached(text)
+        else:
+            tokens = _jieba_cut(text)
         
         # 过滤停用词
         filtered_tokens = [token for token in tokens if token not in self.stopwords and token.strip()]
@@ -141,17 +231,30 @@ class SearchOptimizer:
         if not query:
             return [query]
         
-        expanded_queries = set([query])
+        expanded_queries = [query]
         
-        # 检查查询中的每个词是否有同义词
-        for word, synonyms in self.synonyms_dict.items():
-            if word in query:
-                for synonym in synonyms:
-                    if synonym != word:
-                        expanded_query = query.replace(word, synonym)
-                        expanded_queries.add(expanded_query)
+        # 一次扫描找出查询中出现的同义词，再逐个替换
+        synonyms_dict = self.synonyms_dict
+        for word in self.lexicon.find(query, SYNONYM):
+            for synonym in synonyms_dict.get(word, ()):
+                if synonym != word:
+                    expanded_query = query.replace(word, synonym)
+                    if expanded_query not in expanded_queries:
+                        expanded_queries.append(expanded_query)
         
-        return list(expanded_queries)
+        return expanded_queries
+    
+    def find_festivals(self, text: str) -> List[str]:
+        """找出文本中出现的节日名称（中文，重叠时保留最长的）"""
+        if not text:
+            return []
+        return self.lexicon.find_longest(text, FESTIVAL)
+    
+    def split_on_stopwords(self, text: str) -> List[str]:
+        """在停用词处切分文本（不依赖分词工具的粗分词）"""
+        if not text:
+            return []
+        return self.lexicon.replace(text, STOPWORD, ' ').split()
     
     def preprocess_search_query(self, query: str) -> Dict:
         """
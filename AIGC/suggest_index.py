@@ -0,0 +1,515 @@
+# -*- coding: utf-8 -*-
+"""
+搜索框输入提示（前缀补全）索引
+对 cultural_entities、AIGC_cultural_entities 的实体名称和 FESTIVAL_NAME_MAP 中的节日名称建立内存前缀索引：
+- 有序数组 + 二分查找，名称的小写形式、全拼和拼音首字母（安装了 pypinyin 时）都作为检索键
+- 按 user_access_logs 中的访问次数计算热度，同一前缀下热度高的排在前面
+- 对应检索键较多的前缀（超过 SUGGEST_TOP_THRESHOLD 个）在构建时按热度预先算好前 SUGGEST_MAX_LIMIT 条，
+  查询时直接取用；其余前缀的区间很短，查询时直接扫描
+- 后台线程按实体 id / updated_at 水位和访问日志 id 水位增量刷新，定期全量重建以反映删除和改名
+- 相同前缀的结果在两次刷新之间直接复用
+/api/search/suggest 只查询本索引，不访问MySQL
+"""
+import os
+import sys
+import math
+import time
+import bisect
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# 添加项目根目录和scripts目录到路径
+current_dir = os.path.dirname(os.path.realpath(__file__))
+project_root = os.path.dirname(current_dir)
+scripts_dir = os.path.join(project_root, 'scripts')
+sys.path.insert(0, project_root)
+sys.path.insert(0, scripts_dir)
+sys.path.insert(0, current_dir)
+
+from pymysql.cursors import SSDictCursor
+from db_connection import get_default_db_connection
+from schema_registry import schema_registry
+
+try:
+    from festival_name_utils import FESTIVAL_NAME_MAP
+except ImportError:
+    FESTIVAL_NAME_MAP = {}
+
+try:
+    from pypinyin import lazy_pinyin, Style
+except ImportError:
+    lazy_pinyin = None
+    Style = None
+
+SUGGEST_REFRESH_INTERVAL = float(os.getenv("SUGGEST_REFRESH_INTERVAL", "60"))
+SUGGEST_REBUILD_INTERVAL = float(os.getenv("SUGGEST_REBUILD_INTERVAL", "3600"))
+SUGGEST_DEFAULT_LIMIT = 10
+SUGGEST_MAX_LIMIT = 50
+# 检索键数超过该值的前缀预先计算热度前 SUGGEST_MAX_LIMIT 条，不超过的前缀查询时直接扫描
+SUGGEST_TOP_THRESHOLD = int(os.getenv("SUGGEST_TOP_THRESHOLD", "256"))
+# 单次查询最多扫描的前缀区间长度（兜底，正常情况下扫描区间不超过 SUGGEST_TOP_THRESHOLD）
+SUGGEST_MAX_SCAN = 5000
+# 前缀结果缓存的最大条目数（数据变化时整体清空）
+SUGGEST_MEMO_SIZE = 4096
+
+SUGGEST_ENTITY_TABLES = ('cultural_entities', 'AIGC_cultural_entities')
+# 访问日志 resource_type -> 实体表
+POPULARITY_RESOURCE_TYPES = {
+    'cultural_entities': 'cultural_entities',
+    'cultural_entity': 'cultural_entities',
+    'entity': 'cultural_entities',
+    'AIGC_cultural_entities': 'AIGC_cultural_entities',
+    'aigc_entity': 'AIGC_cultural_entities',
+}
+# 节日名称的基础热度（节日是最常见的检索入口，没有访问记录时也排在普通实体前面）
+FESTIVAL_BASE_SCORE = 1.0
+# 泛化的节日名称不作为提示
+_GENERIC_FESTIVALS = {"节日", "传统节日"}
+
+
+def normalize_key(text: str) -> str:
+    return ''.join((text or '').lower().split())
+
+
+def pinyin_keys(name: str) -> List[str]:
+    """名称的全拼和拼音首字母（未安装 pypinyin 或名称不含汉字时为空）"""
+    if lazy_pinyin is None or not any('\u4e00' <= ch <= '\u9fff' for ch in name):
+        return []
+    full = ''.join(lazy_pinyin(name)).lower()
+    initials = ''.join(lazy_pinyin(name, style=Style.FIRST_LETTER)).lower()
+    return [k for k in dict.fromkeys((normalize_key(full), normalize_key(initials))) if k]
+
+
+class _SuggestData:
+    """一份完整的前缀索引，全量重建时整体替换"""
+
+    def __init__(self):
+        self.keys: List[str] = []  # 有序的检索键
+        self.refs: List[Tuple] = []  # 与keys对应的条目标识
+        self.entries: Dict[Tuple, Dict] = {}  # 条目标识 -> {'text','type','table','id'}
+        self.entry_keys: Dict[Tuple, List[str]] = {}  # 条目标识 -> 检索键（用于删除）
+        self.access_counts: Dict[Tuple, int] = {}  # 条目标识 -> 访问次数
+        self.watermarks: Dict[str, Dict] = {}  # 实体表 -> {'id','updated_at'}；'user_access_logs' -> {'id'}
+        self.top: Dict[str, List[Tuple]] = {}  # 热门前缀 -> 按热度排好序的条目标识（同名只保留一条）
+        # 全量构建时先收集 (检索键, 条目标识)，最后一次性排序，避免逐个插入有序数组
+        self.pending: Optional[List[Tuple[str, Tuple]]] = None
+        # 增量刷新时记录变化，刷新结束后据此修正热门前缀的结果
+        self.dirty_refs: set = set()
+        self.removed: List[Tuple[Tuple, List[str]]] = []
+
+
+class SuggestIndex:
+    """实体名称和节日名称的前缀补全索引"""
+
+    def __init__(self):
+        self._data = _SuggestData()
+        self._lock = threading.RLock()
+        self._memo: Dict[Tuple[str, int], List[Dict]] = {}
+        self.ready = False
+        self.running = False
+        self.last_build_time: Optional[float] = None
+        self.last_refresh_time: Optional[float] = None
+        self.build_seconds: Optional[float] = None
+        self.queries = 0
+        self.memo_hits = 0
+        self._wakeup = threading.Event()
+        self._rebuild_requested = False
+
+    # ==================== 索引维护 ====================
+    @staticmethod
+    def _add_entry(data: _SuggestData, ref: Tuple, entry: Dict):
+        current = data.entries.get(ref)
+        if current is not None and current['text'] == entry['text']:
+            # 名称未变（如只更新了其他字段），检索键不变
+            data.entries[ref] = entry
+            return
+        SuggestIndex._remove_entry(data, ref)
+        name = entry['text']
+        keys = [k for k in dict.fromkeys([normalize_key(name)] + pinyin_keys(name)) if k]
+        if not keys:
+            return
+        data.entries[ref] = entry
+        data.entry_keys[ref] = keys
+        if data.pending is not None:
+            data.pending.extend((key, ref) for key in keys)
+            return
+        for key in keys:
+            pos = bisect.bisect_right(data.keys, key)
+            data.keys.insert(pos, key)
+            data.refs.insert(pos, ref)
+        data.dirty_refs.add(ref)
+
+    @staticmethod
+    def _remove_entry(data: _SuggestData, ref: Tuple):
+        keys = data.entry_keys.pop(ref, ())
+        for key in keys:
+            lo = bisect.bisect_left(data.keys, key)
+            hi = bisect.bisect_right(data.keys, key)
+            for pos in range(lo, hi):
+                if data.refs[pos] == ref:
+                    del data.keys[pos]
+                    del data.refs[pos]
+                    break
+        if keys:
+            data.removed.append((ref, keys))
+        data.entries.pop(ref, None)
+
+    @staticmethod
+    def _add_festivals(data: _SuggestData):
+        for name in FESTIVAL_NAME_MAP:
+            if name not in _GENERIC_FESTIVALS:
+                SuggestIndex._add_entry(data, ('festival', name),
+                                        {'text': name, 'type': 'festival', 'table': None, 'id': None})
+
+    @staticmethod
+    def _iter_entities(conn, table: str, mark: Optional[Dict]):
+        """读取实体名称；mark不为空时只读取水位之后新增或更新的记录"""
+        has_updated_at = schema_registry.has_column(table, 'updated_at')
+        sql = f"SELECT id, entity_name{', updated_at' if has_updated_at else ''} FROM {table}"
+        params: Tuple = ()
+        if mark:
+            if has_updated_at and mark.get('updated_at') is not None:
+                sql += " WHERE id > %s OR updated_at >= %s"
+                params = (mark['id'], mark['updated_at'])
+            else:
+                sql += " WHERE id > %s"
+                params = (mark['id'],)
+        # 水位取 (updated_at, 已读ID)：updated_at 只精确到秒，用 >= 读出与水位同一秒的记录，已读过的跳过
+        seen = mark.get('ids') if mark and mark.get('updated_at') is not None else None
+        with conn.cursor(SSDictCursor) as cursor:
+            cursor.execute(sql, params)
+            for row in cursor:
+                if seen and int(row['id']) in seen and row.get('updated_at') == mark['updated_at']:
+                    continue
+                yield row
+
+    @staticmethod
+    def _load_entities(data: _SuggestData, table: str, rows) -> int:
+        count = 0
+        mark = data.watermarks.setdefault(table, {'id': 0, 'updated_at': None})
+        for row in rows:
+            entity_id = int(row['id'])
+            name = (row.get('entity_name') or '').strip()
+            ref = (table, entity_id)
+            if name:
+                SuggestIndex._add_entry(data, ref, {'text': name, 'type': 'entity', 'table': table, 'id': entity_id})
+            else:
+                SuggestIndex._remove_entry(data, ref)
+            mark['id'] = max(mark['id'], entity_id)
+            updated_at = row.get('updated_at')
+            if updated_at is not None:
+                if mark['updated_at'] is None or updated_at > mark['updated_at']:
+                    mark['updated_at'] = updated_at
+                    mark['ids'] = {entity_id}
+                elif updated_at == mark['updated_at']:
+                    mark.setdefault('ids', set()).add(entity_id)
+            count += 1
+        return count
+
+    @staticmethod
+    def _read_access_counts(conn, after_id: int) -> Tuple[Dict[Tuple, int], int]:
+        """读取访问日志水位之后各实体的访问次数，返回 (条目标识 -> 次数增量, 新水位)"""
+        counts: Dict[Tuple, int] = {}
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT MAX(id) AS max_id FROM user_access_logs")
+            row = cursor.fetchone()
+            max_id = (row['max_id'] if isinstance(row, dict) else row[0]) if row else None
+            if max_id is None or max_id <= after_id:
+                return counts, after_id
+            placeholders = ', '.join(['%s'] * len(POPULARITY_RESOURCE_TYPES))
+            cursor.execute(f"""
+                SELECT resource_type, resource_id, COUNT(*) AS cnt
+                FROM user_access_logs
+                WHERE id > %s AND id <= %s AND resource_id IS NOT NULL
+                  AND resource_type IN ({placeholders})
+                GROUP BY resource_type, resource_id
+            """, (after_id, max_id) + tuple(POPULARITY_RESOURCE_TYPES))
+            for row in cursor.fetchall():
+                if not isinstance(row, dict):
+                    row = dict(zip(('resource_type', 'resource_id', 'cnt'), row))
+                ref = (POPULARITY_RESOURCE_TYPES[row['resource_type']], int(row['resource_id']))
+                counts[ref] = counts.get(ref, 0) + int(row['cnt'])
+        return counts, int(max_id)
+
+    def _update_access_counts(self, data: _SuggestData, conn):
+        mark = data.watermarks.setdefault('user_access_logs', {'id': 0})
+        try:
+            counts, mark['id'] = self._read_access_counts(conn, mark['id'])
+        except Exception as e:
+            print(f"[SuggestIndex] 读取访问日志失败，热度不更新: {e}")
+            return 0
+        for ref, count in counts.items():
+            data.access_counts[ref] = data.access_counts.get(ref, 0) + count
+        data.dirty_refs.update(counts)
+        return len(counts)
+
+    # ==================== 热门前缀 ====================
+    def _rank_refs(self, data: _SuggestData, refs, limit: int = SUGGEST_MAX_LIMIT) -> List[Tuple]:
+        """按热度降序、名称长度升序排序，同名只保留热度最高的一条"""
+        best: Dict[str, Tuple[float, Tuple]] = {}
+        for ref in refs:
+            entry = data.entries.get(ref)
+            if entry is None:
+                continue
+            score = self._score(data, ref)
+            current = best.get(entry['text'])
+            if current is None or score > current[0]:
+                best[entry['text']] = (score, ref)
+        ranked = sorted(best.items(), key=lambda item: (-item[1][0], len(item[0]), item[0]))[:limit]
+        return [ref for _, (_, ref) in ranked]
+
+    @staticmethod
+    def _prefix_range(data: _SuggestData, prefix: str, lo: int = 0, hi: Optional[int] = None) -> Tuple[int, int]:
+        """以 prefix 开头的检索键在有序数组中的区间（连续）：上界为前缀后接最大字符"""
+        hi = len(data.keys) if hi is None else hi
+        lo = bisect.bisect_left(data.keys, prefix, lo, hi)
+        return lo, bisect.bisect_left(data.keys, prefix + '\U0010ffff', lo, hi)
+
+    def _build_top(self, data: _SuggestData, lo: int, hi: int, depth: int) -> List[Tuple]:
+        """
+        计算区间 [lo, hi)（检索键共享长度为 depth 的前缀）的热门结果并逐层向下：
+        子前缀区间较大时递归计算并只取其热门结果参与合并，较小时整段参与合并，总代价约为 O(检索键数)
+        """
+        keys, refs = data.keys, data.refs
+        candidates = []
+        pos = lo
+        while pos < hi:
+            key = keys[pos]
+            if len(key) <= depth:
+                # 与前缀完全相同的键排在区间最前面
+                candidates.append(refs[pos])
+                pos += 1
+                continue
+            end = self._prefix_range(data, key[:depth + 1], pos, hi)[1]
+            if end - pos > SUGGEST_TOP_THRESHOLD:
+                candidates.extend(self._build_top(data, pos, end, depth + 1))
+            else:
+                candidates.extend(refs[pos:end])
+            pos = end
+        top = self._rank_refs(data, candidates)
+        if depth:
+            data.top[keys[lo][:depth]] = top
+        return top
+
+    def _patch_top(self, data: _SuggestData):
+        """增量刷新后修正热门前缀：新增或热度变化的条目并入结果，删除或改名的条目所在前缀重新计算"""
+        recompute = set()
+        for ref, keys in data.removed:
+            for key in keys:
+                for i in range(1, len(key) + 1):
+                    top = data.top.get(key[:i])
+                    if top is not None and ref in top:
+                        recompute.add(key[:i])
+        merge: Dict[str, List[Tuple]] = {}
+        for ref in data.dirty_refs:
+            for key in data.entry_keys.get(ref, ()):
+                for i in range(1, len(key) + 1):
+                    prefix = key[:i]
+                    if prefix in data.top:
+                        merge.setdefault(prefix, []).append(ref)
+                    else:
+                        lo, hi = self._prefix_range(data, prefix)
+                        if hi - lo > SUGGEST_TOP_THRESHOLD:
+                            # 新增名称使该前缀变为热门前缀
+                            recompute.add(prefix)
+                        else:
+                            # 更短的前缀都不是热门前缀时，更长的前缀也不会是
+                            break
+        for prefix in recompute:
+            lo, hi = self._prefix_range(data, prefix)
+            data.top[prefix] = self._rank_refs(data, data.refs[lo:hi])
+        for prefix, refs in merge.items():
+            if prefix not in recompute:
+                data.top[prefix] = self._rank_refs(data, data.top[prefix] + refs)
+        data.dirty_refs = set()
+        data.removed = []
+        return len(recompute) + len(merge)
+
+    def build(self) -> bool:
+        """全量构建索引，构建完成后原子替换旧索引"""
+        conn = get_default_db_connection()
+        if not conn:
+            print("[SuggestIndex] 数据库连接失败，无法构建索引")
+            return False
+        start = time.time()
+        try:
+            data = _SuggestData()
+            data.pending = []
+            self._add_festivals(data)
+            for table in SUGGEST_ENTITY_TABLES:
+                self._load_entities(data, table, self._iter_entities(conn, table, None))
+            self._update_access_counts(data, conn)
+            data.pending.sort(key=lambda pair: pair[0])
+            data.keys = [key for key, _ in data.pending]
+            data.refs = [ref for _, ref in data.pending]
+            data.pending = None
+            if len(data.keys) > SUGGEST_TOP_THRESHOLD:
+                self._build_top(data, 0, len(data.keys), 0)
+            data.dirty_refs = set()
+            data.removed = []
+            with self._lock:
+                self._data = data
+                self._memo = {}
+                self.ready = True
+            self.last_build_time = time.time()
+            self.last_refresh_time = self.last_build_time
+            self.build_seconds = round(self.last_build_time - start, 3)
+            print(f"[SuggestIndex] 索引构建完成: {len(data.entries)} 个名称，{len(data.keys)} 个检索键，"
+                  f"{len(data.top)} 个热门前缀，耗时 {self.build_seconds} 秒")
+            return True
+        except Exception as e:
+            print(f"[SuggestIndex] 索引构建失败: {e}")
+            return False
+        finally:
+            conn.close()
+
+    def refresh(self) -> int:
+        """按水位增量刷新实体名称和访问热度，返回变化的条目数"""
+        if not self.ready:
+            self.build()
+            return 0
+        conn = get_default_db_connection()
+        if not conn:
+            return 0
+        try:
+            total = 0
+            for table in SUGGEST_ENTITY_TABLES:
+                mark = dict(self._data.watermarks.get(table) or {'id': 0, 'updated_at': None})
+                # 锁外读出增量记录，持锁写入
+                rows = list(self._iter_entities(conn, table, mark))
+                if rows:
+                    with self._lock:
+                        total += self._load_entities(self._data, table, rows)
+            with self._lock:
+                total += self._update_access_counts(self._data, conn)
+                if total:
+                    self._patch_top(self._data)
+                    self._memo = {}
+            self.last_refresh_time = time.time()
+            return total
+        except Exception as e:
+            print(f"[SuggestIndex] 增量刷新失败: {e}")
+            return 0
+        finally:
+            conn.close()
+
+    def start(self):
+        """在后台线程中构建索引并定期刷新"""
+        if self.running:
+            return
+        self.running = True
+        thread = threading.Thread(target=self._refresh_loop, daemon=True)
+        thread.start()
+
+    def stop(self):
+        self.running = False
+        self._wakeup.set()
+
+    def request_refresh(self, rebuild: bool = False):
+        """请求后台线程立即刷新（实体检索索引刷新到新数据时调用）"""
+        if rebuild:
+            self._rebuild_requested = True
+        self._wakeup.set()
+
+    def _refresh_loop(self):
+        self.build()
+        while self.running:
+            self._wakeup.wait(SUGGEST_REFRESH_INTERVAL)
+            self._wakeup.clear()
+            if not self.running:
+                break
+            try:
+                rebuild, self._rebuild_requested = self._rebuild_requested, False
+                if rebuild or not self.ready or (self.last_build_time and
+                                                 time.time() - self.last_build_time >= SUGGEST_REBUILD_INTERVAL):
+                    self.build()
+                else:
+                    self.refresh()
+            except Exception as e:
+                print(f"[SuggestIndex] 后台刷新出错: {e}")
+
+    # ==================== 查询 ====================
+    def _score(self, data: _SuggestData, ref: Tuple) -> float:
+        score = math.log1p(data.access_counts.get(ref, 0))
+        if ref[0] == 'festival':
+            score += FESTIVAL_BASE_SCORE
+        return score
+
+    def suggest(self, prefix: str, limit: int = SUGGEST_DEFAULT_LIMIT) -> List[Dict]:
+        """
+        前缀补全
+
+        Args:
+            prefix: 用户已输入的内容（中文名称、全拼或拼音首字母的前缀）
+            limit: 返回的最大条数
+
+        Returns:
+            list: [{'text', 'type', 'table', 'id', 'score'}]，按热度降序、名称长度升序；同名只保留热度最高的一条
+        """
+        key = normalize_key(prefix)
+        limit = max(1, min(int(limit), SUGGEST_MAX_LIMIT))
+        if not key:
+            return []
+        with self._lock:
+            self.queries += 1
+            memo_key = (key, limit)
+            cached = self._memo.get(memo_key)
+            if cached is not None:
+                self.memo_hits += 1
+                return cached
+
+            data = self._data
+            top = data.top.get(key)
+            if top is not None:
+                ranked = top[:limit]
+            else:
+                lo, hi = self._prefix_range(data, key)
+                ranked = self._rank_refs(data, data.refs[lo:min(hi, lo + SUGGEST_MAX_SCAN)], limit)
+            results = []
+            for ref in ranked:
+                entry = data.entries[ref]
+                results.append({
+                    'text': entry['text'],
+                    'type': entry['type'],
+                    'table': entry['table'],
+                    'id': entry['id'],
+                    'score': round(self._score(data, ref), 4),
+                })
+            if len(self._memo) >= SUGGEST_MEMO_SIZE:
+                self._memo = {}
+            self._memo[memo_key] = results
+            return results
+
+    def stats(self) -> Dict:
+        with self._lock:
+            data = self._data
+            return {
+                'ready': self.ready,
+                'entries': len(data.entries),
+                'keys': len(data.keys),
+                'top_prefixes': len(data.top),
+                'pinyin': lazy_pinyin is not None,
+                'queries': self.queries,
+                'memo_hits': self.memo_hits,
+                'memo_size': len(self._memo),
+                'watermarks': {t: {k: (str(v) if k == 'updated_at' and v else v) for k, v in m.items()}
+                               for t, m in data.watermarks.items()},
+                'build_seconds': self.build_seconds,
+                'last_build_time': self.last_build_time,
+                'last_refresh_time': self.last_refresh_time,
+            }
+
+
+# 全局索引实例
+_suggest_index = None
+_suggest_index_lock = threading.Lock()
+
+
+def get_suggest_index() -> SuggestIndex:
+    """获取输入提示索引实例（单例）"""
+    global _suggest_index
+    if _suggest_index is None:
+        with _suggest_index_lock:
+            if _suggest_index is None:
+                _suggest_index = SuggestIndex()
+    return _suggest_index
@@ -10,6 +10,7 @@ import functools
 from contextlib import contextmanager
 from typing import Optional, Dict, Any, Callable
 from flask import jsonify
+import pymysql
 from pymysql.cursors import DictCursor
 
 # 添加项目根目录和scripts目录到路径
@@ -26,7 +27,7 @@ from db_connection import get_user_db_connection
 def get_db_connection(user_id: Optional[int] = None):
     """
     数据库连接上下文管理器
-    自动处理连接的获取和关闭
+    自动处理连接的获取和关闭（连接从连接池借出，退出时归还）
     
     Usage:
         with get_db_connection(user_id) as conn:
@@ -40,6 +41,11 @@ def get_db_connection(user_id: Optional[int] = None):
         if not conn:
             raise Exception("数据库连接失败")
         yield conn
+    except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+        # 连接层面的错误，连接可能已损坏，不再放回连接池
+        if conn and hasattr(conn, 'invalidate'):
+            conn.invalidate()
+        raise
     except Exception as e:
         if conn:
             conn.rollback()
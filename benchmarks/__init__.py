@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+"""
+检索性能基准（离线）
+- corpus:  基于节日名称（festival_name_utils）和同义词表（synonyms.txt）生成可复现的合成语料，
+           并导入独立的 MySQL / MariaDB 基准库
+- replay:  按查询组合回放 /api/search、/api/ai_search（桩模型）和 RAGBase.query_database，
+           统计 p50/p95/p99 延迟、吞吐量和扫描行数
+- report:  结果输出为JSON，两个版本的结果可直接对比找出性能回退
+
+使用方法见 benchmarks/README_BENCHMARKS.md：
+    python -m benchmarks load --rows 100000
+    python -m benchmarks run --output results/base.json
+    python -m benchmarks compare results/base.json results/head.json
+"""
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+检索性能基准命令行
+
+使用方法（在项目根目录执行）：
+    python -m benchmarks generate --rows 10000 --output-dir bench_corpus     # 只生成JSONL语料
+    python -m benchmarks load --rows 100000                                  # 生成并导入基准库
+    python -m benchmarks run --queries 2000 --concurrency 8 --output results/head.json
+    python -m benchmarks compare results/base.json results/head.json --threshold 0.1
+
+基准库连接使用 BENCH_MYSQL_HOST / BENCH_MYSQL_PORT / BENCH_MYSQL_USER / BENCH_MYSQL_PASSWORD，
+未配置时使用 .env 中的 MYSQL_*；库名使用 BENCH_MYSQL_DB（默认 java_project_bench）。
+为避免覆盖业务数据，默认拒绝在 .env 的 MYSQL_DB 上导入或回放。
+"""
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import platform
+from datetime import datetime
+from typing import Dict
+
+from .corpus import (BENCHMARK_TABLES, LOAD_BATCH_SIZE, CorpusGenerator, corpus_summary, load_corpus,
+                     load_vocabulary, project_root, table_sizes)
+from .report import (compare_results, git_revision, load_results, print_comparison, print_summary,
+                     write_results)
+
+DEFAULT_BENCH_DB = 'java_project_bench'
+
+
+def database_config(args) -> Dict:
+    """基准库连接配置：命令行参数 > BENCH_MYSQL_* > MYSQL_*"""
+    from env_loader import load_env_from_root
+    load_env_from_root(os.path.join(project_root, 'scripts', 'env_loader.py'))
+    return {
+        'host': args.host or os.getenv('BENCH_MYSQL_HOST') or os.getenv('MYSQL_HOST') or '127.0.0.1',
+        'port': int(args.port or os.getenv('BENCH_MYSQL_PORT') or os.getenv('MYSQL_PORT') or 3306),
+        'user': args.user or os.getenv('BENCH_MYSQL_USER') or os.getenv('MYSQL_USER') or 'root',
+        'password': args.password if args.password is not None else
+        (os.getenv('BENCH_MYSQL_PASSWORD') or os.getenv('MYSQL_PASSWORD') or ''),
+        'database': args.database or os.getenv('BENCH_MYSQL_DB') or DEFAULT_BENCH_DB,
+    }
+
+
+def connect(config: Dict, create: bool = False):
+    """连接基准库（create=True 时先创建数据库），失败返回None"""
+    import pymysql
+    try:
+        conn = pymysql.connect(host=config['host'], port=config['port'], user=config['user'],
+                               password=config['password'], charset='utf8mb4', autocommit=False)
+        with conn.cursor() as cursor:
+            if create:
+                cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{config['database']}` CHARACTER SET utf8mb4 "
+                               f"COLLATE utf8mb4_unicode_ci")
+        conn.select_db(config['database'])
+        return conn
+    except Exception as e:
+        print(f"[Benchmark] [ERROR] 连接基准库失败（{config['host']}:{config['port']}/{config['database']}）: {e}")
+        return None
+
+
+def _check_database(config: Dict, args) -> bool:
+    main_db = os.getenv('MYSQL_DB')
+    if main_db and config['database'] == main_db and not args.allow_main_database:
+        print(f"[Benchmark] [ERROR] 基准库与业务库同名（{main_db}），"
+              f"请设置 BENCH_MYSQL_DB 或 --database，确需使用时加 --allow-main-database")
+        return False
+    return True
+
+
+def cmd_generate(args) -> int:
+    generator = CorpusGenerator(load_vocabulary(), table_sizes(args.rows, args.tables), args.seed)
+    for table, path in generator.write_jsonl(args.output_dir).items():
+        print(f"[Benchmark] [OK] {table}: {generator.sizes[table]} 行 -> {path}")
+    return 0
+
+
+def cmd_load(args) -> int:
+    config = database_config(args)
+    if not _check_database(config, args):
+        return 1
+    conn = connect(config, create=True)
+    if not conn:
+        return 1
+    try:
+        generator = CorpusGenerator(load_vocabulary(), table_sizes(args.rows, args.tables), args.seed)
+        load_corpus(conn, generator, reset=not args.append, batch_size=args.batch_size)
+        print(f"[Benchmark] [OK] 基准库 {config['database']}: {corpus_summary(conn)}")
+        return 0
+    finally:
+        conn.close()
+
+
+def cmd_run(args) -> int:
+    from .replay import (ServerStatus, build_query_mix, build_targets, configure_application_database,
+                         run_target)
+
+    config = database_config(args)
+    if not _check_database(config, args):
+        return 1
+    conn = connect(config)
+    if not conn:
+        return 1
+    conn.autocommit(True)
+    keyword_cache_dir = tempfile.mkdtemp(prefix='bench_keywords_')
+    try:
+        corpus = corpus_summary(conn)
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT VERSION()")
+            database_version = cursor.fetchone()[0]
+
+        # 项目代码连接基准库，必须在导入检索模块之前设置
+        configure_application_database(config)
+        targets = build_targets(args.targets, os.path.join(keyword_cache_dir, 'keywords.db'),
+                                stub_latency_ms=args.stub_latency, index_wait=args.index_wait)
+        target_meta = targets.pop('_meta')
+        queries = build_query_mix(load_vocabulary(), args.queries, args.seed, args.repeat_ratio)
+
+        status = ServerStatus(conn)
+        results = {}
+        for name in args.targets:
+            print(f"[Benchmark] 回放 {name}：{len(queries)} 个查询，并发 {args.concurrency}")
+            results[name] = run_target(targets[name], queries, status, concurrency=args.concurrency,
+                                       warmup=args.warmup, cold=args.cold)
+
+        stub_model = target_meta.pop('stub_model', None)
+        meta = {
+            'revision': git_revision(project_root),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'database_version': database_version,
+            'queries': len(queries),
+            'seed': args.seed,
+            'repeat_ratio': args.repeat_ratio,
+            'concurrency': args.concurrency,
+            'warmup': args.warmup,
+            'cold': args.cold,
+            'stub_latency_ms': args.stub_latency,
+            'stub_model_calls': stub_model.calls if stub_model else None,
+        }
+        meta.update(target_meta)
+        report = {'meta': meta, 'corpus': corpus, 'results': results}
+        if args.json and not args.output:
+            write_results(report)
+        else:
+            print_summary(report)
+            if args.output:
+                write_results(report, args.output)
+        return 0
+    finally:
+        conn.close()
+        shutil.rmtree(keyword_cache_dir, ignore_errors=True)
+
+
+def cmd_compare(args) -> int:
+    base, head = load_results(args.base), load_results(args.head)
+    rows, regressions = compare_results(base, head, args.threshold)
+    print_comparison(base, head, rows, regressions, args.threshold)
+    return 1 if regressions else 0
+
+
+def _add_database_arguments(parser):
+    parser.add_argument('--host', help='基准库主机（默认 BENCH_MYSQL_HOST / MYSQL_HOST）')
+    parser.add_argument('--port', type=int, help='基准库端口')
+    parser.add_argument('--user', help='基准库用户名')
+    parser.add_argument('--password', help='基准库密码')
+    parser.add_argument('--database', help=f'基准库名（默认 BENCH_MYSQL_DB 或 {DEFAULT_BENCH_DB}）')
+    parser.add_argument('--allow-main-database', action='store_true', help='允许使用与 .env 中 MYSQL_DB 同名的库')
+
+
+def main(argv=None) -> int:
+    from .replay import TARGETS
+
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='检索性能基准')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    generate = subparsers.add_parser('generate', help='生成合成语料（JSONL）')
+    generate.add_argument('--output-dir', required=True, help='输出目录')
+
+    load = subparsers.add_parser('load', help='生成合成语料并导入基准库')
+    load.add_argument('--append', action='store_true', help='不清空已有数据（默认导入前清空基准表）')
+    load.add_argument('--batch-size', type=int, default=LOAD_BATCH_SIZE, help='每批插入的行数')
+    _add_database_arguments(load)
+
+    for sub in (generate, load):
+        sub.add_argument('--rows', type=int, default=10000,
+                         help='每张表的基准行数（1万~100万，AIGC_cultural_entities 按比例缩小）')
+        sub.add_argument('--tables', nargs='+', choices=BENCHMARK_TABLES, default=list(BENCHMARK_TABLES),
+                         help='生成的表（默认全部）')
+        sub.add_argument('--seed', type=int, default=42, help='随机种子（相同种子和行数生成相同语料）')
+
+    run = subparsers.add_parser('run', help='回放查询组合并统计延迟、吞吐量和扫描行数')
+    run.add_argument('--targets', nargs='+', choices=TARGETS, default=list(TARGETS), help='回放目标（默认全部）')
+    run.add_argument('--queries', type=int, default=1000, help='每个目标回放的查询数')
+    run.add_argument('--repeat-ratio', type=float, default=0.3, help='重复已出现查询的比例（模拟热门查询）')
+    run.add_argument('--concurrency', type=int, default=1, help='并发线程数')
+    run.add_argument('--warmup', type=int, default=50, help='不计入统计的预热查询数')
+    run.add_argument('--cold', action='store_true', help='每个请求前清空检索结果缓存')
+    run.add_argument('--stub-latency', type=float, default=0.0, help='ai_search 桩模型的模拟延迟（毫秒）')
+    run.add_argument('--index-wait', type=float, default=120.0, help='等待实体检索索引就绪的最长时间（秒）')
+    run.add_argument('--seed', type=int, default=42, help='查询组合的随机种子')
+    run.add_argument('--output', help='结果JSON文件路径')
+    run.add_argument('--json', action='store_true', help='不指定 --output 时以JSON格式输出到标准输出')
+    _add_database_arguments(run)
+
+    compare = subparsers.add_parser('compare', help='对比两个结果文件，存在回退时返回1')
+    compare.add_argument('base', help='基线结果文件')
+    compare.add_argument('head', help='当前结果文件')
+    compare.add_argument('--threshold', type=float, default=0.1, help='回退阈值（相对变化，默认0.1）')
+
+    args = parser.parse_args(argv)
+    handlers = {'generate': cmd_generate, 'load': cmd_load, 'run': cmd_run, 'compare': cmd_compare}
+    return handlers[args.command](args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
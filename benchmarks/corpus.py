@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+"""
+合成语料的生成与导入
+词汇来自 festival_name_utils.FESTIVAL_NAME_MAP（节日名称）和 AIGC/synonyms.txt（同义词组），
+同一随机种子、同一行数生成的语料完全相同，不同版本的基准结果可以直接对比。
+
+生成的表：cultural_entities、AIGC_cultural_entities、cultural_resources、crawled_images
+表结构取自 database_files/init_schema.sql，导入后回填 search_documents 和 image_tags，
+与生产库的检索路径保持一致。
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+from typing import Dict, Iterator, List, Optional, Sequence
+
+# 添加项目根目录和scripts目录到路径
+current_dir = os.path.dirname(os.path.realpath(__file__))
+project_root = os.path.dirname(current_dir)
+scripts_dir = os.path.join(project_root, 'scripts')
+sys.path.insert(0, project_root)
+sys.path.insert(0, scripts_dir)
+
+SCHEMA_FILE = os.path.join(project_root, 'database_files', 'init_schema.sql')
+SYNONYMS_FILE = os.path.join(project_root, 'AIGC', 'synonyms.txt')
+
+# 按导入顺序排列（crawled_images 引用 cultural_resources 和 cultural_entities 的ID）
+BENCHMARK_TABLES = ('cultural_resources', 'cultural_entities', 'AIGC_cultural_entities', 'crawled_images')
+
+# 各表行数相对于 --rows 的比例
+TABLE_RATIOS = {
+    'cultural_resources': 1.0,
+    'cultural_entities': 1.0,
+    'AIGC_cultural_entities': 0.2,
+    'crawled_images': 1.0,
+}
+
+# 每批插入的行数
+LOAD_BATCH_SIZE = 1000
+
+# 泛化的节日名称不用于生成语料（与 query_compiler 一致）
+_GENERIC_FESTIVALS = {"节日", "传统节日"}
+_CJK = re.compile(r'[\u4e00-\u9fff]')
+
+REGIONS = ('北京', '苏州', '杭州', '岭南', '川渝', '闽南', '江南', '西北', '东北', '湘西', '徽州', '云南')
+ERAS = ('先秦', '汉代', '唐代', '宋代', '元代', '明代', '清代', '近现代')
+ENTITY_TYPES = ('人物', '作品', '事件', '地点', '其他')
+ENTITY_SUFFIXES = ('习俗', '传说', '技艺', '图', '活动', '故事', '礼仪', '遗址')
+SOURCES = ('中国非物质文化遗产网', '地方志', '民俗调查', '博物馆藏品档案')
+SENTENCES = (
+    '{festival}期间，{region}一带流行{topic}。',
+    '{topic}是{festival}最具代表性的民俗之一，相传起源于{era}。',
+    '{region}的{topic}以{style}著称，至今仍在{festival}前后举行。',
+    '人们在{festival}通过{topic}祈求平安、纪念先人。',
+    '{era}文献中已有关于{topic}的记载。',
+)
+STYLES = ('造型古朴', '色彩鲜艳', '工艺精细', '仪式隆重', '形式多样')
+
+
+class Vocabulary:
+    """语料和查询组合共用的词汇"""
+
+    def __init__(self, festivals: List[str], festival_en: Dict[str, str], synonym_groups: List[List[str]]):
+        self.festivals = festivals
+        self.festival_en = festival_en
+        self.synonym_groups = synonym_groups
+        festival_set = set(festivals)
+        # 非节日名称的中文同义词作为习俗、器物等主题词（同义词表中的拼音、英文别名不用于生成正文）
+        self.topics = list(dict.fromkeys(
+            word for group in synonym_groups for word in group
+            if word not in festival_set and _CJK.search(word)
+        )) or ['民俗']
+
+
+def load_vocabulary(synonyms_file: str = SYNONYMS_FILE) -> Vocabulary:
+    try:
+        from festival_name_utils import FESTIVAL_NAME_MAP
+    except ImportError:
+        FESTIVAL_NAME_MAP = {}
+    festivals = [name for name in FESTIVAL_NAME_MAP if name not in _GENERIC_FESTIVALS]
+    groups = []
+    if os.path.exists(synonyms_file):
+        with open(synonyms_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    group = [word.strip() for word in line.split(',') if word.strip()]
+                    if len(group) > 1:
+                        groups.append(group)
+    return Vocabulary(festivals or ['春节'], dict(FESTIVAL_NAME_MAP), groups)
+
+
+def table_sizes(rows: int, tables: Sequence[str] = BENCHMARK_TABLES) -> Dict[str, int]:
+    """按 TABLE_RATIOS 计算每张表的行数"""
+    return {table: max(1, int(rows * TABLE_RATIOS[table])) for table in tables}
+
+
+# ==================== 生成 ====================
+class CorpusGenerator:
+    """按表生成合成行（每张表使用独立的随机数序列，单独生成某张表的结果与整体生成一致）"""
+
+    def __init__(self, vocabulary: Vocabulary, sizes: Dict[str, int], seed: int = 42):
+        self.vocabulary = vocabulary
+        self.sizes = sizes
+        self.seed = seed
+
+    def _rng(self, table: str) -> random.Random:
+        return random.Random(f"{self.seed}:{table}")
+
+    def _paragraph(self, rng: random.Random, festival: str, topic: str, region: str, sentences: int) -> str:
+        era = rng.choice(ERAS)
+        style = rng.choice(STYLES)
+        return ''.join(
+            rng.choice(SENTENCES).format(festival=festival, topic=topic, region=region, era=era, style=style)
+            for _ in range(sentences)
+        )
+
+    def _entity_rows(self, table: str) -> Iterator[Dict]:
+        vocab = self.vocabulary
+        rng = self._rng(table)
+        for i in range(1, self.sizes.get(table, 0) + 1):
+            festival = rng.choice(vocab.festivals)
+            topic = rng.choice(vocab.topics)
+            region = rng.choice(REGIONS)
+            name = rng.choice((f"{festival}{topic}", f"{region}{topic}{rng.choice(ENTITY_SUFFIXES)}",
+                               f"{topic}{rng.choice(ENTITY_SUFFIXES)}"))
+            yield {
+                'id': i,
+                'entity_name': name,
+                'entity_type': rng.choice(ENTITY_TYPES),
+                'description': self._paragraph(rng, festival, topic, region, rng.randint(2, 5)),
+                'source': rng.choice(SOURCES),
+                'period_era': rng.choice(ERAS),
+                'cultural_region': region,
+                'style_features': rng.choice(STYLES),
+                'cultural_value': f"体现了{festival}的文化内涵",
+            }
+
+    def _resource_rows(self, table: str) -> Iterator[Dict]:
+        vocab = self.vocabulary
+        rng = self._rng(table)
+        for i in range(1, self.sizes.get(table, 0) + 1):
+            festivals = rng.sample(vocab.festivals, k=min(len(vocab.festivals), rng.choice((1, 1, 2))))
+            topic = rng.choice(vocab.topics)
+            region = rng.choice(REGIONS)
+            title = f"{region}{festivals[0]}{topic}"
+            content = {
+                'title': title,
+                'text': self._paragraph(rng, festivals[0], topic, region, rng.randint(4, 12)),
+                'meta': {'festival_names': festivals, 'tags': [topic, region]},
+            }
+            yield {
+                'id': i,
+                'title': festivals[0],
+                'resource_type': '文本',
+                'file_format': 'TXT',
+                'source_from': rng.choice(SOURCES),
+                'source_url': f"https://benchmark.invalid/{table}/{i}",
+                'content_feature_data': json.dumps(content, ensure_ascii=False),
+                'ai_review_status': 'approved',
+                'manual_review_status': 'approved',
+            }
+
+    def _image_rows(self, table: str) -> Iterator[Dict]:
+        vocab = self.vocabulary
+        rng = self._rng(table)
+        resources = self.sizes.get('cultural_resources', 0)
+        entities = self.sizes.get('cultural_entities', 0)
+        for i in range(1, self.sizes.get(table, 0) + 1):
+            festival = rng.choice(vocab.festivals)
+            tags = list(dict.fromkeys([festival] + rng.sample(vocab.topics, k=min(len(vocab.topics), 2))))
+            yield {
+                'id': i,
+                'file_name': f"benchmark_{i}.jpg",
+                'storage_path': f"crawled_images/benchmark_{i}.jpg",
+                'dimensions': rng.choice(('1024x768', '800x600', '1920x1080')),
+                'tags': json.dumps(tags, ensure_ascii=False),
+                'resource_id': rng.randint(1, resources) if resources and rng.random() < 0.5 else None,
+                'entity_id': rng.randint(1, entities) if entities and rng.random() < 0.5 else None,
+                'festival_name': festival,
+            }
+
+    def rows(self, table: str) -> Iterator[Dict]:
+        if table in ('cultural_entities', 'AIGC_cultural_entities'):
+            return self._entity_rows(table)
+        if table == 'cultural_resources':
+            return self._resource_rows(table)
+        if table == 'crawled_images':
+            return self._image_rows(table)
+        raise ValueError(f"不支持生成的表: {table}")
+
+    def write_jsonl(self, output_dir: str) -> Dict[str, str]:
+        """把语料写为每表一个JSONL文件（用于检查生成结果或导入其他环境）"""
+        os.makedirs(output_dir, exist_ok=True)
+        paths = {}
+        for table in self.sizes:
+            path = os.path.join(output_dir, f"{table}.jsonl")
+            with open(path, 'w', encoding='utf-8') as f:
+                for row in self.rows(table):
+                    f.write(json.dumps(row, ensure_ascii=False) + '\n')
+            paths[table] = path
+        return paths
+
+
+# ==================== 导入 ====================
+_CREATE_TABLE = re.compile(r"CREATE TABLE IF NOT EXISTS `(\w+)` \(.*?\)\s*ENGINE=[^;]*;", re.S)
+
+
+def create_tables_statements(schema_file: str = SCHEMA_FILE) -> Dict[str, str]:
+    """从 init_schema.sql 中提取建表语句（表名 -> 语句）"""
+    with open(schema_file, 'r', encoding='utf-8') as f:
+        content = f.read()
+    return {match.group(1): match.group(0) for match in _CREATE_TABLE.finditer(content)}
+
+
+def _index_exists(cursor, table: str, index: str) -> bool:
+    cursor.execute(
+        "SELECT COUNT(*) FROM INFORMATION_SCHEMA.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s",
+        (table, index)
+    )
+    row = cursor.fetchone()
+    return bool(tuple(row.values())[0] if isinstance(row, dict) else row[0])
+
+
+def install_schema(conn, schema_file: str = SCHEMA_FILE):
+    """建表（与 init_schema.sql 一致，跳过视图、角色、授权），并补充 cultural_entities 的全文索引"""
+    statements = create_tables_statements(schema_file)
+    with conn.cursor() as cursor:
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+        for statement in statements.values():
+            cursor.execute(statement)
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+        if not _index_exists(cursor, 'cultural_entities', 'idx_ce_search'):
+            cursor.execute("ALTER TABLE `cultural_entities` ADD FULLTEXT INDEX `idx_ce_search` "
+                           "(`entity_name`, `description`) WITH PARSER ngram")
+    conn.commit()
+    print(f"[Corpus] [OK] 已创建 {len(statements)} 张表")
+
+
+def reset_tables(conn, tables: Sequence[str] = BENCHMARK_TABLES):
+    """清空基准表及其派生表（search_documents、image_tags），并删除同步触发器（导入完成后重新安装）"""
+    import search_documents
+    import image_tags
+
+    with conn.cursor() as cursor:
+        for table in tables:
+            for event in ('ins', 'upd', 'del'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS `{search_documents.trigger_name(table, event)}`")
+                cursor.execute(f"DROP TRIGGER IF EXISTS `{image_tags.trigger_name(table, event)}`")
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+        for table in tuple(tables) + ('search_documents', 'image_tags'):
+            cursor.execute(f"TRUNCATE TABLE `{table}`")
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+    conn.commit()
+
+
+def load_table(conn, table: str, rows: Iterator[Dict], batch_size: int = LOAD_BATCH_SIZE) -> int:
+    """分批插入一张表，返回插入行数"""
+    loaded = 0
+    start = time.time()
+    with conn.cursor() as cursor:
+        # 导入期间关闭唯一性和外键检查（生成的数据本身满足约束）
+        cursor.execute("SET unique_checks = 0, foreign_key_checks = 0")
+        batch: List[Dict] = []
+        sql = None
+        for row in rows:
+            if sql is None:
+                columns = list(row)
+                sql = (f"INSERT INTO `{table}` ({', '.join(f'`{c}`' for c in columns)}) "
+                       f"VALUES ({', '.join(['%s'] * len(columns))})")
+            batch.append(row)
+            if len(batch) >= batch_size:
+                cursor.executemany(sql, [tuple(r.values()) for r in batch])
+                conn.commit()
+                loaded += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(sql, [tuple(r.values()) for r in batch])
+            conn.commit()
+            loaded += len(batch)
+        cursor.execute("SET unique_checks = 1, foreign_key_checks = 1")
+    print(f"[Corpus] [OK] {table} 导入 {loaded} 行，耗时 {time.time() - start:.1f} 秒")
+    return loaded
+
+
+def build_derived_tables(conn, tables: Sequence[str] = BENCHMARK_TABLES):
+    """回填 search_documents / image_tags 并安装同步触发器，更新统计信息"""
+    import search_documents
+    import image_tags
+
+    synced = [table for table in tables if table in search_documents.SOURCE_TABLES]
+    search_documents.backfill(conn, synced)
+    search_documents.install_triggers(conn)
+    image_tables = [table for table in tables if table in image_tags.IMAGE_TABLES]
+    if image_tables:
+        image_tags.backfill(conn, image_tables)
+        image_tags.install_triggers(conn)
+    with conn.cursor() as cursor:
+        for table in tuple(tables) + ('search_documents', 'image_tags'):
+            cursor.execute(f"ANALYZE TABLE `{table}`")
+            cursor.fetchall()
+
+
+def load_corpus(conn, generator: CorpusGenerator, reset: bool = True,
+                batch_size: int = LOAD_BATCH_SIZE) -> Dict[str, int]:
+    """
+    把合成语料导入当前数据库
+
+    Args:
+        conn: 已选择基准库的数据库连接
+        generator: 语料生成器（决定各表行数和随机种子）
+        reset: 导入前清空基准表
+
+    Returns:
+        dict: 表名 -> 导入行数
+    """
+    install_schema(conn)
+    tables = [table for table in BENCHMARK_TABLES if table in generator.sizes]
+    if reset:
+        reset_tables(conn, BENCHMARK_TABLES)
+    counts = {table: load_table(conn, table, generator.rows(table), batch_size) for table in tables}
+    build_derived_tables(conn, tables)
+    return counts
+
+
+def corpus_summary(conn, tables: Sequence[str] = BENCHMARK_TABLES) -> Dict[str, Optional[int]]:
+    """基准库中各表的行数（写入结果文件，便于确认两次结果基于相同规模的语料）"""
+    summary = {}
+    with conn.cursor() as cursor:
+        for table in tuple(tables) + ('search_documents', 'image_tags'):
+            try:
+                cursor.execute(f"SELECT COUNT(*) FROM `{table}`")
+                row = cursor.fetchone()
+                summary[table] = int(tuple(row.values())[0] if isinstance(row, dict) else row[0])
+            except Exception:
+                summary[table] = None
+    return summary
@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+"""
+查询组合回放
+- 查询组合：节日名称、同义词、短语、长描述（模拟多模态检索的图片描述）、英文节日名称、未命中查询，
+  按比例混合，并按 repeat_ratio 重复已出现的查询（模拟热门查询，命中各级缓存）
+- 回放目标：
+    search          GET /api/search（Flask test_client，与线上请求走相同的代码路径）
+    ai_search       GET /api/ai_search（大模型替换为桩模型，可配置模拟延迟）
+    query_database  RAGBase.query_database（不初始化向量库和嵌入模型）
+- 统计：p50/p95/p99 延迟、吞吐量，以及 SHOW GLOBAL STATUS 中 Handler_read_* / Innodb_rows_read 的增量（扫描行数）
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# 添加项目根目录、scripts目录和AIGC目录到路径
+current_dir = os.path.dirname(os.path.realpath(__file__))
+project_root = os.path.dirname(current_dir)
+scripts_dir = os.path.join(project_root, 'scripts')
+aigc_dir = os.path.join(project_root, 'AIGC')
+sys.path.insert(0, project_root)
+sys.path.insert(0, scripts_dir)
+sys.path.insert(0, aigc_dir)
+
+from .corpus import Vocabulary, REGIONS, BENCHMARK_TABLES
+
+TARGETS = ('search', 'ai_search', 'query_database')
+
+# 查询类型及占比
+QUERY_MIX = (
+    ('festival', 0.30),
+    ('synonym', 0.20),
+    ('phrase', 0.20),
+    ('long', 0.10),
+    ('english', 0.10),
+    ('miss', 0.10),
+)
+
+_MISS_WORDS = ('量子计算', '区块链', '火星探测', '深度学习', '半导体', '新能源汽车')
+
+HANDLER_VARIABLES = ('Handler_read_first', 'Handler_read_key', 'Handler_read_last', 'Handler_read_next',
+                     'Handler_read_prev', 'Handler_read_rnd', 'Handler_read_rnd_next')
+
+
+# ==================== 查询组合 ====================
+def build_query_mix(vocabulary: Vocabulary, count: int, seed: int = 42,
+                    repeat_ratio: float = 0.3) -> List[Tuple[str, str]]:
+    """
+    生成可复现的查询序列
+
+    Returns:
+        list: (查询类型, 查询)；重复的查询保留原类型
+    """
+    rng = random.Random(f"{seed}:queries")
+    kinds = [kind for kind, _ in QUERY_MIX]
+    weights = [weight for _, weight in QUERY_MIX]
+    groups = vocabulary.synonym_groups or [[f] for f in vocabulary.festivals]
+    queries: List[Tuple[str, str]] = []
+    for _ in range(count):
+        if queries and rng.random() < repeat_ratio:
+            queries.append(rng.choice(queries))
+            continue
+        kind = rng.choices(kinds, weights)[0]
+        festival = rng.choice(vocabulary.festivals)
+        topic = rng.choice(vocabulary.topics)
+        if kind == 'festival':
+            query = festival
+        elif kind == 'synonym':
+            query = rng.choice(rng.choice(groups))
+        elif kind == 'phrase':
+            query = rng.choice((f"{festival}{topic}的习俗有哪些", f"{rng.choice(REGIONS)}{topic}",
+                                f"介绍一下{festival}的{topic}"))
+        elif kind == 'long':
+            query = (f"图片中有{topic}和{rng.choice(vocabulary.topics)}，背景是{rng.choice(REGIONS)}的街道，"
+                     f"人们穿着传统服饰，正在庆祝{festival}。画面色彩鲜艳，气氛热闹。")
+        elif kind == 'english':
+            query = vocabulary.festival_en.get(festival) or festival
+        else:
+            query = f"{rng.choice(_MISS_WORDS)}{rng.randint(1, 9999)}"
+        queries.append((kind, query))
+    return queries
+
+
+# ==================== 延迟统计 ====================
+def percentile(sorted_values: Sequence[float], p: float) -> Optional[float]:
+    """线性插值百分位数（sorted_values 已升序）"""
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * p / 100.0
+    low = int(k)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (k - low)
+
+
+def summarize_latencies(latencies: Sequence[float]) -> Dict:
+    values = sorted(latencies)
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'mean': round(sum(values) / len(values), 3),
+        'min': round(values[0], 3),
+        'p50': round(percentile(values, 50), 3),
+        'p95': round(percentile(values, 95), 3),
+        'p99': round(percentile(values, 99), 3),
+        'max': round(values[-1], 3),
+    }
+
+
+class ServerStatus:
+    """通过独立连接读取服务端状态变量（连接池中的连接看不到彼此的会话状态，因此读取全局值）"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def snapshot(self) -> Dict[str, int]:
+        with self.conn.cursor() as cursor:
+            cursor.execute("SHOW GLOBAL STATUS WHERE Variable_name LIKE 'Handler_read%' "
+                           "OR Variable_name = 'Innodb_rows_read'")
+            rows = cursor.fetchall()
+        values = {}
+        for row in rows:
+            name, value = tuple(row.values()) if isinstance(row, dict) else tuple(row)
+            values[name] = int(value)
+        return values
+
+    @staticmethod
+    def delta(before: Dict[str, int], after: Dict[str, int]) -> Dict[str, int]:
+        return {
+            'rows_examined': sum(after.get(k, 0) - before.get(k, 0) for k in HANDLER_VARIABLES),
+            'innodb_rows_read': after.get('Innodb_rows_read', 0) - before.get('Innodb_rows_read', 0),
+        }
+
+
+# ==================== 回放目标 ====================
+class StubModel:
+    """ai_search 使用的桩模型：按本地关键词提取结果返回模型格式的JSON，可模拟模型延迟"""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def invoke(self, prompt: str):
+        from types import SimpleNamespace
+        from keyword_extractor import extract_keywords_locally
+
+        with self._lock:
+            self.calls += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+        match = re.search(r'用户查询:\s*(.*)', prompt)
+        query = match.group(1).strip() if match else prompt
+        return SimpleNamespace(content=json.dumps(extract_keywords_locally(query), ensure_ascii=False))
+
+
+class ApiTarget:
+    """通过 Flask test_client 调用检索接口"""
+
+    def __init__(self, name: str, app, endpoint: str, clear_cache: Callable[[], None]):
+        self.name = name
+        self.app = app
+        self.endpoint = endpoint
+        self.clear_cache = clear_cache
+        self._local = threading.local()
+
+    def __call__(self, query: str) -> int:
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.get(self.endpoint, query_string={'q': query})
+        data = response.get_json(silent=True) or {}
+        if response.status_code != 200 or data.get('code', 200) != 200:
+            raise RuntimeError(f"HTTP {response.status_code}: {data.get('msg')}")
+        return len(data.get('data') or [])
+
+
+class QueryDatabaseTarget:
+    """直接调用 RAGBase.query_database"""
+
+    name = 'query_database'
+
+    def __init__(self, tables: Sequence[str]):
+        from rag_base import RAGBase
+
+        class BenchmarkRAG(RAGBase):
+            """只使用数据库检索部分的RAGBase（不初始化向量库和嵌入模型）"""
+
+            def __init__(self, retrieval_tables):
+                self.retrieval_tables = list(retrieval_tables)
+                self.conversation_history = []
+                self.db_config = None
+                self.db_connection = None
+                self.last_query_stats = {}
+
+        self.tables = list(tables)
+        self.rag = BenchmarkRAG(self.tables)
+
+    def clear_cache(self):
+        from retrieval_cache import get_retrieval_cache
+        get_retrieval_cache().invalidate()
+
+    def __call__(self, query: str) -> int:
+        return len(self.rag.query_database(query, self.tables))
+
+
+def configure_application_database(db_config: Dict):
+    """让项目代码（db_connection 的所有连接函数）连接基准库；必须在导入检索模块之前调用"""
+    import db_connection
+    db_connection.MYSQL_HOST = db_config['host']
+    db_connection.MYSQL_PORT = str(db_config['port'])
+    db_connection.MYSQL_USER = db_config['user']
+    db_connection.MYSQL_PASSWORD = db_config['password']
+    db_connection.MYSQL_DB = db_config['database']
+
+
+def build_targets(names: Sequence[str], keyword_cache_path: str, stub_latency_ms: float = 0.0,
+                  index_wait: float = 120.0, tables: Sequence[str] = BENCHMARK_TABLES) -> Dict:
+    """
+    创建回放目标
+
+    Args:
+        names: 要回放的目标（TARGETS 的子集）
+        keyword_cache_path: ai_search 关键词缓存的SQLite路径（每次运行使用新文件，不读写线上缓存）
+        stub_latency_ms: 桩模型的模拟延迟
+        index_wait: 等待实体检索倒排索引构建完成的最长时间（秒），超时后检索回退到数据库查询
+        tables: query_database 检索的表
+
+    Returns:
+        dict: 目标名 -> 可调用对象；以及 '_meta' -> 运行环境信息
+    """
+    targets: Dict = {}
+    meta: Dict = {}
+    if 'search' in names or 'ai_search' in names:
+        import aigc_api_server as server
+        import keyword_extractor
+        from search_cache import get_search_result_cache
+
+        keyword_extractor._keyword_extractor = keyword_extractor.KeywordExtractor(
+            store=keyword_extractor.KeywordCacheStore(db_path=keyword_cache_path)
+        )
+        stub_model = StubModel(stub_latency_ms)
+        stub_system = type('StubRAGSystem', (), {'model': stub_model})()
+        server.init_search_rag_system = lambda: stub_system
+
+        index = server.get_entity_search_index()
+        deadline = time.monotonic() + index_wait
+        while not index.ready and time.monotonic() < deadline:
+            time.sleep(0.5)
+        meta['entity_index_ready'] = index.ready
+        if not index.ready:
+            print(f"[Benchmark] 实体检索索引 {index_wait} 秒内未就绪，检索将回退到数据库查询")
+
+        cache = get_search_result_cache()
+        if 'search' in names:
+            targets['search'] = ApiTarget('search', server.app, '/api/search', cache.invalidate)
+        if 'ai_search' in names:
+            targets['ai_search'] = ApiTarget('ai_search', server.app, '/api/ai_search', cache.invalidate)
+        meta['stub_model'] = stub_model
+    if 'query_database' in names:
+        targets['query_database'] = QueryDatabaseTarget(tables)
+    targets['_meta'] = meta
+    return targets
+
+
+# ==================== 回放 ====================
+def run_target(target, queries: List[Tuple[str, str]], status: ServerStatus, concurrency: int = 1,
+               warmup: int = 0, cold: bool = False) -> Dict:
+    """
+    回放一个目标
+
+    Args:
+        target: 回放目标（query -> 返回结果条数）
+        queries: build_query_mix 生成的查询序列
+        status: 服务端状态读取器
+        concurrency: 并发线程数
+        warmup: 正式计时前顺序执行的查询数（不计入统计）
+        cold: 每个请求前清空检索结果缓存
+
+    Returns:
+        dict: 延迟分布（整体及按查询类型）、吞吐量、扫描行数、错误数
+    """
+    for _, query in queries[:warmup]:
+        try:
+            target(query)
+        except Exception:
+            pass
+
+    samples: List[Tuple[str, float, Optional[int], Optional[str]]] = []
+    samples_lock = threading.Lock()
+
+    def execute(item):
+        kind, query = item
+        if cold:
+            target.clear_cache()
+        start = time.perf_counter()
+        try:
+            returned, error = target(query), None
+        except Exception as e:
+            returned, error = None, f"{type(e).__name__}: {e}"
+        elapsed = (time.perf_counter() - start) * 1000
+        with samples_lock:
+            samples.append((kind, elapsed, returned, error))
+
+    before = status.snapshot()
+    wall_start = time.perf_counter()
+    if concurrency <= 1:
+        for item in queries:
+            execute(item)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='benchmark') as executor:
+            list(executor.map(execute, queries))
+    wall = time.perf_counter() - wall_start
+    scanned = ServerStatus.delta(before, status.snapshot())
+
+    ok = [s for s in samples if s[3] is None]
+    by_kind = {}
+    for kind, _ in QUERY_MIX:
+        latencies = [s[1] for s in ok if s[0] == kind]
+        if latencies:
+            by_kind[kind] = summarize_latencies(latencies)
+    returned = [s[2] for s in ok]
+    return {
+        'requests': len(samples),
+        'errors': len(samples) - len(ok),
+        'error_samples': list(dict.fromkeys(s[3] for s in samples if s[3]))[:5],
+        'concurrency': concurrency,
+        'wall_seconds': round(wall, 3),
+        'throughput_qps': round(len(samples) / wall, 2) if wall > 0 else None,
+        'latency_ms': summarize_latencies([s[1] for s in ok]),
+        'latency_ms_by_kind': by_kind,
+        'rows_examined': scanned['rows_examined'],
+        'rows_examined_per_request': round(scanned['rows_examined'] / len(samples), 1) if samples else None,
+        'innodb_rows_read': scanned['innodb_rows_read'],
+        'rows_returned_mean': round(sum(returned) / len(returned), 2) if returned else None,
+    }
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+基准结果的输出与对比
+结果文件为JSON：meta（版本、时间、配置）、corpus（各表行数）、results（目标 -> 统计）。
+compare 逐目标对比两个结果文件的延迟百分位、吞吐量和扫描行数，超过阈值记为回退。
+"""
+import os
+import json
+import subprocess
+from typing import Dict, List, Optional, Tuple
+
+# (指标路径, 显示名称, 数值越大越好)
+COMPARED_METRICS = (
+    (('latency_ms', 'p50'), 'p50 ms', False),
+    (('latency_ms', 'p95'), 'p95 ms', False),
+    (('latency_ms', 'p99'), 'p99 ms', False),
+    (('throughput_qps',), 'qps', True),
+    (('rows_examined_per_request',), 'rows/req', False),
+)
+
+RESULT_FORMAT_VERSION = 1
+
+
+def git_revision(repo_dir: str) -> Optional[str]:
+    """当前代码版本（提交ID，工作区有修改时加 -dirty）"""
+    try:
+        revision = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=repo_dir,
+                                           stderr=subprocess.DEVNULL, text=True).strip()
+        dirty = subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=repo_dir,
+                                        stderr=subprocess.DEVNULL, text=True).strip()
+        return f"{revision}-dirty" if dirty else revision
+    except Exception:
+        return None
+
+
+def write_results(report: Dict, path: Optional[str] = None):
+    """写入结果文件（path为None时输出到标准输出）"""
+    report.setdefault('format_version', RESULT_FORMAT_VERSION)
+    text = json.dumps(report, ensure_ascii=False, indent=2, sort_keys=True)
+    if not path:
+        print(text)
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text + '\n')
+    print(f"[Benchmark] 结果已写入 {path}")
+
+
+def load_results(path: str) -> Dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _metric(result: Dict, path: Tuple[str, ...]):
+    value = result
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def compare_results(base: Dict, head: Dict, threshold: float = 0.1) -> Tuple[List[Dict], List[Dict]]:
+    """
+    对比两个结果文件
+
+    Args:
+        base: 基线结果
+        head: 当前结果
+        threshold: 回退阈值（相对变化，0.1 表示变差超过10%）
+
+    Returns:
+        (所有对比行, 其中判定为回退的行)
+    """
+    rows, regressions = [], []
+    base_results, head_results = base.get('results', {}), head.get('results', {})
+    for target in sorted(set(base_results) & set(head_results)):
+        for path, label, higher_is_better in COMPARED_METRICS:
+            old, new = _metric(base_results[target], path), _metric(head_results[target], path)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old else (0.0 if new == old else None)
+            row = {'target': target, 'metric': label, 'base': old, 'head': new,
+                   'change': round(change, 4) if change is not None else None}
+            rows.append(row)
+            # 基线为0的指标（如扫描行数）变为非0时 change 为None，同样视为回退
+            if change is None or (-change if higher_is_better else change) > threshold:
+                regressions.append(row)
+    return rows, regressions
+
+
+def print_summary(report: Dict):
+    """以表格形式输出一次运行的结果"""
+    meta = report.get('meta', {})
+    print("=" * 100)
+    print(f"版本: {meta.get('revision')}  数据库: {meta.get('database_version')}  "
+          f"查询数: {meta.get('queries')}  并发: {meta.get('concurrency')}  冷缓存: {meta.get('cold')}")
+    print(f"语料: {report.get('corpus')}")
+    print("=" * 100)
+    print(f"{'目标':<16}{'请求':>8}{'错误':>6}{'p50ms':>10}{'p95ms':>10}{'p99ms':>10}{'qps':>10}"
+          f"{'扫描行/请求':>14}{'平均返回':>10}")
+    print("-" * 100)
+    for target, result in report.get('results', {}).items():
+        latency = result.get('latency_ms', {})
+        print(f"{target:<16}{result.get('requests', 0):>8}{result.get('errors', 0):>6}"
+              f"{latency.get('p50', '-'):>10}{latency.get('p95', '-'):>10}{latency.get('p99', '-'):>10}"
+              f"{result.get('throughput_qps') or '-':>10}{result.get('rows_examined_per_request') or 0:>14}"
+              f"{result.get('rows_returned_mean') or 0:>10}")
+        for sample in result.get('error_samples', []):
+            print(f"{'':<16}[ERROR] {sample}")
+
+
+def print_comparison(base: Dict, head: Dict, rows: List[Dict], regressions: List[Dict], threshold: float):
+    print("=" * 88)
+    print(f"基线: {base.get('meta', {}).get('revision')}  当前: {head.get('meta', {}).get('revision')}  "
+          f"回退阈值: {threshold:.0%}")
+    if base.get('corpus') != head.get('corpus'):
+        print("[WARNING] 两次运行的语料规模不同，结果不可直接比较")
+    print("=" * 88)
+    print(f"{'目标':<16}{'指标':<12}{'基线':>14}{'当前':>14}{'变化':>12}")
+    print("-" * 88)
+    flagged = {(r['target'], r['metric']) for r in regressions}
+    for row in rows:
+        change = f"{row['change']:+.1%}" if row['change'] is not None else 'n/a'
+        mark = '  << 回退' if (row['target'], row['metric']) in flagged else ''
+        print(f"{row['target']:<16}{row['metric']:<12}{row['base']:>14}{row['head']:>14}{change:>12}{mark}")
+    print("-" * 88)
+    print(f"共 {len(regressions)} 项回退" if regressions else "未发现回退")
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+content_feature_data 生成列的前后对比基准
+对同一查询分别执行：
+    - 迁移前的写法：JSON_EXTRACT(content_feature_data, ...) LIKE（逐行解析JSON，全表扫描）
+    - 迁移后的写法：生成列上的全文索引 / 普通索引
+记录每种写法的耗时（多次执行取中位数）、扫描行数（Handler_read_* 状态变量的增量）和 EXPLAIN 的访问方式
+
+使用方法：
+    python database_files/benchmark_content_feature_columns.py
+    python database_files/benchmark_content_feature_columns.py --query 端午 --festival 端午节 --runs 10 --json
+
+注意：需要先执行 run_init_schema.py 完成生成列迁移
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+# 添加scripts目录到路径
+current_file_dir = os.path.dirname(os.path.realpath(__file__))
+project_root = os.path.dirname(current_file_dir)
+sys.path.insert(0, os.path.join(project_root, 'scripts'))
+
+from db_connection import get_user_db_connection
+from search_documents import build_match_expression
+
+TABLES = ('cultural_resources', 'AIGC_cultural_resources', 'cultural_resources_from_user')
+
+# (场景, 写法, SQL模板, 参数构造函数)
+CASES = [
+    ('text_search', 'before', """
+        SELECT id FROM {table}
+        WHERE JSON_EXTRACT(content_feature_data, '$.title') LIKE %s
+           OR JSON_EXTRACT(content_feature_data, '$.text') LIKE %s
+           OR JSON_EXTRACT(content_feature_data, '$.meta.festival_names') LIKE %s
+        LIMIT %s
+    """, lambda a: (f"%{a.query}%",) * 3 + (a.limit,)),
+    ('text_search', 'after', """
+        SELECT id FROM {table}
+        WHERE MATCH(title, cf_title, cf_text, cf_festival_names) AGAINST(%s IN BOOLEAN MODE)
+        LIMIT %s
+    """, lambda a: (build_match_expression(a.query), a.limit)),
+    ('festival_lookup', 'before', """
+        SELECT id FROM {table}
+        WHERE JSON_UNQUOTE(JSON_EXTRACT(content_feature_data, '$.meta.festival_names[0]')) = %s
+        LIMIT %s
+    """, lambda a: (a.festival, a.limit)),
+    ('festival_lookup', 'after', """
+        SELECT id FROM {table}
+        WHERE cf_festival = %s
+        LIMIT %s
+    """, lambda a: (a.festival, a.limit)),
+]
+
+HANDLER_VARIABLES = ('Handler_read_first', 'Handler_read_key', 'Handler_read_next', 'Handler_read_rnd_next')
+
+
+def _handler_counts(cursor):
+    cursor.execute("SHOW SESSION STATUS LIKE 'Handler_read%'")
+    return {row['Variable_name']: int(row['Value']) for row in cursor.fetchall()}
+
+
+def run_case(cursor, table, sql, params, runs):
+    """执行一个场景，返回耗时中位数、扫描行数、返回行数和EXPLAIN访问方式"""
+    sql = sql.format(table=table)
+    cursor.execute("EXPLAIN " + sql, params)
+    plan = cursor.fetchone() or {}
+
+    timings = []
+    rows_examined = 0
+    returned = 0
+    for i in range(runs):
+        before = _handler_counts(cursor)
+        start = time.perf_counter()
+        cursor.execute(sql, params)
+        returned = len(cursor.fetchall())
+        timings.append((time.perf_counter() - start) * 1000)
+        if i == 0:
+            after = _handler_counts(cursor)
+            rows_examined = sum(after.get(k, 0) - before.get(k, 0) for k in HANDLER_VARIABLES)
+
+    return {
+        'median_ms': round(statistics.median(timings), 2),
+        'min_ms': round(min(timings), 2),
+        'rows_examined': rows_examined,
+        'rows_returned': returned,
+        'access_type': plan.get('type'),
+        'key': plan.get('key'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='content_feature_data 生成列前后对比基准')
+    parser.add_argument('--query', default='春节', help='全文检索的查询词')
+    parser.add_argument('--festival', default='春节', help='按节日精确查询的节日名称')
+    parser.add_argument('--runs', type=int, default=5, help='每个场景执行次数')
+    parser.add_argument('--limit', type=int, default=50, help='LIMIT（与query_database单表上限一致）')
+    parser.add_argument('--json', action='store_true', help='以JSON格式输出结果')
+    args = parser.parse_args()
+
+    conn = get_user_db_connection()
+    if not conn:
+        print("[ERROR] 数据库连接失败")
+        return 1
+
+    report = {'query': args.query, 'festival': args.festival, 'runs': args.runs, 'tables': {}}
+    try:
+        with conn.cursor() as cursor:
+            for table in TABLES:
+                cursor.execute(f"SELECT COUNT(*) AS total FROM {table}")
+                table_report = {'rows': cursor.fetchone()['total'], 'cases': {}}
+                for name, variant, sql, build_params in CASES:
+                    try:
+                        result = run_case(cursor, table, sql, build_params(args), max(1, args.runs))
+                    except Exception as e:
+                        result = {'error': str(e)}
+                    table_report['cases'].setdefault(name, {})[variant] = result
+                report['tables'][table] = table_report
+    finally:
+        conn.close()
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0
+
+    print("=" * 96)
+    print(f"查询词: {args.query}  节日: {args.festival}  每个场景执行 {args.runs} 次")
+    print("=" * 96)
+    print(f"{'表':<30}{'场景':<18}{'写法':<8}{'中位耗时ms':>12}{'扫描行数':>12}{'返回行数':>10}  访问方式")
+    print("-" * 96)
+    for table, table_report in report['tables'].items():
+        for name, variants in table_report['cases'].items():
+            for variant, result in variants.items():
+                if 'error' in result:
+                    print(f"{table:<30}{name:<18}{variant:<8}  [ERROR] {result['error']}")
+                    continue
+                print(f"{table:<30}{name:<18}{variant:<8}{result['median_ms']:>12}{result['rows_examined']:>12}"
+                      f"{result['rows_returned']:>10}  {result['access_type']} {result['key'] or ''}")
+        print(f"{'':<30}（表总行数: {table_report['rows']}）")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -61,6 +61,10 @@ CREATE TABLE IF NOT EXISTS `cultural_resources` (
   `source_from` VARCHAR(255) COMMENT '数据来源（如：网站名称）',
   `source_url` TEXT COMMENT '原始URL链接',
   `content_feature_data` LONGTEXT COMMENT '存储用于知识图谱构建的实体向量或AI提取的语义特征（数据赋能）',
+  `cf_title` VARCHAR(255) GENERATED ALWAYS AS (LEFT(IF(JSON_VALID(`content_feature_data`), JSON_UNQUOTE(JSON_EXTRACT(`content_feature_data`, '$.title')), NULL), 255)) STORED COMMENT 'content_feature_data.$.title（生成列）',
+  `cf_text` MEDIUMTEXT GENERATED ALWAYS AS (LEFT(IF(JSON_VALID(`content_feature_data`), JSON_UNQUOTE(JSON_EXTRACT(`content_feature_data`, '$.text')), NULL), 1000000)) STORED COMMENT 'content_feature_data.$.text（生成列）',
+  `cf_festival_names` VARCHAR(255) GENERATED ALWAYS AS (LEFT(IF(JSON_VALID(`content_feature_data`), JSON_UNQUOTE(JSON_EXTRACT(`content_feature_data`, '$.meta.festival_names')), NULL), 255)) STORED COMMENT 'content_feature_data.$.meta.festival_names（生成列，JSON数组文本）',
+  `cf_festival` VARCHAR(100) GENERATED ALWAYS AS (LEFT(IF(JSON_VALID(`content_feature_data`), JSON_UNQUOTE(JSON_EXTRACT(`content_feature_data`, '$.meta.festival_names[0]')), NULL), 100)) STORED COMMENT 'content_feature_data.$.meta.festival_names[0]（生成列，第一个节日名称）',
   `version` INT DEFAULT 1 COMMENT '版本号',
   `created_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
   `updated_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '最后更新时间',
@@ -70,6 +74,8 @@ CREATE TABLE IF NOT EXISTS `cultural_resources` (
   `manual_review_status` VARCHAR(20) DEFAULT 'pending' COMMENT '人工审核状态：pending-待审核/approved-通过/rejected-驳回',
   `manual_review_remark` TEXT COMMENT '人工审核备注',
   `upload_time` DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '上传时间',
+  INDEX `idx_cf_festival` (`cf_festival`),
+  FULLTEXT INDEX `idx_cf_search` (`title`, `cf_title`, `cf_text`, `cf_festival_names`) WITH PARSER ngram,
   UNIQUE KEY `uk_source_url` (`source_url`(255)) COMMENT 'URL唯一索引',
   CONSTRAINT `fk_cr_upload_user` FOREIGN KEY (`upload_user_id`) REFERENCES `users`(`id`) ON DELETE SET NULL
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='文化资源表';
@@ -277,6 +283,10 @@ CREATE TABLE IF NOT EXISTS `cultural_resources_from_user` (
   `resource_type` VARCHAR(50) COMMENT '资源类型（文本、图像、视频、数据态资源、虚拟展示资源等。数据态资源：用于AI分析的原始数据集；虚拟展示资源：全景图像、3D模型文件等）',
   `file_format` VARCHAR(20) COMMENT '文件格式（如：TXT, JPG, MP4, OBJ, GLB等）',
   `content_feature_data` LONGTEXT COMMENT '存储用于知识图谱构建的实体向量或AI提取的语义特征（数据赋能），包含文件路径、文本内容等信息',
+  `cf_title` VARCHAR(255) GENERATED ALWAYS AS (LEFT(IF(JSON_VALID(`content_feature_data`), JSON_UNQUOTE(JSON_EXTRACT(`content_feature_data`, '$.title')), NULL), 255)) STORED COMMENT 'content_feature_data.$.title（生成列）',
+  `cf_text` MEDIUMTEXT GENERATED ALWAYS AS (LEFT(IF(JSON_VALID(`content_feature_data`), JSON_UNQUOTE(JSON_EXTRACT(`content_feature_data`, '$.text')), NULL), 1000000)) STORED COMMENT 'content_feature_data.$.text（生成列）',
+  `cf_festival_names` VARCHAR(255) GENERATED ALWAYS AS (LEFT(IF(JSON_VALID(`content_feature_data`), JSON_UNQUOTE(JSON_EXTRACT(`content_feature_data`, '$.meta.festival_names')), NULL), 255)) STORED COMMENT 'content_feature_data.$.meta.festival_names（生成列，JSON数组文本）',
+  `cf_festival` VARCHAR(100) GENERATED ALWAYS AS (LEFT(IF(JSON_VALID(`content_feature_data`), JSON_UNQUOTE(JSON_EXTRACT(`content_feature_data`, '$.meta.festival_names[0]')), NULL), 100)) STORED COMMENT 'content_feature_data.$.meta.festival_names[0]（生成列，第一个节日名称）',
   `content_hash` VARCHAR(64) COMMENT '内容的SHA-256哈希，用于快速查重',
   `storage_path` VARCHAR(767) COMMENT '文件存储路径（相对于项目根目录，如uploads/xxx.jpg）',
   `ai_review_status` ENUM('pending', 'passed', 'failed') NOT NULL DEFAULT 'pending' COMMENT 'AI审核状态',
@@ -284,6 +294,8 @@ CREATE TABLE IF NOT EXISTS `cultural_resources_from_user` (
   `upload_time` TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '上传时间',
   `review_notes` TEXT COMMENT '审核备注（例如：未通过原因）',
   FOREIGN KEY (`user_id`) REFERENCES `users`(`id`) ON DELETE CASCADE,
+  INDEX `idx_cf_festival` (`cf_festival`),
+  FULLTEXT INDEX `idx_cf_search` (`title`, `cf_title`, `cf_text`, `cf_festival_names`) WITH PARSER ngram,
   UNIQUE KEY `uk_content_hash` (`content_hash`) COMMENT '哈希唯一索引，防止重复上传',
   INDEX `idx_user_id` (`user_id`),
   INDEX `idx_upload_time` (`upload_time`),
@@ -306,11 +318,17 @@ CREATE TABLE IF NOT EXISTS `AIGC_cultural_resources` (
   `source_from` VARCHAR(255) COMMENT '数据来源（例如：AIGC模型名称）',
   `source_url` TEXT COMMENT '原始URL链接 (如果适用)',
   `content_feature_data` LONGTEXT COMMENT '存储用于知识图谱构建的实体向量或AI提取的语义特征（数据赋能），包含文件路径、文本内容等信息',
+  `cf_title` VARCHAR(255) GENERATED ALWAYS AS (LEFT(IF(JSON_VALID(`content_feature_data`), JSON_UNQUOTE(JSON_EXTRACT(`content_feature_data`, '$.title')), NULL), 255)) STORED COMMENT 'content_feature_data.$.title（生成列）',
+  `cf_text` MEDIUMTEXT GENERATED ALWAYS AS (LEFT(IF(JSON_VALID(`content_feature_data`), JSON_UNQUOTE(JSON_EXTRACT(`content_feature_data`, '$.text')), NULL), 1000000)) STORED COMMENT 'content_feature_data.$.text（生成列）',
+  `cf_festival_names` VARCHAR(255) GENERATED ALWAYS AS (LEFT(IF(JSON_VALID(`content_feature_data`), JSON_UNQUOTE(JSON_EXTRACT(`content_feature_data`, '$.meta.festival_names')), NULL), 255)) STORED COMMENT 'content_feature_data.$.meta.festival_names（生成列，JSON数组文本）',
+  `cf_festival` VARCHAR(100) GENERATED ALWAYS AS (LEFT(IF(JSON_VALID(`content_feature_data`), JSON_UNQUOTE(JSON_EXTRACT(`content_feature_data`, '$.meta.festival_names[0]')), NULL), 100)) STORED COMMENT 'content_feature_data.$.meta.festival_names[0]（生成列，第一个节日名称）',
   `storage_path` VARCHAR(767) COMMENT '文件存储路径（相对于项目根目录，如AIGC_graph/xxx.jpg）',
   `retrieved_resource_ids` TEXT COMMENT '检索到的资源ID列表（英文逗号分隔，用于持久化显示检索结果）',
   `version` INT DEFAULT 1 COMMENT '版本号',
   `created_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
   `updated_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '最后更新时间',
+  INDEX `idx_cf_festival` (`cf_festival`),
+  FULLTEXT INDEX `idx_cf_search` (`title`, `cf_title`, `cf_text`, `cf_festival_names`) WITH PARSER ngram,
   INDEX `idx_storage_path` (`storage_path`),
   INDEX `idx_created_at` (`created_at`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='AIGC生成的文化资源表';
@@ -526,6 +544,85 @@ CREATE TABLE IF NOT EXISTS `user_access_logs` (
   INDEX `idx_access_time` (`access_time`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='用户访问日志表';
 
+-- --------------------------------------------------
+-- 21. 统一检索文档表 (search_documents)
+-- 把RAG检索涉及的7张表投影为统一结构，检索时一条全文索引查询替代逐表LIKE扫描
+-- 数据由源表上的触发器增量同步，触发器的创建和全量回填见 scripts/search_documents.py
+-- （run_init_schema.py 执行完本文件后会自动安装触发器并回填）
+-- --------------------------------------------------
+CREATE TABLE IF NOT EXISTS `search_documents` (
+  `id` BIGINT PRIMARY KEY AUTO_INCREMENT COMMENT '唯一主键',
+  `source_table` VARCHAR(64) NOT NULL COMMENT '来源表名',
+  `source_id` BIGINT NOT NULL COMMENT '来源表中的记录ID',
+  `title` TEXT COMMENT '标题（资源标题、实体名称、关系描述、图片文件名）',
+  `text` MEDIUMTEXT COMMENT '正文（资源正文、实体描述、关系证据、图片尺寸及关联信息）',
+  `festival` TEXT COMMENT '关联的节日名称',
+  `tags` TEXT COMMENT '标签（图片标签、实体类型、关系类型等）',
+  `image_path` VARCHAR(767) COMMENT '图片/文件存储路径（源表的storage_path）',
+  `source` TEXT COMMENT '数据来源',
+  `url` TEXT COMMENT '原始URL链接',
+  `resource_id` BIGINT COMMENT '关联的文化资源ID（crawled_images）',
+  `entity_id` BIGINT COMMENT '关联的文化实体ID（crawled_images）',
+  `updated_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '最后同步时间',
+  UNIQUE KEY `uk_source` (`source_table`, `source_id`),
+  INDEX `idx_resource_id` (`resource_id`),
+  INDEX `idx_entity_id` (`entity_id`),
+  FULLTEXT INDEX `idx_sd_search` (`title`, `text`, `festival`, `tags`) WITH PARSER ngram
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='统一检索文档表（由触发器从源表同步）';
+
+-- --------------------------------------------------
+-- 22. 图片标签表 (image_tags)
+-- crawled_images、AIGC_graph 的JSON标签拆分为一行一个标签，按标签查图片走索引而不是逐行JSON_SEARCH
+-- 保存图片时同步写入（aigc_db_helper.save_aigc_image），爬虫等外部写入由触发器维护，
+-- 回填和触发器安装见 scripts/image_tags.py
+-- --------------------------------------------------
+CREATE TABLE IF NOT EXISTS `image_tags` (
+  `image_table` VARCHAR(32) NOT NULL COMMENT '图片所在表（crawled_images 或 AIGC_graph）',
+  `image_id` BIGINT NOT NULL COMMENT '图片ID',
+  `tag` VARCHAR(100) NOT NULL COMMENT '标签',
+  PRIMARY KEY (`image_table`, `image_id`, `tag`),
+  INDEX `idx_tag` (`tag`, `image_table`, `image_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='图片标签表（由图片表的JSON标签拆分）';
+
+-- --------------------------------------------------
+-- 23. 节日资源索引表 (festival_resource_index)
+-- 规范节日名称（festival_name_utils.chinese_to_english_festival 的英文名，别名归为同一个键）
+-- 到实体、资源、图片ID的映射，资源详情页按节日名称一次键查找即可取回全部实体和图片
+-- 由API服务的后台线程（AIGC/festival_index.py）计算并维护，服务启动时从本表加载
+-- --------------------------------------------------
+CREATE TABLE IF NOT EXISTS `festival_resource_index` (
+  `festival_key` VARCHAR(100) NOT NULL COMMENT '规范节日名称（英文名）',
+  `source_table` VARCHAR(32) NOT NULL COMMENT '来源表（cultural_entities、cultural_resources 或 crawled_images）',
+  `source_id` BIGINT NOT NULL COMMENT '来源表中的记录ID',
+  `name` VARCHAR(255) COMMENT '实体名称（来源为cultural_entities时）',
+  `entity_id` BIGINT COMMENT '图片关联的实体ID（来源为crawled_images时）',
+  PRIMARY KEY (`festival_key`, `source_table`, `source_id`),
+  INDEX `idx_source` (`source_table`, `source_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='节日资源索引表（规范节日名称 -> 实体、资源、图片）';
+
+-- --------------------------------------------------
+-- 24. RAG自反思记录表 (rag_reflection_log)
+-- CulturalResourceRAG.ask 的自反思评估结果（RAG_REFLECTION_MODE：off/sampled/async/inline），
+-- 由API服务的后台线程（AIGC/reflection_worker.py）写入，供回答质量看板查询（/api/admin/rag/reflections）
+-- --------------------------------------------------
+CREATE TABLE IF NOT EXISTS `rag_reflection_log` (
+  `id` BIGINT AUTO_INCREMENT PRIMARY KEY,
+  `session_id` BIGINT COMMENT '会话ID（调用方提供时记录）',
+  `mode` VARCHAR(16) NOT NULL COMMENT '反思模式（async、inline、sampled）',
+  `question` TEXT COMMENT '用户问题',
+  `answer` MEDIUMTEXT COMMENT '回答（JSON：answer、key_entities、sources、confidence）',
+  `accuracy_score` DECIMAL(4,1) COMMENT '准确性评分（0-10）',
+  `needs_more_info` VARCHAR(8) COMMENT '是否需要更多信息（是/否）',
+  `requires_retrieval` VARCHAR(8) COMMENT '是否需要重新检索（是/否）',
+  `improvement_suggestions` TEXT COMMENT '改进建议',
+  `regenerated` TINYINT(1) NOT NULL DEFAULT 0 COMMENT '是否根据反思结果重新生成了回答（仅请求内反思）',
+  `answer_ms` INT COMMENT '生成回答耗时（毫秒，不含反思）',
+  `reflection_ms` INT COMMENT '反思耗时（毫秒）',
+  `created_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  INDEX `idx_created` (`created_at`),
+  INDEX `idx_mode_created` (`mode`, `created_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='RAG自反思记录表';
+
 -- --------------------------------------------------
 -- 创建角色和权限
 -- --------------------------------------------------
@@ -1030,6 +1127,108 @@ PREPARE stmt FROM @sql;
 EXECUTE stmt;
 DEALLOCATE PREPARE stmt;
 
+-- --------------------------------------------------
+-- content_feature_data 生成列迁移（已有数据库）
+-- 把检索常用的 $.title、$.text、$.meta.festival_names 物化为STORED生成列并建立索引，
+-- 查询时不再逐行解析JSON；新建的表已在CREATE TABLE中包含这些列
+-- --------------------------------------------------
+
+-- 为cultural_resources表添加生成列（如果不存在）
+SET @column_exists = (
+    SELECT COUNT(*) 
+    FROM information_schema.COLUMNS 
+    WHERE TABLE_SCHEMA = 'java_project' 
+    AND TABLE_NAME = 'cultural_resources' 
+    AND COLUMN_NAME = 'cf_title'
+);
+SET @sql = IF(@column_exists = 0,
+    'ALTER TABLE `cultural_resources` ADD COLUMN `cf_festival` VARCHAR(100) GENERATED ALWAYS AS (LEFT(IF(JSON_VALID(`content_feature_data`), JSON_UNQUOTE(JSON_EXTRACT(`content_feature_data`, \'$.meta.festival_names[0]\')), NULL), 100)) STORED COMMENT \'content_feature_data.$.meta.festival_names[0]（生成列，第一个节日名称）\' AFTER `content_feature_data`, ADD COLUMN `cf_festival_names` VARCHAR(255) GENERATED ALWAYS AS (LEFT(IF(JSON_VALID(`content_feature_data`), JSON_UNQUOTE(JSON_EXTRACT(`content_feature_data`, \'$.meta.festival_names\')), NULL), 255)) STORED COMMENT \'content_feature_data.$.meta.festival_names（生成列，JSON数组文本）\' AFTER `content_feature_data`, ADD COLUMN `cf_text` MEDIUMTEXT GENERATED ALWAYS AS (LEFT(IF(JSON_VALID(`content_feature_data`), JSON_UNQUOTE(JSON_EXTRACT(`content_feature_data`, \'$.text\')), NULL), 1000000)) STORED COMMENT \'content_feature_data.$.text（生成列）\' AFTER `content_feature_data`, ADD COLUMN `cf_title` VARCHAR(255) GENERATED ALWAYS AS (LEFT(IF(JSON_VALID(`content_feature_data`), JSON_UNQUOTE(JSON_EXTRACT(`content_feature_data`, \'$.title\')), NULL), 255)) STORED COMMENT \'content_feature_data.$.title（生成列）\' AFTER `content_feature_data`, ADD INDEX `idx_cf_festival` (`cf_festival`)',
+    'SELECT "cultural_resources生成列已存在，跳过添加"'
+);
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- 为cultural_resources表添加生成列全文索引（如果不存在）
+SET @index_exists = (
+    SELECT COUNT(*) 
+    FROM information_schema.STATISTICS 
+    WHERE TABLE_SCHEMA = 'java_project' 
+    AND TABLE_NAME = 'cultural_resources' 
+    AND INDEX_NAME = 'idx_cf_search'
+);
+SET @sql = IF(@index_exists = 0,
+    'ALTER TABLE `cultural_resources` ADD FULLTEXT INDEX `idx_cf_search` (`title`, `cf_title`, `cf_text`, `cf_festival_names`) WITH PARSER ngram',
+    'SELECT "idx_cf_search索引已存在，跳过添加"'
+);
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- 为AIGC_cultural_resources表添加生成列（如果不存在）
+SET @column_exists = (
+    SELECT COUNT(*) 
+    FROM information_schema.COLUMNS 
+    WHERE TABLE_SCHEMA = 'java_project' 
+    AND TABLE_NAME = 'AIGC_cultural_resources' 
+    AND COLUMN_NAME = 'cf_title'
+);
+SET @sql = IF(@column_exists = 0,
+    'ALTER TABLE `AIGC_cultural_resources` ADD COLUMN `cf_festival` VARCHAR(100) GENERATED ALWAYS AS (LEFT(IF(JSON_VALID(`content_feature_data`), JSON_UNQUOTE(JSON_EXTRACT(`content_feature_data`, \'$.meta.festival_names[0]\')), NULL), 100)) STORED COMMENT \'content_feature_data.$.meta.festival_names[0]（生成列，第一个节日名称）\' AFTER `content_feature_data`, ADD COLUMN `cf_festival_names` VARCHAR(255) GENERATED ALWAYS AS (LEFT(IF(JSON_VALID(`content_feature_data`), JSON_UNQUOTE(JSON_EXTRACT(`content_feature_data`, \'$.meta.festival_names\')), NULL), 255)) STORED COMMENT \'content_feature_data.$.meta.festival_names（生成列，JSON数组文本）\' AFTER `content_feature_data`, ADD COLUMN `cf_text` MEDIUMTEXT GENERATED ALWAYS AS (LEFT(IF(JSON_VALID(`content_feature_data`), JSON_UNQUOTE(JSON_EXTRACT(`content_feature_data`, \'$.text\')), NULL), 1000000)) STORED COMMENT \'content_feature_data.$.text（生成列）\' AFTER `content_feature_data`, ADD COLUMN `cf_title` VARCHAR(255) GENERATED ALWAYS AS (LEFT(IF(JSON_VALID(`content_feature_data`), JSON_UNQUOTE(JSON_EXTRACT(`content_feature_data`, \'$.title\')), NULL), 255)) STORED COMMENT \'content_feature_data.$.title（生成列）\' AFTER `content_feature_data`, ADD INDEX `idx_cf_festival` (`cf_festival`)',
+    'SELECT "AIGC_cultural_resources生成列已存在，跳过添加"'
+);
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- 为AIGC_cultural_resources表添加生成列全文索引（如果不存在）
+SET @index_exists = (
+    SELECT COUNT(*) 
+    FROM information_schema.STATISTICS 
+    WHERE TABLE_SCHEMA = 'java_project' 
+    AND TABLE_NAME = 'AIGC_cultural_resources' 
+    AND INDEX_NAME = 'idx_cf_search'
+);
+SET @sql = IF(@index_exists = 0,
+    'ALTER TABLE `AIGC_cultural_resources` ADD FULLTEXT INDEX `idx_cf_search` (`title`, `cf_title`, `cf_text`, `cf_festival_names`) WITH PARSER ngram',
+    'SELECT "idx_cf_search索引已存在，跳过添加"'
+);
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- 为cultural_resources_from_user表添加生成列（如果不存在）
+SET @column_exists = (
+    SELECT COUNT(*) 
+    FROM information_schema.COLUMNS 
+    WHERE TABLE_SCHEMA = 'java_project' 
+    AND TABLE_NAME = 'cultural_resources_from_user' 
+    AND COLUMN_NAME = 'cf_title'
+);
+SET @sql = IF(@column_exists = 0,
+    'ALTER TABLE `cultural_resources_from_user` ADD COLUMN `cf_festival` VARCHAR(100) GENERATED ALWAYS AS (LEFT(IF(JSON_VALID(`content_feature_data`), JSON_UNQUOTE(JSON_EXTRACT(`content_feature_data`, \'$.meta.festival_names[0]\')), NULL), 100)) STORED COMMENT \'content_feature_data.$.meta.festival_names[0]（生成列，第一个节日名称）\' AFTER `content_feature_data`, ADD COLUMN `cf_festival_names` VARCHAR(255) GENERATED ALWAYS AS (LEFT(IF(JSON_VALID(`content_feature_data`), JSON_UNQUOTE(JSON_EXTRACT(`content_feature_data`, \'$.meta.festival_names\')), NULL), 255)) STORED COMMENT \'content_feature_data.$.meta.festival_names（生成列，JSON数组文本）\' AFTER `content_feature_data`, ADD COLUMN `cf_text` MEDIUMTEXT GENERATED ALWAYS AS (LEFT(IF(JSON_VALID(`content_feature_data`), JSON_UNQUOTE(JSON_EXTRACT(`content_feature_data`, \'$.text\')), NULL), 1000000)) STORED COMMENT \'content_feature_data.$.text（生成列）\' AFTER `content_feature_data`, ADD COLUMN `cf_title` VARCHAR(255) GENERATED ALWAYS AS (LEFT(IF(JSON_VALID(`content_feature_data`), JSON_UNQUOTE(JSON_EXTRACT(`content_feature_data`, \'$.title\')), NULL), 255)) STORED COMMENT \'content_feature_data.$.title（生成列）\' AFTER `content_feature_data`, ADD INDEX `idx_cf_festival` (`cf_festival`)',
+    'SELECT "cultural_resources_from_user生成列已存在，跳过添加"'
+);
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- 为cultural_resources_from_user表添加生成列全文索引（如果不存在）
+SET @index_exists = (
+    SELECT COUNT(*) 
+    FROM information_schema.STATISTICS 
+    WHERE TABLE_SCHEMA = 'java_project' 
+    AND TABLE_NAME = 'cultural_resources_from_user' 
+    AND INDEX_NAME = 'idx_cf_search'
+);
+SET @sql = IF(@index_exists = 0,
+    'ALTER TABLE `cultural_resources_from_user` ADD FULLTEXT INDEX `idx_cf_search` (`title`, `cf_title`, `cf_text`, `cf_festival_names`) WITH PARSER ngram',
+    'SELECT "idx_cf_search索引已存在，跳过添加"'
+);
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
 -- --------------------------------------------------
 -- 注意：
 -- 1. users表的signature字段已在CREATE TABLE中定义，无需ALTER TABLE
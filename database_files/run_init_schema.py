@@ -11,6 +11,9 @@
     - 执行 init_schema.sql 中的所有SQL语句
     - 创建所有表、视图、索引和角色
     - 创建默认管理员账户和测试用户账户（在Python代码中创建）
+    - 为已有数据库补充 content_feature_data 的生成列和索引
+    - 安装统一检索文档表（search_documents）的同步触发器并回填
+    - 安装图片标签表（image_tags）的同步触发器并回填
     
 注意：
     - 此脚本会创建全新的数据库结构
@@ -80,6 +83,9 @@ MYSQL_CONFIG = {
 # 使用相对路径
 SQL_FILE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'init_schema.sql')
 
+# scripts目录（search_documents、image_tags 同步触发器）
+sys.path.insert(0, os.path.join(project_root, 'scripts'))
+
 
 def get_statement_priority(stmt):
     """获取SQL语句的优先级"""
@@ -443,6 +449,101 @@ def create_default_accounts(conn):
         conn.rollback()
 
 
+# content_feature_data 常用JSON路径的STORED生成列（与 init_schema.sql 中的定义保持一致）
+CONTENT_FEATURE_TABLES = ('cultural_resources', 'AIGC_cultural_resources', 'cultural_resources_from_user')
+
+
+def _json_path_expr(path):
+    return f"IF(JSON_VALID(`content_feature_data`), JSON_UNQUOTE(JSON_EXTRACT(`content_feature_data`, '{path}')), NULL)"
+
+
+CONTENT_FEATURE_COLUMNS = [
+    ('cf_title', f"VARCHAR(255) GENERATED ALWAYS AS (LEFT({_json_path_expr('$.title')}, 255)) STORED "
+                 "COMMENT 'content_feature_data.$.title（生成列）'"),
+    ('cf_text', f"MEDIUMTEXT GENERATED ALWAYS AS (LEFT({_json_path_expr('$.text')}, 1000000)) STORED "
+                "COMMENT 'content_feature_data.$.text（生成列）'"),
+    ('cf_festival_names', f"VARCHAR(255) GENERATED ALWAYS AS (LEFT({_json_path_expr('$.meta.festival_names')}, 255)) STORED "
+                          "COMMENT 'content_feature_data.$.meta.festival_names（生成列，JSON数组文本）'"),
+    ('cf_festival', f"VARCHAR(100) GENERATED ALWAYS AS (LEFT({_json_path_expr('$.meta.festival_names[0]')}, 100)) STORED "
+                    "COMMENT 'content_feature_data.$.meta.festival_names[0]（生成列，第一个节日名称）'"),
+]
+
+CONTENT_FEATURE_INDEXES = [
+    ('idx_cf_festival', "INDEX `idx_cf_festival` (`cf_festival`)"),
+    ('idx_cf_search', "FULLTEXT INDEX `idx_cf_search` (`title`, `cf_title`, `cf_text`, `cf_festival_names`) WITH PARSER ngram"),
+]
+
+
+def migrate_content_feature_columns(conn):
+    """
+    为已有数据库补充 content_feature_data 的生成列和索引
+    init_schema.sql 中的 SET/PREPARE 迁移语句会被按优先级重排，这里逐表检查后显式执行
+    （添加STORED生成列会重建表，数据量大时耗时较长）
+    """
+    with conn.cursor() as cursor:
+        for table in CONTENT_FEATURE_TABLES:
+            try:
+                cursor.execute("""
+                    SELECT COLUMN_NAME FROM information_schema.COLUMNS
+                    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+                """, (table,))
+                columns = {row[0].lower() for row in cursor.fetchall()}
+                if not columns:
+                    continue
+                cursor.execute("""
+                    SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS
+                    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+                """, (table,))
+                indexes = {row[0].lower() for row in cursor.fetchall()}
+
+                missing_columns = [(name, ddl) for name, ddl in CONTENT_FEATURE_COLUMNS if name not in columns]
+                if missing_columns:
+                    cursor.execute(
+                        f"ALTER TABLE `{table}` " +
+                        ", ".join(f"ADD COLUMN `{name}` {ddl} AFTER `content_feature_data`"
+                                  for name, ddl in reversed(missing_columns))
+                    )
+                    print(f"  [OK] {table} 已添加生成列: {', '.join(name for name, _ in missing_columns)}")
+                # InnoDB 每次只能创建一个全文索引，索引逐个添加
+                for name, ddl in CONTENT_FEATURE_INDEXES:
+                    if name not in indexes:
+                        cursor.execute(f"ALTER TABLE `{table}` ADD {ddl}")
+                        print(f"  [OK] {table} 已添加索引: {name}")
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"  [WARNING] {table} 生成列迁移失败: {e}")
+
+
+def install_search_documents(conn):
+    """安装 search_documents 的同步触发器并全量回填"""
+    try:
+        from search_documents import install_triggers, backfill
+        installed = install_triggers(conn)
+        backfill(conn)
+        failed = [table for table, ok in installed.items() if not ok]
+        if failed:
+            print(f"[WARNING] 以下表的同步触发器安装失败: {', '.join(failed)}")
+            print("  开启binlog时需要SUPER权限或 log_bin_trust_function_creators=1，")
+            print("  可在调整权限后执行: python scripts/search_documents.py")
+    except Exception as e:
+        print(f"[WARNING] 安装统一检索文档表同步触发器失败: {e}")
+
+
+def install_image_tags(conn):
+    """安装 image_tags 的同步触发器并从图片表的JSON标签回填"""
+    try:
+        from image_tags import install_triggers, backfill
+        installed = install_triggers(conn)
+        backfill(conn)
+        failed = [table for table, ok in installed.items() if not ok]
+        if failed:
+            print(f"[WARNING] 以下表的标签同步触发器安装失败: {', '.join(failed)}")
+            print("  可在调整权限后执行: python scripts/image_tags.py")
+    except Exception as e:
+        print(f"[WARNING] 安装图片标签表同步触发器失败: {e}")
+
+
 def main():
     """主函数"""
     print("=" * 60)
@@ -490,6 +591,18 @@ def main():
             print("\n正在创建默认账号...")
             create_default_accounts(conn)
             
+            # 为已有数据库补充 content_feature_data 生成列和索引
+            print("\n正在检查 content_feature_data 生成列...")
+            migrate_content_feature_columns(conn)
+            
+            # 安装 search_documents 同步触发器并回填（失败不影响初始化，检索会回退到逐表查询）
+            print("\n正在安装统一检索文档表的同步触发器...")
+            install_search_documents(conn)
+            
+            # 安装 image_tags 同步触发器并回填
+            print("\n正在回填图片标签表...")
+            install_image_tags(conn)
+            
             print("\n" + "=" * 60)
             print("[OK] 数据库初始化成功完成！")
             print("=" * 60)
@@ -4,11 +4,17 @@
 提供两种连接方式：
 1. 爬虫专用连接（使用root账户）
 2. 用户连接（使用登录用户的账户信息）
+
+所有连接默认从按数据库配置区分的连接池中借出，调用 conn.close() 即归还连接池
 """
 
 import os
+import time
+import threading
+from collections import deque
 import pymysql
 from pymysql.cursors import DictCursor
+from pymysql.constants import SERVER_STATUS
 from typing import Dict, Optional
 from dotenv import load_dotenv
 from env_loader import load_env_from_root
@@ -24,6 +30,18 @@ MYSQL_USER = os.getenv("MYSQL_USER")
 MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD")
 MYSQL_DB = os.getenv("MYSQL_DB")
 
+# ==================== 连接池配置（可选，均有默认值） ====================
+# MYSQL_POOL_ENABLED=0 可关闭连接池，回退为每次新建连接
+MYSQL_POOL_ENABLED = os.getenv("MYSQL_POOL_ENABLED", "1").lower() not in ("0", "false", "no")
+# 每个数据库配置的最大连接数（空闲 + 借出）
+MYSQL_POOL_MAX_SIZE = int(os.getenv("MYSQL_POOL_MAX_SIZE", "10"))
+# 空闲连接最长保留时间（秒），超过后关闭回收
+MYSQL_POOL_MAX_IDLE = float(os.getenv("MYSQL_POOL_MAX_IDLE", "300"))
+# 借出连接时的最长等待时间（秒）
+MYSQL_POOL_TIMEOUT = float(os.getenv("MYSQL_POOL_TIMEOUT", "10"))
+# 空闲超过该时间（秒）的连接在借出前先ping一次做健康检查
+MYSQL_POOL_PING_INTERVAL = float(os.getenv("MYSQL_POOL_PING_INTERVAL", "30"))
+
 # 验证必需的配置项
 def validate_db_config():
     """验证数据库配置是否完整"""
@@ -51,6 +69,264 @@ def validate_db_config():
         )
     return True
 
+# ==================== 连接池 ====================
+class PooledConnection:
+    """
+    连接池中借出的连接代理
+    除close()外的属性和方法都转发给真实的pymysql连接；
+    close()不会真正断开连接，而是把连接归还给连接池，
+    因此现有代码中的 conn.close() 无需修改即可复用连接
+    """
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        conn = self.__dict__.get('_conn')
+        if conn is None:
+            raise pymysql.err.InterfaceError(0, "连接已归还连接池，不能继续使用")
+        return getattr(conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """归还连接到连接池（可重复调用）"""
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.release(conn)
+
+    def invalidate(self):
+        """连接已损坏时调用：直接关闭真实连接，不再放回连接池"""
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.release(conn, discard=True)
+
+    def __del__(self):
+        # 忘记close的连接在回收时归还连接池，避免泄漏名额
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    单个数据库配置对应的线程安全连接池
+    - 有界：空闲 + 借出的连接数不超过 max_size
+    - 健康检查：空闲较久的连接借出前先ping，失效则丢弃重建
+    - 空闲回收：空闲超过 max_idle 秒的连接直接关闭
+    - 借出超时：连接耗尽时最多等待 timeout 秒，超时抛出 TimeoutError
+    """
+
+    def __init__(self, db_config: Dict, max_size: int = MYSQL_POOL_MAX_SIZE,
+                 max_idle: float = MYSQL_POOL_MAX_IDLE, timeout: float = MYSQL_POOL_TIMEOUT,
+                 ping_interval: float = MYSQL_POOL_PING_INTERVAL):
+        self.db_config = dict(db_config)
+        self.max_size = max(1, max_size)
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self._idle = deque()  # (conn, 归还时间)
+        self._in_use = 0
+        self._cond = threading.Condition(threading.Lock())
+        self._stats = {
+            'created': 0,
+            'reused': 0,
+            'recycled': 0,
+            'broken': 0,
+            'timeouts': 0,
+            'waits': 0,
+        }
+
+    def _connect(self):
+        return pymysql.connect(
+            host=self.db_config["host"],
+            port=int(self.db_config["port"]),
+            user=self.db_config["user"],
+            password=self.db_config["password"],
+            database=self.db_config["database"],
+            charset=self.db_config.get("charset", "utf8mb4"),
+            cursorclass=DictCursor
+        )
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _recycle_expired_locked(self, now: float):
+        """关闭空闲超时的连接（调用方需持有锁）"""
+        while self._idle and now - self._idle[0][1] > self.max_idle:
+            conn, _ = self._idle.popleft()
+            self._stats['recycled'] += 1
+            self._close_quietly(conn)
+
+    def acquire(self, timeout: Optional[float] = None) -> PooledConnection:
+        """借出一个连接，连接耗尽时等待，超时抛出TimeoutError"""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            conn = None
+            idle_for = 0.0
+            with self._cond:
+                while True:
+                    now = time.time()
+                    self._recycle_expired_locked(now)
+                    if self._idle:
+                        # 后进先出，优先复用最近用过的热连接
+                        conn, released_at = self._idle.pop()
+                        idle_for = now - released_at
+                        self._in_use += 1
+                        break
+                    if self._in_use < self.max_size:
+                        self._in_use += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise TimeoutError(
+                            f"等待数据库连接超时（{timeout}秒，连接池上限{self.max_size}）"
+                        )
+                    self._stats['waits'] += 1
+                    self._cond.wait(remaining)
+
+            # 网络操作（建连、ping）放在锁外进行
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    self._give_back_slot()
+                    raise
+                with self._cond:
+                    self._stats['created'] += 1
+                return PooledConnection(self, conn)
+
+            if idle_for > self.ping_interval:
+                try:
+                    conn.ping(reconnect=False)
+                except Exception:
+                    with self._cond:
+                        self._stats['broken'] += 1
+                    self._close_quietly(conn)
+                    self._give_back_slot()
+                    continue
+            with self._cond:
+                self._stats['reused'] += 1
+            return PooledConnection(self, conn)
+
+    def _give_back_slot(self):
+        with self._cond:
+            self._in_use -= 1
+            self._cond.notify()
+
+    def release(self, conn, discard: bool = False):
+        """归还连接；未提交的事务会被回滚，损坏的连接直接关闭"""
+        if not discard:
+            try:
+                if not conn.open:
+                    discard = True
+                elif conn.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+                    conn.rollback()
+            except Exception:
+                discard = True
+        if discard:
+            self._close_quietly(conn)
+        with self._cond:
+            self._in_use -= 1
+            if discard:
+                self._stats['broken'] += 1
+            else:
+                self._idle.append((conn, time.time()))
+            self._cond.notify()
+
+    def close_all(self):
+        """关闭所有空闲连接（借出的连接归还时照常放回）"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                'host': self.db_config.get('host'),
+                'port': self.db_config.get('port'),
+                'user': self.db_config.get('user'),
+                'database': self.db_config.get('database'),
+                'max_size': self.max_size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                **self._stats,
+            }
+
+
+_pools: Dict[tuple, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def _pool_key(db_config: Dict) -> tuple:
+    """不同用户的数据库配置可能不同，按完整连接参数区分连接池"""
+    return (
+        db_config["host"],
+        int(db_config["port"]),
+        db_config["user"],
+        db_config["password"],
+        db_config["database"],
+        db_config.get("charset", "utf8mb4"),
+    )
+
+
+def get_connection_pool(db_config: Dict) -> ConnectionPool:
+    """获取（必要时创建）指定数据库配置对应的连接池"""
+    key = _pool_key(db_config)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(db_config)
+                _pools[key] = pool
+    return pool
+
+
+def _connect_with_pool(db_config: Dict):
+    """按配置获取连接：启用连接池时从池中借出，否则直接新建"""
+    if not MYSQL_POOL_ENABLED:
+        return pymysql.connect(
+            host=db_config["host"],
+            port=db_config["port"],
+            user=db_config["user"],
+            password=db_config["password"],
+            database=db_config["database"],
+            charset=db_config.get("charset", "utf8mb4"),
+            cursorclass=DictCursor
+        )
+    return get_connection_pool(db_config).acquire()
+
+
+def get_pool_stats() -> list:
+    """返回所有连接池的统计信息（用于监控，不包含密码）"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.stats() for pool in pools]
+
+
+def close_all_pools():
+    """关闭所有连接池中的空闲连接"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_all()
+
+
 # 获取爬虫专用数据库配置（使用root账户，从环境变量读取）
 def get_spider_db_config():
     """
@@ -76,7 +352,7 @@ def get_spider_db_connection():
     用于爬虫程序连接数据库
     
     Returns:
-        pymysql.Connection: 数据库连接对象，失败返回None
+        PooledConnection: 数据库连接对象（close()时归还连接池），失败返回None
     """
     try:
         config = get_spider_db_config()
@@ -89,16 +365,7 @@ def get_spider_db_connection():
         return None
     
     try:
-        conn = pymysql.connect(
-            host=config["host"],
-            port=config["port"],
-            user=config["user"],
-            password=config["password"],
-            database=config["database"],
-            charset=config["charset"],
-            cursorclass=DictCursor
-        )
-        return conn
+        return _connect_with_pool(config)
     except Exception as e:
         print(f"爬虫数据库连接失败: {e}")
         return None
@@ -118,9 +385,9 @@ def get_user_db_config(user_id: Optional[int] = None):
     """
     if user_id is not None:
         try:
-            from login import AuthSystem
-            auth_system = AuthSystem()
-            user_config = auth_system.get_user_db_config(user_id)
+            # 使用带TTL的缓存，避免每次都新建AuthSystem并查询数据库
+            from user_cache import get_cached_user_db_config
+            user_config = get_cached_user_db_config(user_id)
             if user_config:
                 return user_config
         except Exception as e:
@@ -147,7 +414,7 @@ def get_user_db_connection(user_id: Optional[int] = None):
         user_id: 用户ID，如果提供则使用该用户的数据库配置
     
     Returns:
-        pymysql.Connection: 数据库连接对象，失败返回None
+        PooledConnection: 数据库连接对象（close()时归还连接池），失败返回None
     """
     try:
         config = get_user_db_config(user_id)
@@ -169,16 +436,7 @@ def get_user_db_connection(user_id: Optional[int] = None):
         return None
     
     try:
-        conn = pymysql.connect(
-            host=db_config["host"],
-            port=db_config["port"],
-            user=db_config["user"],
-            password=db_config["password"],
-            database=db_config["database"],
-            charset=db_config.get("charset", "utf8mb4"),
-            cursorclass=DictCursor
-        )
-        return conn
+        return _connect_with_pool(db_config)
     except Exception as e:
         print(f"用户数据库连接失败: {e}")
         return None
@@ -210,7 +468,7 @@ def get_default_db_connection():
     获取默认数据库连接（用于向后兼容）
     
     Returns:
-        pymysql.Connection: 数据库连接对象，失败返回None
+        PooledConnection: 数据库连接对象（close()时归还连接池），失败返回None
     """
     try:
         db_config = get_default_db_config()
@@ -222,16 +480,7 @@ def get_default_db_connection():
         return None
     
     try:
-        conn = pymysql.connect(
-            host=db_config["host"],
-            port=db_config["port"],
-            user=db_config["user"],
-            password=db_config["password"],
-            database=db_config["database"],
-            charset=db_config.get("charset", "utf8mb4"),
-            cursorclass=DictCursor
-        )
-        return conn
+        return _connect_with_pool(db_config)
     except Exception as e:
         print(f"默认数据库连接失败: {e}")
         return None
@@ -255,3 +504,7 @@ if __name__ == "__main__":
     else:
         print("[FAIL] 用户数据库连接失败")
 
+    print("\n连接池状态:")
+    for pool_stats in get_pool_stats():
+        print(f"  {pool_stats}")
+
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+查询向量持久化缓存
+向量检索、补充检索、节日资源生成和多模态图片检索每次都要调用远程嵌入接口（DashScope / OpenAI）把查询转为向量，
+相同或重复的查询每次都要多付 100~300ms。这里为嵌入模型提供带缓存的包装：
+- 按 (模型名, 文本SHA-256) 缓存，同一文本换模型不会串用；查询向量与文档向量分开缓存（DashScope 两者的 text_type 不同）
+- 内存LRU在前，本地SQLite在后（float32 BLOB），进程重启后仍可命中
+- embed_documents 只为未命中的文本批量调用一次接口
+- 分层统计命中（内存/磁盘）、未命中和接口耗时
+RAGBase、多模态检索和 vectorize_images.py 共用同一个缓存库。
+"""
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from ttl_cache import TTLCache
+
+project_root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(project_root, "cache", "embedding_cache.db"))
+# 内存LRU条目数；磁盘最多保留的向量数（超出后删除最早写入的）
+EMBEDDING_CACHE_MEMORY_SIZE = int(os.getenv("EMBEDDING_CACHE_MEMORY_SIZE", "4096"))
+EMBEDDING_CACHE_MAX_ROWS = int(os.getenv("EMBEDDING_CACHE_MAX_ROWS", "200000"))
+# 每写入多少条检查一次磁盘条目数上限
+_PRUNE_EVERY = 1000
+
+
+def embedding_model_name(model) -> str:
+    """嵌入模型的缓存名称：类名 + 模型名（如 DashScopeEmbeddings:text-embedding-v2）"""
+    name = getattr(model, 'model', None) or getattr(model, 'model_name', None) or ''
+    return f"{type(model).__name__}:{name}"
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256((text or '').encode('utf-8')).hexdigest()
+
+
+class EmbeddingCacheStore:
+    """基于SQLite的向量缓存（内存LRU + 磁盘持久化）"""
+
+    def __init__(self, db_path: str = EMBEDDING_CACHE_PATH, memory_size: int = EMBEDDING_CACHE_MEMORY_SIZE,
+                 max_rows: int = EMBEDDING_CACHE_MAX_ROWS):
+        self.db_path = db_path
+        self.max_rows = max_rows
+        self._memory = TTLCache(maxsize=memory_size, ttl=float('inf'), name='embedding_memory')
+        self._lock = threading.Lock()
+        self._conn = None
+        self._writes_since_prune = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.api_calls = 0
+        self.api_texts = 0
+        self.api_seconds = 0.0
+        self.errors = 0
+
+    def _get_conn(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS embedding_cache (
+                    model TEXT NOT NULL,
+                    text_hash TEXT NOT NULL,
+                    dim INTEGER NOT NULL,
+                    vector BLOB NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (model, text_hash)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_embedding_created ON embedding_cache (created_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, List[float]]:
+        """批量读取向量：先查内存，再查磁盘（磁盘命中回填内存），返回 {text_hash: 向量}"""
+        found: Dict[str, List[float]] = {}
+        missing = []
+        for h in hashes:
+            vector = self._memory.get((model, h))
+            if vector is not None:
+                found[h] = vector
+            else:
+                missing.append(h)
+        memory_hits = len(found)
+        if missing:
+            try:
+                with self._lock:
+                    conn = self._get_conn()
+                    # SQLite 单条语句的参数个数有限，分批查询
+                    for i in range(0, len(missing), 500):
+                        batch = missing[i:i + 500]
+                        rows = conn.execute(
+                            f"SELECT text_hash, vector FROM embedding_cache WHERE model = ? "
+                            f"AND text_hash IN ({', '.join('?' * len(batch))})",
+                            [model] + batch
+                        ).fetchall()
+                        for h, blob in rows:
+                            found[h] = array('f', blob).tolist()
+            except Exception as e:
+                self.errors += 1
+                print(f"[EmbeddingCache] 读取缓存失败: {e}")
+            for h in missing:
+                if h in found:
+                    self._memory.set((model, h), found[h])
+        with self._lock:
+            self.memory_hits += memory_hits
+            self.disk_hits += len(found) - memory_hits
+            self.misses += len(set(hashes) - set(found))
+        return found
+
+    def set_many(self, model: str, items: List[Tuple[str, List[float]]]):
+        """写入向量（内存和磁盘）"""
+        if not items:
+            return
+        for h, vector in items:
+            self._memory.set((model, h), vector)
+        try:
+            now = time.time()
+            with self._lock:
+                conn = self._get_conn()
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embedding_cache (model, text_hash, dim, vector, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(model, h, len(vector), array('f', vector).tobytes(), now) for h, vector in items]
+                )
+                conn.commit()
+                self._writes_since_prune += len(items)
+                if self._writes_since_prune >= _PRUNE_EVERY:
+                    self._writes_since_prune = 0
+                    self._prune(conn)
+        except Exception as e:
+            self.errors += 1
+            print(f"[EmbeddingCache] 写入缓存失败: {e}")
+
+    def _prune(self, conn):
+        """磁盘条目超过上限时删除最早写入的条目（调用方持有锁）"""
+        count = conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+        if count > self.max_rows:
+            conn.execute(
+                "DELETE FROM embedding_cache WHERE rowid IN "
+                "(SELECT rowid FROM embedding_cache ORDER BY created_at LIMIT ?)",
+                (count - self.max_rows,)
+            )
+            conn.commit()
+
+    def record_api_call(self, texts: int, seconds: float):
+        with self._lock:
+            self.api_calls += 1
+            self.api_texts += texts
+            self.api_seconds += seconds
+
+    def stats(self) -> Dict:
+        size = None
+        try:
+            with self._lock:
+                size = self._get_conn().execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+        except Exception:
+            pass
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                'path': self.db_path,
+                'disk_size': size,
+                'max_rows': self.max_rows,
+                'memory': self._memory.stats(),
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round(hits / total, 4) if total else 0.0,
+                'api_calls': self.api_calls,
+                'api_texts': self.api_texts,
+                'api_avg_ms': round(self.api_seconds * 1000 / self.api_calls, 1) if self.api_calls else 0.0,
+                'errors': self.errors,
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """带缓存的嵌入模型包装，可直接作为 Chroma 的 embedding_function 使用"""
+
+    def __init__(self, model: Embeddings, store: Optional[EmbeddingCacheStore] = None,
+                 model_name: Optional[str] = None):
+        self.model = model
+        self.store = store or get_embedding_cache()
+        self.model_name = model_name or embedding_model_name(model)
+
+    def _embed(self, texts: List[str], embed_func, kind: str) -> List[List[float]]:
+        model = f"{self.model_name}|{kind}"
+        hashes = [text_hash(t) for t in texts]
+        found = self.store.get_many(model, hashes)
+        # 未命中的文本去重后一次性调用接口
+        pending: Dict[str, str] = {}
+        for t, h in zip(texts, hashes):
+            if h not in found and h not in pending:
+                pending[h] = t
+        if pending:
+            start = time.time()
+            vectors = embed_func(list(pending.values()))
+            self.store.record_api_call(len(pending), time.time() - start)
+            items = list(zip(pending.keys(), vectors))
+            self.store.set_many(model, items)
+            found.update(items)
+        return [found[h] for h in hashes]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(list(texts), self.model.embed_documents, 'document')
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text], lambda pending: [self.model.embed_query(pending[0])], 'query')[0]
+
+
+_embedding_cache = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCacheStore:
+    """获取向量缓存单例（同一进程内所有嵌入模型共用，按模型名区分）"""
+    global _embedding_cache
+    if _embedding_cache is None:
+        with _embedding_cache_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCacheStore()
+    return _embedding_cache
+
+
+def cached_embeddings(model: Optional[Embeddings]) -> Optional[Embeddings]:
+    """为嵌入模型加上缓存（已包装或为None时原样返回）"""
+    if model is None or isinstance(model, CachedEmbeddings):
+        return model
+    return CachedEmbeddings(model)
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+图片标签表（image_tags）的维护
+crawled_images、AIGC_graph 的 tags 是JSON数组，按标签查图片只能逐行 JSON_SEARCH / LIKE。
+这里把标签拆分到 image_tags(image_table, image_id, tag)，按标签查图片走 idx_tag 索引：
+- 保存图片时在同一事务内同步写入（write_image_tags，aigc_db_helper.save_aigc_image 使用）
+- crawled_images 由爬虫和Java后端写入，不经过本项目的Python代码，由触发器维护
+- 提供按ID区间分批的全量回填
+
+使用方法：
+    python scripts/image_tags.py                      # 安装触发器并全量回填
+    python scripts/image_tags.py --install-triggers   # 只安装触发器
+    python scripts/image_tags.py --backfill --tables AIGC_graph --batch-size 2000
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from typing import Dict, Iterable, List, Optional, Sequence
+
+IMAGE_TAGS_TABLE = 'image_tags'
+IMAGE_TABLES = ('crawled_images', 'AIGC_graph')
+
+# 由触发器维护标签的图片表（写入方不在本项目的Python代码中）
+TRIGGER_TABLES = ('crawled_images',)
+
+# 标签最大长度（与 image_tags.tag 列一致）
+TAG_MAX_LENGTH = 100
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def normalize_tags(tags) -> List[str]:
+    """
+    标签归一化：接受JSON字符串或列表，去除首尾空白、截断到 TAG_MAX_LENGTH、去空去重（保持顺序）
+    与触发器中的处理保持一致
+    """
+    if tags is None:
+        return []
+    if isinstance(tags, (bytes, str)):
+        try:
+            tags = json.loads(tags)
+        except (ValueError, TypeError):
+            return []
+    if not isinstance(tags, list):
+        return []
+    result = []
+    for tag in tags:
+        if tag is None or isinstance(tag, (dict, list)):
+            continue
+        tag = str(tag).strip()[:TAG_MAX_LENGTH]
+        if tag and tag not in result:
+            result.append(tag)
+    return result
+
+
+def write_image_tags(cursor, image_table: str, image_id: int, tags) -> int:
+    """
+    覆盖写入一张图片的标签（调用方负责提交事务）
+
+    Returns:
+        int: 写入的标签数
+    """
+    cursor.execute(f"DELETE FROM `{IMAGE_TAGS_TABLE}` WHERE image_table = %s AND image_id = %s",
+                   (image_table, image_id))
+    normalized = normalize_tags(tags)
+    if normalized:
+        cursor.executemany(
+            f"INSERT IGNORE INTO `{IMAGE_TAGS_TABLE}` (image_table, image_id, tag) VALUES (%s, %s, %s)",
+            [(image_table, image_id, tag) for tag in normalized]
+        )
+    return len(normalized)
+
+
+def escape_like(value: str) -> str:
+    """转义LIKE通配符"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def tag_match_subquery(image_table: str) -> str:
+    """
+    按标签匹配图片ID的子查询（结果列为image_id，参数为 tag_prefix_pattern 生成的前缀模式），
+    走 idx_tag 索引范围扫描；通常与其他条件的图片ID子查询 UNION 后再与图片表关联
+    """
+    return (f"SELECT image_id FROM `{IMAGE_TAGS_TABLE}` "
+            f"WHERE image_table = '{image_table}' AND tag LIKE %s")
+
+
+def tag_prefix_pattern(query: str) -> str:
+    """标签前缀匹配模式：标签等于查询词或以查询词开头"""
+    return escape_like(query.strip()[:TAG_MAX_LENGTH]) + '%'
+
+
+# ==================== 触发器 ====================
+def trigger_name(table: str, event: str) -> str:
+    return f"trg_it_{table.lower()}_{event}"
+
+
+def build_trigger_statements(table: str) -> List[str]:
+    """生成图片表的标签同步触发器（循环展开JSON数组，兼容MySQL 5.7，不依赖JSON_TABLE）"""
+    declarations = f"DECLARE i INT DEFAULT 0; DECLARE t VARCHAR({TAG_MAX_LENGTH}); "
+    sync_body = (
+        f"DELETE FROM `{IMAGE_TAGS_TABLE}` WHERE image_table = '{table}' AND image_id = NEW.id; "
+        f"IF NEW.tags IS NOT NULL AND JSON_TYPE(NEW.tags) = 'ARRAY' THEN "
+        f"WHILE i < JSON_LENGTH(NEW.tags) DO "
+        f"SET t = LEFT(TRIM(JSON_UNQUOTE(JSON_EXTRACT(NEW.tags, CONCAT('$[', i, ']')))), {TAG_MAX_LENGTH}); "
+        f"IF t IS NOT NULL AND t <> '' AND JSON_TYPE(JSON_EXTRACT(NEW.tags, CONCAT('$[', i, ']'))) "
+        f"NOT IN ('OBJECT', 'ARRAY', 'NULL') THEN "
+        f"INSERT IGNORE INTO `{IMAGE_TAGS_TABLE}` (image_table, image_id, tag) VALUES ('{table}', NEW.id, t); "
+        f"END IF; "
+        f"SET i = i + 1; "
+        f"END WHILE; "
+        f"END IF;"
+    )
+    return [
+        f"CREATE TRIGGER `{trigger_name(table, 'ins')}` AFTER INSERT ON `{table}` FOR EACH ROW "
+        f"BEGIN {declarations}{sync_body} END",
+        # 只在标签变化时重写
+        f"CREATE TRIGGER `{trigger_name(table, 'upd')}` AFTER UPDATE ON `{table}` FOR EACH ROW "
+        f"BEGIN {declarations}IF NOT (OLD.tags <=> NEW.tags) THEN {sync_body} END IF; END",
+        f"CREATE TRIGGER `{trigger_name(table, 'del')}` AFTER DELETE ON `{table}` FOR EACH ROW BEGIN "
+        f"DELETE FROM `{IMAGE_TAGS_TABLE}` WHERE image_table = '{table}' AND image_id = OLD.id; END",
+    ]
+
+
+def install_triggers(conn, tables: Optional[Sequence[str]] = None) -> Dict[str, bool]:
+    """安装（或重建）图片表上的标签同步触发器，默认只安装 TRIGGER_TABLES"""
+    result = {}
+    with conn.cursor() as cursor:
+        for table in tables or TRIGGER_TABLES:
+            try:
+                for event in ('ins', 'upd', 'del'):
+                    cursor.execute(f"DROP TRIGGER IF EXISTS `{trigger_name(table, event)}`")
+                for statement in build_trigger_statements(table):
+                    cursor.execute(statement)
+                conn.commit()
+                result[table] = True
+                print(f"[ImageTags] [OK] 已安装 {table} 的标签同步触发器")
+            except Exception as e:
+                conn.rollback()
+                result[table] = False
+                print(f"[ImageTags] [ERROR] 安装 {table} 的标签同步触发器失败: {e}")
+    return result
+
+
+# ==================== 回填 ====================
+def _rows_as_tuples(rows: Iterable) -> List[tuple]:
+    return [tuple(r.values()) if isinstance(r, dict) else tuple(r) for r in rows]
+
+
+def backfill(conn, tables: Optional[Sequence[str]] = None, batch_size: int = BACKFILL_BATCH_SIZE) -> Dict[str, int]:
+    """
+    全量回填：按ID区间分批读取图片表的JSON标签并覆盖写入 image_tags，再清理已删除图片的标签
+    可重复执行
+
+    Returns:
+        dict: 图片表 -> 写入的标签数
+    """
+    counts = {}
+    with conn.cursor() as cursor:
+        for table in tables or IMAGE_TABLES:
+            start = time.time()
+            try:
+                cursor.execute(f"SELECT MIN(id), MAX(id) FROM `{table}`")
+                low, high = _rows_as_tuples([cursor.fetchone()])[0]
+            except Exception as e:
+                print(f"[ImageTags] 读取 {table} 失败，跳过回填: {e}")
+                continue
+            written = 0
+            if low is not None:
+                for batch_start in range(int(low), int(high) + 1, batch_size):
+                    cursor.execute(f"SELECT id, tags FROM `{table}` WHERE id BETWEEN %s AND %s",
+                                   (batch_start, batch_start + batch_size - 1))
+                    for image_id, tags in _rows_as_tuples(cursor.fetchall()):
+                        written += write_image_tags(cursor, table, image_id, tags)
+                    conn.commit()
+            cursor.execute(
+                f"DELETE it FROM `{IMAGE_TAGS_TABLE}` it LEFT JOIN `{table}` t ON t.id = it.image_id "
+                f"WHERE it.image_table = %s AND t.id IS NULL",
+                (table,)
+            )
+            removed = cursor.rowcount
+            conn.commit()
+            counts[table] = written
+            print(f"[ImageTags] [OK] {table} 回填完成：写入 {written} 个标签，"
+                  f"清理 {removed} 个已删除图片的标签，耗时 {time.time() - start:.1f} 秒")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='image_tags 图片标签表：安装同步触发器 / 全量回填')
+    parser.add_argument('--install-triggers', action='store_true', help='安装（重建）crawled_images上的标签同步触发器')
+    parser.add_argument('--backfill', action='store_true', help='按ID区间分批全量回填')
+    parser.add_argument('--tables', nargs='+', choices=IMAGE_TABLES, help='只回填指定的图片表（默认全部）')
+    parser.add_argument('--batch-size', type=int, default=BACKFILL_BATCH_SIZE, help='回填时每批的ID区间大小')
+    args = parser.parse_args()
+    # 未指定操作时先安装触发器再回填
+    do_install = args.install_triggers or not args.backfill
+    do_backfill = args.backfill or not args.install_triggers
+
+    sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+    from db_connection import get_user_db_connection
+
+    conn = get_user_db_connection()
+    if not conn:
+        print("[ImageTags] 数据库连接失败")
+        return 1
+    try:
+        ok = True
+        if do_install:
+            ok = all(install_triggers(conn).values())
+        if do_backfill:
+            backfill(conn, args.tables, max(1, args.batch_size))
+        return 0 if ok else 1
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+数据库结构能力注册表
+启动时一次性读取当前数据库所有表的列和索引，缓存在内存中，
+替代请求路径上逐个查询 INFORMATION_SCHEMA 的做法。
+表结构变更（执行迁移）后调用 refresh() 或管理员接口刷新。
+"""
+
+import time
+import threading
+from typing import Dict, Optional, Set
+
+from db_connection import get_user_db_connection
+
+
+class SchemaRegistry:
+    """表 -> 列集合 / 索引集合 的内存注册表"""
+
+    # 加载失败后的最小重试间隔（秒），避免数据库不可用时每个请求都去重试
+    RETRY_INTERVAL = 30
+
+    def __init__(self):
+        self._columns: Dict[str, Set[str]] = {}
+        self._indexes: Dict[str, Dict[str, str]] = {}  # table -> {index_name: index_type}
+        self._loaded = False
+        self._loaded_at: Optional[float] = None
+        self._last_attempt = 0.0
+        self._lock = threading.Lock()
+
+    def load(self, conn=None) -> bool:
+        """
+        读取当前数据库的列和索引信息
+
+        Args:
+            conn: 可选的数据库连接，不提供则自动获取（用完归还）
+
+        Returns:
+            bool: 是否加载成功
+        """
+        with self._lock:
+            self._last_attempt = time.monotonic()
+            own_conn = conn is None
+            if own_conn:
+                conn = get_user_db_connection()
+                if not conn:
+                    print("[SchemaRegistry] 数据库连接失败，无法加载表结构")
+                    return False
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("""
+                        SELECT TABLE_NAME, COLUMN_NAME
+                        FROM INFORMATION_SCHEMA.COLUMNS
+                        WHERE TABLE_SCHEMA = DATABASE()
+                    """)
+                    columns: Dict[str, Set[str]] = {}
+                    for row in cursor.fetchall():
+                        columns.setdefault(row['TABLE_NAME'].lower(), set()).add(row['COLUMN_NAME'].lower())
+
+                    cursor.execute("""
+                        SELECT DISTINCT TABLE_NAME, INDEX_NAME, INDEX_TYPE
+                        FROM INFORMATION_SCHEMA.STATISTICS
+                        WHERE TABLE_SCHEMA = DATABASE()
+                    """)
+                    indexes: Dict[str, Dict[str, str]] = {}
+                    for row in cursor.fetchall():
+                        indexes.setdefault(row['TABLE_NAME'].lower(), {})[row['INDEX_NAME'].lower()] = row['INDEX_TYPE']
+
+                self._columns = columns
+                self._indexes = indexes
+                self._loaded = True
+                self._loaded_at = time.time()
+                print(f"[SchemaRegistry] 已加载 {len(columns)} 张表的结构信息")
+                return True
+            except Exception as e:
+                print(f"[SchemaRegistry] 加载表结构失败: {e}")
+                return False
+            finally:
+                if own_conn:
+                    conn.close()
+
+    def refresh(self, conn=None) -> bool:
+        """重新加载表结构（迁移后调用）"""
+        return self.load(conn)
+
+    def _ensure_loaded(self):
+        if not self._loaded and time.monotonic() - self._last_attempt >= self.RETRY_INTERVAL:
+            self.load()
+
+    def has_table(self, table: str) -> bool:
+        self._ensure_loaded()
+        return table.lower() in self._columns
+
+    def has_column(self, table: str, column: str) -> bool:
+        """表中是否存在指定列（注册表未加载时返回False）"""
+        self._ensure_loaded()
+        return column.lower() in self._columns.get(table.lower(), ())
+
+    def has_index(self, table: str, index_name: str) -> bool:
+        """表中是否存在指定索引（注册表未加载时返回False）"""
+        self._ensure_loaded()
+        return index_name.lower() in self._indexes.get(table.lower(), {})
+
+    def columns(self, table: str) -> Set[str]:
+        self._ensure_loaded()
+        return set(self._columns.get(table.lower(), ()))
+
+    def indexes(self, table: str) -> Dict[str, str]:
+        self._ensure_loaded()
+        return dict(self._indexes.get(table.lower(), {}))
+
+    def mark_column(self, table: str, column: str):
+        """本进程内执行了ALTER TABLE ADD COLUMN后，直接登记新列，无需整体刷新"""
+        with self._lock:
+            self._columns.setdefault(table.lower(), set()).add(column.lower())
+
+    def summary(self) -> Dict:
+        """返回注册表概要（用于监控和管理接口）"""
+        return {
+            'loaded': self._loaded,
+            'loaded_at': self._loaded_at,
+            'table_count': len(self._columns),
+            'tables': {
+                table: {
+                    'columns': len(cols),
+                    'indexes': sorted(self._indexes.get(table, {}).keys()),
+                }
+                for table, cols in sorted(self._columns.items())
+            },
+        }
+
+
+# 进程内共享的注册表实例
+schema_registry = SchemaRegistry()
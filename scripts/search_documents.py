@@ -0,0 +1,435 @@
+# -*- coding: utf-8 -*-
+"""
+统一检索文档表（search_documents）的同步与检索
+RAG检索涉及的7张源表结构各不相同，这里把每张表投影为统一的
+(source_table, source_id, title, text, festival, tags, image_path, ...) 结构：
+- 源表上的 AFTER INSERT/UPDATE/DELETE 触发器增量同步，Python、Java后端、爬虫的写入都会被同步
+- 被引用的表（cultural_entities、cultural_resources）修改或删除时，同步刷新引用它们的关系和图片文档
+- 提供按ID区间分批的全量回填（首次部署、触发器安装前已有数据、修复不一致时使用）
+- 检索时一条 FULLTEXT(ngram) 查询替代逐表 LIKE / JSON_EXTRACT 扫描
+
+使用方法：
+    python scripts/search_documents.py                      # 安装触发器并全量回填
+    python scripts/search_documents.py --install-triggers   # 只安装触发器
+    python scripts/search_documents.py --backfill --tables crawled_images --batch-size 2000
+
+注意：开启binlog的MySQL上创建触发器需要 TRIGGER 权限，并且需要 SUPER 权限或
+log_bin_trust_function_creators=1；触发器安装失败时检索自动回退到逐表查询。
+"""
+
+import os
+import sys
+import time
+import threading
+import argparse
+from typing import Dict, List, Optional, Sequence, Set
+
+SEARCH_DOCUMENTS_TABLE = 'search_documents'
+
+# 触发器名前缀：trg_sd_<源表>_<ins|upd|del>
+TRIGGER_PREFIX = 'trg_sd_'
+
+# 正文最多同步的字符数（MEDIUMTEXT上限16MB，utf8mb4按4字节计留出余量）
+TEXT_MAX_CHARS = 1000000
+
+# 回填时每批处理的ID区间大小
+BACKFILL_BATCH_SIZE = 1000
+
+# 已同步表的状态缓存时间（秒）
+SYNC_STATUS_TTL = 60
+
+# search_documents 的同步列（与投影表达式一一对应）
+DOCUMENT_COLUMNS = ('title', 'text', 'festival', 'tags', 'image_path', 'source', 'url', 'resource_id', 'entity_id')
+
+
+def _json_text(column: str, path: str) -> str:
+    """JSON字段取值表达式（非法JSON返回NULL，避免触发器报错导致源表写入失败）"""
+    return f"IF(JSON_VALID({column}), JSON_UNQUOTE(JSON_EXTRACT({column}, '{path}')), NULL)"
+
+
+def _resource_projection(source_expr: str, fallback_content: bool = False) -> Dict[str, str]:
+    """文化资源类表（原始、AIGC、用户上传）的投影，{r} 为行别名"""
+    cfd = '{r}.content_feature_data'
+    text_parts = [_json_text(cfd, '$.title'), _json_text(cfd, '$.text')]
+    if fallback_content:
+        text_parts.append(_json_text(cfd, '$.content_full'))
+    return {
+        'title': '{r}.title',
+        # 非JSON内容按原文同步
+        'text': f"LEFT(IF(JSON_VALID({cfd}), CONCAT_WS('\\n', {', '.join(text_parts)}), {cfd}), {TEXT_MAX_CHARS})",
+        'festival': f"CONCAT_WS(' ', {{r}}.title, {_json_text(cfd, '$.meta.festival_names')})",
+        'tags': _json_text(cfd, '$.meta.tags'),
+        'image_path': '{r}.storage_path' if fallback_content else 'NULL',
+        'source': source_expr,
+        'url': '{r}.source_url' if not fallback_content else 'NULL',
+        'resource_id': 'NULL',
+        'entity_id': 'NULL',
+    }
+
+
+def _image_projection(source: str, with_relations: bool) -> Dict[str, str]:
+    """图片类表（AIGC生成、爬虫抓取）的投影"""
+    text = "CONCAT('尺寸：', IFNULL({r}.dimensions, '未知'))"
+    if with_relations:
+        text = ("CONCAT('尺寸：', IFNULL({r}.dimensions, '未知'), "
+                "'，关联资源：', IFNULL((SELECT title FROM cultural_resources WHERE id = {r}.resource_id), ''), "
+                "'，关联实体：', IFNULL((SELECT entity_name FROM cultural_entities WHERE id = {r}.entity_id), ''))")
+    return {
+        'title': '{r}.file_name',
+        'text': text,
+        'festival': '{r}.festival_name' if with_relations else 'NULL',
+        'tags': 'CAST({r}.tags AS CHAR)',
+        'image_path': '{r}.storage_path',
+        'source': f"'{source}'",
+        'url': 'NULL',
+        'resource_id': '{r}.resource_id' if with_relations else 'NULL',
+        'entity_id': '{r}.entity_id' if with_relations else 'NULL',
+    }
+
+
+# 各源表 -> search_documents 列的SQL投影表达式（{r} 为行别名：触发器中为NEW，回填时为t）
+SOURCE_PROJECTIONS: Dict[str, Dict[str, str]] = {
+    'cultural_resources': _resource_projection('{r}.source_from'),
+    'AIGC_cultural_resources': _resource_projection('{r}.source_from'),
+    # 用户上传表没有 source_from 和 source_url 列
+    'cultural_resources_from_user': _resource_projection("'用户上传'", fallback_content=True),
+    'cultural_entities': {
+        'title': '{r}.entity_name',
+        'text': ("CONCAT_WS('；', CONCAT('描述：', NULLIF({r}.description, '')), "
+                 "CONCAT('文化价值：', NULLIF({r}.cultural_value, '')), "
+                 "CONCAT('时期：', NULLIF({r}.period_era, '')), "
+                 "CONCAT('文化区域：', NULLIF({r}.cultural_region, '')), "
+                 "CONCAT('风格特征：', NULLIF({r}.style_features, '')), "
+                 # 来源不在全文索引的列中，并入正文以便检索（原逐表 LIKE 查询同样匹配 source）
+                 "CONCAT('来源：', NULLIF({r}.source, '')))"),
+        'festival': 'NULL',
+        'tags': '{r}.entity_type',
+        'image_path': 'NULL',
+        'source': '{r}.source',
+        'url': 'NULL',
+        'resource_id': 'NULL',
+        'entity_id': 'NULL',
+    },
+    'entity_relationships': {
+        'title': ("CONCAT_WS(' - ', (SELECT entity_name FROM cultural_entities WHERE id = {r}.source_entity_id), "
+                  "{r}.relationship_type, "
+                  "(SELECT entity_name FROM cultural_entities WHERE id = {r}.target_entity_id))"),
+        'text': '{r}.relationship_evidence',
+        'festival': 'NULL',
+        'tags': '{r}.relationship_type',
+        'image_path': 'NULL',
+        'source': "''",
+        'url': 'NULL',
+        'resource_id': 'NULL',
+        'entity_id': 'NULL',
+    },
+    'AIGC_graph': _image_projection('AIGC生成', with_relations=False),
+    'crawled_images': _image_projection('爬虫抓取', with_relations=True),
+}
+
+SOURCE_TABLES = tuple(SOURCE_PROJECTIONS.keys())
+
+
+# ==================== 同步SQL生成 ====================
+def _upsert_sql(table: str, alias: str, where: Optional[str] = None) -> str:
+    """
+    生成把源表行投影写入 search_documents 的 INSERT ... ON DUPLICATE KEY UPDATE
+
+    Args:
+        table: 源表名
+        alias: 行别名（触发器中为NEW，从源表选取时为t）
+        where: 从源表选取时的过滤条件；为None时直接投影别名行（触发器）
+    """
+    projection = SOURCE_PROJECTIONS[table]
+    exprs = ', '.join(projection[col].format(r=alias) for col in DOCUMENT_COLUMNS)
+    columns = ', '.join(f'`{col}`' for col in DOCUMENT_COLUMNS)
+    updates = ', '.join(f'`{col}` = VALUES(`{col}`)' for col in DOCUMENT_COLUMNS)
+    from_clause = f"FROM `{table}` {alias} WHERE {where}" if where else "FROM DUAL"
+    return (f"INSERT INTO `{SEARCH_DOCUMENTS_TABLE}` (`source_table`, `source_id`, {columns}) "
+            f"SELECT '{table}', {alias}.id, {exprs} {from_clause} "
+            f"ON DUPLICATE KEY UPDATE {updates}")
+
+
+def _delete_sql(table: str, id_expr: str) -> str:
+    return f"DELETE FROM `{SEARCH_DOCUMENTS_TABLE}` WHERE source_table = '{table}' AND source_id = {id_expr}"
+
+
+def _dependent_refresh_sql(table: str, old_or_new: str, deleted: bool) -> List[str]:
+    """
+    被引用表的行变化后，需要刷新的引用方文档
+    外键级联（ON DELETE CASCADE / SET NULL）不会触发子表的触发器，这里一并处理
+    """
+    statements = []
+    if table == 'cultural_entities':
+        if deleted:
+            # 关系已被级联删除
+            statements.append(
+                f"DELETE FROM `{SEARCH_DOCUMENTS_TABLE}` WHERE source_table = 'entity_relationships' "
+                f"AND NOT EXISTS (SELECT 1 FROM entity_relationships er WHERE er.id = source_id)"
+            )
+            # 图片的entity_id已被置空，按文档中记录的旧entity_id找回
+            statements.append(_upsert_sql('crawled_images', 't', (
+                f"t.id IN (SELECT source_id FROM `{SEARCH_DOCUMENTS_TABLE}` "
+                f"WHERE source_table = 'crawled_images' AND entity_id = {old_or_new}.id)"
+            )))
+        else:
+            statements.append(_upsert_sql('entity_relationships', 't', (
+                f"t.source_entity_id = {old_or_new}.id OR t.target_entity_id = {old_or_new}.id"
+            )))
+            statements.append(_upsert_sql('crawled_images', 't', f"t.entity_id = {old_or_new}.id"))
+    elif table == 'cultural_resources':
+        if deleted:
+            statements.append(_upsert_sql('crawled_images', 't', (
+                f"t.id IN (SELECT source_id FROM `{SEARCH_DOCUMENTS_TABLE}` "
+                f"WHERE source_table = 'crawled_images' AND resource_id = {old_or_new}.id)"
+            )))
+        else:
+            statements.append(_upsert_sql('crawled_images', 't', f"t.resource_id = {old_or_new}.id"))
+    return statements
+
+
+def trigger_name(table: str, event: str) -> str:
+    return f"{TRIGGER_PREFIX}{table.lower()}_{event}"
+
+
+def build_trigger_statements(table: str) -> List[str]:
+    """生成源表的三个同步触发器的 CREATE TRIGGER 语句（通过API执行，不需要DELIMITER）"""
+    statements = []
+    for event, timing_event, alias in (('ins', 'INSERT', 'NEW'), ('upd', 'UPDATE', 'NEW'), ('del', 'DELETE', 'OLD')):
+        if event == 'del':
+            body = [_delete_sql(table, 'OLD.id')]
+            body.extend(_dependent_refresh_sql(table, 'OLD', deleted=True))
+        else:
+            body = [_upsert_sql(table, alias)]
+            if event == 'upd':
+                body.extend(_dependent_refresh_sql(table, 'NEW', deleted=False))
+        statements.append(
+            f"CREATE TRIGGER `{trigger_name(table, event)}` AFTER {timing_event} ON `{table}` "
+            f"FOR EACH ROW BEGIN {'; '.join(body)}; END"
+        )
+    return statements
+
+
+# ==================== 安装与回填 ====================
+def _first_row(cursor):
+    """取第一行为元组（兼容普通游标和DictCursor）"""
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return tuple(row.values()) if isinstance(row, dict) else tuple(row)
+
+
+def _existing_tables(cursor) -> Set[str]:
+    cursor.execute("SELECT TABLE_NAME FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_SCHEMA = DATABASE()")
+    rows = cursor.fetchall()
+    return {(tuple(r.values())[0] if isinstance(r, dict) else r[0]).lower() for r in rows}
+
+
+def install_triggers(conn, tables: Optional[Sequence[str]] = None) -> Dict[str, bool]:
+    """
+    安装（或重建）源表上的同步触发器
+
+    Args:
+        conn: 数据库连接
+        tables: 要安装的源表，默认全部
+
+    Returns:
+        dict: 源表 -> 是否安装成功
+    """
+    result = {}
+    with conn.cursor() as cursor:
+        existing = _existing_tables(cursor)
+        if SEARCH_DOCUMENTS_TABLE not in existing:
+            print(f"[SearchDocuments] {SEARCH_DOCUMENTS_TABLE} 表不存在，请先执行 init_schema.sql")
+            return {table: False for table in (tables or SOURCE_TABLES)}
+        for table in tables or SOURCE_TABLES:
+            if table.lower() not in existing:
+                print(f"[SearchDocuments] 源表 {table} 不存在，跳过")
+                result[table] = False
+                continue
+            try:
+                for event in ('ins', 'upd', 'del'):
+                    cursor.execute(f"DROP TRIGGER IF EXISTS `{trigger_name(table, event)}`")
+                for statement in build_trigger_statements(table):
+                    cursor.execute(statement)
+                conn.commit()
+                result[table] = True
+                print(f"[SearchDocuments] [OK] 已安装 {table} 的同步触发器")
+            except Exception as e:
+                conn.rollback()
+                result[table] = False
+                print(f"[SearchDocuments] [ERROR] 安装 {table} 的同步触发器失败: {e}")
+    invalidate_sync_status()
+    return result
+
+
+def backfill(conn, tables: Optional[Sequence[str]] = None, batch_size: int = BACKFILL_BATCH_SIZE) -> Dict[str, int]:
+    """
+    全量回填：按ID区间分批把源表投影写入 search_documents，并删除源表中已不存在的文档
+    可重复执行（按 (source_table, source_id) 覆盖写入）
+
+    Returns:
+        dict: 源表 -> 写入的行数
+    """
+    counts = {}
+    with conn.cursor() as cursor:
+        existing = _existing_tables(cursor)
+        for table in tables or SOURCE_TABLES:
+            if table.lower() not in existing:
+                print(f"[SearchDocuments] 源表 {table} 不存在，跳过回填")
+                continue
+            start = time.time()
+            cursor.execute(f"SELECT MIN(id), MAX(id) FROM `{table}`")
+            low, high = _first_row(cursor) or (None, None)
+            written = 0
+            if low is not None:
+                sql = _upsert_sql(table, 't', 't.id BETWEEN %s AND %s')
+                for batch_start in range(int(low), int(high) + 1, batch_size):
+                    cursor.execute(sql, (batch_start, batch_start + batch_size - 1))
+                    conn.commit()
+                    written += cursor.rowcount if cursor.rowcount and cursor.rowcount > 0 else 0
+            cursor.execute(
+                f"DELETE sd FROM `{SEARCH_DOCUMENTS_TABLE}` sd "
+                f"LEFT JOIN `{table}` t ON t.id = sd.source_id "
+                f"WHERE sd.source_table = %s AND t.id IS NULL",
+                (table,)
+            )
+            removed = cursor.rowcount
+            conn.commit()
+            counts[table] = written
+            print(f"[SearchDocuments] [OK] {table} 回填完成：影响 {written} 行，"
+                  f"清理 {removed} 条过期文档，耗时 {time.time() - start:.1f} 秒")
+    invalidate_sync_status()
+    return counts
+
+
+# ==================== 同步状态 ====================
+_sync_status = {'tables': None, 'checked_at': 0.0}
+_sync_status_lock = threading.Lock()
+
+
+def invalidate_sync_status():
+    with _sync_status_lock:
+        _sync_status['tables'] = None
+
+
+def get_synced_tables(cursor) -> Set[str]:
+    """
+    返回三个同步触发器都已安装的源表（结果缓存 SYNC_STATUS_TTL 秒）
+    search_documents 表不存在时返回空集合
+    """
+    with _sync_status_lock:
+        if _sync_status['tables'] is not None and time.monotonic() - _sync_status['checked_at'] < SYNC_STATUS_TTL:
+            return _sync_status['tables']
+    tables: Set[str] = set()
+    try:
+        if SEARCH_DOCUMENTS_TABLE in _existing_tables(cursor):
+            cursor.execute(
+                "SELECT TRIGGER_NAME FROM INFORMATION_SCHEMA.TRIGGERS "
+                "WHERE TRIGGER_SCHEMA = DATABASE() AND TRIGGER_NAME LIKE %s",
+                (TRIGGER_PREFIX.replace('_', '\\_') + '%',)
+            )
+            names = {(tuple(r.values())[0] if isinstance(r, dict) else r[0]).lower() for r in cursor.fetchall()}
+            tables = {
+                table for table in SOURCE_TABLES
+                if all(trigger_name(table, event) in names for event in ('ins', 'upd', 'del'))
+            }
+    except Exception as e:
+        print(f"[SearchDocuments] 读取同步状态失败: {e}")
+    with _sync_status_lock:
+        _sync_status['tables'] = tables
+        _sync_status['checked_at'] = time.monotonic()
+    return tables
+
+
+# ==================== 检索 ====================
+# ngram 全文索引的最小词长（innodb_ft_ngram_token_size 默认值），短于该长度的查询无法走全文索引
+NGRAM_TOKEN_SIZE = 2
+
+
+def build_match_expression(*phrases: str) -> str:
+    """
+    把查询词组合为布尔模式的全文检索式：每个查询词作为短语（与 LIKE '%词%' 的子串语义一致），
+    多个查询词之间为或关系；短于 NGRAM_TOKEN_SIZE 的查询词被忽略
+    """
+    terms = []
+    for phrase in phrases:
+        phrase = (phrase or '').replace('"', ' ').strip()
+        if len(phrase) >= NGRAM_TOKEN_SIZE and f'"{phrase}"' not in terms:
+            terms.append(f'"{phrase}"')
+    return ' '.join(terms)
+
+
+def search(cursor, match_expression: str, tables: Sequence[str], limit_per_table: int) -> List[Dict]:
+    """
+    在 search_documents 中检索
+
+    Args:
+        cursor: DictCursor 游标
+        match_expression: build_match_expression 生成的检索式
+        tables: 限定的源表
+        limit_per_table: 每张源表最多返回的行数
+
+    Returns:
+        list: 文档行（含 score），按源表分组、组内按相关度降序
+    """
+    if not match_expression or not tables:
+        return []
+    # 每张源表单独 ORDER BY ... LIMIT 后 UNION ALL，与逐表查询一样每张表各自最多返回 limit_per_table 行，
+    # 不会因为某张表的相关度整体偏高而挤掉其他表的结果
+    table_query = f"""
+        (SELECT source_table, source_id, title, text, festival, tags, image_path,
+                source, url, resource_id, entity_id,
+                MATCH(title, text, festival, tags) AGAINST(%s IN BOOLEAN MODE) AS score
+         FROM `{SEARCH_DOCUMENTS_TABLE}`
+         WHERE MATCH(title, text, festival, tags) AGAINST(%s IN BOOLEAN MODE)
+           AND source_table = %s
+         ORDER BY score DESC
+         LIMIT %s)
+    """
+    params: List = []
+    for table in tables:
+        params.extend((match_expression, match_expression, table, limit_per_table))
+    cursor.execute(' UNION ALL '.join([table_query] * len(tables)), params)
+
+    grouped: Dict[str, List[Dict]] = {table: [] for table in tables}
+    for row in cursor.fetchall():
+        bucket = grouped.get(row['source_table'])
+        if bucket is not None:
+            bucket.append(row)
+    for bucket in grouped.values():
+        bucket.sort(key=lambda row: row['score'], reverse=True)
+    return [row for table in tables for row in grouped[table]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='search_documents 统一检索文档表：安装同步触发器 / 全量回填')
+    parser.add_argument('--install-triggers', action='store_true', help='安装（重建）源表上的同步触发器')
+    parser.add_argument('--backfill', action='store_true', help='按ID区间分批全量回填')
+    parser.add_argument('--tables', nargs='+', choices=SOURCE_TABLES, help='只处理指定的源表（默认全部）')
+    parser.add_argument('--batch-size', type=int, default=BACKFILL_BATCH_SIZE, help='回填时每批的ID区间大小')
+    args = parser.parse_args()
+    # 未指定操作时先安装触发器再回填（先装触发器，回填期间的新写入不会遗漏）
+    do_install = args.install_triggers or not args.backfill
+    do_backfill = args.backfill or not args.install_triggers
+
+    sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+    from db_connection import get_user_db_connection
+
+    conn = get_user_db_connection()
+    if not conn:
+        print("[SearchDocuments] 数据库连接失败")
+        return 1
+    try:
+        ok = True
+        if do_install:
+            ok = all(install_triggers(conn, args.tables).values())
+        if do_backfill:
+            backfill(conn, args.tables, max(1, args.batch_size))
+        return 0 if ok else 1
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+线程安全的 TTL + LRU 内存缓存
+- 条目超过 ttl 秒后视为过期
+- 条目数超过 maxsize 时淘汰最久未使用的条目
+- 可选内存预算：提供 max_bytes 时按 sizeof 估算条目大小，总量超过预算时同样按LRU淘汰
+- 可选淘汰回调：条目因LRU/内存预算被淘汰或过期被清理时调用 on_evict(key, value, reason)
+- 记录命中、未命中、淘汰等统计信息，便于监控
+"""
+
+import sys
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+_MISSING = object()
+
+
+class TTLCache:
+    """带过期时间的LRU缓存"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300, name: str = 'cache',
+                 max_bytes: Optional[int] = None, sizeof: Optional[Callable[[Any], int]] = None,
+                 on_evict: Optional[Callable[[Hashable, Any, str], None]] = None):
+        """
+        Args:
+            maxsize: 最大条目数
+            ttl: 默认过期时间（秒）
+            name: 缓存名称（用于统计信息）
+            max_bytes: 内存预算（字节），None表示不限制
+            sizeof: 估算条目大小的函数，默认使用 sys.getsizeof
+            on_evict: 淘汰回调 (key, value, reason)，reason 为 'lru' 或 'expired'；
+                      在锁外调用，pop/clear 等主动删除不触发
+        """
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self.name = name
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof or sys.getsizeof
+        self._on_evict = on_evict
+        self._data = OrderedDict()  # key -> (value, 过期时间, 估算大小)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """读取缓存，未命中或已过期时返回default"""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self._misses += 1
+                return default
+            value, expires_at, size = item
+            if expires_at > now:
+                self._data.move_to_end(key)
+                self._hits += 1
+                return value
+            del self._data[key]
+            self._bytes -= size
+            self._expirations += 1
+            self._misses += 1
+        self._notify_evicted([(key, value, 'expired')])
+        return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """写入缓存"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        size = self._sizeof(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            # 单个条目就超过预算，不缓存
+            self.pop(key)
+            return
+        evicted_items = []
+        with self._lock:
+            old = self._data.pop(key, _MISSING)
+            if old is not _MISSING:
+                self._bytes -= old[2]
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+            while len(self._data) > self.maxsize or \
+                    (self.max_bytes is not None and self._bytes > self.max_bytes):
+                evicted_key, evicted = self._data.popitem(last=False)
+                self._bytes -= evicted[2]
+                self._evictions += 1
+                if self._on_evict is not None:
+                    evicted_items.append((evicted_key, evicted[0], 'lru'))
+        self._notify_evicted(evicted_items)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any], cache_none: bool = False) -> Any:
+        """
+        读取缓存，未命中时调用loader加载并写入
+        默认不缓存None结果（例如用户刚注册时查询不到的情况）
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        value = loader()
+        if value is not None or cache_none:
+            self.set(key, value)
+        return value
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """删除并返回指定条目"""
+        with self._lock:
+            item = self._data.pop(key, _MISSING)
+            if item is not _MISSING:
+                self._bytes -= item[2]
+        return default if item is _MISSING else item[0]
+
+    def pop_where(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """删除满足条件的所有条目，返回删除数量"""
+        with self._lock:
+            keys = [k for k, item in self._data.items() if predicate(k, item[0])]
+            for k in keys:
+                self._bytes -= self._data.pop(k)[2]
+        return len(keys)
+
+    def purge_expired(self) -> int:
+        """清理所有已过期的条目（get 只在读取时惰性清理），返回清理数量"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [(k, item[0]) for k, item in self._data.items() if item[1] <= now]
+            for k, _ in expired:
+                self._bytes -= self._data.pop(k)[2]
+            self._expirations += len(expired)
+        self._notify_evicted([(k, v, 'expired') for k, v in expired])
+        return len(expired)
+
+    def _notify_evicted(self, items: List[Tuple[Hashable, Any, str]]):
+        """在锁外调用淘汰回调，回调异常不影响缓存本身"""
+        if self._on_evict is None:
+            return
+        for key, value, reason in items:
+            try:
+                self._on_evict(key, value, reason)
+            except Exception as e:
+                print(f"缓存 {self.name} 淘汰回调出错: {e}")
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def stats(self) -> Dict:
+        """返回缓存统计信息"""
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                'name': self.name,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / total, 4) if total else 0.0,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+            }
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+用户数据库配置和用户信息缓存
+get_user_db_config / get_user_by_id 每次都会查询数据库，在对话、检索、上传等
+热点路径上被反复调用。这里用 TTL + LRU 缓存其结果，并在用户修改密码、角色、
+昵称、头像或注销账号时显式失效。
+"""
+
+import os
+import copy
+import threading
+from typing import Dict, Optional
+
+from ttl_cache import TTLCache
+
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+USER_CACHE_MAXSIZE = int(os.getenv("USER_CACHE_MAXSIZE", "1024"))
+
+_user_config_cache = TTLCache(maxsize=USER_CACHE_MAXSIZE, ttl=USER_CACHE_TTL, name='user_db_config')
+_user_profile_cache = TTLCache(maxsize=USER_CACHE_MAXSIZE, ttl=USER_CACHE_TTL, name='user_profile')
+
+_shared_auth_system = None
+_auth_lock = threading.Lock()
+
+
+def _get_shared_auth_system():
+    """获取进程内共享的AuthSystem实例（避免每次查询都新建）"""
+    global _shared_auth_system
+    if _shared_auth_system is None:
+        with _auth_lock:
+            if _shared_auth_system is None:
+                from login import AuthSystem
+                _shared_auth_system = AuthSystem()
+    return _shared_auth_system
+
+
+def get_cached_user_db_config(user_id: int, auth_system=None) -> Optional[Dict]:
+    """获取用户数据库配置（带缓存），返回副本，调用方可放心修改"""
+    auth_system = auth_system or _get_shared_auth_system()
+    value = _user_config_cache.get_or_load(
+        int(user_id), lambda: auth_system.get_user_db_config(user_id)
+    )
+    return copy.deepcopy(value)
+
+
+def get_cached_user_by_id(user_id: int, auth_system=None) -> Optional[Dict]:
+    """获取用户信息（带缓存），返回副本，调用方可放心修改"""
+    auth_system = auth_system or _get_shared_auth_system()
+    value = _user_profile_cache.get_or_load(
+        int(user_id), lambda: auth_system.get_user_by_id(user_id)
+    )
+    return copy.deepcopy(value)
+
+
+def invalidate_user_cache(user_id=None):
+    """
+    使指定用户的缓存失效；user_id为None时清空全部缓存
+    在修改密码、角色、昵称、头像、签名或注销账号后调用
+    """
+    if user_id is None:
+        _user_config_cache.clear()
+        _user_profile_cache.clear()
+        return
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return
+    _user_config_cache.pop(user_id)
+    _user_profile_cache.pop(user_id)
+
+
+def invalidate_user_cache_by_account(account: str):
+    """按账号使缓存失效（用于忘记密码等只知道账号的场景）"""
+    user_ids = set()
+
+    def _match(key, value):
+        if isinstance(value, dict) and value.get('account') == account:
+            user_ids.add(key)
+            return True
+        return False
+
+    _user_profile_cache.pop_where(_match)
+    for user_id in user_ids:
+        _user_config_cache.pop(user_id)
+    if not user_ids:
+        # 用户信息未缓存时无法确定user_id，保守起见清空配置缓存
+        _user_config_cache.clear()
+
+
+def get_user_cache_stats() -> list:
+    """返回用户缓存的统计信息"""
+    return [_user_config_cache.stats(), _user_profile_cache.stats()]
+
+
+class CachedAuthSystem:
+    """
+    AuthSystem 的缓存包装
+    get_user_db_config / get_user_by_id 走缓存，修改用户信息的方法成功后自动失效缓存，
+    其余方法原样转发给被包装的实例
+    """
+
+    def __init__(self, auth_system):
+        self._auth_system = auth_system
+
+    def __getattr__(self, name):
+        return getattr(self._auth_system, name)
+
+    def get_user_db_config(self, user_id):
+        return get_cached_user_db_config(user_id, self._auth_system)
+
+    def get_user_by_id(self, user_id):
+        return get_cached_user_by_id(user_id, self._auth_system)
+
+    def update_nickname(self, user_id, *args, **kwargs):
+        result = self._auth_system.update_nickname(user_id, *args, **kwargs)
+        invalidate_user_cache(user_id)
+        return result
+
+    def update_password(self, user_id, *args, **kwargs):
+        result = self._auth_system.update_password(user_id, *args, **kwargs)
+        invalidate_user_cache(user_id)
+        return result
+
+    def update_security_question(self, user_id, *args, **kwargs):
+        result = self._auth_system.update_security_question(user_id, *args, **kwargs)
+        invalidate_user_cache(user_id)
+        return result
+
+    def reset_password(self, account, *args, **kwargs):
+        result = self._auth_system.reset_password(account, *args, **kwargs)
+        invalidate_user_cache_by_account(account)
+        return result
@@ -27,6 +27,7 @@ try:
     from langchain_openai import OpenAIEmbeddings
     from langchain_community.embeddings import DashScopeEmbeddings
     from langchain.schema import Document
+    from embedding_cache import cached_embeddings
 except ImportError as e:
     print(f"错误：缺少必要的库，请运行: pip install langchain langchain-openai langchain-community")
     sys.exit(1)
@@ -36,21 +37,21 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 DASHSCOPE_API_KEY = os.getenv("DASHSCOPE_API_KEY") or os.getenv("ALIYUN_API_KEY")
 
 def get_image_embedding_model():
-    """获取图片嵌入模型"""
+    """获取图片嵌入模型（带持久化向量缓存，重复运行时已向量化过的描述不再调用接口）"""
     # 优先使用支持图片的模型
     if DASHSCOPE_API_KEY:
         try:
             # 阿里云的多模态模型支持图片
-            return DashScopeEmbeddings(
+            return cached_embeddings(DashScopeEmbeddings(
                 dashscope_api_key=DASHSCOPE_API_KEY,
                 model="text-embedding-v2"
-            )
+            ))
         except:
             pass
     
     if OPENAI_API_KEY:
         try:
-            return OpenAIEmbeddings(model="text-embedding-3-large")
+            return cached_embeddings(OpenAIEmbeddings(model="text-embedding-3-large"))
         except:
             pass
     
@@ -243,6 +244,11 @@ def vectorize_images(crawled_images_dir: str, persist_directory: str, batch_size
     print(f"失败: {fail_count} 张")
     print(f"跳过: {len(image_files) - new_count} 张（已处理）")
     print(f"向量数据库: {persist_directory}")
+    cache_stats = getattr(embedding_model, 'store', None)
+    if cache_stats is not None:
+        cache_stats = cache_stats.stats()
+        print(f"向量缓存: 命中 {cache_stats['memory_hits'] + cache_stats['disk_hits']} 条，"
+              f"未命中 {cache_stats['misses']} 条，接口调用 {cache_stats['api_calls']} 次")
     print("=" * 60)
     
     return True